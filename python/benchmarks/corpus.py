@@ -0,0 +1,101 @@
+"""
+Synthetic PDF corpora for benchmarks.
+
+PDFs are written by hand rather than with a PDF library, as pypdf can read
+text from PDFs but not lay it out. Each PDF has pages of pseudo-random words,
+so that every document has different contents (and content hash) while
+corpora stay reproducible for a given seed.
+"""
+import random
+from pathlib import Path
+
+WORDS = (
+    "learning model data training feature algorithm classifier error bias "
+    "variance overfitting generalization representation evaluation sample "
+    "distribution gradient optimization network inference kernel ensemble "
+    "regularization accuracy prediction hypothesis dimension knowledge search"
+).split()
+
+LINES_PER_PAGE = 50
+WORDS_PER_LINE = 12
+
+
+def _page_content(rng: random.Random) -> bytes:
+    lines = [
+        " ".join(rng.choice(WORDS) for _ in range(WORDS_PER_LINE))
+        for _ in range(LINES_PER_PAGE)
+    ]
+    text_ops = "\n".join(f"({line}) Tj T*" for line in lines)
+    return f"BT /F1 10 Tf 14 TL 50 750 Td\n{text_ops}\nET".encode("latin-1")
+
+
+def write_synthetic_pdf(filepath: Path, num_pages: int, seed: int) -> None:
+    """
+    Writes a PDF with `num_pages` pages of text to `filepath`.
+    """
+    rng = random.Random(seed)
+
+    # object numbers: 1 catalog, 2 page tree, 3 font, then a page object
+    # and a content stream for each page
+    page_ids = [4 + 2 * i for i in range(num_pages)]
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        (
+            f"<< /Type /Pages /Count {num_pages} "
+            f"/Kids [{' '.join(f'{i} 0 R' for i in page_ids)}] >>"
+        ).encode("latin-1"),
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    for page_id in page_ids:
+        content = _page_content(rng)
+        objects.append(
+            (
+                "<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                "/Resources << /Font << /F1 3 0 R >> >> "
+                f"/Contents {page_id + 1} 0 R >>"
+            ).encode("latin-1")
+        )
+        objects.append(
+            f"<< /Length {len(content)} >>\nstream\n".encode("latin-1")
+            + content
+            + b"\nendstream"
+        )
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, obj in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n".encode("latin-1") + obj + b"\nendobj\n"
+
+    xref_offset = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("latin-1")
+    for offset in offsets:
+        out += f"{offset:010d} 00000 n \n".encode("latin-1")
+    out += (
+        f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\n"
+        f"startxref\n{xref_offset}\n%%EOF\n"
+    ).encode("latin-1")
+
+    Path(filepath).write_bytes(bytes(out))
+
+
+def create_corpus(
+    directory: Path, num_docs: int, num_pages: int = 8, seed: int = 0
+) -> list[Path]:
+    """
+    Writes `num_docs` synthetic PDFs to `directory`.
+
+    Returns
+    -------
+    list[Path]
+        Paths to the PDFs
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+
+    filepaths = []
+    for i in range(num_docs):
+        filepath = directory.joinpath(f"paper-{i:05d}.pdf")
+        write_synthetic_pdf(filepath, num_pages=num_pages, seed=seed * 1_000_003 + i)
+        filepaths.append(filepath)
+    return filepaths
@@ -0,0 +1,125 @@
+"""
+Local stand-in for a Grobid server, so that ingest can be benchmarked
+without network access.
+
+The stub answers `processHeaderDocument` requests with the TEI XML and error
+fixtures used by the tests, after a configurable delay. Whether a file fails
+is decided from its filename, so a corpus fails the same way on every run.
+"""
+import re
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from xml.sax.saxutils import escape
+
+FIXTURES_DIR = Path(__file__).parent.parent.joinpath("tests", "fixtures", "xml")
+
+FILENAME_PATTERN = re.compile(rb'filename="([^"]+)"')
+TITLE_PATTERN = re.compile(r"<title level=\"a\" type=\"main\">.*?</title>", re.DOTALL)
+
+
+class StubGrobidServer:
+    """
+    Runs a stub Grobid server on a background thread.
+
+    Parameters
+    ----------
+    latency : float
+        Seconds to wait before responding to each PDF
+    failure_rate : float
+        Fraction of PDFs (between 0 and 1) that fail with a 500 response
+    version : str
+        Version reported by the `/api/version` endpoint
+
+    Examples
+    --------
+    >>> with StubGrobidServer(latency=0.05) as server:
+    ...     client = GrobidClient(server_url=server.url)
+    """
+
+    def __init__(
+        self, latency: float = 0.0, failure_rate: float = 0.0, version: str = "stub"
+    ):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.version = version
+
+        self.tei_template = FIXTURES_DIR.joinpath("test.tei.xml").read_text()
+        self.error_text = FIXTURES_DIR.joinpath("grobid-fails_500.txt").read_text()
+
+        self.num_requests = 0
+        self._lock = threading.Lock()
+        self._server: ThreadingHTTPServer | None = None
+        self._thread: threading.Thread | None = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def is_failure(self, filename: str) -> bool:
+        return zlib.crc32(filename.encode("utf8")) / 2**32 < self.failure_rate
+
+    def create_tei(self, filename: str) -> str:
+        title = f'<title level="a" type="main">{escape(filename)}</title>'
+        return TITLE_PATTERN.sub(title, self.tei_template, count=2)
+
+    def start(self) -> "StubGrobidServer":
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != "/api/version":
+                    self._respond(404, "")
+                    return
+                self._respond(
+                    200, f'{{"version": "{stub.version}"}}', "application/json"
+                )
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                if self.path != "/api/processHeaderDocument":
+                    self._respond(404, "")
+                    return
+
+                with stub._lock:
+                    stub.num_requests += 1
+
+                match = FILENAME_PATTERN.search(body)
+                filename = match.group(1).decode("utf8") if match else ""
+
+                time.sleep(stub.latency)
+                if stub.is_failure(filename):
+                    self._respond(500, stub.error_text)
+                else:
+                    self._respond(200, stub.create_tei(filename), "application/xml")
+
+            def _respond(self, status: int, text: str, content_type="text/plain"):
+                data = text.encode("utf8")
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+
+    def __enter__(self) -> "StubGrobidServer":
+        return self.start()
+
+    def __exit__(self, *args) -> None:
+        self.stop()
@@ -0,0 +1,220 @@
+"""
+Benchmarks reference ingest end to end, against a local stub Grobid server.
+
+For each corpus size, a project with that many synthetic PDFs is created in a
+temporary directory and ingested with `PDFIngestion`. The time spent in each
+ingest stage, the throughput and the peak memory use (of the sidecar and its
+worker processes) are reported.
+
+Run from the `python` directory:
+
+    poetry run python -m benchmarks.ingest --docs 10 100 1000
+"""
+import json
+import tempfile
+import threading
+import time
+from argparse import ArgumentParser
+from pathlib import Path
+
+import psutil
+from sidecar import config
+from sidecar.references.grobid import GrobidClient
+from sidecar.references.ingest import IngestProgress, PDFIngestion
+from sidecar.references.schemas import IngestStage, IngestStatus
+
+from benchmarks.corpus import create_corpus
+from benchmarks.grobid_stub import StubGrobidServer
+
+
+class StageTimer(IngestProgress):
+    """Records when ingest enters each stage"""
+
+    def __init__(self):
+        self.stage_starts: list[tuple[IngestStage, float]] = []
+
+    def set_stage(self, stage: IngestStage) -> None:
+        self.stage_starts.append((stage, time.perf_counter()))
+
+    def get_timings(self, finished_at: float) -> dict[str, float]:
+        """
+        Returns the seconds spent in each stage, in the order they ran.
+        """
+        timings = {}
+        ends = [start for _, start in self.stage_starts[1:]] + [finished_at]
+        for (stage, start), end in zip(self.stage_starts, ends):
+            timings[stage] = timings.get(stage, 0.0) + end - start
+        return timings
+
+
+class PeakMemorySampler:
+    """
+    Samples the resident set size of this process and its children (e.g.
+    the PDF worker processes) on a background thread, keeping the peak.
+    """
+
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.peak_rss = 0
+        self._process = psutil.Process()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _sample(self) -> int:
+        rss = self._process.memory_info().rss
+        for child in self._process.children(recursive=True):
+            try:
+                rss += child.memory_info().rss
+            except psutil.Error:
+                pass
+        return rss
+
+    def _run(self) -> None:
+        while not self._stopped.is_set():
+            self.peak_rss = max(self.peak_rss, self._sample())
+            self._stopped.wait(self.interval)
+
+    def __enter__(self) -> "PeakMemorySampler":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self._stopped.set()
+        self._thread.join()
+        self.peak_rss = max(self.peak_rss, self._sample())
+
+
+def run_benchmark(
+    num_docs: int,
+    num_pages: int = 8,
+    latency: float = 0.05,
+    failure_rate: float = 0.05,
+    concurrency: int = config.GROBID_CONCURRENCY,
+    max_workers: int = None,
+) -> dict:
+    """
+    Ingests a synthetic corpus of `num_docs` PDFs and returns measurements.
+
+    Parameters
+    ----------
+    num_docs : int
+        Number of PDFs in the corpus
+    num_pages : int
+        Number of pages in each PDF
+    latency : float
+        Seconds the stub Grobid server takes to respond to each PDF
+    failure_rate : float
+        Fraction of PDFs that the stub Grobid server fails to parse
+    concurrency : int
+        Maximum number of in-flight Grobid requests
+    max_workers : int, optional
+        Number of processes used to extract text from PDFs
+
+    Returns
+    -------
+    dict
+        Measurements for the run
+    """
+    # results from earlier runs must not be served from the Grobid cache
+    config.GROBID_CACHE_MAX_BYTES = 0
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        uploads_dir = Path(tmp_dir, "project", "uploads")
+        create_corpus(uploads_dir, num_docs=num_docs, num_pages=num_pages)
+
+        with StubGrobidServer(latency=latency, failure_rate=failure_rate) as server:
+            timer = StageTimer()
+            ingestion = PDFIngestion(
+                input_dir=uploads_dir,
+                progress=timer,
+                max_workers=max_workers,
+                grobid_client=GrobidClient(
+                    server_url=server.url, concurrency=concurrency
+                ),
+            )
+
+            with PeakMemorySampler() as memory:
+                started_at = time.perf_counter()
+                response = ingestion.run()
+                finished_at = time.perf_counter()
+
+        total = finished_at - started_at
+        return {
+            "docs": num_docs,
+            "pages_per_doc": num_pages,
+            "grobid_latency": latency,
+            "grobid_requests": server.num_requests,
+            "references": len(response.references),
+            "failures": sum(
+                1 for ref in response.references if ref.status == IngestStatus.FAILURE
+            ),
+            "total_seconds": round(total, 3),
+            "docs_per_second": round(num_docs / total, 2) if total else None,
+            "stage_seconds": {
+                stage: round(seconds, 3)
+                for stage, seconds in timer.get_timings(finished_at).items()
+            },
+            "peak_rss_mb": round(memory.peak_rss / 1024**2, 1),
+        }
+
+
+def format_result(result: dict) -> str:
+    stages = ", ".join(f"{k}={v:.2f}s" for k, v in result["stage_seconds"].items())
+    return (
+        f"{result['docs']:>5} docs: {result['total_seconds']:8.2f}s "
+        f"({result['docs_per_second']} docs/s), "
+        f"peak RSS {result['peak_rss_mb']} MB, "
+        f"{result['failures']} failures\n"
+        f"       {stages}"
+    )
+
+
+def get_arg_parser() -> ArgumentParser:
+    parser = ArgumentParser(description="Benchmark reference ingest")
+    parser.add_argument(
+        "--docs", type=int, nargs="+", default=[10, 100, 1000], help="Corpus sizes"
+    )
+    parser.add_argument("--pages", type=int, default=8, help="Pages per PDF")
+    parser.add_argument(
+        "--latency", type=float, default=0.05, help="Stub Grobid latency (seconds)"
+    )
+    parser.add_argument(
+        "--failure-rate",
+        type=float,
+        default=0.05,
+        help="Fraction of PDFs that stub Grobid fails to parse",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=config.GROBID_CONCURRENCY,
+        help="Maximum number of in-flight Grobid requests",
+    )
+    parser.add_argument(
+        "--workers", type=int, default=None, help="PDF text extraction processes"
+    )
+    parser.add_argument(
+        "--json", type=Path, default=None, help="Also write results to this file"
+    )
+    return parser
+
+
+if __name__ == "__main__":
+    args = get_arg_parser().parse_args()
+
+    results = []
+    for num_docs in args.docs:
+        result = run_benchmark(
+            num_docs,
+            num_pages=args.pages,
+            latency=args.latency,
+            failure_rate=args.failure_rate,
+            concurrency=args.concurrency,
+            max_workers=args.workers,
+        )
+        print(format_result(result), flush=True)
+        results.append(result)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
@@ -0,0 +1,248 @@
+"""
+Benchmarks ranking a project's chunks with BM25 for chat.
+
+A synthetic library of References is generated with a Zipf-distributed
+vocabulary, as in natural language text. Ranking by building
+`rank_bm25.BM25Plus` over the tokenized corpus for every query (as chat did
+before the BM25 index) is compared with building, saving and opening the
+BM25 index, and searching it. The memory taken by the tokens of the corpus is
+measured as lists of strings, and as term ids with their vocabulary.
+
+Dense retrieval is measured in the same way: embedding the chunks into a
+vector index, saving and opening it, and searching it, both approximately
+(probing `config.VECTOR_NPROBE` inverted lists) and exactly. The recall of
+approximate search is the fraction of the exact top chunks it finds.
+
+Run from the `python` directory:
+
+    poetry run python -m benchmarks.retrieval --references 100 1000
+"""
+import json
+import random
+import tempfile
+import time
+import tracemalloc
+from argparse import ArgumentParser
+from itertools import accumulate
+from pathlib import Path
+from typing import Callable
+
+from rank_bm25 import BM25Plus
+from sidecar.references.bm25 import BM25Index
+from sidecar.references.embeddings import HashingEmbedder
+from sidecar.references.segments import Hit
+from sidecar.references.vectors import VectorIndex
+from sidecar.references.vocabulary import TokenizedCorpus, Vocabulary, tokenize
+
+from benchmarks.storage import create_library
+
+VOCABULARY_SIZE = 50_000
+QUERY_LENGTH = 6
+
+
+def create_vocabulary(size: int = VOCABULARY_SIZE) -> tuple[list[str], list[float]]:
+    """
+    Returns `size` words, with cumulative weights that follow Zipf's law.
+    """
+    words = [f"w{i}" for i in range(size)]
+    cum_weights = list(accumulate(1 / rank for rank in range(1, size + 1)))
+    return words, cum_weights
+
+
+def _timed(func: Callable[[], object]) -> tuple[object, float]:
+    started_at = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - started_at
+
+
+def _allocated(func: Callable[[], object]) -> tuple[object, int]:
+    """
+    Returns the result of `func`, and the bytes it allocated that are still in
+    use when it returns (i.e. held by the result).
+    """
+    tracemalloc.start()
+    try:
+        result = func()
+        allocated, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, allocated
+
+
+def _chunks(hits: list[Hit]) -> list[tuple[str, int]]:
+    return [(hit.reference_id, hit.chunk_index) for hit in hits]
+
+
+def run_benchmark(
+    num_references: int,
+    pages_per_reference: int = 8,
+    num_queries: int = 20,
+    baseline_queries: int = 3,
+    seed: int = 0,
+) -> dict:
+    """
+    Generates a synthetic library of `num_references` References and returns
+    the time taken to rank its chunks for queries, in seconds.
+
+    Parameters
+    ----------
+    num_references : int
+        Number of References in the library
+    pages_per_reference : int
+        Number of pages in each Reference
+    num_queries : int
+        Number of queries run against the index
+    baseline_queries : int
+        Number of queries run with `rank_bm25`, which is much slower
+    seed : int
+        Seed for the library and queries
+
+    Returns
+    -------
+    dict
+        Measurements for the run
+    """
+    words, cum_weights = create_vocabulary()
+    references = create_library(
+        num_references,
+        pages_per_reference,
+        seed=seed,
+        words=words,
+        cum_weights=cum_weights,
+    )
+    corpus = [ref.get_chunk_text(chunk) for ref in references for chunk in ref.chunks]
+
+    rng = random.Random(seed)
+    queries = [
+        tokenize(" ".join(rng.choices(words, cum_weights=cum_weights, k=QUERY_LENGTH)))
+        for _ in range(num_queries)
+    ]
+
+    def rank_with_bm25plus(query: list[str]):
+        ranker = BM25Plus([tokenize(text) for text in corpus])
+        return ranker.get_top_n(query, range(len(corpus)), n=5)
+
+    _, token_lists_bytes = _allocated(lambda: [tokenize(text) for text in corpus])
+    _, token_ids_bytes = _allocated(
+        lambda: TokenizedCorpus.from_texts(corpus, Vocabulary())
+    )
+
+    baseline_seconds = sum(
+        _timed(lambda: rank_with_bm25plus(query))[1]
+        for query in queries[:baseline_queries]
+    ) / max(1, min(baseline_queries, num_queries))
+
+    index, build_seconds = _timed(lambda: BM25Index.build(references))
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        _, save_seconds = _timed(lambda: index.save(Path(tmp_dir), "checksum"))
+        opened, open_seconds = _timed(lambda: BM25Index.open(Path(tmp_dir), "checksum"))
+        # the first search computes the BM25 weights of the postings
+        _, first_query_seconds = _timed(lambda: opened.get_top_n(queries[0], n=5))
+        query_seconds = [
+            _timed(lambda: opened.get_top_n(query, n=5))[1] for query in queries
+        ]
+        _, batch_seconds = _timed(lambda: opened.get_top_n_batch(queries, n=5))
+
+    embedder = HashingEmbedder()
+    query_texts = [" ".join(query) for query in queries]
+    vectors, embed_seconds = _timed(lambda: VectorIndex.build(references, embedder))
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        vectors.save(Path(tmp_dir), "checksum")
+        opened, vectors_open_seconds = _timed(
+            lambda: VectorIndex.open(Path(tmp_dir), "checksum", embedder=embedder)
+        )
+        dense_results, dense_query_seconds = zip(
+            *[_timed(lambda: opened.get_top_n(query, n=5)) for query in query_texts]
+        )
+        # no segment has more lists than chunks, so all of them are probed
+        exact_results, exact_query_seconds = zip(
+            *[
+                _timed(lambda: opened.get_top_n(query, n=5, nprobe=opened.num_docs))
+                for query in query_texts
+            ]
+        )
+    found = sum(
+        len(set(_chunks(hits)) & set(_chunks(exact)))
+        for hits, exact in zip(dense_results, exact_results)
+    )
+
+    return {
+        "references": num_references,
+        "chunks": len(corpus),
+        "token_lists_mb": round(token_lists_bytes / 1e6, 1),
+        "token_ids_mb": round(token_ids_bytes / 1e6, 1),
+        "baseline_query_seconds": round(baseline_seconds, 4),
+        "build_seconds": round(build_seconds, 3),
+        "save_seconds": round(save_seconds, 3),
+        "open_seconds": round(open_seconds, 4),
+        "first_query_seconds": round(first_query_seconds, 4),
+        "query_ms": round(1000 * sum(query_seconds) / len(query_seconds), 2),
+        "max_query_ms": round(1000 * max(query_seconds), 2),
+        "batch_query_ms": round(1000 * batch_seconds / len(queries), 2),
+        "embed_seconds": round(embed_seconds, 3),
+        "vectors_open_seconds": round(vectors_open_seconds, 4),
+        "dense_query_ms": round(
+            1000 * sum(dense_query_seconds) / len(dense_query_seconds), 2
+        ),
+        "exact_dense_query_ms": round(
+            1000 * sum(exact_query_seconds) / len(exact_query_seconds), 2
+        ),
+        "dense_recall": round(
+            found / max(1, sum(len(exact) for exact in exact_results)), 3
+        ),
+    }
+
+
+def format_result(result: dict) -> str:
+    return (
+        f"{result['references']:>6} references ({result['chunks']} chunks): "
+        f"tokens take {result['token_lists_mb']:.1f} MB as strings, "
+        f"{result['token_ids_mb']:.1f} MB as ids, "
+        f"rank_bm25 {result['baseline_query_seconds']:.3f}s per query, "
+        f"index built in {result['build_seconds']:.3f}s, "
+        f"saved in {result['save_seconds']:.3f}s, "
+        f"opened in {result['open_seconds']:.4f}s, "
+        f"first query {result['first_query_seconds']:.4f}s, "
+        f"queries {result['query_ms']:.2f}ms (max {result['max_query_ms']:.2f}ms), "
+        f"batched {result['batch_query_ms']:.2f}ms per query; "
+        f"chunks embedded in {result['embed_seconds']:.3f}s, "
+        f"vectors opened in {result['vectors_open_seconds']:.4f}s, "
+        f"dense queries {result['dense_query_ms']:.2f}ms "
+        f"(recall {result['dense_recall']:.3f}), "
+        f"exact dense queries {result['exact_dense_query_ms']:.2f}ms"
+    )
+
+
+def get_arg_parser() -> ArgumentParser:
+    parser = ArgumentParser(description="Benchmark ranking chunks for chat")
+    parser.add_argument(
+        "--references",
+        type=int,
+        nargs="+",
+        default=[100, 1000],
+        help="Library sizes",
+    )
+    parser.add_argument("--pages", type=int, default=8, help="Pages per reference")
+    parser.add_argument(
+        "--queries", type=int, default=20, help="Queries run against the index"
+    )
+    parser.add_argument(
+        "--json", type=Path, default=None, help="Also write results to this file"
+    )
+    return parser
+
+
+if __name__ == "__main__":
+    args = get_arg_parser().parse_args()
+
+    results = []
+    for num_references in args.references:
+        result = run_benchmark(
+            num_references, pages_per_reference=args.pages, num_queries=args.queries
+        )
+        print(format_result(result), flush=True)
+        results.append(result)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
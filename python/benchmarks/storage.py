@@ -0,0 +1,218 @@
+"""
+Benchmarks loading a project's references from storage.
+
+A synthetic library of References is saved with `JsonStorage` in each
+storage format, then loaded with full validation (the path taken for files
+written by an older sidecar, or edited by hand) and with the trusted path
+(for files that storage wrote itself). Time spent deserializing the file
+alone is reported as a lower bound.
+
+Run from the `python` directory:
+
+    poetry run python -m benchmarks.storage --references 100 1000 --format json compact
+"""
+import json
+import random
+import tempfile
+import time
+from argparse import ArgumentParser
+from pathlib import Path
+from typing import Callable
+
+from sidecar.references import serialization
+from sidecar.references.schemas import Author, IngestStatus, Reference
+from sidecar.references.serialization import StorageFormat
+from sidecar.references.storage import JsonStorage
+from sidecar.shared import chunk_reference
+
+from benchmarks.corpus import WORDS
+
+# about 5000 characters, which is split into 7 chunks
+WORDS_PER_PAGE = 500
+
+
+def create_library(
+    num_references: int,
+    pages_per_reference: int = 8,
+    vector_dims: int = 0,
+    seed: int = 0,
+    words: list[str] = WORDS,
+    cum_weights: list[float] | None = None,
+) -> list[Reference]:
+    """
+    Returns References that look like the output of ingest, with pages of
+    pseudo-random text, chunked the same way as ingest chunks them.
+    Chunks get pseudo-random vectors of `vector_dims` dimensions.
+
+    Text is made of `words`, drawn with the given cumulative weights, or
+    uniformly if there are none.
+    """
+    rng = random.Random(seed)
+
+    def sample(k: int) -> str:
+        return " ".join(rng.choices(words, cum_weights=cum_weights, k=k))
+
+    references = []
+    for i in range(num_references):
+        ref = Reference(
+            id=f"ref-{i:05d}",
+            source_filename=f"paper-{i:05d}.pdf",
+            status=IngestStatus.COMPLETE,
+            citation_key=f"author{i}",
+            title=sample(8),
+            abstract=sample(150),
+            authors=[
+                Author(full_name=f"Author {i}-{j}", given_name="Author")
+                for j in range(4)
+            ],
+            pages=[sample(WORDS_PER_PAGE) for _ in range(pages_per_reference)],
+        )
+        ref.chunks = chunk_reference(ref)
+        for chunk in ref.chunks:
+            chunk.vector = [rng.uniform(-1, 1) for _ in range(vector_dims)]
+        references.append(ref)
+    return references
+
+
+def _best_of(repeat: int, func: Callable[[], object]) -> float:
+    timings = []
+    for _ in range(repeat):
+        started_at = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started_at)
+    return min(timings)
+
+
+def run_benchmark(
+    num_references: int,
+    pages_per_reference: int = 8,
+    repeat: int = 3,
+    format: StorageFormat = StorageFormat.JSON,
+    compress: bool = False,
+    vector_dims: int = 0,
+) -> dict:
+    """
+    Saves a synthetic library of `num_references` References and returns
+    the time taken to save it, and to load it with and without validation,
+    in seconds.
+
+    Parameters
+    ----------
+    num_references : int
+        Number of References in the library
+    pages_per_reference : int
+        Number of pages in each Reference
+    repeat : int
+        Number of times each save and load is run (the fastest is reported)
+    format : StorageFormat
+        Storage format
+    compress : bool
+        Compress the storage file (compact format only)
+    vector_dims : int
+        Number of dimensions of each chunk's vector
+
+    Returns
+    -------
+    dict
+        Measurements for the run
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        filepath = Path(tmp_dir, "references.json")
+        store = JsonStorage(filepath)
+        store.format = StorageFormat(format)
+        store.compress = compress
+        store.references = create_library(
+            num_references, pages_per_reference, vector_dims=vector_dims
+        )
+        save_seconds = _best_of(repeat, store.save)
+        num_chunks = len(store.chunks)
+
+        def deserialize():
+            with open(filepath, "rb") as f:
+                serialization.loads(f.read())
+
+        deserialize_seconds = _best_of(repeat, deserialize)
+        validated_seconds = _best_of(
+            repeat, lambda: JsonStorage(filepath).load(validate=True)
+        )
+        trusted_seconds = _best_of(repeat, lambda: JsonStorage(filepath).load())
+        file_size = filepath.stat().st_size
+
+    return {
+        "references": num_references,
+        "chunks": num_chunks,
+        "format": f"{format}+zlib" if compress else str(format),
+        "file_mb": round(file_size / 1024**2, 1),
+        "save_seconds": round(save_seconds, 3),
+        "deserialize_seconds": round(deserialize_seconds, 3),
+        "validated_seconds": round(validated_seconds, 3),
+        "trusted_seconds": round(trusted_seconds, 3),
+        "speedup": round(validated_seconds / trusted_seconds, 1),
+    }
+
+
+def format_result(result: dict) -> str:
+    return (
+        f"{result['references']:>6} references ({result['chunks']} chunks, "
+        f"{result['format']}, {result['file_mb']} MB): "
+        f"save {result['save_seconds']:.3f}s, "
+        f"load validated {result['validated_seconds']:.3f}s, "
+        f"trusted {result['trusted_seconds']:.3f}s ({result['speedup']}x), "
+        f"deserializing alone {result['deserialize_seconds']:.3f}s"
+    )
+
+
+def get_arg_parser() -> ArgumentParser:
+    parser = ArgumentParser(description="Benchmark loading reference storage")
+    parser.add_argument(
+        "--references",
+        type=int,
+        nargs="+",
+        default=[100, 1000],
+        help="Library sizes",
+    )
+    parser.add_argument("--pages", type=int, default=8, help="Pages per reference")
+    parser.add_argument(
+        "--format",
+        nargs="+",
+        choices=[f.value for f in StorageFormat],
+        default=[f.value for f in StorageFormat],
+        help="Storage formats",
+    )
+    parser.add_argument(
+        "--compress",
+        action="store_true",
+        help="Compress storage files (compact format only)",
+    )
+    parser.add_argument(
+        "--dims", type=int, default=0, help="Dimensions of each chunk's vector"
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=3, help="Runs per measurement (best is kept)"
+    )
+    parser.add_argument(
+        "--json", type=Path, default=None, help="Also write results to this file"
+    )
+    return parser
+
+
+if __name__ == "__main__":
+    args = get_arg_parser().parse_args()
+
+    results = []
+    for num_references in args.references:
+        for format in args.format:
+            result = run_benchmark(
+                num_references,
+                pages_per_reference=args.pages,
+                repeat=args.repeat,
+                format=StorageFormat(format),
+                compress=args.compress,
+                vector_dims=args.dims,
+            )
+            print(format_result(result), flush=True)
+            results.append(result)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
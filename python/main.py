@@ -1,5 +1,6 @@
 import inspect
 import json
+import multiprocessing
 from argparse import ArgumentParser
 
 from sidecar.typing import CliCommands
@@ -27,6 +28,9 @@ def get_arg_parser():
 
 
 if __name__ == "__main__":
+    # ingest uses worker processes, which need this in a frozen executable
+    multiprocessing.freeze_support()
+
     parser = get_arg_parser()
     args = parser.parse_args()
 
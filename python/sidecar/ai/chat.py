@@ -4,15 +4,20 @@ import openai
 import litellm
 from sidecar import config
 from sidecar.ai.prompts import create_prompt_for_chat, prepare_chunks_for_prompt
-from sidecar.ai.ranker import BM25Ranker
+from sidecar.ai.ranker import BM25Ranker, DenseRanker, fuse_rankings
 from sidecar.ai.schemas import ChatRequest, ChatResponse, ChatResponseChoice
 from sidecar.config import logger
 from sidecar.projects.service import get_project_path
-from sidecar.references.storage import JsonStorage
+from sidecar.references.schemas import Chunk
+from sidecar.references.storage import JsonStorage, load_storage
 from sidecar.settings.schemas import FlatSettingsSchema
 from sidecar.typing import ResponseStatus
 from tenacity import retry, stop_after_attempt, wait_fixed
 
+# number of chunks taken from each ranking to be fused, as a multiple of the
+# number of chunks used in the prompt
+FUSION_DEPTH = 4
+
 
 def ask_question(
     request: ChatRequest,
@@ -34,17 +39,24 @@ def ask_question(
 
     if project_id:
         project_path = get_project_path(user_id="user1", project_id=project_id)
-        filepath = project_path / ".storage" / "references.json"
-        storage = JsonStorage(filepath=filepath)
+        storage = load_storage(project_path / ".storage")
     else:
-        storage = JsonStorage(filepath=config.REFERENCES_JSON_PATH)
+        storage = load_storage(config.REFERENCES_JSON_PATH.parent)
 
-    logger.info(f"Loading documents from storage: {storage.filepath}")
-    storage.load()
     logger.info(f"Loaded {len(storage.chunks)} documents from storage")
 
     ranker = BM25Ranker(storage=storage)
-    chat = Chat(input_text=input_text, storage=storage, ranker=ranker, model=model)
+    # chunks are also ranked by their vectors, if an embedder is configured
+    dense_ranker = None
+    if storage.vector_index is not None:
+        dense_ranker = DenseRanker(storage=storage)
+    chat = Chat(
+        input_text=input_text,
+        storage=storage,
+        ranker=ranker,
+        model=model,
+        dense_ranker=dense_ranker,
+    )
 
     try:
         choices = chat.ask_question(n_choices=n_choices, temperature=temperature)
@@ -73,15 +85,32 @@ class Chat:
         storage: JsonStorage,
         ranker: BM25Ranker,
         model: str = "gpt-3.5-turbo",
+        dense_ranker: DenseRanker | None = None,
     ):
         self.input_text = input_text
         self.ranker = ranker
+        self.dense_ranker = dense_ranker
         self.storage = storage
         self.model = model
 
-    def get_relevant_documents(self):
-        docs = self.ranker.get_top_n(query=self.input_text, limit=5)
-        return docs
+    def get_relevant_documents(self, limit: int = 5) -> list[Chunk]:
+        """
+        Returns the chunks most relevant to the input text.
+
+        With a dense ranker, the chunks ranked highest by BM25 and by the
+        similarity of their vectors are fused into a single ranking, so that
+        chunks that match the words of the input text and chunks that are
+        about the same topic are both found.
+        """
+        if self.dense_ranker is None:
+            return self.ranker.get_top_n(query=self.input_text, limit=limit)
+
+        depth = limit * FUSION_DEPTH
+        rankings = [
+            self.ranker.get_top_hits(self.input_text, limit=depth),
+            self.dense_ranker.get_top_hits(self.input_text, limit=depth),
+        ]
+        return self.dense_ranker.get_chunks(fuse_rankings(rankings, limit=limit))
 
     @retry(stop=stop_after_attempt(3), wait=wait_fixed(1))
     def call_model(self, messages: list, n_choices: int = 1, temperature: float = 0.7):
@@ -1,12 +1,24 @@
-from rank_bm25 import BM25Plus
-from sidecar.references.schemas import Chunk
+from abc import ABC, abstractmethod
+
+from sidecar.references.schemas import Chunk, Reference
+from sidecar.references.segments import Hit
 from sidecar.references.storage import JsonStorage
+from sidecar.references.vocabulary import tokenize
+
+# constant added to the rank of a chunk in each ranking when rankings are
+# fused, so that the top few chunks of one ranking do not outweigh chunks
+# ranked well by all of them
+RRF_K = 60
+
 
+class Ranker(ABC):
+    """
+    Ranks the chunks of a storage's References for queries. Subclasses rank
+    them with one of the storage's chunk indexes.
+    """
 
-class BM25Ranker:
     def __init__(self, storage: JsonStorage):
         self.storage = storage
-        self.ranker = BM25Plus(self.storage.tokenized_corpus)
 
     def get_top_n(self, query: str, limit: int = 5) -> list[Chunk]:
         """
@@ -23,6 +35,118 @@ class BM25Ranker:
         -------
         docs : list[Chunk]
         """
-        tokenized_query = query.lower().split()
-        docs = self.ranker.get_top_n(tokenized_query, self.storage.chunks, n=limit)
+        return self.get_top_n_batch([query], limit=limit)[0]
+
+    def get_top_n_batch(self, queries: list[str], limit: int = 5) -> list[list[Chunk]]:
+        """
+        Rank documents for several queries, which are scored together
+
+        Parameters
+        ----------
+        queries : list[str]
+            Input texts to be used as queries
+        limit : int, default 5
+            Number of documents to return for each query
+
+        Returns
+        -------
+        docs : list[list[Chunk]]
+        """
+        results = self.get_top_hits_batch(queries, limit=limit)
+        return [self.get_chunks(hits) for hits in results]
+
+    def get_top_hits(self, query: str, limit: int = 5) -> list[Hit]:
+        """
+        As `get_top_n`, returning the chunks found as `Hit`s.
+        """
+        return self.get_top_hits_batch([query], limit=limit)[0]
+
+    @abstractmethod
+    def get_top_hits_batch(self, queries: list[str], limit: int = 5) -> list[list[Hit]]:
+        """
+        As `get_top_n_batch`, returning the chunks found as `Hit`s.
+        """
+
+    def get_chunks(self, hits: list[Hit]) -> list[Chunk]:
+        """
+        Returns the chunks found by a search, skipping those of References
+        that have been deleted since, and those no longer in References that
+        have been updated to fewer chunks since.
+        """
+        docs = []
+        for hit in hits:
+            ref = self.storage.get_reference(hit.reference_id)
+            if ref is None or hit.chunk_index >= len(ref.chunks):
+                # deleted, or updated to fewer chunks, since the search
+                continue
+            docs.append(self._copy_chunk(ref, hit))
         return docs
+
+    def _copy_chunk(self, ref: Reference, hit: Hit) -> Chunk:
+        chunk = ref.chunks[hit.chunk_index]
+        # chunks are returned with their text, for use in prompts
+        return chunk.copy(update={"text": ref.get_chunk_text(chunk)})
+
+
+class BM25Ranker(Ranker):
+    def __init__(self, storage: JsonStorage):
+        super().__init__(storage)
+        self.index = self.storage.bm25_index
+
+    def get_top_hits_batch(self, queries: list[str], limit: int = 5) -> list[list[Hit]]:
+        return self.index.get_top_n_batch(
+            [tokenize(query) for query in queries], n=limit
+        )
+
+
+class DenseRanker(Ranker):
+    """
+    Ranks chunks by the similarity of their vectors to the vector of the
+    query. The storage must have a vector index (i.e. an embedder must be
+    configured).
+    """
+
+    def __init__(self, storage: JsonStorage):
+        super().__init__(storage)
+        self.index = self.storage.vector_index
+        if self.index is None:
+            raise ValueError("Dense ranking requires an embedder")
+
+    def get_top_hits_batch(self, queries: list[str], limit: int = 5) -> list[list[Hit]]:
+        return self.index.get_top_n_batch(queries, n=limit)
+
+    def _copy_chunk(self, ref: Reference, hit: Hit) -> Chunk:
+        chunk = super()._copy_chunk(ref, hit)
+        # and with their vector, which is not kept in storage
+        vectors = self.index.get_vectors(hit.reference_id)
+        if vectors is not None and hit.chunk_index < len(vectors):
+            chunk = chunk.copy(update={"vector": vectors[hit.chunk_index].tolist()})
+        return chunk
+
+
+def fuse_rankings(rankings: list[list[Hit]], limit: int = 5) -> list[Hit]:
+    """
+    Fuses rankings of chunks with reciprocal rank fusion: each chunk scores
+    the sum of `1 / (RRF_K + rank)` over the rankings it is in. Rankings by
+    different methods can be fused, as their scores are not compared.
+
+    Parameters
+    ----------
+    rankings : list[list[Hit]]
+        Rankings of chunks, best first
+    limit : int, default 5
+        Number of chunks to return
+
+    Returns
+    -------
+    hits : list[Hit]
+        The best chunks, with their fused scores, best first
+    """
+    scores = {}
+    for hits in rankings:
+        for rank, hit in enumerate(hits, start=1):
+            key = (hit.reference_id, hit.chunk_index)
+            scores[key] = scores.get(key, 0.0) + 1 / (RRF_K + rank)
+    # ties keep the order in which chunks were first ranked
+    best = sorted(scores.items(), key=lambda item: -item[1])[:limit]
+    return [Hit(ref_id, chunk_index, score) for (ref_id, chunk_index), score in best]
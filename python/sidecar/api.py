@@ -1,3 +1,5 @@
+from contextlib import asynccontextmanager
+
 import uvicorn
 from fastapi import FastAPI
 
@@ -6,10 +8,19 @@ from sidecar.filesystem import router as filesystem_route
 from sidecar.meta import router as meta_router
 from sidecar.projects import router as projects_router
 from sidecar.references import router as references_router
+from sidecar.references.storage import storage_cache
 from sidecar.search import router as search_router
 from sidecar.settings import router as settings_router
 
-api = FastAPI(title="RefStudio API", version="0.1")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # write any reference changes that are still waiting to be saved
+    storage_cache.flush()
+
+
+api = FastAPI(title="RefStudio API", version="0.1", lifespan=lifespan)
 api.include_router(meta_router.router, prefix="/api")
 api.include_router(ai_router.router, prefix="/api")
 api.include_router(filesystem_route.router, prefix="/api")
@@ -11,6 +11,57 @@ WEB_STORAGE_URL = Path(os.environ.get("WEB_STORAGE_URL", "/tmp/web-storage-url")
 PROJECT_DIR = Path(os.environ.get("PROJECT_DIR", "/tmp/project-x"))
 UPLOADS_DIR = Path(os.path.join(PROJECT_DIR, "uploads"))
 REFERENCES_JSON_PATH = Path(os.path.join(PROJECT_DIR, ".storage", "references.json"))
+# backend used to store a project's references: "json" or "sqlite"
+REFERENCES_STORAGE_BACKEND = os.environ.get("REFERENCES_STORAGE_BACKEND", "json")
+# format of new `references.json` files: "json" or "compact" (binary).
+# Existing files keep the format they were written in.
+REFERENCES_STORAGE_FORMAT = os.environ.get("REFERENCES_STORAGE_FORMAT", "json")
+# compress new files in the compact format with zlib
+REFERENCES_STORAGE_COMPRESS = (
+    os.environ.get("REFERENCES_STORAGE_COMPRESS", "false").lower() == "true"
+)
+# approximate memory for caching loaded project storages, measured by file size
+STORAGE_CACHE_MAX_BYTES = int(os.environ.get("STORAGE_CACHE_MAX_MB", 512)) * 1024 * 1024
+# seconds to wait before writing reference updates, so that bursts of updates
+# are written at once (0 writes every update immediately)
+STORAGE_WRITE_DELAY = float(os.environ.get("STORAGE_WRITE_DELAY", 0.5))
+# embedder used to compute the vectors of chunks for dense retrieval:
+# "hashing" (hashed word and n-gram features), or "none" to disable it
+EMBEDDER = os.environ.get("EMBEDDER", "hashing")
+# number of dimensions of chunk vectors
+EMBEDDING_DIM = int(os.environ.get("EMBEDDING_DIM", 256))
+# number of inverted lists of chunk vectors searched per query in large
+# projects: more lists find more of the most similar chunks, more slowly
+VECTOR_NPROBE = int(os.environ.get("VECTOR_NPROBE", 64))
+
+GROBID_SERVER_URL = os.environ.get(
+    "GROBID_SERVER_URL", "https://kermitt2-grobid.hf.space"
+)
+# maximum number of in-flight requests to the Grobid server
+GROBID_CONCURRENCY = int(os.environ.get("GROBID_CONCURRENCY", 4))
+# timeout (in seconds) for a single PDF, not for the whole batch
+GROBID_TIMEOUT = float(os.environ.get("GROBID_TIMEOUT", 30))
+
+# Grobid output is cached across projects, keyed by PDF content hash
+# a maximum size of 0 disables the cache
+GROBID_CACHE_PATH = Path(
+    os.environ.get(
+        "GROBID_CACHE_PATH", os.path.join(WEB_STORAGE_URL, ".cache", "grobid.sqlite3")
+    )
+)
+GROBID_CACHE_MAX_BYTES = int(os.environ.get("GROBID_CACHE_MAX_MB", 256)) * 1024 * 1024
+
+# keep the raw Grobid output in the project's `.grobid` directory, for debugging
+KEEP_GROBID_OUTPUT = os.environ.get("KEEP_GROBID_OUTPUT", "false").lower() == "true"
+
+# number of projects that can be ingesting references at the same time
+INGEST_MAX_WORKERS = int(os.environ.get("INGEST_MAX_WORKERS", 2))
+# number of processes used to extract text from and chunk PDFs during ingest
+INGEST_PDF_WORKERS = int(os.environ.get("INGEST_PDF_WORKERS", os.cpu_count() or 1))
+# seconds between commits of finished references to storage during ingest:
+# references that finish in between are committed together (0 commits every
+# reference as soon as it finishes)
+INGEST_COMMIT_INTERVAL = float(os.environ.get("INGEST_COMMIT_INTERVAL", 5))
 
 logging.root.setLevel(logging.NOTSET)
 
@@ -1,10 +1,12 @@
 import os
 import shutil
+import tempfile
 from pathlib import Path
 
 from fastapi import APIRouter, File, HTTPException, UploadFile
 from fastapi.responses import FileResponse
 from sidecar.projects.service import get_project_path
+from sidecar.shared import set_replacement_mode
 
 router = APIRouter(
     prefix="/fs",
@@ -21,11 +23,22 @@ async def create_file(project_id: str, filepath: Path, file: UploadFile = File(.
     if not filepath.exists():
         filepath.parent.mkdir(parents=True, exist_ok=True)
 
+    # write to a temporary file and then replace, rather than overwrite, any
+    # existing file so that hard links to it (made when staging uploads for
+    # ingest) keep the previous contents
+    tmp_filepath = None
     try:
-        with open(filepath, "wb") as f:
+        with tempfile.NamedTemporaryFile(
+            "wb", dir=filepath.parent, prefix=f".{filepath.name}.", delete=False
+        ) as f:
+            tmp_filepath = f.name
             shutil.copyfileobj(file.file, f)
+        set_replacement_mode(tmp_filepath, filepath)
+        os.replace(tmp_filepath, filepath)
     except Exception as e:
         print(e)
+        if tmp_filepath is not None and os.path.exists(tmp_filepath):
+            os.remove(tmp_filepath)
     finally:
         file.file.close()
     return {
@@ -3,6 +3,7 @@ import os
 
 import psutil
 from fastapi import APIRouter
+from sidecar.references.storage import storage_cache
 
 router = APIRouter(
     prefix="/meta",
@@ -17,6 +18,9 @@ async def status():
 
 @router.post("/shutdown")
 async def shutdown():
+    # references updated in the last moments have not been written yet
+    storage_cache.flush()
+
     # See https://stackoverflow.com/a/74757349/388951
     parent_pid = os.getpid()
     parent = psutil.Process(parent_pid)
@@ -0,0 +1,434 @@
+"""
+An inverted index of the chunks of a project's References, for ranking them
+with BM25.
+
+The index is made of segments (see `sidecar.references.segments`), each of
+which holds the postings of the chunks of some References: for each term,
+the chunks it appears in and how many times. Terms are numbered by a
+`Vocabulary` shared by all the segments of an index, so postings of the same
+term in different segments have the same term id.
+
+The vocabulary is saved with the segments, and only grows (see
+`sidecar.references.vocabulary`). Segment files are memory mapped
+when they are opened, so opening the index of a large project does not read
+all of its postings.
+
+Chunks are scored in the same way as `rank_bm25.BM25Plus`. The postings of
+all segments form a sparse matrix of terms and chunks, whose BM25 weights are
+computed when the index is first searched after a change. A query is scored
+as the product of its term counts with the rows of its terms, and the best
+chunks are selected without sorting all of them.
+"""
+from collections import Counter
+from pathlib import Path
+
+import numpy as np
+from sidecar.references.schemas import Reference
+from sidecar.references.segments import (
+    Hit,
+    IndexSegment,
+    SegmentedIndex,
+    read_segment_file,
+    write_segment_file,
+)
+from sidecar.references.vocabulary import TokenizedCorpus, Vocabulary
+
+# BM25+ parameters, as in `rank_bm25.BM25Plus`
+K1 = 1.5
+B = 0.75
+DELTA = 1.0
+
+# queries with more postings than this fraction of the number of chunks are
+# summed into an array of every chunk, which is then faster than summing
+# the postings of each chunk (which sorts them)
+DENSE_QUERY_RATIO = 1 / 16
+# largest matrix of queries and chunks (in elements) summed at once, which
+# fits in the CPU cache
+DENSE_BLOCK_SIZE = 1 << 16
+
+MAGIC = b"RSBM25\x00"
+VERSION = 2
+VOCABULARY_FILENAME = "vocabulary.txt"
+
+_ARRAYS = {
+    # ids of the terms that have postings, in increasing order
+    "terms": np.dtype("<i4"),
+    # start of each term's postings, with the end of the last term's
+    "offsets": np.dtype("<i8"),
+    # chunk and term frequency of each posting
+    "doc_ids": np.dtype("<i4"),
+    "tfs": np.dtype("<i4"),
+    # number of tokens in each chunk
+    "doc_lengths": np.dtype("<i4"),
+}
+
+
+class Segment(IndexSegment):
+    """
+    The postings of the chunks of some References, numbered in the order of
+    the References and their chunks.
+    """
+
+    def __init__(
+        self,
+        references: list[tuple[str, int]],
+        arrays: dict[str, np.ndarray],
+        name: str | None = None,
+    ):
+        self.terms = arrays["terms"]
+        self.offsets = arrays["offsets"]
+        self.doc_ids = arrays["doc_ids"]
+        self.tfs = arrays["tfs"]
+        self.doc_lengths = arrays["doc_lengths"]
+        super().__init__(references, name)
+
+    def _count_alive(self) -> None:
+        super()._count_alive()
+        self.alive_length = int(self.doc_lengths[self.alive].sum())
+
+    def find(self, term_id: int) -> tuple[int, int] | None:
+        """
+        Returns the start and end of the postings of a term, or None if the
+        term is not in the segment.
+        """
+        i = int(np.searchsorted(self.terms, term_id))
+        if i == len(self.terms) or self.terms[i] != term_id:
+            return None
+        return int(self.offsets[i]), int(self.offsets[i + 1])
+
+    @classmethod
+    def build(cls, references: list[Reference], vocabulary: Vocabulary) -> "Segment":
+        """
+        Tokenizes the chunks of References into a new segment, adding their
+        new terms to `vocabulary`.
+        """
+        corpus = TokenizedCorpus.from_texts(
+            (ref.get_chunk_text(chunk) for ref in references for chunk in ref.chunks),
+            vocabulary,
+        )
+        # tokens are counted by term and chunk, encoded together as one key
+        num_docs = max(1, len(corpus))
+        doc_of_tokens = np.repeat(
+            np.arange(len(corpus), dtype=np.int64), corpus.lengths
+        )
+        keys = corpus.token_ids.astype(np.int64) * num_docs + doc_of_tokens
+        keys, tfs = np.unique(keys, return_counts=True)
+        term_ids, doc_ids = np.divmod(keys, num_docs)
+
+        return cls._from_postings(
+            [(ref.id, len(ref.chunks)) for ref in references],
+            term_ids,
+            doc_ids,
+            tfs,
+            corpus.lengths,
+        )
+
+    @classmethod
+    def merge(cls, segments: list["Segment"]) -> "Segment":
+        """
+        Merges segments into a new segment, without their deleted References.
+        """
+        refs = []
+        term_ids, doc_ids, tfs, doc_lengths = [], [], [], []
+        base = 0
+        for segment in segments:
+            # chunks are renumbered without the deleted ones
+            new_doc_ids = np.cumsum(segment.alive) - 1 + base
+            keep = segment.alive[segment.doc_ids]
+            term_ids.append(segment.posting_terms()[keep])
+            doc_ids.append(new_doc_ids[segment.doc_ids[keep]])
+            tfs.append(segment.tfs[keep])
+            doc_lengths.append(segment.doc_lengths[segment.alive])
+            refs.extend(segment.alive_references)
+            base += segment.num_alive
+
+        empty = [np.zeros(0, dtype=np.int64)]
+        return cls._from_postings(
+            refs,
+            np.concatenate(term_ids + empty),
+            np.concatenate(doc_ids + empty),
+            np.concatenate(tfs + empty),
+            np.concatenate(doc_lengths + empty),
+        )
+
+    @classmethod
+    def _from_postings(
+        cls,
+        references: list[tuple[str, int]],
+        term_ids: np.ndarray,
+        doc_ids: np.ndarray,
+        tfs: np.ndarray,
+        doc_lengths: np.ndarray,
+    ) -> "Segment":
+        """
+        Creates a segment from postings in any order.
+        """
+        order = np.lexsort((doc_ids, term_ids))
+        terms, counts = np.unique(term_ids[order], return_counts=True)
+        arrays = {
+            "terms": terms,
+            "offsets": np.concatenate([[0], np.cumsum(counts)]),
+            "doc_ids": doc_ids[order],
+            "tfs": tfs[order],
+            "doc_lengths": doc_lengths,
+        }
+        arrays = {key: arrays[key].astype(dtype) for key, dtype in _ARRAYS.items()}
+        return cls(references, arrays)
+
+    def posting_terms(self) -> np.ndarray:
+        """
+        Returns the term id of every posting.
+        """
+        return np.repeat(self.terms, np.diff(self.offsets))
+
+    def save(self, dirpath: Path) -> None:
+        """
+        Writes the segment to a new file in `dirpath`.
+        """
+        self.name = write_segment_file(
+            dirpath,
+            MAGIC,
+            VERSION,
+            {"references": self.references},
+            {key: getattr(self, key) for key in _ARRAYS},
+        )
+
+    @classmethod
+    def open(cls, filepath: Path) -> "Segment":
+        """
+        Opens a segment file, memory mapping its postings.
+        """
+        header, arrays = read_segment_file(filepath, MAGIC, VERSION, _ARRAYS)
+        references = [tuple(r) for r in header["references"]]
+        return cls(references, arrays, name=filepath.name)
+
+
+class BM25Index(SegmentedIndex):
+    """
+    Ranks the chunks of a project's References with BM25, from an inverted
+    index that is updated as References are added, patched and deleted.
+    """
+
+    segment_class = Segment
+    version = VERSION
+
+    def __init__(
+        self,
+        segments: list[Segment] | None = None,
+        vocabulary: Vocabulary | None = None,
+    ):
+        super().__init__(segments)
+        self.vocabulary = vocabulary if vocabulary is not None else Vocabulary()
+        self._scorer: _Scorer | None = None
+        # directory and size of the vocabulary when it was last saved
+        self._saved_vocabulary: tuple[Path, int] | None = None
+
+    @classmethod
+    def build(cls, references: list[Reference]) -> "BM25Index":
+        vocabulary = Vocabulary()
+        return cls([Segment.build(references, vocabulary)], vocabulary)
+
+    def _build_segment(self, references: list[Reference]) -> Segment:
+        return Segment.build(references, self.vocabulary)
+
+    def get_top_n(self, tokens: list[str], n: int = 5) -> list[Hit]:
+        """
+        Returns the `n` chunks with the highest BM25 scores for a tokenized
+        query, highest first.
+        """
+        return self.get_top_n_batch([tokens], n)[0]
+
+    def get_top_n_batch(self, queries: list[list[str]], n: int = 5) -> list[list[Hit]]:
+        """
+        Returns the `n` chunks with the highest BM25 scores for each of several
+        tokenized queries, which are scored together.
+
+        Each query is a sparse vector of term counts, and is scored as its
+        product with the matrix of BM25 weights of the postings of its terms.
+        Only chunks that contain a query term are ranked, so the time taken
+        grows with the number of postings of the query terms, rather than
+        with the number of chunks.
+        """
+        scorer = self._get_scorer()
+        if scorer.num_docs == 0 or n <= 0:
+            return [[] for _ in queries]
+
+        gathered = [scorer.gather(tokens) for tokens in queries]
+        is_dense = [
+            len(doc_ids) > DENSE_QUERY_RATIO * scorer.bounds[-1]
+            for doc_ids, _, _ in gathered
+        ]
+        results = [None] * len(queries)
+        for dense in [False, True]:
+            rows = [row for row in range(len(queries)) if is_dense[row] == dense]
+            if not rows:
+                continue
+            score = scorer.score_dense if dense else scorer.score_sparse
+            scored = score([gathered[row][:2] for row in rows])
+            for row, (doc_ids, scores) in zip(rows, scored):
+                base_score = gathered[row][2]
+                results[row] = scorer.top_n(doc_ids, scores + base_score, base_score, n)
+        return results
+
+    def _get_scorer(self) -> "_Scorer":
+        # weights depend on every segment, so they are computed again after
+        # each change, when the index is next searched
+        scorer = self._scorer
+        if scorer is None or scorer.segments is not self.segments:
+            scorer = self._scorer = _Scorer(self.segments, self.vocabulary)
+        return scorer
+
+    def _save_files(self, dirpath: Path) -> dict:
+        # the vocabulary only grows, so it is written only when it has new
+        # terms, before the manifest that counts them
+        vocabulary_size = len(self.vocabulary)
+        if self._saved_vocabulary != (dirpath, vocabulary_size):
+            self.vocabulary.save(dirpath.joinpath(VOCABULARY_FILENAME))
+            self._saved_vocabulary = (dirpath, vocabulary_size)
+        return {"vocabulary_size": vocabulary_size}
+
+    @classmethod
+    def _from_saved(
+        cls, dirpath: Path, manifest: dict, segments: list[Segment]
+    ) -> "BM25Index":
+        vocabulary = Vocabulary.open(dirpath.joinpath(VOCABULARY_FILENAME))
+        if len(vocabulary) < manifest["vocabulary_size"]:
+            raise ValueError("The vocabulary is missing terms")
+        index = cls(segments, vocabulary)
+        index._saved_vocabulary = (dirpath, len(vocabulary))
+        return index
+
+
+class _Scorer:
+    """
+    The BM25 weight of every posting of a list of segments, from the document
+    frequencies of terms and the average length of chunks in all of them.
+
+    Chunks are numbered across segments, in the order of the segments.
+    """
+
+    def __init__(self, segments: list[Segment], vocabulary: Vocabulary):
+        self.segments = segments
+        self.vocabulary = vocabulary
+        # terms added after this are not in any of the segments
+        num_terms = len(vocabulary)
+        self.idf = np.zeros(0)
+        self.bounds = np.cumsum([0] + [len(segment) for segment in segments])
+        self.alive = np.concatenate(
+            [segment.alive for segment in segments] + [np.zeros(0, dtype=bool)]
+        )
+        self.num_docs = sum(segment.num_alive for segment in segments)
+        if self.num_docs == 0:
+            return
+        avgdl = sum(segment.alive_length for segment in segments) / self.num_docs
+
+        # document frequencies of the terms of all segments, for live chunks
+        posting_terms = [segment.posting_terms() for segment in segments]
+        df = np.zeros(num_terms)
+        for segment, terms in zip(segments, posting_terms):
+            df += np.bincount(
+                terms, weights=segment.alive[segment.doc_ids], minlength=num_terms
+            )
+        with np.errstate(divide="ignore"):
+            self.idf = np.where(df > 0, np.log((self.num_docs + 1) / df), 0.0)
+
+        self.weights = []
+        for segment, terms in zip(segments, posting_terms):
+            tfs = segment.tfs.astype(np.float64)
+            norms = K1 * (1 - B + B * segment.doc_lengths[segment.doc_ids] / avgdl)
+            weights = self.idf[terms] * tfs * (K1 + 1) / (tfs + norms)
+            self.weights.append(weights.astype(np.float32))
+
+    def gather(self, tokens: list[str]) -> tuple[np.ndarray, np.ndarray, float]:
+        """
+        Returns the postings of a query's terms in live chunks, as the chunk
+        and the weight (times the term's count in the query) of each posting,
+        and the score of chunks that contain none of the terms.
+        """
+        doc_ids, weights = [np.zeros(0, dtype=np.int64)], [np.zeros(0)]
+        # BM25+ adds `idf * DELTA` for every query term to the score of every
+        # chunk, whether it contains the term or not
+        base_score = 0.0
+        for term, count in Counter(tokens).items():
+            term_id = self.vocabulary.get(term)
+            if term_id is None or term_id >= len(self.idf) or self.idf[term_id] == 0:
+                continue
+            base_score += count * self.idf[term_id] * DELTA
+            for i, segment in enumerate(self.segments):
+                postings = segment.find(term_id)
+                if postings is None:
+                    continue
+                start, end = postings
+                doc_ids.append(segment.doc_ids[start:end] + self.bounds[i])
+                weights.append(self.weights[i][start:end] * count)
+
+        doc_ids = np.concatenate(doc_ids)
+        live = self.alive[doc_ids]
+        return doc_ids[live], np.concatenate(weights)[live], base_score
+
+    def score_sparse(
+        self, postings: list[tuple[np.ndarray, np.ndarray]]
+    ) -> list[tuple[np.ndarray, np.ndarray]]:
+        """
+        Sums the weights of the postings of each chunk, for each query, and
+        returns the chunks that have postings with their sums.
+        """
+        results = []
+        # queries are summed one at a time, as sorting the postings of all
+        # of them together is slower
+        for doc_ids, weights in postings:
+            doc_ids, inverse = np.unique(doc_ids, return_inverse=True)
+            results.append((doc_ids, np.bincount(inverse, weights=weights)))
+        return results
+
+    def score_dense(
+        self, postings: list[tuple[np.ndarray, np.ndarray]]
+    ) -> list[tuple[np.ndarray, np.ndarray]]:
+        """
+        As `score_sparse`, summing into a matrix of queries and chunks.
+        """
+        total = self.bounds[-1]
+        block_size = max(1, DENSE_BLOCK_SIZE // total)
+        results = []
+        for block_start in range(0, len(postings), block_size):
+            block = postings[block_start : block_start + block_size]
+            keys = np.concatenate(
+                [doc_ids + row * total for row, (doc_ids, _) in enumerate(block)]
+            )
+            sums = np.bincount(
+                keys,
+                weights=np.concatenate([weights for _, weights in block]),
+                minlength=len(block) * total,
+            ).reshape(len(block), total)
+            for row in sums:
+                # every posting has a positive weight
+                doc_ids = np.flatnonzero(row)
+                results.append((doc_ids, row[doc_ids]))
+        return results
+
+    def top_n(
+        self, doc_ids: np.ndarray, scores: np.ndarray, base_score: float, n: int
+    ) -> list[Hit]:
+        """
+        Returns the `n` highest scoring of the chunks in `doc_ids`, highest
+        first. Other live chunks all score `base_score`, and make up the rest
+        if there are fewer than `n` chunks.
+        """
+        if len(doc_ids) > n:
+            top = np.argpartition(-scores, n - 1)[:n]
+            doc_ids, scores = doc_ids[top], scores[top]
+        order = np.lexsort((doc_ids, -scores))
+        doc_ids, scores = doc_ids[order], scores[order]
+
+        if len(doc_ids) < n:
+            needed = min(n, self.num_docs) - len(doc_ids)
+            others = np.flatnonzero(self.alive)[: needed + len(doc_ids)]
+            others = others[np.isin(others, doc_ids, invert=True)][:needed]
+            doc_ids = np.concatenate([doc_ids, others])
+            scores = np.concatenate([scores, np.full(len(others), base_score)])
+
+        hits = []
+        for doc, score in zip(doc_ids, scores):
+            i = int(np.searchsorted(self.bounds, doc, side="right")) - 1
+            hits.append(self.segments[i].get_hit(doc - self.bounds[i], score))
+        return hits
@@ -0,0 +1,49 @@
+"""
+Converts the references stored for projects to another storage format.
+
+Run from the `python` directory:
+
+    poetry run python -m sidecar.references.convert path/to/project --format compact
+
+Projects that are converted to the compact format keep it when they are saved
+again, whatever `REFERENCES_STORAGE_FORMAT` is set to.
+"""
+from argparse import ArgumentParser
+from pathlib import Path
+
+from sidecar.references.serialization import StorageFormat
+from sidecar.references.storage import convert_storage, get_storage
+
+
+def get_arg_parser() -> ArgumentParser:
+    parser = ArgumentParser(description="Convert the format of reference storage")
+    parser.add_argument("projects", type=Path, nargs="+", help="Project directories")
+    parser.add_argument(
+        "--format",
+        choices=[f.value for f in StorageFormat],
+        default=StorageFormat.COMPACT.value,
+        help="Format to convert to",
+    )
+    parser.add_argument(
+        "--compress",
+        action="store_true",
+        help="Compress with zlib (compact format only)",
+    )
+    return parser
+
+
+if __name__ == "__main__":
+    args = get_arg_parser().parse_args()
+
+    for project_dir in args.projects:
+        storage_dir = project_dir.joinpath(".storage")
+        filepath = Path(get_storage(storage_dir).filepath)
+        size_before = filepath.stat().st_size
+
+        convert_storage(storage_dir, StorageFormat(args.format), args.compress)
+
+        size_after = filepath.stat().st_size
+        print(
+            f"{filepath}: {size_before:,} -> {size_after:,} bytes ({args.format})",
+            flush=True,
+        )
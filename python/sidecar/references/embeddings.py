@@ -0,0 +1,194 @@
+"""
+Embedders, which turn text into dense vectors for finding similar chunks.
+
+Embedders run on the CPU and without network access, so that chunks can be
+embedded when References are ingested, and queries when they are asked. The
+embedder used is chosen by name with `config.EMBEDDER` (see `get_embedder`):
+others, e.g. a small local model, can be added to `EMBEDDERS`.
+
+`HashingEmbedder` is the default. It embeds text as a random projection of
+the bag of its words and their character n-grams: every such feature is
+hashed to a few of the vector's dimensions, each with a random sign (the
+"hashing trick", a sparse random projection). Texts that share words, or
+parts of words, have similar vectors, with no model to train or download.
+"""
+import hashlib
+import math
+import struct
+import threading
+from abc import ABC, abstractmethod
+from array import array
+from collections import Counter
+
+import numpy as np
+from sidecar import config
+from sidecar.references.vocabulary import tokenize
+
+_HASH = struct.Struct("<I")
+
+
+class Embedder(ABC):
+    """
+    Turns texts into float32 vectors of `dim` dimensions, normalized to unit
+    length (or zero, for texts without any tokens).
+
+    The `name` of an embedder identifies the vectors it computes: indexes of
+    vectors are built again when it changes.
+    """
+
+    name: str
+    dim: int
+
+    @abstractmethod
+    def embed(self, texts: list[str]) -> np.ndarray:
+        """
+        Returns the vectors of texts, as a matrix with a row per text.
+        """
+
+
+class HashingEmbedder(Embedder):
+    """
+    Embeds texts as the sum of the hashed features of their tokens, weighted
+    by the logarithm of their counts.
+
+    The features of each distinct token (the token itself, and the
+    `ngram_size` character n-grams of the token between `<` and `>`) are
+    hashed once, and kept in a table, so that embedding text costs about as
+    much as tokenizing it. The embedder is shared by all projects, so the
+    table is emptied once it holds `max_tokens` tokens, rather than growing
+    with every token ever embedded.
+
+    Parameters
+    ----------
+    dim : int, default 256
+        Number of dimensions of the vectors
+    ngram_size : int, default 3
+        Length of the character n-grams of tokens, or 0 for whole tokens only
+    num_hashes : int, default 2
+        Number of dimensions each feature is hashed to
+    max_tokens : int, default 100_000
+        Number of tokens whose features are kept in the table
+    """
+
+    def __init__(
+        self,
+        dim: int = 256,
+        ngram_size: int = 3,
+        num_hashes: int = 2,
+        max_tokens: int = 100_000,
+    ):
+        self.dim = dim
+        self.ngram_size = ngram_size
+        self.num_hashes = num_hashes
+        self.max_tokens = max_tokens
+        self.name = f"hashing-{dim}-{ngram_size}-{num_hashes}"
+
+        # held while the table is extended and read
+        self._lock = threading.Lock()
+        self._clear_tokens()
+
+    def _clear_tokens(self) -> None:
+        # the hashed features of each token: their dimensions and values,
+        # from `offsets[i]` to `offsets[i + 1]` for the token with id `i`
+        self._token_ids: dict[str, int] = {}
+        self._offsets = array("q", [0])
+        self._columns = array("i")
+        self._values = array("f")
+
+    def _add_token(self, token: str) -> int:
+        features = [(token, 1.0)]
+        if self.ngram_size:
+            padded = f"<{token}>"
+            ngrams = [
+                padded[i : i + self.ngram_size]
+                for i in range(len(padded) - self.ngram_size + 1)
+            ]
+            # a token's n-grams weigh as much as the whole token
+            features.extend((ngram, 1 / math.sqrt(len(ngrams))) for ngram in ngrams)
+
+        scale = 1 / math.sqrt(self.num_hashes)
+        for feature, weight in features:
+            digest = hashlib.blake2b(
+                feature.encode("utf8"), digest_size=_HASH.size * self.num_hashes
+            ).digest()
+            for (value,) in _HASH.iter_unpack(digest):
+                self._columns.append((value & 0x7FFFFFFF) % self.dim)
+                self._values.append(weight * scale if value >> 31 else -weight * scale)
+        self._offsets.append(len(self._columns))
+
+        token_id = len(self._token_ids)
+        self._token_ids[token] = token_id
+        return token_id
+
+    def embed(self, texts: list[str]) -> np.ndarray:
+        token_ids, counts, num_tokens = array("q"), array("q"), []
+        with self._lock:
+            # tokens are only dropped between calls, as the ids of the tokens
+            # of a call refer to the table until it returns
+            if len(self._token_ids) >= self.max_tokens:
+                self._clear_tokens()
+            get = self._token_ids.get
+            for text in texts:
+                token_counts = Counter(tokenize(text))
+                ids = [get(token) for token in token_counts]
+                if None in ids:
+                    ids = [
+                        self._add_token(token) if i is None else i
+                        for token, i in zip(token_counts, ids)
+                    ]
+                token_ids.extend(ids)
+                counts.extend(token_counts.values())
+                num_tokens.append(len(ids))
+
+            # the features of every token of every text, from the table
+            offsets = np.frombuffer(self._offsets, dtype=np.int64)
+            token_ids = np.frombuffer(token_ids, dtype=np.int64)
+            starts = offsets[token_ids]
+            lengths = offsets[token_ids + 1] - starts
+            ends = np.cumsum(lengths)
+            positions = np.arange(ends[-1] if len(ends) else 0) + np.repeat(
+                starts - (ends - lengths), lengths
+            )
+            columns = np.frombuffer(self._columns, dtype=np.int32)[positions]
+            values = np.frombuffer(self._values, dtype=np.float32)[positions]
+            # the table can only be extended once no arrays share its memory
+            del offsets
+
+        rows = np.repeat(np.arange(len(texts), dtype=np.int64), num_tokens)
+        keys = np.repeat(rows, lengths) * self.dim + columns
+        weights = 1 + np.log(np.frombuffer(counts, dtype=np.int64))
+        vectors = np.bincount(
+            keys,
+            weights=values * np.repeat(weights, lengths),
+            minlength=len(texts) * self.dim,
+        ).reshape(len(texts), self.dim)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return (vectors / np.where(norms > 0, norms, 1)).astype(np.float32)
+
+
+# embedders by name, created with the number of dimensions of their vectors
+EMBEDDERS: dict[str, type[Embedder]] = {
+    "hashing": HashingEmbedder,
+}
+
+_embedders: dict[tuple[str, int], Embedder] = {}
+_embedders_lock = threading.Lock()
+
+
+def get_embedder() -> Embedder | None:
+    """
+    Returns the embedder set by `config.EMBEDDER`, with vectors of
+    `config.EMBEDDING_DIM` dimensions, or None if embedding is disabled
+    (`EMBEDDER=none`). Embedders are shared by all projects.
+    """
+    name = config.EMBEDDER
+    if name == "none":
+        return None
+    if name not in EMBEDDERS:
+        raise ValueError(f"Unknown embedder: {name}")
+
+    key = (name, config.EMBEDDING_DIM)
+    with _embedders_lock:
+        if key not in _embedders:
+            _embedders[key] = EMBEDDERS[name](dim=config.EMBEDDING_DIM)
+        return _embedders[key]
@@ -0,0 +1,215 @@
+"""
+Async client for the Grobid `processHeaderDocument` service.
+
+PDFs are sent to Grobid one request per file over a pooled keep-alive
+connection, with a bounded number of requests in flight at once. Each file
+gets its own timeout, so one slow PDF no longer holds up the whole batch.
+"""
+import asyncio
+from pathlib import Path
+from typing import AsyncIterator, Iterable
+
+import httpx
+from sidecar.config import (
+    GROBID_CONCURRENCY,
+    GROBID_SERVER_URL,
+    GROBID_TIMEOUT,
+    logger,
+)
+from sidecar.typing import RefStudioModel
+
+logger = logger.getChild(__name__)
+
+
+class GrobidResult(RefStudioModel):
+    """The outcome of sending a single PDF to Grobid"""
+
+    filepath: Path
+    status_code: int
+    text: str = ""
+
+    @property
+    def ok(self) -> bool:
+        return self.status_code == 200 and bool(self.text)
+
+
+class GrobidClient:
+    """
+    Sends PDFs to a Grobid server with bounded concurrency.
+
+    Parameters
+    ----------
+    server_url : str
+        Base URL of the Grobid server
+    concurrency : int
+        Maximum number of requests that can be in flight at once
+    timeout : float
+        Timeout (in seconds) for each individual PDF, including its retries
+    max_retries : int
+        Number of times a file is retried when Grobid reports that it is busy
+    retry_wait : float
+        Seconds to wait before retrying a file
+    transport : httpx.AsyncBaseTransport, optional
+        Custom transport, mostly useful for testing
+    """
+
+    # Grobid responds with 503 when all of its workers are busy
+    BUSY_STATUS_CODE = 503
+
+    # status code used for files where no HTTP response was received at all
+    # (e.g. timeouts and connection errors)
+    NO_RESPONSE_STATUS_CODE = 0
+
+    def __init__(
+        self,
+        server_url: str = GROBID_SERVER_URL,
+        concurrency: int = GROBID_CONCURRENCY,
+        timeout: float = GROBID_TIMEOUT,
+        max_retries: int = 3,
+        retry_wait: float = 5,
+        transport: httpx.AsyncBaseTransport = None,
+    ):
+        self.server_url = server_url.rstrip("/")
+        self.concurrency = max(1, concurrency)
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.retry_wait = retry_wait
+        self.transport = transport
+
+    def _create_http_client(self) -> httpx.AsyncClient:
+        limits = httpx.Limits(
+            max_connections=self.concurrency,
+            max_keepalive_connections=self.concurrency,
+        )
+        return httpx.AsyncClient(
+            base_url=self.server_url,
+            limits=limits,
+            timeout=self.timeout,
+            transport=self.transport,
+        )
+
+    async def get_version(self) -> str | None:
+        """
+        Returns the version of the Grobid server, or None if it cannot be reached.
+        """
+        async with self._create_http_client() as http_client:
+            try:
+                response = await http_client.get("/api/version")
+                response.raise_for_status()
+            except httpx.HTTPError as e:
+                logger.warning(f"Unable to get Grobid server version: {e!r}")
+                return None
+
+        # recent Grobid versions respond with JSON, older ones with plain text
+        try:
+            return str(response.json()["version"])
+        except (ValueError, KeyError, TypeError):
+            return response.text.strip() or None
+
+    async def _post_header_document(
+        self, http_client: httpx.AsyncClient, filepath: Path
+    ) -> httpx.Response:
+        with open(filepath, "rb") as f:
+            return await http_client.post(
+                "/api/processHeaderDocument",
+                files={"input": (filepath.name, f, "application/pdf")},
+                data={"consolidateHeader": "1"},
+                headers={"Accept": "application/xml"},
+            )
+
+    async def process_file(
+        self,
+        http_client: httpx.AsyncClient,
+        filepath: Path,
+        semaphore: asyncio.Semaphore = None,
+    ) -> GrobidResult:
+        """
+        Sends a single PDF to Grobid, retrying while the server is busy.
+        Errors are never raised: they are returned as a failed GrobidResult.
+
+        The file has `timeout` seconds from when its first request is sent,
+        including any retries, however slowly the server responds.
+
+        Parameters
+        ----------
+        http_client : httpx.AsyncClient
+            Client to send requests with
+        filepath : Path
+            Path to the PDF file
+        semaphore : asyncio.Semaphore, optional
+            Held while each request is in flight (but not while waiting to
+            retry), to bound the number of requests across files
+        """
+        if semaphore is None:
+            semaphore = asyncio.Semaphore()
+        loop = asyncio.get_running_loop()
+        deadline = None
+
+        for attempt in range(self.max_retries + 1):
+            async with semaphore:
+                if deadline is None:
+                    deadline = loop.time() + self.timeout
+                try:
+                    response = await asyncio.wait_for(
+                        self._post_header_document(http_client, filepath),
+                        deadline - loop.time(),
+                    )
+                except asyncio.TimeoutError:
+                    msg = f"Timed out after {self.timeout}s"
+                    logger.warning(f"Grobid request failed for {filepath.name}: {msg}")
+                    return GrobidResult(
+                        filepath=filepath,
+                        status_code=self.NO_RESPONSE_STATUS_CODE,
+                        text=msg,
+                    )
+                except httpx.HTTPError as e:
+                    logger.warning(f"Grobid request failed for {filepath.name}: {e!r}")
+                    return GrobidResult(
+                        filepath=filepath,
+                        status_code=self.NO_RESPONSE_STATUS_CODE,
+                        text=str(e),
+                    )
+
+            if response.status_code != self.BUSY_STATUS_CODE:
+                break
+
+            # a retry that could not finish before the deadline is not sent
+            if attempt < self.max_retries and loop.time() + self.retry_wait < deadline:
+                logger.info(f"Grobid is busy, retrying {filepath.name}")
+                await asyncio.sleep(self.retry_wait)
+            else:
+                break
+
+        return GrobidResult(
+            filepath=filepath, status_code=response.status_code, text=response.text
+        )
+
+    async def process(self, filepaths: Iterable[Path]) -> AsyncIterator[GrobidResult]:
+        """
+        Sends PDFs to Grobid and yields a result for each file as soon as
+        it finishes, in completion order.
+
+        Parameters
+        ----------
+        filepaths : Iterable[Path]
+            Paths to PDF files
+
+        Yields
+        ------
+        GrobidResult
+        """
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async with self._create_http_client() as http_client:
+            tasks = [
+                asyncio.create_task(
+                    self.process_file(http_client, fp, semaphore=semaphore)
+                )
+                for fp in filepaths
+            ]
+            try:
+                for next_done in asyncio.as_completed(tasks):
+                    yield await next_done
+            finally:
+                for task in tasks:
+                    task.cancel()
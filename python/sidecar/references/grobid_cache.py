@@ -0,0 +1,137 @@
+"""
+Persistent cache of Grobid output, shared by all projects.
+
+The same paper is often uploaded to several projects. Grobid output for a PDF
+only depends on the PDF's contents and the Grobid server that parsed it, so
+results are cached by PDF content hash, server URL and server version.
+The cache is a SQLite database bounded in size: once it grows past its
+maximum size, the least recently used results are evicted.
+"""
+import sqlite3
+import time
+from contextlib import closing
+from pathlib import Path
+
+from sidecar import config
+from sidecar.config import logger
+
+logger = logger.getChild(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    sha256 TEXT NOT NULL,
+    server_url TEXT NOT NULL,
+    version TEXT NOT NULL,
+    tei TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    last_used REAL NOT NULL,
+    PRIMARY KEY (sha256, server_url, version)
+);
+CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used);
+CREATE TABLE IF NOT EXISTS servers (
+    server_url TEXT PRIMARY KEY,
+    version TEXT NOT NULL
+);
+"""
+
+# deletes the least recently used results that do not fit in the cache
+EVICT_SQL = """
+DELETE FROM results WHERE rowid IN (
+    SELECT rowid FROM (
+        SELECT rowid, SUM(size) OVER (ORDER BY last_used DESC, rowid DESC) AS total
+        FROM results
+    ) WHERE total > ?
+)
+"""
+
+
+class GrobidCache:
+    """
+    Parameters
+    ----------
+    filepath : Path
+        Path to the SQLite database, which is created if it does not exist
+    max_bytes : int
+        Maximum total size of the cached Grobid output
+    """
+
+    def __init__(self, filepath: Path, max_bytes: int):
+        self.filepath = Path(filepath)
+        self.max_bytes = max_bytes
+
+        self.filepath.parent.mkdir(parents=True, exist_ok=True)
+        with closing(self._connect()) as conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        # a new connection per operation, as ingest calls the cache from
+        # whichever thread is running the Grobid event loop
+        return sqlite3.connect(self.filepath, timeout=30)
+
+    def get(self, sha256: str, server_url: str, version: str) -> str | None:
+        """
+        Returns the cached TEI XML for a PDF, marking it as recently used.
+        """
+        with closing(self._connect()) as conn, conn:
+            row = conn.execute(
+                "SELECT tei FROM results "
+                "WHERE sha256 = ? AND server_url = ? AND version = ?",
+                (sha256, server_url, version),
+            ).fetchone()
+            if row is None:
+                return None
+
+            conn.execute(
+                "UPDATE results SET last_used = ? "
+                "WHERE sha256 = ? AND server_url = ? AND version = ?",
+                (time.time(), sha256, server_url, version),
+            )
+        return row[0]
+
+    def put(self, sha256: str, server_url: str, version: str, tei: str) -> None:
+        """
+        Adds the TEI XML for a PDF, evicting the least recently used results
+        if the cache has grown past its maximum size.
+        """
+        size = len(tei.encode("utf8"))
+        if size > self.max_bytes:
+            return
+
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?)",
+                (sha256, server_url, version, tei, size, time.time()),
+            )
+            conn.execute(EVICT_SQL, (self.max_bytes,))
+
+    def get_server_version(self, server_url: str) -> str | None:
+        """
+        Returns the version last seen for a Grobid server, so that cached
+        results can still be used when the server cannot be reached.
+        """
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT version FROM servers WHERE server_url = ?", (server_url,)
+            ).fetchone()
+        return row[0] if row is not None else None
+
+    def set_server_version(self, server_url: str, version: str) -> None:
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO servers VALUES (?, ?)", (server_url, version)
+            )
+
+
+def get_default_cache() -> GrobidCache | None:
+    """
+    Returns the cache configured for the sidecar, or None if it is disabled.
+    """
+    if config.GROBID_CACHE_MAX_BYTES <= 0:
+        return None
+
+    try:
+        return GrobidCache(config.GROBID_CACHE_PATH, config.GROBID_CACHE_MAX_BYTES)
+    except (sqlite3.Error, OSError) as e:
+        # e.g. the cache directory cannot be created
+        logger.warning(f"Unable to open Grobid cache {config.GROBID_CACHE_PATH}: {e}")
+        return None
@@ -1,49 +1,70 @@
-import json
-import os
-import shutil
-import sys
+import multiprocessing
+import sqlite3
+import time
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
 from uuid import uuid4
 
 import grobid_tei_xml
 from dotenv import load_dotenv
-from grobid_client.grobid_client import GrobidClient, ServerUnavailableException
 from sidecar import shared
-from sidecar.config import REFERENCES_JSON_PATH, UPLOADS_DIR, logger
+from sidecar.config import (
+    INGEST_COMMIT_INTERVAL,
+    INGEST_PDF_WORKERS,
+    KEEP_GROBID_OUTPUT,
+    REFERENCES_JSON_PATH,
+    UPLOADS_DIR,
+    logger,
+)
+from sidecar.references.grobid import GrobidClient, GrobidResult
+from sidecar.references.grobid_cache import get_default_cache
+from sidecar.references.journal import IngestJournal
+from sidecar.references.manifest import IngestManifest
 from sidecar.references.schemas import (
     Author,
+    Chunk,
     IngestRequest,
     IngestResponse,
+    IngestStage,
     IngestStatus,
     IngestStatusResponse,
     Reference,
     ReferenceStatus,
 )
-from sidecar.references.storage import JsonStorage
+from sidecar.references.storage import (
+    JsonStorage,
+    SqliteStorage,
+    get_storage,
+    load_storage,
+    storage_cache,
+)
 from sidecar.typing import ResponseStatus
 
 load_dotenv()
 logger = logger.getChild(__name__)
 
-GROBID_SERVER_URL = "https://kermitt2-grobid.hf.space"
-
 
-def run_ingest(args: IngestRequest):
+def run_ingest(args: IngestRequest, progress: "IngestProgress" = None):
     pdf_directory = Path(args.pdf_directory)
 
     # PDF files for ingest must be written to the `uploads` directory
     if pdf_directory.parent != "uploads":
         pdf_directory = pdf_directory.parent / "uploads"
 
-    ingest = PDFIngestion(input_dir=pdf_directory)
+    ingest = PDFIngestion(input_dir=pdf_directory, progress=progress)
     response = ingest.run()
     return response
 
 
 def get_statuses():
-    storage = JsonStorage(REFERENCES_JSON_PATH)
-    status_fetcher = IngestStatusFetcher(storage=storage)
+    # a project kept in memory is looked up by filename, without reading it
+    storage = storage_cache.get(REFERENCES_JSON_PATH.parent)
+    if storage is not None:
+        status_fetcher = IngestStatusFetcher(storage=storage, loaded=True)
+    else:
+        storage = get_storage(REFERENCES_JSON_PATH.parent)
+        status_fetcher = IngestStatusFetcher(storage=storage)
     response = status_fetcher.emit_statuses()
     return response
 
@@ -55,9 +76,68 @@ def get_references(args: IngestRequest):
     return response
 
 
+def _extract_and_chunk(ref: Reference, filepath: Path) -> tuple[list[str], list[Chunk]]:
+    """
+    Parses a Reference's PDF, returning the text of each page and its chunks.
+    This runs in worker processes, so it must stay a module-level function.
+    """
+    try:
+        pages = shared.extract_pages_from_pdf(filepath)
+    except FileNotFoundError:
+        logger.error(f"File not found: {filepath}")
+        pages = []
+    return pages, shared.chunk_reference(ref, pages=pages)
+
+
+class IngestCancelled(Exception):
+    """Raised from within ingest when its job has been cancelled"""
+
+    pass
+
+
+class IngestProgress:
+    """
+    Receives progress updates from PDFIngestion.
+
+    This default implementation ignores all updates and is never cancelled.
+    See `sidecar.references.jobs.IngestJob` for an implementation that tracks
+    the progress of a background ingest job.
+    """
+
+    def set_stage(self, stage: IngestStage) -> None:
+        pass
+
+    def set_files(self, filenames: list[str]) -> None:
+        pass
+
+    def update_file(
+        self,
+        filename: str,
+        stage: IngestStage,
+        status: IngestStatus = IngestStatus.PROCESSING,
+    ) -> None:
+        pass
+
+    def raise_if_cancelled(self) -> None:
+        pass
+
+
 class PDFIngestion:
-    def __init__(self, input_dir: Path):
+    def __init__(
+        self,
+        input_dir: Path,
+        progress: IngestProgress = None,
+        max_workers: int = None,
+        keep_grobid_output: bool = None,
+        grobid_client: GrobidClient = None,
+    ):
         self.input_dir = input_dir
+        self.progress = progress if progress is not None else IngestProgress()
+        self.max_workers = max_workers if max_workers else INGEST_PDF_WORKERS
+        self.keep_grobid_output = (
+            keep_grobid_output if keep_grobid_output is not None else KEEP_GROBID_OUTPUT
+        )
+        self.grobid_client = grobid_client if grobid_client else GrobidClient()
         self.project_name = input_dir.parent.name
         self.uploaded_files = list(self.input_dir.glob("*.pdf"))
 
@@ -67,17 +147,63 @@ class PDFIngestion:
         self.storage_dir = input_dir.parent.joinpath(".storage")
         self._create_directories()
 
+        self.storage = get_storage(self.storage_dir)
         self.references = self._load_references()
 
+        self.manifest = IngestManifest(self.storage_dir.joinpath("manifest.json"))
+        self.manifest.load()
+
+        self.journal = IngestJournal(self.storage_dir.joinpath("journal.jsonl"))
+        self.journal.load()
+
+        # Grobid output for PDFs seen in any project, or None when disabled
+        self.grobid_cache = get_default_cache()
+
+        # uploads whose contents are identical to an already uploaded file
+        # {filepath: sha256}
+        self.duplicate_uploads = {}
+
+        # stored References by the content hash of their file when ingest
+        # started, before the hashes of changed files are updated
+        # {sha256: Reference}
+        self.refs_by_hash: dict[str, Reference] = {}
+
+        # References created from Grobid responses during this ingest
+        self.new_references: list[Reference] = []
+
+        # References that have finished ingest but have not been committed to
+        # the project's storage yet, and when References were last committed
+        self.uncommitted_references: list[Reference] = []
+        self.last_commit: float | None = None
+
     def run(self):
         logger.info(f"Starting ingestion for project: {self.project_name}")
 
-        self._copy_uploads_to_staging()
-        self._call_grobid_for_staging()
-        self._convert_grobid_xml_to_json()
+        self.progress.set_stage(IngestStage.CHECKING_UPLOADS)
+        self._remove_stale_staging_files()
+        files_to_ingest = self._get_files_to_ingest()
+        self.progress.set_files(
+            [fp.name for fp in files_to_ingest]
+            + [fp.name for fp in self.duplicate_uploads]
+        )
 
-        self._create_references()
+        try:
+            if files_to_ingest:
+                self._stage_uploads(files_to_ingest)
+                files_for_grobid = self._resume_from_journal(files_to_ingest)
+                if files_for_grobid:
+                    self._call_grobid_for_staging(files_for_grobid)
+
+            self._create_references()
+        except IngestCancelled:
+            logger.info(f"Ingestion cancelled for project: {self.project_name}")
+            for filepath in files_to_ingest:
+                self._remove_temporary_files(filepath.name)
+            raise
+
+        self.progress.set_stage(IngestStage.SAVING)
         self._save_references()
+        self.progress.set_stage(IngestStage.DONE)
 
         response = self.create_ingest_response()
 
@@ -91,7 +217,7 @@ class PDFIngestion:
         if not self.staging_dir.exists():
             self.staging_dir.mkdir()
 
-        if not self.grobid_output_dir.exists():
+        if self.keep_grobid_output and not self.grobid_output_dir.exists():
             self.grobid_output_dir.mkdir()
 
         if not self.storage_dir.exists():
@@ -111,19 +237,6 @@ class PDFIngestion:
             return False
         return True
 
-    def _check_for_staging_files(self) -> bool:
-        """
-        Checks for PDF files in the `.staging` directory.
-        Returns
-        -------
-        bool
-            True if PDF files are in the `.staging` directory.
-        """
-        if not list(self.staging_dir.glob("*.pdf")):
-            logger.warning(f"No PDF files found in directory: {self.staging_dir}")
-            return False
-        return True
-
     def _load_references(self) -> list[Reference]:
         """
         Loads existing References list for project. If none exist, this will
@@ -131,165 +244,284 @@ class PDFIngestion:
         References that have been previously processed will not be ingested
         again.
         """
-        filepath = self.storage_dir.joinpath("references.json")
-        if not filepath.exists():
-            logger.warning(f"No previous `references.json` found at {filepath}")
+        try:
+            self.storage.load()
+        except FileNotFoundError:
+            logger.warning(f"No previous references found at {self.storage.filepath}")
             return []
-
-        jstore = JsonStorage(filepath)
-        jstore.load()
-        return jstore.references
+        return self.storage.references
 
     def _get_files_to_ingest(self) -> list[Path]:
         """
-        Determines which files need to be ingested by comparing the list of
-        already processed References against files found in `uploads`.
+        Determines which files need to be ingested by comparing the content
+        hash of each file in `uploads` against the manifest of files that
+        have already been processed.
+
+        - Files whose size and mtime match the manifest are skipped without
+          being read.
+        - Files with the same contents as another upload are not sent to
+          Grobid again. They are recorded in `self.duplicate_uploads` and
+          get a copy of the other upload's Reference, as it was before this
+          ingest (e.g. if the other upload has since been replaced).
+        - Files whose contents have changed since they were processed are
+          ingested again, replacing their previous Reference.
         """
         if not self._check_for_uploaded_files():
             logger.info("No files have been uploaded")
-            sys.exit()
+            return []
 
-        uploaded_filestems = {fp.stem: fp for fp in self.input_dir.glob("*.pdf")}
-        processed_filestems = {
-            Path(ref.source_filename).stem: ref.source_filename
-            for ref in self.references
-        }
-        needs_ingestion_filestems = set(uploaded_filestems.keys()) - set(
-            processed_filestems.keys()
-        )
+        # taken before `get_hash` records the new hashes of changed files
+        for ref in self.references:
+            sha256 = self.manifest.get_recorded_hash(ref.source_filename)
+            if sha256 is not None:
+                self.refs_by_hash.setdefault(sha256, ref)
+
+        filepaths_to_ingest = []
+        hashes_to_ingest = set()
+        for filepath in sorted(self.uploaded_files):
+            is_processed = (
+                self.storage.get_reference_by_filename(filepath.name) is not None
+            )
+            if is_processed and self.manifest.is_unchanged(filepath):
+                continue
+
+            previous_hash = self.manifest.get_recorded_hash(filepath.name)
+            sha256 = self.manifest.get_hash(filepath)
+
+            if is_processed:
+                # files processed before the manifest existed have no
+                # previous hash, and files that were only touched keep theirs
+                if previous_hash is None or previous_hash == sha256:
+                    continue
+                logger.info(f"Contents of {filepath.name} changed since last ingest")
+                filepaths_to_ingest.append(filepath)
+                hashes_to_ingest.add(sha256)
+            elif sha256 in self.refs_by_hash or sha256 in hashes_to_ingest:
+                logger.info(f"Upload {filepath.name} is a duplicate of another upload")
+                self.duplicate_uploads[filepath] = sha256
+            else:
+                filepaths_to_ingest.append(filepath)
+                hashes_to_ingest.add(sha256)
 
-        if not needs_ingestion_filestems:
+        if not filepaths_to_ingest:
             logger.info("All uploaded PDFs have already been processed")
-            sys.exit()
 
-        filepaths_to_ingest = [
-            uploaded_filestems[stem] for stem in needs_ingestion_filestems
-        ]
         return filepaths_to_ingest
 
-    def _copy_uploads_to_staging(self) -> None:
+    def _stage_uploads(self, files_to_ingest: list[Path]) -> None:
         """
-        Copies PDF files in need of ingestion from `self.input_dir` to
-        `self.staging_dir` so that files in `uploads` are not mutated and are
-        only processed once.
+        Places PDF files in need of ingestion from `self.input_dir` into
+        `self.staging_dir`, so that a file removed from `uploads` while it is
+        being ingested can still be processed.
+
+        Files are hard linked rather than copied where the filesystem allows,
+        which avoids duplicating large PDFs on disk. Uploads are replaced
+        rather than modified in place, so a linked file keeps the contents
+        that were hashed when ingest started.
         """
-        files_to_ingest = self._get_files_to_ingest()
         logger.info(f"Found {len(files_to_ingest)} new uploads to ingest")
 
         for filepath in files_to_ingest:
-            logger.info(f"Copying {filepath.name} to {self.staging_dir}")
-            shutil.copy(filepath, self.staging_dir)
+            logger.info(f"Staging {filepath.name} in {self.staging_dir}")
+            shared.link_or_copy_file(filepath, self.staging_dir.joinpath(filepath.name))
+
+    def _remove_stale_staging_files(self) -> None:
+        """
+        Removes files left in `.staging` by an ingest that did not finish.
+        Only one ingest runs per project at a time, so nothing else uses them.
+        """
+        for filepath in self.staging_dir.iterdir():
+            logger.info(f"Removing stale staging file: {filepath.name}")
+            shared.remove_file(filepath)
+
+    def _resume_from_journal(self, files_to_ingest: list[Path]) -> list[Path]:
+        """
+        Reuses the References that an earlier, unfinished ingest created for
+        files whose contents have not changed since.
+
+        Returns
+        -------
+        list[Path]
+            Files that still need to be sent to Grobid
+        """
+        pending = []
+        for filepath in files_to_ingest:
+            sha256 = self.manifest.get_recorded_hash(filepath.name)
+            ref = self.journal.get_reference(filepath.name, sha256)
+            if ref is None:
+                pending.append(filepath)
+                continue
+
+            logger.info(f"Resuming {filepath.name} from the ingest journal")
+            self.new_references.append(ref)
+            self.progress.update_file(filepath.name, IngestStage.CREATING_REFERENCES)
+
+        return pending
 
     def _remove_temporary_files_for_reference(self, ref: Reference) -> None:
         """
         Removes a Reference's temporary files that were created during
         various stages of ingestion.
         """
-        staging_path = self.staging_dir.joinpath(ref.source_filename)
-        shared.remove_file(staging_path)
+        self._remove_temporary_files(ref.source_filename)
 
-        # grobid success
-        xml_filename = f"{Path(ref.source_filename).stem}.tei.xml"
-        xml_path = self.grobid_output_dir.joinpath(xml_filename)
-        shared.remove_file(xml_path)
+    def _remove_temporary_files(self, source_filename: str) -> None:
+        """
+        Removes the temporary files created for an uploaded PDF during
+        various stages of ingestion.
+        """
+        staging_path = self.staging_dir.joinpath(source_filename)
+        shared.remove_file(staging_path)
 
-        # grobid failures - there might not be any
-        txt_filename = f"{Path(ref.source_filename).stem}*.txt"
-        matches = list(self.grobid_output_dir.glob(txt_filename))
+    def _call_grobid_for_staging(self, files_to_ingest: list[Path]) -> None:
+        """
+        Calls the Grobid server for the staged copies of `files_to_ingest`,
+        creating a Reference from each response as soon as it arrives.
 
-        if matches:
-            txt_path = matches[0]
-            shared.remove_file(txt_path)
+        When `keep_grobid_output` is set, the raw Grobid output is also written
+        to `.grobid`: `{filename}.tei.xml` for files that were successfully
+        parsed and `{filename}_{errorcode}.txt` (e.g. some-pdf_500.txt) for
+        files that were not.
+        """
+        staging_files = [self.staging_dir.joinpath(fp.name) for fp in files_to_ingest]
+        logger.info(f"Calling Grobid server for {len(staging_files)} files")
+        self.progress.set_stage(IngestStage.GROBID)
 
-        # json converted from grobid XML
-        json_filename = f"{Path(ref.source_filename).stem}.json"
-        json_path = self.storage_dir.joinpath(json_filename)
-        shared.remove_file(json_path)
+        shared.run_coroutine(self._process_with_grobid(staging_files))
+        logger.info("Finished calling Grobid server")
 
-    def _call_grobid_for_staging(self) -> None:
+    async def _process_with_grobid(self, filepaths: list[Path]) -> None:
         """
-        Call Grobid server for all files in `.staging` directory.
-
-        Files that are successfully parsed result in a `{filename}.tei.xml`
-        file being written to `.grobid`. Files that are unable to be parsed
-        are also written to `.grobid`, but their file names are structured
-        as `{filename}_{errorcode}.txt` (e.g. some-pdf_500.txt)
+        Sends files to Grobid concurrently, creating each file's Reference
+        as soon as its request finishes and recording it in the journal.
+        Files whose Grobid output is in the Grobid cache are not sent.
         """
-        if not self._check_for_staging_files():
-            logger.info("No staging files found for Grobid processing")
-            sys.exit()
-
-        num_files = len(list(self.staging_dir.glob("*.pdf")))
-        timeout = 30 * num_files
+        client = self.grobid_client
+        version = await self._get_grobid_version(client)
 
-        logger.info(f"Calling Grobid server for {num_files} files")
+        uncached = []
+        for filepath in filepaths:
+            sha256 = self.manifest.get_recorded_hash(filepath.name)
+            tei = self._get_cached_grobid_output(client, version, sha256)
+            if tei is None:
+                uncached.append(filepath)
+                continue
 
-        # The Grobid client library we use prints info and error messages to stdout.
-        # This is a problem because the Tauri client <-> sidecar communicate over stdout
-        # So we need to wrap Grobid calls inside of `HiddenPrints` to prevent `print`
-        # messages from ending up in stdout (https://stackoverflow.com/a/45669280).
-        #
-        # Longer-term, we should probably fork the Grobid client and make changes
-        # to better suit our use-case.
-        with shared.HiddenPrints():
-            try:
-                client = GrobidClient(GROBID_SERVER_URL, timeout=timeout)
-            except ServerUnavailableException as e:
-                logger.error(e)
-
-            client.process(
-                "processHeaderDocument",
-                input_path=self.staging_dir,
-                output=self.grobid_output_dir,
-                force=True,
+            logger.info(f"Using cached Grobid output for {filepath.name}")
+            self._handle_grobid_result(
+                GrobidResult(filepath=filepath, status_code=200, text=tei)
             )
-        logger.info("Finished calling Grobid server")
 
-        # statuses aren't needed right now, but calling this method
-        # will write a status message for each file in the logs for us
-        _ = self._get_grobid_output_statuses()
+        async for result in client.process(uncached):
+            if result.ok:
+                sha256 = self.manifest.get_recorded_hash(result.filepath.name)
+                self._cache_grobid_output(client, version, sha256, result.text)
+            self._handle_grobid_result(result)
+
+    def _handle_grobid_result(self, result: GrobidResult) -> None:
+        if self.keep_grobid_output:
+            self._write_grobid_output(result)
+        ref = self._create_reference_from_grobid(result)
+        sha256 = self.manifest.get_recorded_hash(ref.source_filename)
+        self.journal.append(sha256, ref)
+        self.new_references.append(ref)
+        self.progress.update_file(result.filepath.name, IngestStage.CREATING_REFERENCES)
+        self.progress.raise_if_cancelled()
 
-    def _get_grobid_output_statuses(self) -> dict[Path, str]:
+    async def _get_grobid_version(self, client: GrobidClient) -> str | None:
         """
-        Determines the status of Grobid output files.
+        Returns the version of the Grobid server, which is part of the key for
+        cached Grobid output. When the server cannot be reached, the version it
+        last reported is used, so that cached output is still available.
         """
-        # xml files represent Grobid parsing successes - {filename}.tei.xml
-        xml_filestems = [
-            f.stem.rpartition(".")[0] for f in self.grobid_output_dir.glob("*.xml")
-        ]
-        # txt files represent Grobid parsing failures - {filename}_{error}.txt
-        txt_filestems = [
-            f.stem.rpartition("_")[0] for f in self.grobid_output_dir.glob("*.txt")
-        ]
+        if self.grobid_cache is None:
+            return None
 
-        statuses = {}
-        for file in self.staging_dir.glob("*.pdf"):
-            if file.stem in xml_filestems:
-                logger.info(f"Grobid successfully parsed file: {file.name}")
-                statuses[file.name] = "success"
-            elif file.stem in txt_filestems:
-                logger.warning(f"Grobid failed to parse file: {file.name}")
-                statuses[file.name] = "failure"
-            else:
-                logger.warning(f"Grobid did not create an output file: {file.name}")
-                statuses[file.name] = "not_found"
-        return statuses
+        version = await client.get_version()
+        try:
+            if version is None:
+                return self.grobid_cache.get_server_version(client.server_url)
+            self.grobid_cache.set_server_version(client.server_url, version)
+        except sqlite3.Error as e:
+            logger.warning(f"Unable to read Grobid cache: {e}")
+            return None
+        return version
+
+    def _get_cached_grobid_output(
+        self, client: GrobidClient, version: str | None, sha256: str
+    ) -> str | None:
+        if version is None:
+            return None
+        try:
+            return self.grobid_cache.get(sha256, client.server_url, version)
+        except sqlite3.Error as e:
+            logger.warning(f"Unable to read Grobid cache: {e}")
+            return None
+
+    def _cache_grobid_output(
+        self, client: GrobidClient, version: str | None, sha256: str, tei: str
+    ) -> None:
+        if version is None:
+            return
+        try:
+            self.grobid_cache.put(sha256, client.server_url, version, tei)
+        except sqlite3.Error as e:
+            logger.warning(f"Unable to write to Grobid cache: {e}")
 
-    def _convert_grobid_xml_to_json(self) -> None:
-        xml_files = list(self.grobid_output_dir.glob("*.xml"))
-        logger.info(f"Converting {len(xml_files)} Grobid XML files to JSON")
+    def _write_grobid_output(self, result: GrobidResult) -> None:
+        """
+        Writes the Grobid output for a single file to `.grobid`, using the
+        same naming scheme as the Grobid client library:
+        `{filename}.tei.xml` for successes and `{filename}_{errorcode}.txt`
+        for failures.
+        """
+        stem = result.filepath.stem
+        if result.ok:
+            filepath = self.grobid_output_dir.joinpath(f"{stem}.tei.xml")
+        else:
+            filepath = self.grobid_output_dir.joinpath(
+                f"{stem}_{result.status_code}.txt"
+            )
 
-        for file in xml_files:
-            with open(file, "r") as fin:
-                xml = fin.read()
+        with open(filepath, "w", encoding="utf8") as fout:
+            fout.write(result.text)
 
-            # XML files written by Grobid have the filename as: {filename}.tei.xml
-            # We want to strip both the .tei and .xml extensions => {filename}.json
-            json_filename = f"{file.stem.rpartition('.tei')[0]}"
-            json_filepath = os.path.join(self.storage_dir, f"{json_filename}.json")
-            with open(json_filepath, "w") as fout:
-                doc = grobid_tei_xml.parse_document_xml(xml)
-                json.dump(doc.to_dict(), fout)
+    def _create_reference_from_grobid(self, result: GrobidResult) -> Reference:
+        """
+        Creates a Reference from the Grobid output for a single file.
+        Responses that are errors, or that cannot be parsed as TEI XML, result
+        in a Reference with a failure status.
+        """
+        source_pdf = result.filepath.name
+        if not result.ok:
+            logger.warning(
+                f"Grobid failed to parse file: {source_pdf} ({result.status_code})"
+            )
+            return self._create_reference_for_grobid_failure(source_pdf)
+
+        try:
+            doc = grobid_tei_xml.parse_document_xml(result.text).to_dict()
+        except Exception as e:
+            logger.warning(f"Unable to parse Grobid output for {source_pdf}: {e}")
+            return self._create_reference_for_grobid_failure(source_pdf)
+
+        logger.info(f"Grobid successfully parsed file: {source_pdf}")
+        header = self._parse_header(doc)
+        pub_date = shared.parse_date(header.get("published_date", ""))
+
+        ref = Reference(
+            id=str(uuid4()),
+            source_filename=source_pdf,
+            status=IngestStatus.COMPLETE,
+            title=header.get("title"),
+            authors=header.get("authors"),
+            doi=header.get("doi"),
+            published_date=pub_date,
+            abstract=doc.get("abstract"),
+            contents=doc.get("body"),
+        )
+        ref.citation_key = shared.create_citation_key(ref)
+        return ref
 
     def _parse_header(self, document: dict) -> dict:
         """
@@ -330,38 +562,21 @@ class PDFIngestion:
             email=author_dict.get("email"),
         )
 
-    def _create_references_for_grobid_failures(self) -> list[Reference]:
+    def _create_reference_for_grobid_failure(self, source_pdf: str) -> Reference:
         """
-        Creates Reference objects for PDFs that Grobid was unable to parse.
+        Creates a Reference object for a PDF that Grobid was unable to parse.
         We want the output of PDF Ingestion to contain _all_ PDF References, even
         if Grobid was unable to parse them. This allows the frontend to inform the
         user which PDFs we were unable to parse.
 
-        In cases where Grobid was unable to parse the PDF, a TXT file is created
-        in the same output directory where the XML file would have been created.
-        The TXT file is named as {pdf_filename}_{error_code}.txt.
+        Its contents are filled in from the PDF text when the Reference is chunked.
         """
-        txt_files = list(self.grobid_output_dir.glob("*.txt"))
-        logger.info(f"Found {len(txt_files)} txt files from Grobid parsing errors")
-
-        references = []
-        for file in txt_files:
-            logger.info(f"Creating Reference from file: {file.name}")
-
-            source_pdf = f"{file.stem.rpartition('_')[0]}.pdf"
-            source_pdf_path = os.path.join(self.staging_dir, source_pdf)
-            full_text = shared.extract_text_from_pdf(source_pdf_path)
-
-            references.append(
-                Reference(
-                    id=str(uuid4()),
-                    source_filename=source_pdf,
-                    status=IngestStatus.FAILURE,
-                    citation_key="untitled",
-                    contents=full_text,
-                )
-            )
-        return references
+        return Reference(
+            id=str(uuid4()),
+            source_filename=source_pdf,
+            status=IngestStatus.FAILURE,
+            citation_key="untitled",
+        )
 
     def _add_citation_keys(self, new_references: list[Reference]) -> list[Reference]:
         """
@@ -446,77 +661,206 @@ class PDFIngestion:
 
     def _create_references(self) -> None:
         """
-        Creates new Reference objects, appending them to any we have
+        Chunks the References created from Grobid output and creates
+        References for duplicate uploads, appending them to any we have
         previously loaded.
         """
-        json_files = list(self.storage_dir.glob("*.json"))
+        self.progress.set_stage(IngestStage.CREATING_REFERENCES)
 
-        # Remove references.json from the list of files to parse
-        try:
-            fp = self.storage_dir.joinpath("references.json")
-            json_files.remove(fp)
-        except ValueError:
-            pass
-
-        logger.info(f"Found {len(json_files)} Grobid JSON files to parse")
-
-        successes = []
-        for file in json_files:
-            logger.info(f"Creating Reference from file: {file.name}")
-
-            with open(file, "r") as fin:
-                doc = json.load(fin)
-
-            source_pdf = f"{file.stem}.pdf"
-
-            header = self._parse_header(doc)
-            pub_date = shared.parse_date(header.get("published_date", ""))
-
-            ref = Reference(
-                id=str(uuid4()),
-                source_filename=source_pdf,
-                status=IngestStatus.COMPLETE,
-                title=header.get("title"),
-                authors=header.get("authors"),
-                doi=header.get("doi"),
-                published_date=pub_date,
-                abstract=doc.get("abstract"),
-                contents=doc.get("body"),
-            )
-            ref.citation_key = shared.create_citation_key(ref)
-            successes.append(ref)
-
-        failures = self._create_references_for_grobid_failures()
-        num_created = len(successes) + len(failures)
+        # sort so that output does not depend on the order Grobid finished in
+        new_references = sorted(
+            self.new_references, key=lambda ref: ref.source_filename
+        )
+        num_failures = sum(
+            1 for ref in new_references if ref.status == IngestStatus.FAILURE
+        )
 
         msg = (
-            f"Created {num_created} Reference objects: "
-            f"{len(successes)} Grobid successes, {len(failures)} Grobid failures"
+            f"Created {len(new_references)} Reference objects: "
+            f"{len(new_references) - num_failures} Grobid successes, "
+            f"{num_failures} Grobid failures"
         )
         logger.info(msg)
 
-        new_references = successes + failures
+        # uploads whose contents changed replace their previous Reference
+        new_filenames = {ref.source_filename for ref in new_references}
+        self.references = [
+            ref for ref in self.references if ref.source_filename not in new_filenames
+        ]
+
         self._add_citation_keys(new_references)
+        self._extract_and_chunk_references(new_references)
 
         # append new references to any we have previously loaded
+        self.references.extend(new_references)
+
+        duplicates = self._create_references_for_duplicates(new_references)
+        self._add_citation_keys(duplicates)
+        self.references.extend(duplicates)
+        for ref in duplicates:
+            self.progress.update_file(ref.source_filename, IngestStage.DONE, ref.status)
+        self.uncommitted_references.extend(duplicates)
+
+    def _extract_and_chunk_references(self, references: list[Reference]) -> None:
+        """
+        Extracts the text of each Reference's PDF into its `pages`, and splits
+        it into chunks. Grobid failures also get their `contents` from the
+        extracted text.
+
+        PDFs are parsed in a pool of `max_workers` processes. Results are
+        applied as each PDF finishes, so progress is reported per file, while
+        the order of `references` is left untouched. Finished References are
+        committed to storage in the order of `references`, so that the order
+        they are stored in does not depend on the order the PDFs finish in.
+        """
+        finished = [False] * len(references)
+        # position of the first Reference that has not been committed
+        next_position = 0
+
+        def apply(ref: Reference, pages: list[str], chunks: list[Chunk]) -> None:
+            nonlocal next_position
+            if ref.status == IngestStatus.FAILURE:
+                ref.contents = "".join(pages)
+            ref.pages = pages
+            ref.chunks = chunks
+            self.progress.update_file(ref.source_filename, IngestStage.DONE, ref.status)
+
+            finished[positions[ref.id]] = True
+            while next_position < len(references) and finished[next_position]:
+                self._commit_reference(references[next_position])
+                next_position += 1
+
+        positions = {ref.id: i for i, ref in enumerate(references)}
+        tasks = [
+            (ref, self.staging_dir.joinpath(ref.source_filename)) for ref in references
+        ]
+        num_workers = min(self.max_workers, len(tasks))
+
+        # not worth starting processes for a single PDF
+        if num_workers <= 1:
+            for ref, filepath in tasks:
+                self.progress.raise_if_cancelled()
+                logger.info(
+                    f"Creating text chunks for Reference: {ref.source_filename}"
+                )
+                apply(ref, *_extract_and_chunk(ref, filepath))
+            return
+
+        logger.info(f"Creating text chunks for {len(tasks)} References")
+        # workers are spawned rather than forked, as ingest runs on a thread
+        # of the server, and other threads may hold locks (e.g. of logging or
+        # SQLite) that a forked process would inherit, held, forever
+        with ProcessPoolExecutor(
+            max_workers=num_workers, mp_context=multiprocessing.get_context("spawn")
+        ) as executor:
+            futures = {
+                executor.submit(_extract_and_chunk, ref, filepath): ref
+                for ref, filepath in tasks
+            }
+            try:
+                for future in as_completed(futures):
+                    apply(futures[future], *future.result())
+                    self.progress.raise_if_cancelled()
+            except BaseException:
+                executor.shutdown(wait=False, cancel_futures=True)
+                raise
+
+    def _create_references_for_duplicates(
+        self, new_references: list[Reference]
+    ) -> list[Reference]:
+        """
+        Creates Reference objects for uploads whose contents are identical to
+        an already processed upload, by copying the existing Reference instead
+        of parsing the PDF again.
+
+        Parameters
+        ----------
+        new_references : list[Reference]
+            References created by this ingest, for duplicates of other new
+            uploads
+        """
+        refs_by_hash = dict(self.refs_by_hash)
         for ref in new_references:
-            logger.info(f"Creating text chunks for Reference: {ref.source_filename}")
-            ref.chunks = shared.chunk_reference(
-                ref, filepath=self.staging_dir.joinpath(ref.source_filename)
+            sha256 = self.manifest.get_recorded_hash(ref.source_filename)
+            refs_by_hash.setdefault(sha256, ref)
+
+        references = []
+        for filepath, sha256 in self.duplicate_uploads.items():
+            # every duplicate has a stored or new Reference with its contents
+            original = refs_by_hash[sha256]
+
+            logger.info(
+                f"Creating Reference for {filepath.name} "
+                f"from duplicate upload {original.source_filename}"
+            )
+            ref = original.copy(
+                deep=True,
+                update={
+                    "id": str(uuid4()),
+                    "source_filename": filepath.name,
+                    "citation_key": None,
+                },
             )
+            for chunk in ref.chunks:
+                chunk.metadata["source_filename"] = filepath.name
+            references.append(ref)
+        return references
 
-            self.references.append(ref)
+    def _commit_reference(self, ref: Reference) -> None:
+        """
+        Commits a Reference that has finished ingest to the project's storage,
+        so that it is kept if ingest stops before the other files finish.
+
+        Saving a large storage file for every PDF would be slow, so References
+        that finish within `INGEST_COMMIT_INTERVAL` seconds of the last commit
+        are committed with the next one, or when ingest finishes. If ingest
+        stops before then, the next ingest creates them again from the
+        journal, without calling Grobid.
+        """
+        self.uncommitted_references.append(ref)
+        if (
+            self.last_commit is None
+            or time.monotonic() - self.last_commit >= INGEST_COMMIT_INTERVAL
+        ):
+            self._commit_references()
+
+    def _commit_references(self) -> "JsonStorage | SqliteStorage":
+        """
+        Adds the References that have not been committed yet to the project's
+        cached storage, which saves them. Returns the storage.
+        """
+        try:
+            store = load_storage(self.storage_dir)
+        except FileNotFoundError:
+            store = get_storage(self.storage_dir)
+        logger.info(
+            f"Committing {len(self.uncommitted_references)} references "
+            f"to {store.filepath}"
+        )
+
+        # references may have been updated or deleted while ingest was
+        # running, so only the ingested references are taken from this run
+        with store.lock:
+            store.add_references(self.uncommitted_references)
+        self.uncommitted_references = []
+        self.last_commit = time.monotonic()
+        return store
 
     def _save_references(self) -> None:
         """
-        Saves all Reference objects to the filesystem
+        Commits the References that are not in storage yet, and saves the
+        manifest of ingested files. Storage is the project's cached storage,
+        so that ingest does not overwrite concurrent changes.
         """
-        filepath = self.storage_dir.joinpath("references.json")
-        logger.info(f"Saving references to file: {filepath}")
+        store = self._commit_references()
+        with store.lock:
+            self.references = store.references
+
+        self.manifest.prune({fp.name for fp in self.uploaded_files})
+        self.manifest.save()
 
-        contents = [ref.dict() for ref in self.references]
-        with open(filepath, "w") as fout:
-            json.dump(contents, fout, indent=2, default=str)
+        # everything in the journal is now in storage
+        self.journal.clear()
 
     def create_ingest_response(self) -> IngestResponse:
         """
@@ -533,8 +877,11 @@ class PDFIngestion:
 
 
 class IngestStatusFetcher:
-    def __init__(self, storage: JsonStorage):
+    def __init__(self, storage: JsonStorage, loaded: bool = False):
         self.storage = storage
+        # whether `storage` has been loaded, so that uploads can be looked up
+        # by filename instead of reading the storage file
+        self.loaded = loaded
         self.uploads = list(UPLOADS_DIR.glob("*.pdf"))
 
     def _emit_ingest_status_response(
@@ -566,22 +913,21 @@ class IngestStatusFetcher:
             )
         return statuses
 
-    def _compare_uploads_against_references_json(self) -> list[ReferenceStatus]:
+    def _compare_uploads_against_references_json(
+        self, stored_statuses: dict[str, IngestStatus]
+    ) -> list[ReferenceStatus]:
         """
         Compares files in `uploads` directory against References stored
         in `references.json` to determine ingestion status.
 
         Files that are not yet in `references.json` are in process.
         """
-        references = {ref.source_filename: ref for ref in self.storage.references}
-
         statuses = []
         for filepath in self.uploads:
-            if filepath.name in references:
-                ref = references[filepath.name]
-
+            if filepath.name in stored_statuses:
                 status = ReferenceStatus(
-                    source_filename=ref.source_filename, status=ref.status
+                    source_filename=filepath.name,
+                    status=stored_statuses[filepath.name],
                 )
             else:
                 status = ReferenceStatus(
@@ -590,9 +936,24 @@ class IngestStatusFetcher:
             statuses.append(status)
         return statuses
 
+    def _get_stored_statuses(self) -> dict[str, IngestStatus]:
+        if self.loaded:
+            refs = (
+                self.storage.get_reference_by_filename(filepath.name)
+                for filepath in self.uploads
+            )
+            return {ref.source_filename: ref.status for ref in refs if ref is not None}
+
+        # only statuses are needed, so references are read one at a time
+        # and their chunks are skipped
+        return {
+            ref.source_filename: ref.status
+            for ref in self.storage.iter_references(include_chunks=False)
+        }
+
     def emit_statuses(self):
         try:
-            self.storage.load()
+            stored_statuses = self._get_stored_statuses()
         except FileNotFoundError as e:
             logger.warning(e)
             statuses = self._handle_missing_references_json()
@@ -607,7 +968,7 @@ class IngestStatusFetcher:
             )
             return response
 
-        statuses = self._compare_uploads_against_references_json()
+        statuses = self._compare_uploads_against_references_json(stored_statuses)
         response = self._emit_ingest_status_response(
             response_status=ResponseStatus.OK, reference_statuses=statuses
         )
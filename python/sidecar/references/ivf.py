@@ -0,0 +1,107 @@
+"""
+Inverted lists over the vectors of a segment of chunks, for approximate
+nearest neighbour search (an IVF index).
+
+The vectors are clustered with spherical k-means, and each vector is listed
+under its nearest centroid. The vectors are then stored list after list, so
+that each list is a contiguous block of rows. A query is scored against the
+centroids first, and then only against the blocks of the `nprobe` centroids
+nearest to it, rather than against every vector. Probing more lists finds
+more of the true nearest neighbours (recall), at the cost of scoring more
+vectors (latency); probing every list is an exact search.
+"""
+import numpy as np
+
+# segments with fewer vectors than this are searched exactly, as scoring all
+# of their vectors is about as fast as probing lists
+MIN_VECTORS = 16_384
+# number of vectors sampled per list to train the centroids
+SAMPLES_PER_LIST = 64
+KMEANS_ITERATIONS = 10
+
+# number of vectors scored at once when assigning them to lists, which bounds
+# the memory used to train
+_BATCH_SIZE = 16_384
+
+
+class InvertedLists:
+    """
+    Vectors listed under their nearest centroid, with the vectors of each
+    list in a block of rows of a matrix ordered by list.
+
+    Parameters
+    ----------
+    centroids : np.ndarray
+        The normalized centroids, as a matrix with a row per list
+    offsets : np.ndarray
+        The first row of each list, followed by the number of rows
+    docs : np.ndarray
+        The number of the vector in each row, i.e. its position in the
+        vectors the lists were trained on, in ascending order in each list
+    """
+
+    def __init__(self, centroids: np.ndarray, offsets: np.ndarray, docs: np.ndarray):
+        self.centroids = centroids
+        self.offsets = offsets
+        self.docs = docs
+
+    def __len__(self) -> int:
+        return len(self.centroids)
+
+    @classmethod
+    def train(cls, vectors: np.ndarray, seed: int = 0) -> "InvertedLists":
+        """
+        Clusters normalized vectors into about `sqrt(len(vectors))` lists.
+        Training is deterministic for a given `seed`. The vectors are to be
+        stored ordered by list, as `vectors[lists.docs]`.
+        """
+        rng = np.random.default_rng(seed)
+        num_lists = max(1, int(np.sqrt(len(vectors))))
+        num_samples = min(len(vectors), SAMPLES_PER_LIST * num_lists)
+        # sorted, so that memory mapped vectors are read in order
+        sample = vectors[np.sort(rng.choice(len(vectors), num_samples, replace=False))]
+        centroids = sample[rng.choice(num_samples, num_lists, replace=False)]
+
+        for _ in range(KMEANS_ITERATIONS):
+            assignments = _assign(sample, centroids)
+            order = np.argsort(assignments, kind="stable")
+            counts = np.bincount(assignments, minlength=num_lists)
+            # sums of the vectors of each non-empty list
+            starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+            listed = counts > 0
+            sums = np.add.reduceat(sample[order], starts[listed], axis=0)
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            # lists left empty keep their centroids
+            centroids = centroids.copy()
+            centroids[listed] = sums / np.maximum(norms, 1e-12)
+
+        assignments = _assign(vectors, centroids)
+        docs = np.argsort(assignments, kind="stable").astype(np.int32)
+        counts = np.bincount(assignments, minlength=num_lists)
+        offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+        return cls(centroids.astype(np.float32), offsets, docs)
+
+    def probe(self, query_vectors: np.ndarray, nprobe: int) -> list[list[slice]]:
+        """
+        Returns the blocks of rows of the `nprobe` lists whose centroids are
+        nearest to each query.
+        """
+        nprobe = max(1, min(nprobe, len(self)))
+        scores = query_vectors @ self.centroids.T
+        nearest = np.argpartition(-scores, nprobe - 1, axis=1)[:, :nprobe]
+        offsets = self.offsets.tolist()
+        return [
+            [slice(offsets[i], offsets[i + 1]) for i in np.sort(lists)]
+            for lists in nearest
+        ]
+
+
+def _assign(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """
+    Returns the nearest centroid of each vector.
+    """
+    assignments = np.empty(len(vectors), dtype=np.int64)
+    for start in range(0, len(vectors), _BATCH_SIZE):
+        batch = vectors[start : start + _BATCH_SIZE]
+        assignments[start : start + len(batch)] = np.argmax(batch @ centroids.T, axis=1)
+    return assignments
@@ -0,0 +1,210 @@
+"""
+Background ingest jobs.
+
+Ingest can take minutes for large uploads, so it runs on a worker pool rather
+than inside the HTTP handler. Only one ingest job runs per project at a time:
+requesting an ingest while one is in progress returns the running job.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from uuid import uuid4
+
+from sidecar.config import INGEST_MAX_WORKERS, logger
+from sidecar.references.ingest import IngestCancelled, IngestProgress, run_ingest
+from sidecar.references.schemas import (
+    IngestFileProgress,
+    IngestJobResponse,
+    IngestJobStatus,
+    IngestRequest,
+    IngestStage,
+    IngestStatus,
+)
+
+logger = logger.getChild(__name__)
+
+# finished jobs are kept around so that clients can read their final state,
+# but only up to this many
+MAX_FINISHED_JOBS = 100
+
+# fraction of a file's work that is done once it reaches a stage
+STAGE_WEIGHTS = {
+    IngestStage.CREATING_REFERENCES: 0.5,
+    IngestStage.DONE: 1.0,
+}
+
+
+class IngestJob(IngestProgress):
+    """
+    Runs ingest for a project and tracks its progress.
+    Progress updates are called from the worker thread running the job,
+    while `to_response` is called from request handlers.
+    """
+
+    def __init__(self, project_id: str, uploads_dir: Path):
+        self.job_id = str(uuid4())
+        self.project_id = project_id
+        self.uploads_dir = uploads_dir
+
+        self.status = IngestJobStatus.QUEUED
+        self.stage = IngestStage.QUEUED
+        self.files: dict[str, IngestFileProgress] = {}
+        self.message = ""
+
+        self.started_at: float | None = None
+        self.finished_at: float | None = None
+
+        self._cancelled = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def is_finished(self) -> bool:
+        return self.status in {
+            IngestJobStatus.COMPLETED,
+            IngestJobStatus.FAILED,
+            IngestJobStatus.CANCELLED,
+        }
+
+    def set_stage(self, stage: IngestStage) -> None:
+        with self._lock:
+            self.stage = stage
+
+    def set_files(self, filenames: list[str]) -> None:
+        with self._lock:
+            self.files = {
+                filename: IngestFileProgress(
+                    source_filename=filename,
+                    stage=IngestStage.QUEUED,
+                    status=IngestStatus.PROCESSING,
+                )
+                for filename in filenames
+            }
+
+    def update_file(
+        self,
+        filename: str,
+        stage: IngestStage,
+        status: IngestStatus = IngestStatus.PROCESSING,
+    ) -> None:
+        with self._lock:
+            self.files[filename] = IngestFileProgress(
+                source_filename=filename, stage=stage, status=status
+            )
+
+    def raise_if_cancelled(self) -> None:
+        if self._cancelled.is_set():
+            raise IngestCancelled(f"Ingest job {self.job_id} was cancelled")
+
+    def cancel(self) -> None:
+        """
+        Requests cancellation. A queued job is cancelled before it starts,
+        a running job stops at the next file boundary.
+        """
+        with self._lock:
+            self._cancelled.set()
+            if self.status == IngestJobStatus.QUEUED:
+                self.status = IngestJobStatus.CANCELLED
+                self.finished_at = time.monotonic()
+
+    def run(self) -> None:
+        with self._lock:
+            if self._cancelled.is_set():
+                return
+            self.status = IngestJobStatus.RUNNING
+            self.started_at = time.monotonic()
+
+        logger.info(f"Starting ingest job {self.job_id} for {self.project_id}")
+        try:
+            run_ingest(IngestRequest(pdf_directory=str(self.uploads_dir)), self)
+            status, message = IngestJobStatus.COMPLETED, ""
+        except IngestCancelled as e:
+            status, message = IngestJobStatus.CANCELLED, str(e)
+        except Exception as e:
+            logger.exception(f"Ingest job {self.job_id} failed")
+            status, message = IngestJobStatus.FAILED, str(e)
+
+        with self._lock:
+            self.status = status
+            self.message = message
+            self.finished_at = time.monotonic()
+        logger.info(f"Ingest job {self.job_id} finished with status: {status}")
+
+    def _estimate_seconds_remaining(self) -> float | None:
+        """
+        Estimates time remaining from the rate at which files have progressed
+        so far, weighting each file by `STAGE_WEIGHTS`.
+        """
+        if self.status != IngestJobStatus.RUNNING or not self.files:
+            return None
+
+        done = sum(STAGE_WEIGHTS.get(f.stage, 0.0) for f in self.files.values())
+        if done == 0:
+            return None
+
+        elapsed = time.monotonic() - self.started_at
+        return elapsed * (len(self.files) - done) / done
+
+    def to_response(self) -> IngestJobResponse:
+        with self._lock:
+            files = list(self.files.values())
+            return IngestJobResponse(
+                job_id=self.job_id,
+                project_id=self.project_id,
+                status=self.status,
+                stage=self.stage,
+                files_total=len(files),
+                files_done=sum(1 for f in files if f.stage == IngestStage.DONE),
+                files=files,
+                eta_seconds=self._estimate_seconds_remaining(),
+                message=self.message,
+            )
+
+
+class IngestJobManager:
+    def __init__(self, max_workers: int = INGEST_MAX_WORKERS):
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="ingest"
+        )
+        self._jobs: dict[str, IngestJob] = {}
+        self._active_jobs: dict[str, IngestJob] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, project_id: str, uploads_dir: Path) -> IngestJob:
+        """
+        Starts an ingest job for a project, or returns the project's
+        queued/running job if there is one.
+        """
+        with self._lock:
+            active = self._active_jobs.get(project_id)
+            if active is not None and not active.is_finished:
+                logger.info(f"Joining running ingest job {active.job_id}")
+                return active
+
+            job = IngestJob(project_id=project_id, uploads_dir=uploads_dir)
+            self._jobs[job.job_id] = job
+            self._active_jobs[project_id] = job
+            self._prune_finished_jobs()
+
+        self._executor.submit(self._run, job)
+        return job
+
+    def get(self, job_id: str) -> IngestJob | None:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _run(self, job: IngestJob) -> None:
+        try:
+            job.run()
+        finally:
+            with self._lock:
+                if self._active_jobs.get(job.project_id) is job:
+                    del self._active_jobs[job.project_id]
+
+    def _prune_finished_jobs(self) -> None:
+        finished = [job_id for job_id, j in self._jobs.items() if j.is_finished]
+        for job_id in finished[: max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self._jobs[job_id]
+
+
+job_manager = IngestJobManager()
@@ -0,0 +1,92 @@
+"""
+Journal of the work done by an ingest that has not finished yet.
+
+Every Reference created from a Grobid response is appended to the journal
+(and flushed to disk) as soon as it is created, along with the content hash
+of the PDF it came from. References are committed to storage once their PDF
+has been chunked as well. If ingest stops before then, e.g. because the
+sidecar crashed or the job was cancelled, the next ingest reuses the
+journaled References for PDFs whose contents have not changed, instead of
+sending them to Grobid again.
+
+The journal is a JSON Lines file, so appending a Reference never rewrites
+the work that came before it. It is removed once ingest has committed every
+Reference to storage.
+"""
+import json
+import os
+from pathlib import Path
+
+from sidecar.config import logger
+from sidecar.references.schemas import Reference
+from sidecar.typing import RefStudioModel
+
+logger = logger.getChild(__name__)
+
+
+class JournalEntry(RefStudioModel):
+    sha256: str
+    reference: Reference
+
+
+class IngestJournal:
+    def __init__(self, filepath: Path):
+        self.filepath = Path(filepath)
+        # {source_filename: JournalEntry}
+        self.entries: dict[str, JournalEntry] = {}
+
+    def load(self) -> None:
+        """
+        Loads journal entries from disk. Lines that cannot be read, such as a
+        line that was only partially written when the sidecar stopped, are
+        skipped.
+        """
+        if not self.filepath.exists():
+            return
+
+        with open(self.filepath, "r") as f:
+            for line in f:
+                try:
+                    entry = JournalEntry.parse_raw(line)
+                except Exception as e:
+                    logger.warning(f"Skipping unreadable journal entry: {e}")
+                    continue
+                self.entries[entry.reference.source_filename] = entry
+
+        if self.entries:
+            logger.info(f"Loaded {len(self.entries)} entries from ingest journal")
+
+    def append(self, sha256: str, reference: Reference) -> None:
+        """
+        Records a Reference, making sure that it is on disk before returning.
+        """
+        entry = JournalEntry(sha256=sha256, reference=reference)
+        line = json.dumps(entry.dict(), default=str) + "\n"
+        with open(self.filepath, "a+b") as f:
+            # a line left partially written when the sidecar stopped is ended
+            # first, so that this entry is not appended to it
+            if f.seek(0, os.SEEK_END) > 0:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    f.write(b"\n")
+            f.write(line.encode("utf8"))
+            f.flush()
+            os.fsync(f.fileno())
+        self.entries[reference.source_filename] = entry
+
+    def get_reference(self, source_filename: str, sha256: str) -> Reference | None:
+        """
+        Returns the journaled Reference for a file, as long as it was created
+        from a file with the same contents.
+        """
+        entry = self.entries.get(source_filename)
+        if entry is None or entry.sha256 != sha256:
+            return None
+        return entry.reference.copy(deep=True)
+
+    def clear(self) -> None:
+        self.entries = {}
+        try:
+            os.remove(self.filepath)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,113 @@
+"""
+Content-hash manifest of the PDFs that have been seen by ingest.
+
+The manifest lives next to `references.json` and maps each uploaded filename
+to the SHA-256 of its contents, along with the file size and mtime at the time
+it was hashed. Size and mtime act as a cheap pre-check: a file whose stat
+matches its manifest entry is assumed to be unchanged and is not read again.
+"""
+import hashlib
+import json
+import os
+from pathlib import Path
+
+from sidecar.config import logger
+from sidecar.shared import write_file_atomically
+from sidecar.typing import RefStudioModel
+
+logger = logger.getChild(__name__)
+
+MANIFEST_VERSION = 1
+
+# read files in 1 MiB blocks so that large PDFs are never fully in memory
+HASH_BLOCK_SIZE = 1024 * 1024
+
+
+def hash_file(filepath: Path) -> str:
+    """
+    Returns the SHA-256 hex digest of a file's contents.
+    """
+    sha256 = hashlib.sha256()
+    with open(filepath, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+            sha256.update(block)
+    return sha256.hexdigest()
+
+
+class ManifestEntry(RefStudioModel):
+    sha256: str
+    size: int
+    mtime_ns: int
+
+    def matches(self, stat: os.stat_result) -> bool:
+        return self.size == stat.st_size and self.mtime_ns == stat.st_mtime_ns
+
+
+class IngestManifest:
+    def __init__(self, filepath: Path):
+        self.filepath = Path(filepath)
+        self.files: dict[str, ManifestEntry] = {}
+
+    def load(self):
+        """
+        Loads the manifest from disk. A missing or unreadable manifest is
+        treated as empty, which means every file will be hashed again.
+        """
+        if not self.filepath.exists():
+            return
+
+        try:
+            with open(self.filepath, "r") as f:
+                data = json.load(f)
+            self.files = {
+                filename: ManifestEntry(**entry)
+                for filename, entry in data["files"].items()
+            }
+        except Exception as e:
+            logger.warning(f"Unable to read manifest {self.filepath}: {e}")
+            self.files = {}
+
+    def save(self):
+        contents = {
+            "version": MANIFEST_VERSION,
+            "files": {filename: e.dict() for filename, e in self.files.items()},
+        }
+        data = json.dumps(contents, indent=2).encode("utf8")
+        write_file_atomically(self.filepath, data)
+
+    def is_unchanged(self, filepath: Path) -> bool:
+        """
+        Returns True if the file's size and mtime match its manifest entry,
+        without reading the file.
+        """
+        entry = self.files.get(filepath.name)
+        if entry is None:
+            return False
+        return entry.matches(filepath.stat())
+
+    def get_hash(self, filepath: Path) -> str:
+        """
+        Returns the content hash of a file, only reading the file when it is
+        new or its size/mtime have changed since it was last hashed.
+        The manifest entry for the file is updated accordingly.
+        """
+        stat = filepath.stat()
+        entry = self.files.get(filepath.name)
+        if entry is not None and entry.matches(stat):
+            return entry.sha256
+
+        sha256 = hash_file(filepath)
+        self.files[filepath.name] = ManifestEntry(
+            sha256=sha256, size=stat.st_size, mtime_ns=stat.st_mtime_ns
+        )
+        return sha256
+
+    def get_recorded_hash(self, filename: str) -> str | None:
+        entry = self.files.get(filename)
+        return entry.sha256 if entry is not None else None
+
+    def prune(self, filenames: set[str]) -> None:
+        """
+        Removes entries for files that are not in `filenames`.
+        """
+        self.files = {k: v for k, v in self.files.items() if k in filenames}
@@ -1,13 +1,16 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, HTTPException, Query
 from sidecar.projects.service import get_project_path
-from sidecar.references import ingest, storage
+from sidecar.references import jobs, storage
 from sidecar.references.schemas import (
     DeleteRequest,
     DeleteStatusResponse,
-    IngestRequest,
-    IngestResponse,
+    IngestJobResponse,
     Reference,
     ReferencePatch,
+    ReferenceSummaryField,
+    ReferenceSummaryPage,
+    ReferenceUpdate,
+    SortOrder,
     UpdateStatusResponse,
 )
 from sidecar.typing import EmptyRequest
@@ -25,35 +28,87 @@ async def list_references(project_id: str) -> list[Reference]:
     """
     user_id = "user1"
     project_path = get_project_path(user_id, project_id)
-    store = storage.JsonStorage(project_path / ".storage" / "references.json")
     try:
-        store.load()
+        store = storage.load_storage(project_path / ".storage")
     except FileNotFoundError:
         # no references have been ingested yet
         return []
     return store.references
 
 
+@router.get("/{project_id}/summaries", response_model_exclude_unset=True)
+async def list_reference_summaries(
+    project_id: str,
+    fields: list[ReferenceSummaryField] | None = Query(None),
+    offset: int = Query(0, ge=0),
+    limit: int | None = Query(None, ge=0),
+    sort: ReferenceSummaryField | None = None,
+    order: SortOrder = SortOrder.ASC,
+) -> ReferenceSummaryPage:
+    """
+    Returns a page of reference summaries (metadata without contents or
+    chunks), with only the requested `fields`
+    """
+    user_id = "user1"
+    project_path = get_project_path(user_id, project_id)
+    try:
+        return storage.list_reference_summaries(
+            project_path / ".storage",
+            fields=fields,
+            offset=offset,
+            limit=limit,
+            sort=sort,
+            order=order,
+        )
+    except FileNotFoundError:
+        # no references have been ingested yet
+        return ReferenceSummaryPage(total=0, offset=offset, references=[])
+
+
 @router.post("/{project_id}")
-async def ingest_references(project_id: str, payload: EmptyRequest) -> IngestResponse:
+async def ingest_references(
+    project_id: str, payload: EmptyRequest
+) -> IngestJobResponse:
     """
-    Ingests references from PDFs in the project uploads directory
+    Starts a background job to ingest PDFs in the project uploads directory
     """
     user_id = "user1"
     project_path = get_project_path(user_id, project_id)
     uploads_dir = project_path / "uploads"
-    req = IngestRequest(pdf_directory=str(uploads_dir))
-    response = ingest.run_ingest(req)
-    return response
+    job = jobs.job_manager.submit(project_id, uploads_dir)
+    return job.to_response()
+
+
+@router.get("/{project_id}/jobs/{job_id}")
+async def get_ingest_job(project_id: str, job_id: str) -> IngestJobResponse:
+    """
+    Returns the progress of an ingest job
+    """
+    job = jobs.job_manager.get(job_id)
+    if job is None or job.project_id != project_id:
+        raise HTTPException(status_code=404, detail="Ingest job not found")
+    return job.to_response()
+
+
+@router.post("/{project_id}/jobs/{job_id}/cancel")
+async def cancel_ingest_job(
+    project_id: str, job_id: str, payload: EmptyRequest
+) -> IngestJobResponse:
+    """
+    Cancels an ingest job, discarding any references it has not saved yet
+    """
+    job = jobs.job_manager.get(job_id)
+    if job is None or job.project_id != project_id:
+        raise HTTPException(status_code=404, detail="Ingest job not found")
+    job.cancel()
+    return job.to_response()
 
 
 @router.get("/{project_id}/{reference_id}")
 async def http_get(project_id: str, reference_id: str) -> Reference | None:
     user_id = "user1"
     project_path = get_project_path(user_id, project_id)
-    store = storage.JsonStorage(project_path / ".storage" / "references.json")
-    store.load()
-    response = store.get_reference(reference_id)
+    response = storage.find_reference(project_path / ".storage", reference_id)
     return response
 
 
@@ -63,18 +118,30 @@ async def http_update(
 ) -> UpdateStatusResponse:
     user_id = "user1"
     project_path = get_project_path(user_id, project_id)
-    store = storage.JsonStorage(project_path / ".storage" / "references.json")
-    store.load()
+    store = storage.load_storage(project_path / ".storage")
     response = store.update(reference_id, req)
     return response
 
 
+@router.post("/{project_id}/bulk_update")
+async def http_bulk_update(
+    project_id: str, req: list[ReferenceUpdate]
+) -> UpdateStatusResponse:
+    """
+    Applies the patches of several references, saving them together
+    """
+    user_id = "user1"
+    project_path = get_project_path(user_id, project_id)
+    store = storage.load_storage(project_path / ".storage")
+    response = store.update_many(req)
+    return response
+
+
 @router.delete("/{project_id}/{reference_id}")
 async def http_delete(project_id: str, reference_id: str) -> DeleteStatusResponse:
     user_id = "user1"
     project_path = get_project_path(user_id, project_id)
-    store = storage.JsonStorage(project_path / ".storage" / "references.json")
-    store.load()
+    store = storage.load_storage(project_path / ".storage")
     response = store.delete(reference_ids=[reference_id])
     return response
 
@@ -83,7 +150,6 @@ async def http_delete(project_id: str, reference_id: str) -> DeleteStatusRespons
 async def http_bulk_delete(project_id: str, req: DeleteRequest) -> DeleteStatusResponse:
     user_id = "user1"
     project_path = get_project_path(user_id, project_id)
-    store = storage.JsonStorage(project_path / ".storage" / "references.json")
-    store.load()
+    store = storage.load_storage(project_path / ".storage")
     response = store.delete(reference_ids=req.reference_ids, all_=req.all)
     return response
@@ -19,6 +19,39 @@ class IngestStatus(StrEnum):
     COMPLETE = "complete"
 
 
+class IngestJobStatus(StrEnum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+
+class IngestStage(StrEnum):
+    QUEUED = "queued"
+    CHECKING_UPLOADS = "checking_uploads"
+    GROBID = "grobid"
+    CREATING_REFERENCES = "creating_references"
+    SAVING = "saving"
+    DONE = "done"
+
+
+class ReferenceSummaryField(StrEnum):
+    SOURCE_FILENAME = "source_filename"
+    STATUS = "status"
+    CITATION_KEY = "citation_key"
+    DOI = "doi"
+    TITLE = "title"
+    ABSTRACT = "abstract"
+    PUBLISHED_DATE = "published_date"
+    AUTHORS = "authors"
+
+
+class SortOrder(StrEnum):
+    ASC = "asc"
+    DESC = "desc"
+
+
 class Reference(RefStudioModel):
     """A reference for an academic paper / PDF"""
 
@@ -33,8 +66,43 @@ class Reference(RefStudioModel):
     published_date: date | None = None
     authors: list["Author"] = []
     chunks: list["Chunk"] = []
+    pages: list[str] = []
     metadata: dict[str, Any] = {}
 
+    def get_chunk_text(self, chunk: "Chunk") -> str:
+        """
+        Returns the text of one of this Reference's chunks, slicing it out of
+        the text of its page if the chunk is stored as a span.
+        """
+        if chunk.text is not None:
+            return chunk.text
+        return self.pages[chunk.page_num - 1][chunk.start : chunk.end]
+
+
+class ReferenceSummary(RefStudioModel):
+    """
+    The metadata of a Reference, without its contents and chunks, for
+    listing references. Only `id` and the requested fields are returned.
+    """
+
+    id: str
+    source_filename: str | None = None
+    status: IngestStatus | None = None
+    citation_key: str | None = None
+    doi: str | None = None
+    title: str | None = None
+    abstract: str | None = None
+    published_date: date | None = None
+    authors: list["Author"] | None = None
+
+
+class ReferenceSummaryPage(RefStudioModel):
+    """A page of reference summaries, out of `total` references"""
+
+    total: int
+    offset: int
+    references: list[ReferenceSummary]
+
 
 class ReferencePatch(RefStudioModel):
     """
@@ -61,7 +129,18 @@ class Author(RefStudioModel):
 
 
 class Chunk(RefStudioModel):
-    text: str
+    """
+    A piece of a Reference's text.
+
+    Chunks created by ingest do not hold a copy of their text. They are a
+    span, from character `start` to `end`, of page `page_num` of their
+    Reference's `pages`: use `Reference.get_chunk_text` to read it.
+    """
+
+    text: str | None = None
+    page_num: int | None = None
+    start: int | None = None
+    end: int | None = None
     vector: list[float] = []
     metadata: dict[str, Any] = {}
 
@@ -85,6 +164,26 @@ class IngestStatusResponse(RefStudioModel):
     reference_statuses: list[ReferenceStatus]
 
 
+class IngestFileProgress(RefStudioModel):
+    source_filename: str
+    stage: IngestStage
+    status: IngestStatus
+
+
+class IngestJobResponse(RefStudioModel):
+    """The state of a background ingest job for a project"""
+
+    job_id: str
+    project_id: str
+    status: IngestJobStatus
+    stage: IngestStage
+    files_total: int
+    files_done: int
+    files: list[IngestFileProgress]
+    eta_seconds: float | None = None
+    message: str
+
+
 class UpdateStatusResponse(RefStudioModel):
     status: ResponseStatus
     message: str
@@ -102,3 +201,4 @@ class DeleteStatusResponse(RefStudioModel):
 
 
 Reference.update_forward_refs()
+ReferenceSummary.update_forward_refs()
@@ -0,0 +1,385 @@
+"""
+Indexes of the chunks of a project's References, made of immutable segments.
+
+A segment holds the data of the chunks of some References (e.g. their BM25
+postings, or their vectors). References that are added (or whose text is
+patched) go into a new segment, and References that are deleted (or
+replaced) are marked as deleted in the segment that holds them. Segments are
+merged when there are too many of them, or too many deleted chunks.
+
+Segments are saved as files in a directory next to the storage file, along
+with a manifest of the segments and their deleted References. The manifest
+records the checksum of the storage file the index was saved for, so that an
+index that no longer matches its storage file is built again.
+
+Segment files (see `write_segment_file`) hold a JSON header followed by the
+segment's arrays, which are memory mapped when the file is opened:
+
+    magic | version (1 byte) | header length (uint64) | header | arrays
+
+Each array starts at an offset aligned to 8 bytes, so it is used in place.
+"""
+import json
+import mmap
+import struct
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import NamedTuple
+from uuid import uuid4
+
+import numpy as np
+from sidecar.config import logger
+from sidecar.references.schemas import Reference
+from sidecar.shared import remove_file, write_file_atomically
+
+logger = logger.getChild(__name__)
+
+# segments are merged when there are more than this many ...
+MAX_SEGMENTS = 8
+# ... or when more than this fraction of their chunks are deleted
+MAX_DELETED_RATIO = 0.5
+
+MANIFEST_FILENAME = "manifest.json"
+
+_LENGTH = struct.Struct("<Q")
+_ALIGNMENT = 8
+
+
+class Hit(NamedTuple):
+    """
+    A chunk found by a search, as the id of its Reference and its position in
+    the Reference's chunks.
+    """
+
+    reference_id: str
+    chunk_index: int
+    score: float
+
+
+class IndexSegment(ABC):
+    """
+    The chunks of some References, numbered in the order of the References
+    and their chunks. Subclasses hold the data of the chunks, and merge, save
+    and open it.
+    """
+
+    def __init__(self, references: list[tuple[str, int]], name: str | None = None):
+        # id and number of chunks of each Reference
+        self.references = references
+        # file the segment is saved in, or None if it has not been saved
+        self.name = name
+
+        counts = np.array([n for _, n in references], dtype=np.int64)
+        starts = np.concatenate([[0], np.cumsum(counts)])
+        self.ref_ranges = {
+            ref_id: (int(starts[i]), int(starts[i + 1]))
+            for i, (ref_id, _) in enumerate(references)
+        }
+        self.doc_refs = np.repeat(np.arange(len(references)), counts)
+        self.doc_chunks = np.arange(starts[-1]) - starts[:-1][self.doc_refs]
+
+        self.deleted: frozenset[str] = frozenset()
+        self.alive = np.ones(int(starts[-1]), dtype=bool)
+        self._count_alive()
+
+    def __len__(self) -> int:
+        return len(self.alive)
+
+    def _count_alive(self) -> None:
+        self.num_alive = int(np.count_nonzero(self.alive))
+
+    @property
+    def alive_references(self) -> list[tuple[str, int]]:
+        return [r for r in self.references if r[0] not in self.deleted]
+
+    def get_hit(self, doc: int, score: float) -> Hit:
+        """
+        Returns the chunk numbered `doc` in the segment, with its score.
+        """
+        ref_id = self.references[self.doc_refs[doc]][0]
+        return Hit(ref_id, int(self.doc_chunks[doc]), float(score))
+
+    def without(self, reference_ids: set[str]) -> "IndexSegment":
+        """
+        Returns a copy of the segment with References marked as deleted. The
+        copy shares the data of the segment.
+        """
+        deleted = {ref_id for ref_id in reference_ids if ref_id in self.ref_ranges}
+        if not deleted - self.deleted:
+            return self
+
+        segment = object.__new__(type(self))
+        segment.__dict__.update(self.__dict__)
+        segment.deleted = self.deleted | deleted
+        segment.alive = self.alive.copy()
+        for ref_id in deleted:
+            start, end = self.ref_ranges[ref_id]
+            segment.alive[start:end] = False
+        segment._count_alive()
+        return segment
+
+    @classmethod
+    @abstractmethod
+    def merge(cls, segments: list["IndexSegment"]) -> "IndexSegment":
+        """
+        Merges segments into a new segment, without their deleted References.
+        """
+
+    @abstractmethod
+    def save(self, dirpath: Path) -> None:
+        """
+        Writes the segment to a new file in `dirpath`, named `segment-*`, and
+        sets its `name`.
+        """
+
+    @classmethod
+    @abstractmethod
+    def open(cls, filepath: Path) -> "IndexSegment":
+        """
+        Opens a segment file written by `save`.
+        """
+
+
+class SegmentedIndex(ABC):
+    """
+    An index of the chunks of a project's References that is updated as
+    References are added, patched and deleted.
+
+    Changes are made to a copy of the list of segments, which then replaces
+    it, so searches running on other threads see the index either before or
+    after each change.
+
+    Subclasses build segments from References, and can save files and
+    manifest entries of their own.
+    """
+
+    segment_class: type[IndexSegment] = IndexSegment
+    # version of the saved index, which must match when it is opened
+    version = 1
+
+    def __init__(self, segments: list[IndexSegment] | None = None):
+        self.segments = segments if segments is not None else []
+
+    @property
+    def num_docs(self) -> int:
+        return sum(segment.num_alive for segment in self.segments)
+
+    @abstractmethod
+    def _build_segment(self, references: list[Reference]) -> IndexSegment:
+        """
+        Builds a new segment of the chunks of References.
+        """
+
+    def add(self, references: list[Reference]) -> None:
+        """
+        Adds References to the index, replacing any indexed References with
+        the same ids.
+        """
+        if not references:
+            return
+        segments = self._without({ref.id for ref in references})
+        self.segments = segments + [self._build_segment(references)]
+
+    def remove(self, reference_ids: list[str]) -> None:
+        """
+        Removes References from the index.
+        """
+        self.segments = self._without(set(reference_ids))
+
+    def _without(self, reference_ids: set[str]) -> list[IndexSegment]:
+        return [segment.without(reference_ids) for segment in self.segments]
+
+    def compact(self) -> None:
+        """
+        Merges segments when there are more than `MAX_SEGMENTS`, or when more
+        than `MAX_DELETED_RATIO` of their chunks are deleted. The newest
+        segments are merged together, unless they are larger than the oldest.
+        """
+        merge = self.segment_class.merge
+        segments = self.segments
+        total = sum(len(segment) for segment in segments)
+        deleted = total - sum(segment.num_alive for segment in segments)
+        if deleted and deleted > MAX_DELETED_RATIO * total:
+            self.segments = [merge(segments)]
+        elif len(segments) > MAX_SEGMENTS:
+            oldest, newest = segments[0], segments[1:]
+            if sum(segment.num_alive for segment in newest) < oldest.num_alive:
+                self.segments = [oldest, merge(newest)]
+            else:
+                self.segments = [merge(segments)]
+
+    def _save_files(self, dirpath: Path) -> dict:
+        """
+        Saves any files of the index other than its segments, before the
+        manifest, and returns entries to add to the manifest.
+        """
+        return {}
+
+    def save(self, dirpath: Path, checksum: str) -> None:
+        """
+        Saves the index to `dirpath`, writing only the segments that have not
+        been saved yet.
+
+        Parameters
+        ----------
+        dirpath : Path
+            Directory of the index
+        checksum : str
+            Checksum of the storage file the index was built from, which must
+            match when the index is opened
+        """
+        self.compact()
+        dirpath = Path(dirpath)
+        dirpath.mkdir(parents=True, exist_ok=True)
+        for segment in self.segments:
+            if segment.name is None:
+                segment.save(dirpath)
+
+        manifest = {
+            "version": self.version,
+            "checksum": checksum,
+            **self._save_files(dirpath),
+            "segments": [
+                {"name": segment.name, "deleted": sorted(segment.deleted)}
+                for segment in self.segments
+            ],
+        }
+        write_file_atomically(
+            dirpath.joinpath(MANIFEST_FILENAME), json.dumps(manifest).encode("utf8")
+        )
+
+        # segments that were merged are no longer needed
+        names = {segment.name for segment in self.segments}
+        for filepath in dirpath.glob("segment-*"):
+            if filepath.name not in names:
+                remove_file(filepath)
+
+    @classmethod
+    def update_checksum(cls, dirpath: Path, checksum: str, new_checksum: str) -> bool:
+        """
+        Records that an index saved for the storage file with `checksum` is
+        also the index of the file with `new_checksum`, e.g. when only the
+        metadata of References changed, without opening the index. Returns
+        whether there was such an index.
+        """
+        filepath = Path(dirpath).joinpath(MANIFEST_FILENAME)
+        try:
+            with open(filepath, "rb") as f:
+                manifest = json.load(f)
+            if (
+                manifest.get("version") != cls.version
+                or manifest.get("checksum") != checksum
+            ):
+                return False
+            manifest["checksum"] = new_checksum
+            write_file_atomically(filepath, json.dumps(manifest).encode("utf8"))
+        except FileNotFoundError:
+            return False
+        except (OSError, ValueError) as e:
+            logger.warning(f"Unable to update {cls.__name__} in {dirpath}: {e}")
+            return False
+        return True
+
+    @classmethod
+    def open(cls, dirpath: Path, checksum: str, **kwargs) -> "SegmentedIndex | None":
+        """
+        Opens a saved index, if it was saved for the storage file with
+        `checksum`. Returns None if there is no such index, or it cannot be
+        read. Keyword arguments are passed to `_from_saved`.
+        """
+        dirpath = Path(dirpath)
+        try:
+            with open(dirpath.joinpath(MANIFEST_FILENAME), "rb") as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Unable to read {cls.__name__} in {dirpath}: {e}")
+            return None
+        if (
+            manifest.get("version") != cls.version
+            or manifest.get("checksum") != checksum
+        ):
+            return None
+
+        try:
+            segments = []
+            for entry in manifest["segments"]:
+                segment = cls.segment_class.open(dirpath.joinpath(entry["name"]))
+                segments.append(segment.without(set(entry["deleted"])))
+            return cls._from_saved(dirpath, manifest, segments, **kwargs)
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Unable to open {cls.__name__} in {dirpath}: {e}")
+            return None
+
+    @classmethod
+    def _from_saved(
+        cls, dirpath: Path, manifest: dict, segments: list[IndexSegment], **kwargs
+    ) -> "SegmentedIndex":
+        """
+        Creates the index from its opened segments, reading any other files
+        that `_save_files` saved. Raises ValueError if they do not match.
+        """
+        return cls(segments, **kwargs)
+
+
+def write_segment_file(
+    dirpath: Path,
+    magic: bytes,
+    version: int,
+    header: dict,
+    arrays: dict[str, np.ndarray],
+) -> str:
+    """
+    Writes a header and arrays to a new segment file in `dirpath`, and returns
+    the name of the file.
+    """
+    header = {**header, "arrays": {}}
+    blocks = []
+    offset = 0
+    for key, array in arrays.items():
+        header["arrays"][key] = [offset, array.size]
+        blocks.append(array.tobytes())
+        offset += _pad(len(blocks[-1]))
+
+    encoded = json.dumps(header).encode("utf8")
+    contents = bytearray(magic + bytes([version]) + _LENGTH.pack(len(encoded)))
+    contents += encoded
+    for block in blocks:
+        contents += bytes(_pad(len(contents)) - len(contents))
+        contents += block
+
+    name = f"segment-{uuid4().hex}.bin"
+    write_file_atomically(dirpath.joinpath(name), bytes(contents))
+    return name
+
+
+def read_segment_file(
+    filepath: Path, magic: bytes, version: int, dtypes: dict[str, np.dtype]
+) -> tuple[dict, dict[str, np.ndarray]]:
+    """
+    Opens a segment file written by `write_segment_file`, and returns its
+    header and its arrays (of `dtypes`), memory mapped.
+    """
+    with open(filepath, "rb") as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    if buffer[: len(magic)] != magic or buffer[len(magic)] != version:
+        raise ValueError(f"Not an index segment: {filepath}")
+    pos = len(magic) + 1
+    (length,) = _LENGTH.unpack_from(buffer, pos)
+    pos += _LENGTH.size
+    header = json.loads(buffer[pos : pos + length])
+    start = _pad(pos + length)
+
+    arrays = {}
+    for key, dtype in dtypes.items():
+        offset, count = header["arrays"][key]
+        arrays[key] = np.frombuffer(
+            buffer, dtype=dtype, count=count, offset=start + offset
+        )
+    return header, arrays
+
+
+def _pad(length: int) -> int:
+    return -(-length // _ALIGNMENT) * _ALIGNMENT
@@ -0,0 +1,448 @@
+"""
+Serialization of References for `JsonStorage`.
+
+References are stored in one of two formats:
+
+- `json`: a JSON array of References, indented so that it can be read and
+  edited by hand. This is the format written by older sidecars.
+- `compact`: a binary format that is faster to read and write, and much
+  smaller. References are encoded as JSON without whitespace, and chunk
+  vectors are packed as float32 arrays after it. The whole body can be
+  compressed with zlib.
+
+The format of a file is detected from its first bytes, so files in either
+format can be loaded.
+
+Compact files start with `MAGIC`, a version byte and a codec byte:
+
+    MAGIC (7 bytes) | version (1 byte) | codec (1 byte) | body
+
+where the (possibly compressed) body is
+
+    JSON length (uint64) | JSON | vectors (float32, little-endian)
+
+The JSON is an object with the `vector_lengths` of every chunk, in order,
+used to unpack the vectors, followed by the `references` (without chunk
+vectors).
+
+References can also be read one at a time with `iter_references`, which
+holds a single Reference in memory (plus a read buffer) instead of all of
+them. Compact files are streamed too: the JSON of the References and their
+vectors are read (and decompressed) from their own positions in the file,
+as References are consumed.
+"""
+import codecs
+import io
+import json
+import re
+import struct
+import sys
+import zlib
+from array import array
+from typing import Any, BinaryIO, Generator, Iterator
+
+try:
+    # introduced in Python 3.11 ...
+    from enum import StrEnum
+except ImportError:
+    # ... but had some breaking changes
+    # https://github.com/python/cpython/issues/100458
+    # Python 3.10 and below
+    from strenum import StrEnum
+
+MAGIC = b"RSREFS\x00"
+VERSION = 1
+
+CODEC_NONE = 0
+CODEC_ZLIB = 1
+
+# fast compression, as storage is written every time references change
+ZLIB_LEVEL = 1
+
+# characters read at a time when streaming References from a JSON file
+STREAM_BLOCK_SIZE = 1024 * 1024
+
+_LENGTH = struct.Struct("<Q")
+_HEADER_SIZE = len(MAGIC) + 2
+# compact files start their JSON with the vector lengths, so that vectors
+# can be unpacked while References are streamed
+_COMPACT_PREFIX = '{"vector_lengths":'
+_WHITESPACE = " \t\n\r"
+# what follows the vector lengths in compact files, before the References
+_REFERENCES_KEY = re.compile(r'\s*,\s*"references"\s*:\s*')
+
+_decoder = json.JSONDecoder()
+
+
+class StorageFormat(StrEnum):
+    JSON = "json"
+    COMPACT = "compact"
+
+
+def detect_format(raw: bytes) -> StorageFormat:
+    """
+    Returns the format of serialized References.
+    """
+    if raw.startswith(MAGIC):
+        return StorageFormat.COMPACT
+    return StorageFormat.JSON
+
+
+def is_compressed(raw: bytes) -> bool:
+    return detect_format(raw) == StorageFormat.COMPACT and raw[len(MAGIC) + 1] != 0
+
+
+def dumps(
+    references: list[dict],
+    format: StorageFormat = StorageFormat.JSON,
+    compress: bool = False,
+) -> bytes:
+    """
+    Serializes References (as dicts) in the given format.
+
+    Parameters
+    ----------
+    references : list[dict]
+        References as dicts, e.g. from `Reference.dict()`. Their chunks'
+        vectors are removed in the compact format.
+    format : StorageFormat, default "json"
+        Format to serialize to
+    compress : bool, default False
+        Compress the data (compact format only)
+    """
+    if format == StorageFormat.JSON:
+        return json.dumps(references, indent=2, default=str).encode("utf8")
+
+    vectors = array("f")
+    vector_lengths = []
+    for ref in references:
+        for chunk in ref.get("chunks", []):
+            vector = chunk.pop("vector", [])
+            vectors.extend(vector)
+            vector_lengths.append(len(vector))
+    if sys.byteorder == "big":
+        vectors.byteswap()
+
+    encoded = _dumps_json({"vector_lengths": vector_lengths, "references": references})
+    body = _LENGTH.pack(len(encoded)) + encoded + vectors.tobytes()
+
+    codec = CODEC_NONE
+    if compress:
+        codec = CODEC_ZLIB
+        body = zlib.compress(body, ZLIB_LEVEL)
+    return MAGIC + bytes([VERSION, codec]) + body
+
+
+def loads(raw: bytes) -> list[dict]:
+    """
+    Deserializes References (as dicts) in either format.
+    """
+    if detect_format(raw) == StorageFormat.JSON:
+        return _loads_json(raw)
+
+    json_bytes, vectors = _read_compact_body(raw)
+    data = _loads_json(json_bytes)
+    reader = _VectorReader(vectors, data["vector_lengths"])
+    for ref in data["references"]:
+        reader.add_vectors(ref)
+    return data["references"]
+
+
+def iter_references(f: BinaryIO, include_chunks: bool = True) -> Iterator[dict]:
+    """
+    Yields References (as dicts) one at a time from a file in either format.
+    Files are read as References are consumed, so stopping early does not
+    read the rest of the file.
+
+    Parameters
+    ----------
+    f : BinaryIO
+        File opened for reading in binary mode
+    include_chunks : bool, default True
+        Include each Reference's chunks. If False, chunks are dropped as soon
+        as each Reference is read, and their vectors are not unpacked.
+    """
+    if f.read(len(MAGIC)) != MAGIC:
+        f.seek(0)
+        text = io.TextIOWrapper(f, encoding="utf8")
+        try:
+            for ref in _iter_json_array(text):
+                if not include_chunks:
+                    ref.pop("chunks", None)
+                yield ref
+        finally:
+            # the file belongs to the caller, so it must not be closed with
+            # the wrapper
+            text.detach()
+        return
+
+    version, codec = f.read(2)
+    if version != VERSION:
+        raise ValueError(f"Unsupported storage format version: {version}")
+    body = _BodyReader(f, codec)
+    (length,) = _LENGTH.unpack(body.read(_LENGTH.size))
+    text = _TextReader(body, length)
+
+    match = None
+    if text.read(len(_COMPACT_PREFIX)) == _COMPACT_PREFIX:
+        vector_lengths, buffer = _read_json_array(text)
+        # the key of the References may span blocks
+        while len(buffer) < 64 and (block := text.read(STREAM_BLOCK_SIZE)):
+            buffer += block
+        match = _REFERENCES_KEY.match(buffer)
+    if match is None:
+        # the vector lengths are after the References, so they must all be read
+        f.seek(0)
+        yield from loads(f.read())
+        return
+
+    vectors = None
+    if include_chunks:
+        # the vectors follow the JSON
+        vectors = _BodyReader(f, codec)
+        vectors.skip(_LENGTH.size + length)
+    reader = _VectorStreamReader(vectors, vector_lengths)
+    for ref in _iter_json_array(text, buffer[match.end() :]):
+        if include_chunks:
+            reader.add_vectors(ref)
+        else:
+            reader.skip(len(ref.pop("chunks", [])))
+        yield ref
+
+
+class _VectorReader:
+    """
+    Unpacks the vectors of chunks, in the order they were packed.
+    """
+
+    def __init__(self, vectors: array, vector_lengths: list[int]):
+        self.vectors = vectors
+        self.vector_lengths = vector_lengths
+        self.chunk_index = 0
+        self.offset = 0
+
+    def add_vectors(self, ref: dict) -> None:
+        for chunk in ref.get("chunks", []):
+            length = self.vector_lengths[self.chunk_index]
+            chunk["vector"] = self.vectors[self.offset : self.offset + length].tolist()
+            self.chunk_index += 1
+            self.offset += length
+
+
+class _VectorStreamReader:
+    """
+    Unpacks the vectors of chunks, in the order they were packed, reading
+    them from the body of a compact file as they are needed.
+    """
+
+    def __init__(self, body: "_BodyReader | None", vector_lengths: list[int]):
+        self.body = body
+        self.vector_lengths = vector_lengths
+        self.chunk_index = 0
+
+    def add_vectors(self, ref: dict) -> None:
+        chunks = ref.get("chunks", [])
+        end = self.chunk_index + len(chunks)
+        lengths = self.vector_lengths[self.chunk_index : end]
+        vectors = array("f")
+        vectors.frombytes(self.body.read(vectors.itemsize * sum(lengths)))
+        if sys.byteorder == "big":
+            vectors.byteswap()
+        offset = 0
+        for chunk, length in zip(chunks, lengths):
+            chunk["vector"] = vectors[offset : offset + length].tolist()
+            offset += length
+        self.chunk_index = end
+
+    def skip(self, num_chunks: int) -> None:
+        self.chunk_index += num_chunks
+
+
+class _BodyReader:
+    """
+    Reads the body of a compact file, decompressing it if needed. Each reader
+    keeps its own position in the file, so that several of them can read
+    different parts of the body of the same file.
+    """
+
+    def __init__(self, f: BinaryIO, codec: int):
+        if codec not in (CODEC_NONE, CODEC_ZLIB):
+            raise ValueError(f"Unsupported storage codec: {codec}")
+        self.f = f
+        self.pos = _HEADER_SIZE
+        self.decompressor = zlib.decompressobj() if codec == CODEC_ZLIB else None
+        # data read (and decompressed) that has not been returned yet
+        self.pending = b""
+
+    def _read_block(self) -> bytes:
+        """
+        Returns the next block of the body, or b"" at its end.
+        """
+        while True:
+            self.f.seek(self.pos)
+            raw = self.f.read(STREAM_BLOCK_SIZE)
+            self.pos += len(raw)
+            if self.decompressor is None:
+                return raw
+            if not raw:
+                return self.decompressor.flush()
+            # compressed blocks can be too small to decompress on their own
+            data = self.decompressor.decompress(raw)
+            if data:
+                return data
+
+    def read(self, size: int) -> bytes:
+        """
+        Returns the next `size` bytes of the body, or fewer at its end.
+        """
+        data = bytearray(self.pending)
+        while len(data) < size:
+            block = self._read_block()
+            if not block:
+                break
+            data += block
+        self.pending = bytes(data[size:])
+        return bytes(data[:size])
+
+    def skip(self, size: int) -> None:
+        """
+        Skips the next `size` bytes of the body. Compressed bodies are read
+        (and decompressed) a block at a time, others are not read.
+        """
+        if self.decompressor is None:
+            skipped = min(size, len(self.pending))
+            self.pending = self.pending[skipped:]
+            self.pos += size - skipped
+            return
+        while size > 0:
+            data = self.read(min(size, STREAM_BLOCK_SIZE))
+            if not data:
+                break
+            size -= len(data)
+
+
+class _TextReader:
+    """
+    Reads the first `length` bytes of a compact file's body as text.
+    """
+
+    def __init__(self, body: _BodyReader, length: int):
+        self.body = body
+        self.remaining = length
+        self.decoder = codecs.getincrementaldecoder("utf8")()
+
+    def read(self, size: int) -> str:
+        """
+        Returns the next (at most) `size` characters, or "" at the end.
+        """
+        text = ""
+        # bytes of a character that spans reads are decoded with the next read
+        while not text and self.remaining:
+            raw = self.body.read(min(size, self.remaining))
+            if not raw:
+                raise ValueError("Unexpected end of storage file")
+            self.remaining -= len(raw)
+            text = self.decoder.decode(raw, final=not self.remaining)
+        return text
+
+
+def _read_compact_body(raw: bytes) -> tuple[memoryview, array]:
+    """
+    Returns the JSON and the unpacked vectors of a file in the compact format.
+    """
+    version, codec = raw[len(MAGIC)], raw[len(MAGIC) + 1]
+    if version != VERSION:
+        raise ValueError(f"Unsupported storage format version: {version}")
+
+    body = memoryview(raw)[_HEADER_SIZE:]
+    if codec == CODEC_ZLIB:
+        body = memoryview(zlib.decompress(body))
+    elif codec != CODEC_NONE:
+        raise ValueError(f"Unsupported storage codec: {codec}")
+
+    (length,) = _LENGTH.unpack_from(body)
+    start = _LENGTH.size
+
+    vectors = array("f")
+    vectors.frombytes(body[start + length :])
+    if sys.byteorder == "big":
+        vectors.byteswap()
+    return body[start : start + length], vectors
+
+
+def _iter_json_array(f: io.TextIOBase, buffer: str = "") -> Generator[Any, None, str]:
+    """
+    Yields the items of the JSON array in a text file, reading the file in
+    blocks so that only the current item (and the block) is held in memory.
+
+    The array starts in `buffer`, or after it in the file. Returns what was
+    read after the array.
+    """
+    pos = 0
+    block_size = STREAM_BLOCK_SIZE
+    started = False
+
+    while True:
+        while pos < len(buffer) and buffer[pos] in _WHITESPACE:
+            pos += 1
+
+        if pos < len(buffer):
+            char = buffer[pos]
+            if not started:
+                if char != "[":
+                    raise ValueError("References must be stored as a JSON array")
+                started = True
+                pos += 1
+                continue
+            if char == "]":
+                return buffer[pos + 1 :]
+            if char == ",":
+                pos += 1
+                continue
+            try:
+                item, end = _decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                # the item does not fit in the buffer yet
+                pass
+            else:
+                # an item that ends at the end of the buffer may be a number
+                # or literal that continues in the next block
+                if end < len(buffer):
+                    yield item
+                    pos = end
+                    continue
+
+        block = f.read(block_size)
+        if not block:
+            if pos < len(buffer):
+                # raises the decoding error for the incomplete item
+                _decoder.raw_decode(buffer, pos)
+            raise ValueError("Unexpected end of JSON array")
+        buffer = buffer[pos:] + block
+        pos = 0
+        # grow reads for items larger than a block, so that they are not
+        # decoded again for every block
+        if len(buffer) > block_size:
+            block_size *= 2
+
+
+def _read_json_array(f: io.TextIOBase, buffer: str = "") -> tuple[list, str]:
+    """
+    As `_iter_json_array`, returning the items of the array, and what was
+    read after it.
+    """
+    items = []
+    iterator = _iter_json_array(f, buffer)
+    while True:
+        try:
+            items.append(next(iterator))
+        except StopIteration as stop:
+            return items, stop.value
+
+
+def _dumps_json(data) -> bytes:
+    return json.dumps(data, separators=(",", ":"), default=str).encode("utf8")
+
+
+def _loads_json(raw: bytes | memoryview):
+    return json.loads(bytes(raw))
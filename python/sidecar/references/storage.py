@@ -1,7 +1,20 @@
+import hashlib
 import json
+import os
+import sqlite3
+import threading
+import weakref
+from collections import OrderedDict
+from datetime import date
+from pathlib import Path
+from typing import BinaryIO, Iterator
 
+from pydantic import ValidationError
 from sidecar import config
 from sidecar.config import logger
+from sidecar.references import serialization
+from sidecar.references.bm25 import BM25Index
+from sidecar.references.embeddings import get_embedder
 from sidecar.references.schemas import (
     Author,
     Chunk,
@@ -9,74 +22,877 @@ from sidecar.references.schemas import (
     DeleteStatusResponse,
     Reference,
     ReferencePatch,
+    ReferenceSummary,
+    ReferenceSummaryField,
+    ReferenceSummaryPage,
     ReferenceUpdate,
+    SortOrder,
     UpdateStatusResponse,
 )
+from sidecar.references.segments import SegmentedIndex
+from sidecar.references.serialization import StorageFormat
+from sidecar.references.vectors import VectorIndex
+from sidecar.shared import write_file_atomically
 from sidecar.typing import ResponseStatus
 
 logger = logger.getChild(__name__)
 
+# Version of the stored Reference format. Bump it whenever the fields of
+# Reference, Author or Chunk change, so that files written by an older
+# sidecar are validated (rather than trusted) the next time they are loaded.
+SCHEMA_VERSION = 2
+
+SUMMARY_FIELDS = ["id"] + [field.value for field in ReferenceSummaryField]
+
+# Reference fields that `JsonStorage` keeps an index of, for lookups
+INDEXED_FIELDS = ["source_filename", "citation_key", "doi"]
+
+# Reference fields that the text of its chunks is read from
+CHUNK_TEXT_FIELDS = {"chunks", "pages"}
+
+# indexes of the chunks of References that storages keep up to date, by the
+# suffix of the directory they are saved in
+CHUNK_INDEXES: dict[str, type[SegmentedIndex]] = {
+    "bm25": BM25Index,
+    "vectors": VectorIndex,
+}
+
+
+def get_chunk_index_kinds() -> list[str]:
+    """
+    Returns the kinds of `CHUNK_INDEXES` in use, without the vector index if
+    no embedder is configured.
+    """
+    return [
+        kind
+        for kind in CHUNK_INDEXES
+        if kind != "vectors" or get_embedder() is not None
+    ]
+
+
+def construct_reference(data: dict) -> Reference:
+    """
+    Creates a Reference, with its authors and chunks, from data that was
+    written by storage, without validating it.
+
+    Validating every field of every chunk is by far the most expensive part
+    of loading a project's references, and is not needed for data that the
+    sidecar has written itself. Only use this for such data.
+    """
+    data = dict(data)
+    data["authors"] = [Author.construct(**a) for a in data.get("authors", [])]
+    data["chunks"] = [Chunk.construct(**c) for c in data.get("chunks", [])]
+    if isinstance(data.get("published_date"), str):
+        data["published_date"] = date.fromisoformat(data["published_date"])
+    return Reference.construct(**data)
+
+
+def index_key(field: str, value: str | None) -> str | None:
+    """
+    Returns the key a Reference's `field` value is indexed and looked up by.
+    DOIs are case-insensitive, so they are indexed in lower case.
+    """
+    if value is None:
+        return None
+    return value.lower() if field == "doi" else value
+
+
+def summarize_reference(ref: Reference) -> dict:
+    """
+    Returns the fields of a Reference that are used for listing references,
+    as JSON-compatible values.
+    """
+    summary = ref.dict(include=set(SUMMARY_FIELDS))
+    if summary["published_date"] is not None:
+        summary["published_date"] = summary["published_date"].isoformat()
+    return summary
+
+
+def get_storage(storage_dir: Path) -> "JsonStorage | SqliteStorage":
+    """
+    Returns the reference storage in a project's `.storage` directory, using
+    the backend configured by `REFERENCES_STORAGE_BACKEND`.
+
+    When the SQLite backend is used for the first time, references in an
+    existing `references.json` are migrated to it.
+    """
+    storage_dir = Path(storage_dir)
+    if config.REFERENCES_STORAGE_BACKEND == "sqlite":
+        store = SqliteStorage(storage_dir.joinpath("references.sqlite3"))
+        store.migrate_from_json(storage_dir.joinpath("references.json"))
+        return store
+    return JsonStorage(storage_dir.joinpath("references.json"))
+
 
 def get_reference(reference_id: str):
-    storage = JsonStorage(config.REFERENCES_JSON_PATH)
-    storage.load()
+    storage = load_storage(config.REFERENCES_JSON_PATH.parent)
     return storage.get_reference(reference_id)
 
 
-def update_reference(reference_id: str, reference_update: ReferenceUpdate):
-    storage = JsonStorage(config.REFERENCES_JSON_PATH)
-    storage.load()
-    response = storage.update(reference_id, reference_update=reference_update)
+def update_reference(reference_id: str, patch: ReferencePatch):
+    storage = load_storage(config.REFERENCES_JSON_PATH.parent)
+    response = storage.update(reference_id, patch)
+    return response
+
+
+def update_references(updates: list[ReferenceUpdate]):
+    storage = load_storage(config.REFERENCES_JSON_PATH.parent)
+    response = storage.update_many(updates)
     return response
 
 
 def delete_references(delete_request: DeleteRequest):
-    storage = JsonStorage(config.REFERENCES_JSON_PATH)
-    storage.load()
-    response = storage.delete(ids=delete_request.reference_ids, all_=delete_request.all)
+    storage = load_storage(config.REFERENCES_JSON_PATH.parent)
+    response = storage.delete(
+        reference_ids=delete_request.reference_ids, all_=delete_request.all
+    )
     return response
 
 
+def list_reference_summaries(
+    storage_dir: Path,
+    fields: list[ReferenceSummaryField] | None = None,
+    offset: int = 0,
+    limit: int | None = None,
+    sort: ReferenceSummaryField | None = None,
+    order: SortOrder = SortOrder.ASC,
+) -> ReferenceSummaryPage:
+    """
+    Returns a page of reference summaries from a project's `.storage`
+    directory, without reading the contents or chunks of any reference.
+    Raises FileNotFoundError if the project has no stored references.
+
+    Parameters
+    ----------
+    storage_dir : Path
+        The project's `.storage` directory
+    fields : list[ReferenceSummaryField], optional
+        Fields to return for each reference, in addition to `id`.
+        Defaults to all summary fields.
+    offset : int, default 0
+        Number of references to skip
+    limit : int, optional
+        Maximum number of references to return. Defaults to all of them.
+    sort : ReferenceSummaryField, optional
+        Field to sort references by (authors are sorted by the first
+        author's name). References without a value come last.
+        Defaults to the order in which references are stored.
+    order : SortOrder, default "asc"
+        Sort order
+    """
+    store = storage_cache.get(storage_dir)
+    if store is not None:
+        # changes that are waiting to be saved are written with the metadata
+        # index, so that it includes them
+        store.flush()
+    summaries = get_storage(storage_dir).read_summaries()
+    if summaries is None:
+        # the metadata index is missing or out of date
+        references = (
+            store.references
+            if store is not None
+            else get_storage(storage_dir).iter_references(include_chunks=False)
+        )
+        summaries = [summarize_reference(ref) for ref in references]
+
+    if sort is not None:
+        keyed = [(_sort_key(summary.get(sort.value)), summary) for summary in summaries]
+        present = [item for item in keyed if item[0] is not None]
+        missing = [summary for key, summary in keyed if key is None]
+        present.sort(key=lambda item: item[0], reverse=order == SortOrder.DESC)
+        summaries = [summary for _, summary in present] + missing
+
+    include = ["id"] + [field.value for field in fields or ReferenceSummaryField]
+    end = None if limit is None else offset + limit
+    references = [
+        ReferenceSummary(**{field: summary.get(field) for field in include})
+        for summary in summaries[offset:end]
+    ]
+    return ReferenceSummaryPage(
+        total=len(summaries), offset=offset, references=references
+    )
+
+
+def convert_storage(
+    storage_dir: Path, format: StorageFormat, compress: bool = False
+) -> None:
+    """
+    Rewrites the references in a project's `.storage` directory in another
+    format. Later saves keep the new format.
+
+    Parameters
+    ----------
+    storage_dir : Path
+        The project's `.storage` directory
+    format : StorageFormat
+        Format to convert to
+    compress : bool, default False
+        Compress the data (compact format only)
+    """
+    store = load_storage(storage_dir)
+    if not isinstance(store, JsonStorage):
+        raise ValueError(f"{store.filepath} is not stored as a JSON storage file")
+
+    with store.lock:
+        logger.info(f"Converting {store.filepath} to {format} (compress={compress})")
+        store.format = StorageFormat(format)
+        store.compress = compress
+        store.save()
+
+
+def _sort_key(value):
+    if isinstance(value, list):
+        value = value[0]["full_name"] if value else None
+    if isinstance(value, str):
+        return value.lower()
+    return value
+
+
+class StorageCache:
+    """
+    Process-wide cache of loaded project storages, so that requests do not
+    parse and validate a project's whole library every time.
+
+    Every request handler and ingest job that uses a project's storage gets
+    the same cached storage, which is the only writer of the project's
+    references: its `lock` serializes their changes.
+
+    Storages are keyed by path. A cached storage is reloaded when its file's
+    mtime or size changes, unless the change was made by the cached storage
+    itself (tracked with its `version` counter). The least recently used
+    storages are evicted once the total size of their files, used as an
+    approximation of their memory, exceeds `max_bytes`.
+
+    An evicted storage may still be in use, e.g. by an ingest job, or by its
+    own pending `save_later`. Until it is no longer used, it is cached again
+    the next time it is needed, rather than loaded a second time: a second
+    storage would be a second writer of the project's references, and would
+    overwrite the changes of the first with its own copy.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        # {filepath: (storage, version, (mtime_ns, size))}
+        self._entries: OrderedDict[Path, tuple] = OrderedDict()
+        # {filepath: lock held while the storage is checked or loaded}
+        self._key_locks: dict[Path, threading.Lock] = {}
+        # entries of evicted storages, with weak references to the storages
+        # {filepath: (weakref, version, (mtime_ns, size))}
+        self._evicted: dict[Path, tuple] = {}
+        self._lock = threading.Lock()
+
+    def load(self, storage_dir: Path) -> "JsonStorage | SqliteStorage":
+        """
+        Returns the loaded storage in a project's `.storage` directory.
+        Raises FileNotFoundError if the project has no stored references.
+        """
+        store = get_storage(storage_dir)
+        key = Path(store.filepath).resolve()
+
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        # a storage is only loaded by one thread at a time, so that there is
+        # never more than one storage (and writer) for a project
+        with key_lock:
+            cached = self._get_if_unchanged(key) or self._revive(key)
+            if cached is not None:
+                return cached
+
+            stat = os.stat(key)
+            logger.info(f"Loading storage: {store.filepath}")
+            store.load()
+
+            with self._lock:
+                self._entries[key] = (
+                    store,
+                    store.version,
+                    (stat.st_mtime_ns, stat.st_size),
+                )
+                evicted = self._evict()
+
+        for evicted_store in evicted:
+            evicted_store.flush()
+        return store
+
+    def get(self, storage_dir: Path) -> "JsonStorage | SqliteStorage | None":
+        """
+        Returns the storage in a project's `.storage` directory if it is
+        cached and up to date, without loading it otherwise.
+        """
+        key = Path(get_storage(storage_dir).filepath).resolve()
+        with self._lock:
+            key_lock = self._key_locks.get(key)
+        if key_lock is None:
+            return None
+        with key_lock:
+            try:
+                return self._get_if_unchanged(key) or self._revive(key)
+            except FileNotFoundError:
+                return None
+
+    def flush(self) -> None:
+        """
+        Writes any changes that cached storages have not written yet.
+        """
+        with self._lock:
+            stores = [store for store, _, _ in self._entries.values()]
+        for store in stores:
+            store.flush()
+
+    def clear(self) -> None:
+        self.flush()
+        with self._lock:
+            self._entries.clear()
+            self._evicted.clear()
+
+    def _get_if_unchanged(self, key: Path) -> "JsonStorage | SqliteStorage | None":
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        cached, version, cached_file_state = entry
+        # holding the storage's lock means it is not saving while its file
+        # is checked, so its changes are never mistaken for someone else's
+        with cached.lock:
+            stat = os.stat(key)
+            file_state = (stat.st_mtime_ns, stat.st_size)
+            with self._lock:
+                if cached.version != version:
+                    # the cached storage has saved its own changes since
+                    # it was loaded, so it is still up to date
+                    cached_file_state = file_state
+                    self._entries[key] = (cached, cached.version, file_state)
+                if cached_file_state == file_state:
+                    self._entries.move_to_end(key)
+                    return cached
+                self._entries.pop(key, None)
+        return None
+
+    def _revive(self, key: Path) -> "JsonStorage | SqliteStorage | None":
+        """
+        Caches an evicted storage again if it is still in use, and returns it
+        if it is up to date.
+        """
+        with self._lock:
+            entry = self._evicted.pop(key, None)
+            store = entry[0]() if entry is not None else None
+            if store is None:
+                return None
+            logger.info(f"Caching storage that is still in use: {key}")
+            self._entries[key] = (store, *entry[1:])
+        return self._get_if_unchanged(key)
+
+    def _evict(self) -> list:
+        evicted = []
+        total = sum(file_state[1] for _, _, file_state in self._entries.values())
+        # the most recently used storage is kept, however large it is
+        while total > self.max_bytes and len(self._entries) > 1:
+            key, (store, version, file_state) = self._entries.popitem(last=False)
+            logger.info(f"Evicting storage from cache: {key}")
+            total -= file_state[1]
+            evicted.append(store)
+            self._evicted[key] = (weakref.ref(store), version, file_state)
+        # forget storages that are no longer used
+        self._evicted = {
+            key: entry for key, entry in self._evicted.items() if entry[0]() is not None
+        }
+        return evicted
+
+
+def find_reference(storage_dir: Path, reference_id: str) -> Reference | None:
+    """
+    Returns a Reference from a project's storage. If the storage is not
+    cached, References are read one at a time until the Reference is found,
+    instead of loading (and caching) the whole storage.
+
+    Raises FileNotFoundError if the project has no stored references.
+    """
+    store = storage_cache.get(storage_dir)
+    if store is not None:
+        return store.get_reference(reference_id)
+
+    store = get_storage(storage_dir)
+    if isinstance(store, SqliteStorage):
+        if not store.filepath.exists():
+            raise FileNotFoundError(f"No such file: '{store.filepath}'")
+        return store.get_reference(reference_id)
+
+    for ref in store.iter_references():
+        if ref.id == reference_id:
+            return ref
+    return None
+
+
+def load_storage(storage_dir: Path) -> "JsonStorage | SqliteStorage":
+    """
+    Returns the loaded reference storage in a project's `.storage` directory,
+    from the process-wide storage cache.
+    """
+    return storage_cache.load(storage_dir)
+
+
 class JsonStorage:
     def __init__(self, filepath: str):
         self.filepath = filepath
-        self.references = []
         self.chunks = []
-        self.corpus = []
-        self.tokenized_corpus = []
+        self.references = []
+        self._corpus = None
+        # incremented every time the storage saves its changes
+        self.version = 0
+        # held while references are changed and saved, so that changes from
+        # request handlers and ingest jobs are applied one at a time
+        self.lock = threading.RLock()
+        self._pending_save: threading.Timer | None = None
+        # files are saved in the format they were loaded in, and new files in
+        # the configured format
+        self.format = StorageFormat(config.REFERENCES_STORAGE_FORMAT)
+        self.compress = config.REFERENCES_STORAGE_COMPRESS
 
-    def load(self):
-        with open(self.filepath, "r") as f:
-            data = json.load(f)
-
-        for item in data:
-            for k, v in item.items():
-                if k == "authors":
-                    authors = [Author(**a) for a in v]
-                elif k == "chunks":
-                    chunks = [Chunk(**c) for c in v]
-            ref = Reference(**item)
-            ref.authors = authors
-            ref.chunks = chunks
-            self.references.append(ref)
-        self.create_corpus()
+    @property
+    def references(self) -> list[Reference]:
+        return self._references
+
+    @references.setter
+    def references(self, references: list[Reference]):
+        self._references = references
+        self._reindex()
+        # the references may no longer be the ones in the storage file
+        self._saved_checksum = None
+        # checksum of the last storage file written or loaded whose chunks are
+        # those of `references`, for which chunk indexes were saved
+        self._chunks_checksum = None
+        self._chunk_indexes: dict[str, SegmentedIndex] = {}
+
+    def _reindex(self) -> None:
+        """
+        Rebuilds the indexes of `references`: the position of each Reference
+        by id, and the ids of the References with each value of the
+        `INDEXED_FIELDS`, in the order they were indexed.
+        """
+        self._positions = {ref.id: i for i, ref in enumerate(self._references)}
+        self._indexes = {field: {} for field in INDEXED_FIELDS}
+        for ref in self._references:
+            self._index(ref)
+
+    def _index(self, ref: Reference) -> None:
+        for field, index in self._indexes.items():
+            key = index_key(field, getattr(ref, field))
+            if key is not None:
+                index.setdefault(key, {})[ref.id] = None
+
+    def _unindex(self, ref: Reference) -> None:
+        for field, index in self._indexes.items():
+            key = index_key(field, getattr(ref, field))
+            ids = index.get(key)
+            if ids is not None:
+                ids.pop(ref.id, None)
+                if not ids:
+                    del index[key]
+
+    def _lookup(self, field: str, value: str) -> list[Reference]:
+        ids = self._indexes[field].get(index_key(field, value), {})
+        positions = sorted(self._positions[ref_id] for ref_id in ids)
+        return [self._references[position] for position in positions]
+
+    @property
+    def corpus(self) -> list[str]:
+        # chunk text is only sliced out of each Reference's pages when needed
+        if self._corpus is None:
+            self._corpus = [
+                ref.get_chunk_text(chunk)
+                for ref in self.references
+                for chunk in ref.chunks
+            ]
+        return self._corpus
+
+    @property
+    def bm25_dirpath(self) -> Path:
+        """
+        Path to the directory of the BM25 index of the storage file, e.g.
+        `references.bm25` for `references.json`.
+        """
+        return self._get_chunk_index_dirpath("bm25")
+
+    @property
+    def bm25_index(self) -> BM25Index:
+        """
+        The BM25 index of the chunks of `references` (see `_get_chunk_index`).
+        """
+        return self._get_chunk_index("bm25")
+
+    @property
+    def vectors_dirpath(self) -> Path:
+        """
+        Path to the directory of the vector index of the storage file, e.g.
+        `references.vectors` for `references.json`.
+        """
+        return self._get_chunk_index_dirpath("vectors")
+
+    @property
+    def vector_index(self) -> VectorIndex | None:
+        """
+        The index of the vectors of the chunks of `references` (see
+        `_get_chunk_index`), or None if no embedder is configured.
+        """
+        if get_embedder() is None:
+            return None
+        return self._get_chunk_index("vectors")
+
+    def _get_chunk_index_dirpath(self, kind: str) -> Path:
+        return Path(self.filepath).with_suffix(f".{kind}")
+
+    def _get_chunk_index(self, kind: str) -> SegmentedIndex:
+        """
+        Returns one of the `CHUNK_INDEXES` of the chunks of `references`.
+
+        The index saved with the storage file is opened if there is one, and
+        it was saved for a file with the current chunks. Otherwise the index
+        is built from `references`, and saved if they have not changed since
+        the file was written. Once opened, the index is kept up to date as
+        references change, and saved along with them.
+        """
+        with self.lock:
+            index = self._chunk_indexes.get(kind)
+            if index is not None:
+                return index
+
+            index_class = CHUNK_INDEXES[kind]
+            is_saved = self._saved_checksum is not None and self._pending_save is None
+            if self._chunks_checksum is not None:
+                index = index_class.open(
+                    self._get_chunk_index_dirpath(kind), self._chunks_checksum
+                )
+            if index is None:
+                logger.info(f"Building {kind} index for {self.filepath}")
+                index = index_class.build(self.references)
+                if is_saved:
+                    self._save_chunk_index(kind, index)
+            self._chunk_indexes[kind] = index
+            return index
+
+    def _get_chunk_indexes(self) -> list[SegmentedIndex]:
+        """
+        Returns all the chunk indexes in use, opening them, so that they can
+        be updated along with `references`.
+        """
+        return [self._get_chunk_index(kind) for kind in get_chunk_index_kinds()]
+
+    def _save_chunk_index(self, kind: str, index: SegmentedIndex) -> None:
+        dirpath = self._get_chunk_index_dirpath(kind)
+        try:
+            index.save(dirpath, self._saved_checksum)
+        except OSError as e:
+            # the index is built again the next time it is opened
+            logger.warning(f"Unable to save {kind} index to {dirpath}: {e}")
+
+    @property
+    def index_filepath(self) -> Path:
+        """
+        Path to the metadata index of the storage file, which holds the
+        summary of each reference, e.g. `references.index.json`.
+        """
+        return Path(self.filepath).with_suffix(".index.json")
+
+    @property
+    def header_filepath(self) -> Path:
+        """
+        Path to the header recording the schema version and checksum of the
+        storage file, e.g. `references.header.json` for `references.json`.
+        """
+        return Path(self.filepath).with_suffix(".header.json")
+
+    def load(self, validate: bool = False):
+        """
+        Load the references from the storage file.
+
+        If the file's header shows that it was written by this version of
+        storage, and the file has not changed since, references are loaded
+        without validation. Otherwise (e.g. for files written by an older
+        sidecar, or edited by hand) every reference is validated. Loading
+        never writes the header: it is only written when storage is saved.
+
+        Parameters
+        ----------
+        validate : bool, default False
+            Validate every reference, even if the header is valid
+        """
+        with open(self.filepath, "rb") as f:
+            raw = f.read()
+        data = serialization.loads(raw)
+
+        header = self._create_header(raw)
+        is_trusted = self._is_header_valid(header)
+        if not validate and is_trusted:
+            references = [construct_reference(item) for item in data]
+        else:
+            logger.info(f"Validating references in {self.filepath}")
+            references = [Reference.parse_obj(item) for item in data]
+
+        with self.lock:
+            self.references = references
+            # indexes saved with the file are only used for files that
+            # storage wrote itself
+            self._saved_checksum = header["sha256"] if is_trusted else None
+            self._chunks_checksum = self._saved_checksum
+            self.format = serialization.detect_format(raw)
+            self.compress = serialization.is_compressed(raw)
+            self.create_corpus()
+
+    def iter_references(
+        self, include_chunks: bool = True, validate: bool = False
+    ) -> Iterator[Reference]:
+        """
+        Returns an iterator over the References in the storage file, which
+        reads them one at a time instead of loading the whole file. This
+        does not change the storage's loaded `references`.
+
+        References are validated as in `load`, except that the file is
+        judged unchanged since it was saved from its mtime and size, as its
+        checksum is only known once the whole file has been read.
+
+        Parameters
+        ----------
+        include_chunks : bool, default True
+            Include each Reference's chunks. If False, References are
+            returned without chunks, which are skipped as they are read.
+        validate : bool, default False
+            Validate every reference, even if the header is valid
+
+        Raises
+        ------
+        FileNotFoundError
+            If the storage file does not exist
+        """
+        f = open(self.filepath, "rb")
+        trusted = not validate and self._is_unchanged_since_save()
+        return self._iter_references(f, include_chunks, trusted)
+
+    def _iter_references(
+        self, f: BinaryIO, include_chunks: bool, trusted: bool
+    ) -> Iterator[Reference]:
+        with f:
+            for item in serialization.iter_references(f, include_chunks):
+                if trusted:
+                    yield construct_reference(item)
+                else:
+                    yield Reference.parse_obj(item)
 
     def save(self):
         """
-        Save the references to the storage file as JSON.
+        Save the references to the storage file, in the storage's `format`,
+        along with its header and metadata index. Any save scheduled by
+        `save_later` is included.
+
+        The file is replaced atomically, so it is never left partially
+        written if the sidecar stops while saving.
         """
-        contents = [ref.dict() for ref in self.references]
-        with open(self.filepath, "w") as f:
-            json.dump(contents, f, indent=2, default=str)
+        with self.lock:
+            if self._pending_save is not None:
+                self._pending_save.cancel()
+                self._pending_save = None
+
+            contents = [ref.dict() for ref in self.references]
+            raw = serialization.dumps(contents, self.format, self.compress)
+            write_file_atomically(self.filepath, raw)
+            stat = os.stat(self.filepath)
+            header = self._create_header(raw)
+            self._write_header(
+                {**header, "file_state": [stat.st_mtime_ns, stat.st_size]}
+            )
+            self._write_index([summarize_reference(ref) for ref in self.references])
+            for kind in CHUNK_INDEXES.keys() - self._chunk_indexes.keys():
+                # indexes that were not opened are still those of the chunks,
+                # if only the metadata of references changed
+                if self._chunks_checksum is not None:
+                    CHUNK_INDEXES[kind].update_checksum(
+                        self._get_chunk_index_dirpath(kind),
+                        self._chunks_checksum,
+                        header["sha256"],
+                    )
+            self._saved_checksum = header["sha256"]
+            self._chunks_checksum = header["sha256"]
+            for kind, index in self._chunk_indexes.items():
+                self._save_chunk_index(kind, index)
+            self.version += 1
+            self.create_corpus()
+
+    def save_later(self):
+        """
+        Saves the references after `STORAGE_WRITE_DELAY` seconds, so that a
+        burst of changes (e.g. a user quickly editing several references) is
+        written to disk once, rather than once per change.
+        """
+        with self.lock:
+            if config.STORAGE_WRITE_DELAY <= 0:
+                self.save()
+            elif self._pending_save is None:
+                self._pending_save = threading.Timer(
+                    config.STORAGE_WRITE_DELAY, self.flush
+                )
+                self._pending_save.start()
+
+    def flush(self):
+        """
+        Saves the references now, if a save has been scheduled by `save_later`.
+        """
+        with self.lock:
+            if self._pending_save is not None:
+                self.save()
+
+    def read_summaries(self) -> list[dict] | None:
+        """
+        Returns the summaries of all references, in storage order, from the
+        metadata index. Returns None if the index is missing, or was not
+        written for the current storage file.
+        """
+        stat = os.stat(self.filepath)
+        try:
+            with open(self.index_filepath, "r") as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        file_state = [stat.st_mtime_ns, stat.st_size]
+        if (
+            index.get("schema_version") != SCHEMA_VERSION
+            or index.get("file_state") != file_state
+        ):
+            return None
+        return index["references"]
+
+    def _write_index(self, summaries: list[dict]) -> None:
+        stat = os.stat(self.filepath)
+        index = {
+            "schema_version": SCHEMA_VERSION,
+            "file_state": [stat.st_mtime_ns, stat.st_size],
+            "references": summaries,
+        }
+        try:
+            write_file_atomically(self.index_filepath, json.dumps(index).encode("utf8"))
+        except OSError as e:
+            # without an index, summaries are read from the storage file
+            logger.warning(f"Unable to write {self.index_filepath}: {e}")
+
+    def _create_header(self, raw: bytes) -> dict:
+        return {
+            "schema_version": SCHEMA_VERSION,
+            "size": len(raw),
+            "sha256": hashlib.sha256(raw).hexdigest(),
+        }
+
+    def _is_header_valid(self, expected: dict) -> bool:
+        header = self._read_header()
+        return header is not None and all(
+            header.get(key) == value for key, value in expected.items()
+        )
+
+    def _is_unchanged_since_save(self) -> bool:
+        """
+        Returns True if the storage file was written by this version of
+        storage and has not changed since, judging by its mtime and size
+        (without reading it).
+        """
+        stat = os.stat(self.filepath)
+        return self._is_header_valid(
+            {
+                "schema_version": SCHEMA_VERSION,
+                "file_state": [stat.st_mtime_ns, stat.st_size],
+            }
+        )
+
+    def _read_header(self) -> dict | None:
+        try:
+            with open(self.header_filepath, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_header(self, header: dict) -> None:
+        try:
+            write_file_atomically(
+                self.header_filepath, json.dumps(header).encode("utf8")
+            )
+        except OSError as e:
+            # without a header the next load validates every reference,
+            # which is slower but still correct
+            logger.warning(f"Unable to write {self.header_filepath}: {e}")
 
     def get_reference(self, reference_id: str) -> Reference | None:
         """
         Get a Reference from storage by id.
         """
-        for ref in self.references:
-            if ref.id == reference_id:
-                return ref
-        return None
+        position = self._positions.get(reference_id)
+        return None if position is None else self._references[position]
+
+    def get_reference_by_filename(self, source_filename: str) -> Reference | None:
+        """
+        Get the Reference ingested from an uploaded file.
+        """
+        refs = self._lookup("source_filename", source_filename)
+        return refs[0] if refs else None
+
+    def get_reference_by_citation_key(self, citation_key: str) -> Reference | None:
+        """
+        Get a Reference by its citation key. If several References have the
+        same key (e.g. after one was edited), the first in storage is returned.
+        """
+        refs = self._lookup("citation_key", citation_key)
+        return refs[0] if refs else None
+
+    def get_references_by_doi(self, doi: str) -> list[Reference]:
+        """
+        Get the References with a DOI, in storage order. The same paper can
+        be uploaded more than once, so several References may share a DOI.
+        """
+        return self._lookup("doi", doi)
+
+    def add_references(self, references: list[Reference]):
+        """
+        Add References to storage and save them. A Reference replaces the
+        stored Reference for the same uploaded file, if there is one (e.g.
+        for a file whose contents changed), and keeps its position.
+
+        Parameters
+        ----------
+        references : list[Reference]
+            References to be added
+        """
+        with self.lock:
+            chunk_indexes = self._get_chunk_indexes()
+            self._chunks_checksum = None
+            replaced = []
+            duplicates = set()
+            for ref in references:
+                stored = self._lookup("source_filename", ref.source_filename)
+                if stored:
+                    position = self._positions.pop(stored[0].id)
+                    self._unindex(stored[0])
+                    self._references[position] = ref
+                    replaced.append(stored[0].id)
+                    duplicates.update(r.id for r in stored[1:])
+                else:
+                    position = len(self._references)
+                    self._references.append(ref)
+                self._positions[ref.id] = position
+                self._index(ref)
+
+            if duplicates:
+                self._remove_references(duplicates)
+            for index in chunk_indexes:
+                index.remove(replaced + list(duplicates))
+                index.add(references)
+            self.save()
+
+    def _remove_references(self, reference_ids: set[str]) -> None:
+        for ref_id in reference_ids:
+            self._unindex(self._references[self._positions[ref_id]])
+        self._references = [
+            ref for ref in self._references if ref.id not in reference_ids
+        ]
+        # positions after the first removed Reference have all moved
+        self._positions = {ref.id: i for i, ref in enumerate(self._references)}
 
     def delete(self, reference_ids: list[str] = [], all_: bool = False):
         """
@@ -95,26 +911,520 @@ class JsonStorage:
             )
             raise ValueError(msg)
 
-        # preprocess references into a dict of reference_ids: Reference
-        # so that we can simply do `del refs[ref_id]]`
-        refs = {ref.id: ref for ref in self.references}
+        with self.lock:
+            if all_:
+                reference_ids = list(self._positions)
 
-        if all_:
-            reference_ids = list(refs.keys())
+            for ref_id in reference_ids:
+                if ref_id not in self._positions:
+                    msg = f"Unable to delete {ref_id}: not found in storage"
+                    logger.warning(msg)
+                    response = DeleteStatusResponse(
+                        status=ResponseStatus.ERROR, message=msg
+                    )
+                    return response
 
-        for ref_id in reference_ids:
-            try:
-                del refs[ref_id]
-            except KeyError:
-                msg = f"Unable to delete {ref_id}: not found in storage"
-                logger.warning(msg)
-                response = DeleteStatusResponse(
+            for index in self._get_chunk_indexes():
+                index.remove(reference_ids)
+            self._chunks_checksum = None
+            self._remove_references(set(reference_ids))
+            self.save()
+
+        response = DeleteStatusResponse(status=ResponseStatus.OK, message="")
+        return response
+
+    def update(self, reference_id: str, patch: ReferencePatch):
+        """
+        Update a Reference in storage with the target reference.
+        This is used when the client has updated the reference in the UI.
+
+        Parameters
+        ----------
+        reference_id : str
+            The id of the reference to be updated
+        patch : ReferencePatch
+            The patch object containing the updated reference data
+
+        Notes
+        -----
+        The update is visible immediately, but is written to disk after
+        `STORAGE_WRITE_DELAY` seconds, together with any other updates made
+        in the meantime.
+        """
+        return self.update_many(
+            [ReferenceUpdate(reference_id=reference_id, patch=patch)]
+        )
+
+    def update_many(self, updates: list[ReferenceUpdate]):
+        """
+        Update several References in storage, in one pass over the references
+        and with a single save. Updates are applied in order, so a Reference
+        can be patched more than once.
+
+        If any of the References is not found, or any patch is not valid,
+        none of them are updated.
+
+        Parameters
+        ----------
+        updates : list[ReferenceUpdate]
+            The id of each reference to be updated, with its patch
+        """
+        if not updates:
+            return UpdateStatusResponse(status=ResponseStatus.OK, message="")
+
+        with self.lock:
+            missing = [
+                u.reference_id for u in updates if u.reference_id not in self._positions
+            ]
+            if missing:
+                msg = f"Unable to update {', '.join(missing)}: not found in storage"
+                logger.error(msg)
+                response = UpdateStatusResponse(
                     status=ResponseStatus.ERROR, message=msg
                 )
                 return response
 
-        self.references = list(refs.values())
-        self.save()
+            # patches are validated (e.g. dates parsed from strings) before
+            # any Reference is updated
+            patched = {}
+            for update in updates:
+                logger.info(
+                    f"Updating {update.reference_id} "
+                    f"with new values: {update.patch.data}"
+                )
+                ref_id = update.reference_id
+                ref = patched.get(ref_id) or self.get_reference(ref_id)
+                try:
+                    patched[ref_id] = Reference.parse_obj(
+                        {**ref.dict(), **update.patch.data}
+                    )
+                except ValidationError as e:
+                    msg = f"Unable to update {ref_id}: {e}"
+                    logger.error(msg)
+                    response = UpdateStatusResponse(
+                        status=ResponseStatus.ERROR, message=msg
+                    )
+                    return response
+
+            # only References whose text changed are indexed again, and the
+            # chunk indexes are only opened if there are any
+            changed_ids = list(
+                dict.fromkeys(
+                    u.reference_id
+                    for u in updates
+                    if CHUNK_TEXT_FIELDS & u.patch.data.keys()
+                )
+            )
+            chunk_indexes = self._get_chunk_indexes() if changed_ids else []
+
+            for ref_id, updated in patched.items():
+                position = self._positions[ref_id]
+                self._unindex(self._references[position])
+                self._references[position] = updated
+                self._index(updated)
+
+            if changed_ids:
+                self._chunks_checksum = None
+                changed = [self.get_reference(ref_id) for ref_id in changed_ids]
+                for index in chunk_indexes:
+                    index.add(changed)
+            self.create_corpus()
+            self.save_later()
+
+        response = UpdateStatusResponse(status=ResponseStatus.OK, message="")
+        return response
+
+    def create_corpus(self):
+        self.chunks = [chunk for ref in self.references for chunk in ref.chunks]
+        self._corpus = None
+
+
+# the lowest limit on query parameters of the SQLite versions in use
+SQLITE_MAX_PARAMETERS = 999
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS reference (
+    id TEXT PRIMARY KEY,
+    position INTEGER NOT NULL,
+    source_filename TEXT NOT NULL,
+    status TEXT NOT NULL,
+    citation_key TEXT,
+    doi TEXT,
+    title TEXT,
+    abstract TEXT,
+    contents TEXT,
+    published_date TEXT,
+    pages TEXT NOT NULL,
+    metadata TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS reference_source_filename ON reference (source_filename);
+CREATE INDEX IF NOT EXISTS reference_citation_key ON reference (citation_key);
+CREATE INDEX IF NOT EXISTS reference_doi ON reference (lower(doi));
+
+CREATE TABLE IF NOT EXISTS author (
+    reference_id TEXT NOT NULL REFERENCES reference (id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    full_name TEXT NOT NULL,
+    given_name TEXT,
+    surname TEXT,
+    email TEXT,
+    PRIMARY KEY (reference_id, position)
+);
+
+CREATE TABLE IF NOT EXISTS chunk (
+    reference_id TEXT NOT NULL REFERENCES reference (id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    text TEXT,
+    page_num INTEGER,
+    start INTEGER,
+    end INTEGER,
+    vector TEXT NOT NULL,
+    metadata TEXT NOT NULL,
+    PRIMARY KEY (reference_id, position)
+);
+"""
+
+REFERENCE_COLUMNS = [
+    "id",
+    "source_filename",
+    "status",
+    "citation_key",
+    "doi",
+    "title",
+    "abstract",
+    "contents",
+    "published_date",
+    "pages",
+    "metadata",
+]
+
+
+class SqliteStorage:
+    """
+    Stores a project's references in a SQLite database, with tables for
+    references, authors and chunks.
+
+    Has the same interface as `JsonStorage`, but `get_reference`, `update`
+    and `delete` only read and write the rows they need, in a single
+    transaction. `references` (and the corpus built from their chunks) is
+    only read from the database when it is first accessed.
+
+    The storage keeps one connection to the database, which is opened (and
+    the schema created) when it is first used. Request handlers and ingest
+    jobs use the storage from different threads, so the connection is only
+    used while holding `lock`.
+    """
+
+    def __init__(self, filepath: str):
+        self.filepath = Path(filepath)
+        self._references: list[Reference] | None = None
+        self._chunks: list[Chunk] | None = None
+        # incremented every time the storage saves its changes
+        self.version = 0
+        # held while references are changed, as for `JsonStorage`
+        self.lock = threading.RLock()
+        # chunk indexes that have been built, kept up to date as references
+        # change
+        self._chunk_indexes: dict[str, SegmentedIndex] = {}
+        self._conn: sqlite3.Connection | None = None
+
+    def _connect(self) -> sqlite3.Connection:
+        """
+        Returns the connection to the database, opening it (and creating the
+        database and its schema) the first time. Only use it while holding
+        `lock`.
+        """
+        if self._conn is None:
+            conn = sqlite3.connect(self.filepath, timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA foreign_keys = ON")
+            conn.executescript(SQLITE_SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def close(self) -> None:
+        """
+        Closes the connection to the database. It is opened again if the
+        storage is used afterwards.
+        """
+        with self.lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def load(self):
+        """
+        Checks that the database exists. References are read lazily.
+        """
+        if not self.filepath.exists():
+            raise FileNotFoundError(f"No such file: '{self.filepath}'")
+        self._references = None
+        self._chunks = None
+        self._chunk_indexes = {}
+
+    @property
+    def references(self) -> list[Reference]:
+        if self._references is None:
+            self._references = self._read_references()
+        return self._references
+
+    @references.setter
+    def references(self, references: list[Reference]):
+        self._references = references
+        self._chunks = None
+        self._chunk_indexes = {}
+
+    @property
+    def chunks(self) -> list[Chunk]:
+        if self._chunks is None:
+            self._chunks = [chunk for ref in self.references for chunk in ref.chunks]
+        return self._chunks
+
+    @property
+    def corpus(self) -> list[str]:
+        return [
+            ref.get_chunk_text(chunk) for ref in self.references for chunk in ref.chunks
+        ]
+
+    @property
+    def bm25_index(self) -> BM25Index:
+        """
+        The BM25 index of the chunks of `references` (see `_get_chunk_index`).
+        """
+        return self._get_chunk_index("bm25")
+
+    @property
+    def vector_index(self) -> VectorIndex | None:
+        """
+        The index of the vectors of the chunks of `references`, or None if no
+        embedder is configured.
+        """
+        if get_embedder() is None:
+            return None
+        return self._get_chunk_index("vectors")
+
+    def _get_chunk_index(self, kind: str) -> SegmentedIndex:
+        """
+        Returns one of the `CHUNK_INDEXES` of the chunks of `references`. It
+        is not saved, but built from the database when it is first needed.
+        Once built, the index is kept up to date as references are added,
+        patched and deleted.
+        """
+        with self.lock:
+            index = self._chunk_indexes.get(kind)
+            if index is None:
+                index = CHUNK_INDEXES[kind].build(self.references)
+                self._chunk_indexes[kind] = index
+            return index
+
+    def save(self):
+        """
+        Replaces all references in the database with `references`.
+        """
+        with self.lock:
+            with self._connect() as conn:
+                conn.execute("DELETE FROM reference")
+                for position, ref in enumerate(self.references):
+                    self._insert_reference(conn, ref, position)
+            self.version += 1
+            self._chunk_indexes = {}
+
+    def flush(self):
+        """
+        Changes are written as soon as they are made, so there is nothing to
+        flush. This keeps the interface of `JsonStorage`.
+        """
+        pass
+
+    def iter_references(self, include_chunks: bool = True) -> Iterator[Reference]:
+        """
+        Returns an iterator over the References in the database, which reads
+        them in batches instead of all at once.
+
+        Parameters
+        ----------
+        include_chunks : bool, default True
+            Include each Reference's chunks. If False, chunks are not read.
+
+        Raises
+        ------
+        FileNotFoundError
+            If the database does not exist
+        """
+        if not self.filepath.exists():
+            raise FileNotFoundError(f"No such file: '{self.filepath}'")
+        with self.lock:
+            ids = [
+                row[0]
+                for row in self._connect().execute(
+                    "SELECT id FROM reference ORDER BY position"
+                )
+            ]
+        return self._iter_references(ids, include_chunks)
+
+    def _iter_references(
+        self, ids: list[str], include_chunks: bool
+    ) -> Iterator[Reference]:
+        for start in range(0, len(ids), SQLITE_MAX_PARAMETERS):
+            batch = ids[start : start + SQLITE_MAX_PARAMETERS]
+            yield from self._read_references(
+                where=f"WHERE id IN ({', '.join('?' * len(batch))})",
+                params=tuple(batch),
+                include_chunks=include_chunks,
+            )
+
+    def read_summaries(self) -> list[dict]:
+        """
+        Returns the summaries of all references, in storage order, without
+        reading their contents or chunks.
+        """
+        if not self.filepath.exists():
+            raise FileNotFoundError(f"No such file: '{self.filepath}'")
+
+        columns = [c for c in SUMMARY_FIELDS if c != "authors"]
+        with self.lock:
+            conn = self._connect()
+            rows = conn.execute(
+                f"SELECT {', '.join(columns)} FROM reference ORDER BY position"
+            ).fetchall()
+            summaries = [dict(zip(columns, row)) for row in rows]
+            authors = {summary["id"]: [] for summary in summaries}
+            for ref_id, full_name, given_name, surname, email in conn.execute(
+                "SELECT reference_id, full_name, given_name, surname, email "
+                "FROM author ORDER BY reference_id, position"
+            ):
+                authors[ref_id].append(
+                    {
+                        "full_name": full_name,
+                        "given_name": given_name,
+                        "surname": surname,
+                        "email": email,
+                    }
+                )
+
+        for summary in summaries:
+            summary["authors"] = authors[summary["id"]]
+        return summaries
+
+    def get_reference(self, reference_id: str) -> Reference | None:
+        """
+        Get a Reference from storage by id.
+        """
+        if not self.filepath.exists():
+            return None
+        refs = self._read_references(where="WHERE id = ?", params=(reference_id,))
+        return refs[0] if refs else None
+
+    def get_reference_by_filename(self, source_filename: str) -> Reference | None:
+        """
+        Get the Reference ingested from an uploaded file.
+        """
+        refs = self._lookup("WHERE source_filename = ?", source_filename)
+        return refs[0] if refs else None
+
+    def get_reference_by_citation_key(self, citation_key: str) -> Reference | None:
+        """
+        Get a Reference by its citation key. If several References have the
+        same key, the first in storage is returned.
+        """
+        refs = self._lookup("WHERE citation_key = ?", citation_key)
+        return refs[0] if refs else None
+
+    def get_references_by_doi(self, doi: str) -> list[Reference]:
+        """
+        Get the References with a DOI, in storage order.
+        """
+        return self._lookup("WHERE lower(doi) = ?", index_key("doi", doi))
+
+    def _lookup(self, where: str, value: str) -> list[Reference]:
+        if not self.filepath.exists():
+            return []
+        return self._read_references(where=where, params=(value,))
+
+    def add_references(self, references: list[Reference]):
+        """
+        Add References to storage. A Reference replaces the stored Reference
+        for the same uploaded file, if there is one, and keeps its position.
+
+        Parameters
+        ----------
+        references : list[Reference]
+            References to be added
+        """
+        with self.lock:
+            with self._connect() as conn:
+                (next_position,) = conn.execute(
+                    "SELECT COALESCE(MAX(position) + 1, 0) FROM reference"
+                ).fetchone()
+                replaced = []
+                for ref in references:
+                    rows = conn.execute(
+                        "SELECT id, position FROM reference WHERE source_filename = ?",
+                        (ref.source_filename,),
+                    ).fetchall()
+                    if rows:
+                        replaced.extend(ref_id for ref_id, _ in rows)
+                        position = min(row[1] for row in rows)
+                        conn.execute(
+                            "DELETE FROM reference WHERE source_filename = ?",
+                            (ref.source_filename,),
+                        )
+                    else:
+                        position = next_position
+                        next_position += 1
+                    self._insert_reference(conn, ref, position)
+            self.version += 1
+            for index in self._chunk_indexes.values():
+                index.remove(replaced)
+                index.add(references)
+            # read again when next accessed
+            self._references = None
+            self._chunks = None
+
+    def delete(self, reference_ids: list[str] = [], all_: bool = False):
+        """
+        Delete one or more References from storage.
+
+        Parameters
+        ----------
+        reference_ids : list[str]
+            List of reference ids to be deleted
+        all_ : bool, default False
+            Delete all References from storage
+        """
+        if not reference_ids and not all_:
+            msg = "`delete` operation requires one of `ids` or `all_` input parameters"
+            raise ValueError(msg)
+
+        with self.lock:
+            with self._connect() as conn:
+                if all_:
+                    conn.execute("DELETE FROM reference")
+                else:
+                    for ref_id in reference_ids:
+                        cursor = conn.execute(
+                            "DELETE FROM reference WHERE id = ?", (ref_id,)
+                        )
+                        if cursor.rowcount == 0:
+                            conn.rollback()
+                            msg = f"Unable to delete {ref_id}: not found in storage"
+                            logger.warning(msg)
+                            return DeleteStatusResponse(
+                                status=ResponseStatus.ERROR, message=msg
+                            )
+            self.version += 1
+            if all_:
+                self._chunk_indexes = {}
+            for index in self._chunk_indexes.values():
+                index.remove(reference_ids)
+
+            if self._references is not None:
+                deleted = set(reference_ids)
+                self._references = (
+                    []
+                    if all_
+                    else [ref for ref in self._references if ref.id not in deleted]
+                )
+                self._chunks = None
 
         response = DeleteStatusResponse(status=ResponseStatus.OK, message="")
         return response
@@ -124,6 +1434,9 @@ class JsonStorage:
         Update a Reference in storage with the target reference.
         This is used when the client has updated the reference in the UI.
 
+        Only the Reference's row is rewritten, along with its authors or chunks
+        if they are part of the patch.
+
         Parameters
         ----------
         reference_id : str
@@ -131,28 +1444,277 @@ class JsonStorage:
         patch : ReferencePatch
             The patch object containing the updated reference data
         """
-        refs = {ref.id: ref for ref in self.references}
+        return self.update_many(
+            [ReferenceUpdate(reference_id=reference_id, patch=patch)]
+        )
 
-        try:
-            target = refs[reference_id]
-        except KeyError:
-            msg = f"Unable to update {reference_id}: not found in storage"
-            logger.error(msg)
-            response = UpdateStatusResponse(status=ResponseStatus.ERROR, message=msg)
-            return response
+    def update_many(self, updates: list[ReferenceUpdate]):
+        """
+        Update several References in storage, in a single transaction.
+        Updates are applied in order, so a Reference can be patched more
+        than once.
+
+        If any of the References is not found, or any patch is not valid,
+        none of them are updated.
+
+        Parameters
+        ----------
+        updates : list[ReferenceUpdate]
+            The id of each reference to be updated, with its patch
+        """
+        if not updates:
+            return UpdateStatusResponse(status=ResponseStatus.OK, message="")
+
+        ids = list(dict.fromkeys(u.reference_id for u in updates))
+        with self.lock:
+            with self._connect() as conn:
+                refs = {}
+                # read in batches, as SQLite limits the number of parameters
+                for start in range(0, len(ids), SQLITE_MAX_PARAMETERS):
+                    batch = ids[start : start + SQLITE_MAX_PARAMETERS]
+                    for ref in self._read_references(
+                        conn,
+                        f"WHERE id IN ({', '.join('?' * len(batch))})",
+                        tuple(batch),
+                    ):
+                        refs[ref.id] = ref
+                missing = [ref_id for ref_id in ids if ref_id not in refs]
+                if missing:
+                    msg = (
+                        f"Unable to update {', '.join(missing)}: "
+                        "not found in storage"
+                    )
+                    logger.error(msg)
+                    response = UpdateStatusResponse(
+                        status=ResponseStatus.ERROR, message=msg
+                    )
+                    return response
+
+                fields = {ref_id: set() for ref_id in ids}
+                for update in updates:
+                    logger.info(
+                        f"Updating {update.reference_id} "
+                        f"with new values: {update.patch.data}"
+                    )
+                    ref = refs[update.reference_id]
+                    try:
+                        refs[ref.id] = Reference.parse_obj(
+                            {**ref.dict(), **update.patch.data}
+                        )
+                    except ValidationError as e:
+                        msg = f"Unable to update {ref.id}: {e}"
+                        logger.error(msg)
+                        response = UpdateStatusResponse(
+                            status=ResponseStatus.ERROR, message=msg
+                        )
+                        return response
+                    fields[ref.id].update(update.patch.data)
 
-        logger.info(f"Updating {reference_id} with new values: {patch.data}")
-        refs[reference_id] = target.copy(update=patch.data)
+                for ref_id in ids:
+                    self._update_reference(conn, refs[ref_id], fields=fields[ref_id])
+            self.version += 1
+            # only References whose text changed are indexed again
+            changed = [
+                refs[ref_id] for ref_id in ids if CHUNK_TEXT_FIELDS & fields[ref_id]
+            ]
+            for index in self._chunk_indexes.values():
+                index.add(changed)
 
-        self.references = list(refs.values())
-        self.save()
+            if self._references is not None:
+                self._references = [refs.get(ref.id, ref) for ref in self._references]
+                self._chunks = None
 
         response = UpdateStatusResponse(status=ResponseStatus.OK, message="")
         return response
 
-    def create_corpus(self):
-        for ref in self.references:
-            for chunk in ref.chunks:
-                self.chunks.append(chunk)
-                self.corpus.append(chunk.text)
-                self.tokenized_corpus.append(chunk.text.lower().split())
+    def migrate_from_json(self, json_filepath: Path) -> bool:
+        """
+        Moves the references in a `references.json` file into the database,
+        if the database does not exist yet. The JSON file is kept, renamed
+        with a `.migrated` suffix, so that it is only migrated once.
+
+        Returns
+        -------
+        bool
+            True if references were migrated
+        """
+        json_filepath = Path(json_filepath)
+        if self.filepath.exists() or not json_filepath.exists():
+            return False
+
+        logger.info(f"Migrating references from {json_filepath} to {self.filepath}")
+        jstore = JsonStorage(json_filepath)
+
+        # write to a temporary database first, so that a failed migration
+        # is retried instead of leaving a partial database behind
+        tmp_filepath = self.filepath.with_name(f"{self.filepath.name}.tmp")
+        if tmp_filepath.exists():
+            os.remove(tmp_filepath)
+        tmp_store = SqliteStorage(tmp_filepath)
+        # references are inserted as they are read, instead of loading them all
+        with tmp_store.lock:
+            with tmp_store._connect() as conn:
+                for position, ref in enumerate(jstore.iter_references()):
+                    tmp_store._insert_reference(conn, ref, position)
+            tmp_store.close()
+
+        os.replace(tmp_filepath, self.filepath)
+        os.replace(
+            json_filepath, json_filepath.with_name(f"{json_filepath.name}.migrated")
+        )
+        for filepath in [jstore.header_filepath, jstore.index_filepath]:
+            try:
+                os.remove(filepath)
+            except FileNotFoundError:
+                pass
+        self._references = None
+        self._chunks = None
+        self._chunk_indexes = {}
+        return True
+
+    def _insert_reference(
+        self, conn: sqlite3.Connection, ref: Reference, position: int
+    ) -> None:
+        row = self._reference_to_row(ref)
+        conn.execute(
+            f"INSERT INTO reference (position, {', '.join(row)}) "
+            f"VALUES (?, {', '.join('?' for _ in row)})",
+            (position, *row.values()),
+        )
+        self._insert_authors(conn, ref)
+        self._insert_chunks(conn, ref)
+
+    def _update_reference(
+        self, conn: sqlite3.Connection, ref: Reference, fields: set[str]
+    ) -> None:
+        row = self._reference_to_row(ref)
+        del row["id"]
+        conn.execute(
+            f"UPDATE reference SET {', '.join(f'{k} = ?' for k in row)} WHERE id = ?",
+            (*row.values(), ref.id),
+        )
+        if "authors" in fields:
+            conn.execute("DELETE FROM author WHERE reference_id = ?", (ref.id,))
+            self._insert_authors(conn, ref)
+        if "chunks" in fields:
+            conn.execute("DELETE FROM chunk WHERE reference_id = ?", (ref.id,))
+            self._insert_chunks(conn, ref)
+
+    def _insert_authors(self, conn: sqlite3.Connection, ref: Reference) -> None:
+        conn.executemany(
+            "INSERT INTO author VALUES (?, ?, ?, ?, ?, ?)",
+            [
+                (ref.id, i, a.full_name, a.given_name, a.surname, a.email)
+                for i, a in enumerate(ref.authors)
+            ],
+        )
+
+    def _insert_chunks(self, conn: sqlite3.Connection, ref: Reference) -> None:
+        conn.executemany(
+            "INSERT INTO chunk VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            [
+                (
+                    ref.id,
+                    i,
+                    c.text,
+                    c.page_num,
+                    c.start,
+                    c.end,
+                    json.dumps(c.vector),
+                    json.dumps(c.metadata, default=str),
+                )
+                for i, c in enumerate(ref.chunks)
+            ],
+        )
+
+    def _reference_to_row(self, ref: Reference) -> dict:
+        row = {k: getattr(ref, k) for k in REFERENCE_COLUMNS}
+        row["published_date"] = (
+            ref.published_date.isoformat() if ref.published_date else None
+        )
+        row["pages"] = json.dumps(ref.pages)
+        row["metadata"] = json.dumps(ref.metadata, default=str)
+        return row
+
+    def _read_references(
+        self,
+        conn: sqlite3.Connection = None,
+        where: str = "",
+        params: tuple = (),
+        include_chunks: bool = True,
+    ) -> list[Reference]:
+        """
+        Reads References, with their authors and chunks, in storage order.
+        """
+        if conn is None:
+            with self.lock:
+                return self._read_references(
+                    self._connect(), where, params, include_chunks
+                )
+
+        rows = conn.execute(
+            f"SELECT {', '.join(REFERENCE_COLUMNS)} FROM reference {where} "
+            "ORDER BY position",
+            params,
+        ).fetchall()
+        if not rows:
+            return []
+
+        ids = [row[0] for row in rows]
+        authors = {ref_id: [] for ref_id in ids}
+        chunks = {ref_id: [] for ref_id in ids}
+
+        # authors and chunks of the selected references, or of all of them
+        ref_filter = (
+            f"WHERE reference_id IN ({', '.join('?' * len(ids))})" if where else ""
+        )
+        ref_params = tuple(ids) if where else ()
+
+        for ref_id, full_name, given_name, surname, email in conn.execute(
+            "SELECT reference_id, full_name, given_name, surname, email "
+            f"FROM author {ref_filter} ORDER BY reference_id, position",
+            ref_params,
+        ):
+            authors[ref_id].append(
+                {
+                    "full_name": full_name,
+                    "given_name": given_name,
+                    "surname": surname,
+                    "email": email,
+                }
+            )
+
+        chunk_rows = (
+            conn.execute(
+                "SELECT reference_id, text, page_num, start, end, vector, metadata "
+                f"FROM chunk {ref_filter} ORDER BY reference_id, position",
+                ref_params,
+            )
+            if include_chunks
+            else []
+        )
+        for ref_id, text, page_num, start, end, vector, metadata in chunk_rows:
+            chunks[ref_id].append(
+                {
+                    "text": text,
+                    "page_num": page_num,
+                    "start": start,
+                    "end": end,
+                    "vector": json.loads(vector),
+                    "metadata": json.loads(metadata),
+                }
+            )
+
+        references = []
+        for row in rows:
+            data = dict(zip(REFERENCE_COLUMNS, row))
+            data["pages"] = json.loads(data["pages"])
+            data["metadata"] = json.loads(data["metadata"])
+            data["authors"] = authors[data["id"]]
+            data["chunks"] = chunks[data["id"]]
+            # the database was written by storage, so is not validated again
+            references.append(construct_reference(data))
+        return references
+
+
+storage_cache = StorageCache(max_bytes=config.STORAGE_CACHE_MAX_BYTES)
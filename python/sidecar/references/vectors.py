@@ -0,0 +1,313 @@
+"""
+An index of the vectors of the chunks of a project's References, for ranking
+them by similarity to a query (dense retrieval).
+
+Chunks are embedded by an `Embedder` when their References are added to the
+index, i.e. when they are ingested. The index is made of segments (see
+`sidecar.references.segments`), each of which holds the vectors of the
+chunks of some References as a float32 matrix. Segment files are memory
+mapped when they are opened, so that the vectors of a large project are read
+from disk as they are searched, rather than loaded into memory.
+
+Vectors are normalized, so a chunk's score for a query is the cosine
+similarity of their vectors. Small segments are searched exactly: queries are
+scored against all of their vectors with a single matrix product. Large
+segments are searched approximately, through inverted lists of their vectors
+(see `sidecar.references.ivf`) that are built when the segment is built or
+merged, and saved in its file. The number of lists probed per query trades
+recall for latency, and is set by `config.VECTOR_NPROBE`. In both cases the
+best chunks are selected without sorting all of them.
+"""
+from pathlib import Path
+
+import numpy as np
+from sidecar import config
+from sidecar.references.embeddings import Embedder, get_embedder
+from sidecar.references.ivf import MIN_VECTORS, InvertedLists
+from sidecar.references.schemas import Reference
+from sidecar.references.segments import (
+    Hit,
+    IndexSegment,
+    SegmentedIndex,
+    read_segment_file,
+    write_segment_file,
+)
+
+MAGIC = b"RSVECS\x00"
+VERSION = 2
+
+_DTYPE = np.dtype("<f4")
+_DTYPES = {
+    "vectors": _DTYPE,
+    "centroids": _DTYPE,
+    "list_offsets": np.dtype("<i8"),
+    "list_docs": np.dtype("<i4"),
+}
+
+# number of chunks embedded at once, which bounds the memory used to embed
+EMBED_BATCH_SIZE = 1024
+
+
+class VectorSegment(IndexSegment):
+    """
+    The vectors of the chunks of some References, as a matrix with a row per
+    chunk, numbered in the order of the References and their chunks.
+
+    Segments of at least `ivf.MIN_VECTORS` chunks have inverted lists of
+    their vectors, for approximate search, and their `vectors` are ordered by
+    list rather than by chunk. Lists are trained when they are not given, in
+    which case `vectors` are ordered by chunk.
+    """
+
+    def __init__(
+        self,
+        references: list[tuple[str, int]],
+        vectors: np.ndarray,
+        name: str | None = None,
+        lists: InvertedLists | None = None,
+    ):
+        if lists is None and len(vectors) >= MIN_VECTORS:
+            lists = InvertedLists.train(vectors)
+            vectors = vectors[lists.docs]
+        self.vectors = vectors
+        self.lists = lists
+        # row of the vector of each chunk, if they are not in the same order
+        self.rows = None
+        if lists is not None:
+            self.rows = np.empty(len(lists.docs), dtype=np.int32)
+            self.rows[lists.docs] = np.arange(len(lists.docs), dtype=np.int32)
+        super().__init__(references, name)
+
+    def _get_rows(self, docs: np.ndarray | slice) -> np.ndarray | slice:
+        return docs if self.rows is None else self.rows[docs]
+
+    @classmethod
+    def build(cls, references: list[Reference], embedder: Embedder) -> "VectorSegment":
+        """
+        Embeds the chunks of References into a new segment.
+        """
+        texts = [
+            ref.get_chunk_text(chunk) for ref in references for chunk in ref.chunks
+        ]
+        vectors = np.zeros((len(texts), embedder.dim), dtype=np.float32)
+        for start in range(0, len(texts), EMBED_BATCH_SIZE):
+            batch = texts[start : start + EMBED_BATCH_SIZE]
+            vectors[start : start + len(batch)] = embedder.embed(batch)
+        return cls([(ref.id, len(ref.chunks)) for ref in references], vectors)
+
+    @classmethod
+    def merge(cls, segments: list["VectorSegment"]) -> "VectorSegment":
+        refs = [r for segment in segments for r in segment.alive_references]
+        vectors = np.concatenate(
+            [
+                segment.vectors[segment._get_rows(np.flatnonzero(segment.alive))]
+                for segment in segments
+            ]
+        )
+        return cls(refs, vectors)
+
+    def get_vectors(self, reference_id: str) -> np.ndarray | None:
+        """
+        Returns the vectors of the chunks of a Reference, or None if the
+        Reference is not in the segment (or is deleted).
+        """
+        if reference_id not in self.ref_ranges or reference_id in self.deleted:
+            return None
+        start, end = self.ref_ranges[reference_id]
+        return self.vectors[self._get_rows(slice(start, end))]
+
+    def search(
+        self, query_vectors: np.ndarray, n: int, nprobe: int
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Returns the scores and positions of the (at most) `n` chunks most
+        similar to each query, in no particular order, as matrices with a row
+        per query. Rows are padded with scores of -inf.
+
+        Parameters
+        ----------
+        query_vectors : np.ndarray
+            The vectors of the queries, with a row per query
+        n : int
+            Number of chunks to return for each query
+        nprobe : int
+            Number of inverted lists to probe, if the segment has them
+        """
+        k = min(n, len(self))
+        if self.lists is None:
+            scores = query_vectors @ self.vectors.T
+            scores[:, ~self.alive] = -np.inf
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            return np.take_along_axis(scores, top, axis=1), top
+
+        scores = np.full((len(query_vectors), k), -np.inf, dtype=np.float32)
+        docs = np.zeros((len(query_vectors), k), dtype=np.int64)
+        probed = self.lists.probe(query_vectors, nprobe)
+        for row, blocks in enumerate(probed):
+            candidates = np.concatenate([self.lists.docs[block] for block in blocks])
+            candidate_scores = np.concatenate(
+                [self.vectors[block] @ query_vectors[row] for block in blocks]
+            )
+            candidate_scores[~self.alive[candidates]] = -np.inf
+            m = min(k, len(candidates))
+            if m == 0:
+                continue
+            top = np.argpartition(-candidate_scores, m - 1)[:m]
+            scores[row, :m] = candidate_scores[top]
+            docs[row, :m] = candidates[top]
+        return scores, docs
+
+    def save(self, dirpath: Path) -> None:
+        dim = self.vectors.shape[1]
+        lists = self.lists
+        if lists is None:
+            # saved as no lists
+            lists = InvertedLists(np.zeros((0, dim)), np.zeros(1), np.zeros(0))
+        self.name = write_segment_file(
+            dirpath,
+            MAGIC,
+            VERSION,
+            {"references": self.references, "dim": dim},
+            {
+                key: np.ascontiguousarray(array, dtype=_DTYPES[key])
+                for key, array in [
+                    ("vectors", self.vectors),
+                    ("centroids", lists.centroids),
+                    ("list_offsets", lists.offsets),
+                    ("list_docs", lists.docs),
+                ]
+            },
+        )
+
+    @classmethod
+    def open(cls, filepath: Path) -> "VectorSegment":
+        """
+        Opens a segment file, memory mapping its vectors and inverted lists.
+        """
+        header, arrays = read_segment_file(filepath, MAGIC, VERSION, _DTYPES)
+        vectors = arrays["vectors"].reshape(-1, header["dim"])
+        centroids = arrays["centroids"].reshape(-1, header["dim"])
+        lists = None
+        if len(centroids):
+            lists = InvertedLists(
+                centroids, arrays["list_offsets"], arrays["list_docs"]
+            )
+        references = [tuple(r) for r in header["references"]]
+        return cls(references, vectors, name=filepath.name, lists=lists)
+
+
+class VectorIndex(SegmentedIndex):
+    """
+    Ranks the chunks of a project's References by the similarity of their
+    vectors to a query, from an index that is updated as References are
+    added, patched and deleted.
+    """
+
+    segment_class = VectorSegment
+    version = VERSION
+
+    def __init__(
+        self,
+        segments: list[VectorSegment] | None = None,
+        embedder: Embedder | None = None,
+    ):
+        super().__init__(segments)
+        self.embedder = embedder if embedder is not None else get_embedder()
+
+    @classmethod
+    def build(
+        cls, references: list[Reference], embedder: Embedder | None = None
+    ) -> "VectorIndex":
+        index = cls(embedder=embedder)
+        index.add(references)
+        return index
+
+    def _build_segment(self, references: list[Reference]) -> VectorSegment:
+        return VectorSegment.build(references, self.embedder)
+
+    def _save_files(self, dirpath: Path) -> dict:
+        return {"embedder": self.embedder.name}
+
+    @classmethod
+    def _from_saved(
+        cls,
+        dirpath: Path,
+        manifest: dict,
+        segments: list[VectorSegment],
+        embedder: Embedder | None = None,
+    ) -> "VectorIndex":
+        index = cls(segments, embedder)
+        if manifest["embedder"] != index.embedder.name:
+            raise ValueError(f"The vectors were made by {manifest['embedder']}")
+        return index
+
+    def get_vectors(self, reference_id: str) -> np.ndarray | None:
+        """
+        Returns the vectors of the chunks of a Reference, as a matrix with a
+        row per chunk, or None if the Reference is not in the index.
+        """
+        for segment in self.segments:
+            vectors = segment.get_vectors(reference_id)
+            if vectors is not None:
+                return vectors
+        return None
+
+    def get_top_n(self, query: str, n: int = 5, nprobe: int | None = None) -> list[Hit]:
+        """
+        Returns the `n` chunks whose vectors are most similar to the vector of
+        a query, most similar first.
+        """
+        return self.get_top_n_batch([query], n, nprobe)[0]
+
+    def get_top_n_batch(
+        self, queries: list[str], n: int = 5, nprobe: int | None = None
+    ) -> list[list[Hit]]:
+        """
+        Returns the `n` chunks whose vectors are most similar to the vector of
+        each of several queries, which are embedded and scored together.
+
+        Parameters
+        ----------
+        queries : list[str]
+            The queries
+        n : int, default 5
+            Number of chunks to return for each query
+        nprobe : int, optional
+            Number of inverted lists probed in large segments, which trades
+            recall for latency. Defaults to `config.VECTOR_NPROBE`.
+        """
+        segments = self.segments
+        if not queries or n <= 0:
+            return [[] for _ in queries]
+        if nprobe is None:
+            nprobe = config.VECTOR_NPROBE
+
+        query_vectors = self.embedder.embed(queries)
+        # the best chunks of each segment for each query, as their scores,
+        # segments and positions in their segment
+        scores, segment_ids, docs = [], [], []
+        for i, segment in enumerate(segments):
+            if segment.num_alive == 0:
+                continue
+            segment_scores, top = segment.search(query_vectors, n, nprobe)
+            scores.append(segment_scores)
+            segment_ids.append(np.full(top.shape, i))
+            docs.append(top)
+        if not scores:
+            return [[] for _ in queries]
+
+        scores = np.concatenate(scores, axis=1)
+        segment_ids = np.concatenate(segment_ids, axis=1)
+        docs = np.concatenate(docs, axis=1)
+        results = []
+        for row in range(len(queries)):
+            # ties are ranked in storage order
+            order = np.lexsort((docs[row], segment_ids[row], -scores[row]))
+            results.append(
+                [
+                    segments[segment_ids[row, j]].get_hit(docs[row, j], scores[row, j])
+                    for j in order[:n]
+                    if scores[row, j] > -np.inf
+                ]
+            )
+        return results
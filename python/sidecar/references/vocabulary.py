@@ -0,0 +1,144 @@
+"""
+Tokenization of chunk text into integer term ids.
+
+Text is split into lowercase tokens on whitespace, without stopwords. Each
+distinct token is interned in a `Vocabulary`, which gives it a stable id, so
+that the tokens of chunks can be held as int32 arrays (see `TokenizedCorpus`)
+rather than as lists of Python strings, which cost tens of bytes per token.
+
+A vocabulary only grows: ids are never reused, so arrays of ids stay valid
+as chunks are added and removed. The terms of removed chunks are kept, even
+when the segments of an index are compacted; a vocabulary only loses them
+when its index is built again from scratch. It is saved as a text file of
+one term per line, in the order of their ids.
+"""
+from array import array
+from pathlib import Path
+from typing import Iterable, Iterator
+
+import numpy as np
+from sidecar.search.constants import stopwords
+from sidecar.shared import write_file_atomically
+
+TOKEN_DTYPE = np.dtype("<i4")
+
+
+def tokenize(text: str) -> list[str]:
+    """
+    Splits text into lowercase tokens on whitespace, dropping stopwords.
+    """
+    return [token for token in text.lower().split() if token not in stopwords]
+
+
+class Vocabulary:
+    """
+    Maps terms to integer ids, numbered in the order the terms were added.
+
+    Terms are only added by the writer of the index that holds the vocabulary.
+    Readers on other threads can look up terms at any time, and may find ids
+    that are newer than the arrays they were computed for.
+    """
+
+    def __init__(self, terms: list[str] | None = None):
+        self.terms = list(terms) if terms else []
+        self.term_ids = {term: i for i, term in enumerate(self.terms)}
+
+    def __len__(self) -> int:
+        return len(self.terms)
+
+    def get(self, term: str) -> int | None:
+        """
+        Returns the id of a term, or None if it is not in the vocabulary.
+        """
+        return self.term_ids.get(term)
+
+    def add(self, tokens: Iterable[str]) -> list[int]:
+        """
+        Returns the ids of tokens, adding the tokens that are new.
+        """
+        term_ids, terms = self.term_ids, self.terms
+        ids = []
+        for token in tokens:
+            term_id = term_ids.get(token)
+            if term_id is None:
+                # the term is listed before its id is published to readers
+                term_id = len(terms)
+                terms.append(token)
+                term_ids[token] = term_id
+            ids.append(term_id)
+        return ids
+
+    def encode(self, tokens: list[str]) -> np.ndarray:
+        """
+        As `add`, returning the ids as an int32 array.
+        """
+        return np.array(self.add(tokens), dtype=TOKEN_DTYPE)
+
+    def decode(self, ids: Iterable[int]) -> list[str]:
+        terms = self.terms
+        return [terms[i] for i in ids]
+
+    def save(self, filepath: Path) -> None:
+        # tokens never contain whitespace, so one per line is unambiguous
+        write_file_atomically(filepath, "\n".join(self.terms).encode("utf8"))
+
+    @classmethod
+    def open(cls, filepath: Path) -> "Vocabulary":
+        with open(filepath, "rb") as f:
+            text = f.read().decode("utf8")
+        return cls(text.split("\n") if text else [])
+
+
+class TokenizedCorpus:
+    """
+    The term ids of a list of chunks, concatenated into one int32 array, with
+    the offset of each chunk's ids in it.
+
+    Indexing returns a view of a chunk's ids, so the corpus takes 4 bytes per
+    token, plus 8 bytes per chunk.
+    """
+
+    def __init__(self, token_ids: np.ndarray, offsets: np.ndarray):
+        self.token_ids = token_ids
+        self.offsets = offsets
+
+    @classmethod
+    def from_texts(
+        cls, texts: Iterable[str], vocabulary: Vocabulary
+    ) -> "TokenizedCorpus":
+        """
+        Tokenizes texts, adding their new tokens to `vocabulary`.
+        """
+        token_ids = array("i")
+        offsets = [0]
+        for text in texts:
+            token_ids.extend(vocabulary.add(tokenize(text)))
+            offsets.append(len(token_ids))
+        return cls(
+            np.frombuffer(token_ids, dtype=np.intc).astype(TOKEN_DTYPE),
+            np.array(offsets, dtype=np.int64),
+        )
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: int) -> np.ndarray:
+        if not -len(self) <= i < len(self):
+            raise IndexError("chunk index out of range")
+        i %= len(self)
+        return self.token_ids[self.offsets[i] : self.offsets[i + 1]]
+
+    def __iter__(self) -> Iterator[np.ndarray]:
+        for i in range(len(self)):
+            yield self[i]
+
+    @property
+    def lengths(self) -> np.ndarray:
+        """
+        Number of tokens in each chunk.
+        """
+        return np.diff(self.offsets)
+
+    @property
+    def nbytes(self) -> int:
+        return self.token_ids.nbytes + self.offsets.nbytes
@@ -1,8 +1,11 @@
+import asyncio
 import os
-import sys
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
-from typing import List
+from typing import Any, Coroutine, List
 
 import pypdf
 from sidecar import config
@@ -22,6 +25,61 @@ def remove_file(filepath: str) -> None:
         pass
 
 
+def link_or_copy_file(source: Path, destination: Path) -> None:
+    """
+    Makes `source` available at `destination` without copying its contents
+    when possible, by creating a hard link. Falls back to a copy when the
+    filesystem does not support hard links (or the paths are on different
+    filesystems). Any existing file at `destination` is replaced.
+    """
+    remove_file(destination)
+    try:
+        os.link(source, destination)
+    except OSError as e:
+        logger.info(f"Unable to link {source}, copying it instead: {e}")
+        shutil.copy(source, destination)
+
+
+def set_replacement_mode(tmp_filepath: Path, filepath: Path) -> None:
+    """
+    Gives a temporary file that is about to replace `filepath` the mode of
+    `filepath`, or the mode of a new file (following the umask) if there is
+    no file at `filepath`. Temporary files are otherwise only readable by
+    their owner.
+    """
+    try:
+        shutil.copymode(filepath, tmp_filepath)
+    except FileNotFoundError:
+        # the umask can only be read by setting it
+        umask = os.umask(0o022)
+        os.umask(umask)
+        os.chmod(tmp_filepath, 0o666 & ~umask)
+
+
+def write_file_atomically(filepath: Path, data: bytes) -> None:
+    """
+    Writes `data` to `filepath`, so that the file always has either its old
+    or its new contents, even if the sidecar stops partway through.
+
+    The data is written to a temporary file in the same directory and
+    flushed to disk, before the temporary file is renamed to `filepath`.
+    """
+    filepath = Path(filepath)
+    fd, tmp_filepath = tempfile.mkstemp(
+        dir=filepath.parent, prefix=f".{filepath.name}.", suffix=".tmp"
+    )
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        set_replacement_mode(tmp_filepath, filepath)
+        os.replace(tmp_filepath, filepath)
+    except BaseException:
+        remove_file(tmp_filepath)
+        raise
+
+
 def parse_date(date_str: str) -> datetime:
     """
     Parse a YYYY-mm-dd date string into a datetime object.
@@ -80,6 +138,24 @@ def create_citation_key(ref: Reference) -> str:
     return key.lower()
 
 
+def extract_pages_from_pdf(pdf_path: str) -> List[str]:
+    """
+    Extract raw text from each page of a PDF file
+
+    Parameters
+    ----------
+    pdf_path : str
+        Path to PDF file
+
+    Returns
+    -------
+    List[str]
+        Raw text extracted from each page, in page order
+    """
+    reader = pypdf.PdfReader(pdf_path)
+    return [page.extract_text() for page in reader.pages]
+
+
 def extract_text_from_pdf(pdf_path: str) -> str:
     """
     Extract raw text from a PDF file
@@ -94,11 +170,7 @@ def extract_text_from_pdf(pdf_path: str) -> str:
     str
         Raw text extracted from PDF
     """
-    reader = pypdf.PdfReader(pdf_path)
-    text = ""
-    for page in reader.pages:
-        text += page.extract_text()
-    return text
+    return "".join(extract_pages_from_pdf(pdf_path))
 
 
 def chunk_text(
@@ -141,55 +213,76 @@ def chunk_reference(
     filepath: Path = None,
     chunk_size: int = 1000,
     chunk_overlap: int = 200,
+    pages: List[str] = None,
 ) -> List[Chunk]:
     """
-    Chunks a Reference document into small pieces of overlapping text
+    Chunks a Reference document into small pieces of overlapping text.
+
+    Each chunk is a span of the text of one of the PDF's pages, rather than a
+    copy of it, so the text of the pages must be kept in `Reference.pages`.
 
     Parameters
     ----------
     ref: Reference
         Reference to chunk
+    filepath : Path, optional
+        Path to the Reference's PDF, by default the file in the uploads directory
     chunk_size : int, optional
         Size of each chunk, by default 1000
     chunk_overlap : int, optional
         Number of characters to overlap between chunks, by default 200
+    pages : List[str], optional
+        Text of each page of the PDF, if it has already been extracted.
+        Defaults to the Reference's `pages`, if it has any. The PDF is only
+        read when the text of its pages is not known yet.
 
     Returns
     -------
     List[Chunk]
     """
-    if not filepath:
-        filepath = Path(config.UPLOADS_DIR).joinpath(ref.source_filename)
+    if pages is None and ref.pages:
+        pages = ref.pages
 
-    try:
-        reader = pypdf.PdfReader(filepath)
-    except FileNotFoundError:
-        logger.error(f"File not found: {filepath}")
-        return []
+    if pages is None:
+        if not filepath:
+            filepath = Path(config.UPLOADS_DIR).joinpath(ref.source_filename)
 
-    chunks = []
-    for page in reader.pages:
-        page_text = page.extract_text()
+        try:
+            pages = extract_pages_from_pdf(filepath)
+        except FileNotFoundError:
+            logger.error(f"File not found: {filepath}")
+            return []
 
+    chunks = []
+    for page_num, page_text in enumerate(pages, start=1):
         for i in range(0, len(page_text), chunk_size - chunk_overlap):
             chunk = Chunk(
-                text=page_text[i : i + chunk_size],
+                page_num=page_num,
+                start=i,
+                end=min(i + chunk_size, len(page_text)),
                 metadata={
                     "source_filename": ref.source_filename,
                     "title": ref.title,
                     # 'authors': ref.authors,
-                    "page_num": page.page_number + 1,
+                    "page_num": page_num,
                 },
             )
             chunks.append(chunk)
     return chunks
 
 
-class HiddenPrints:
-    def __enter__(self):
-        self._original_stdout = sys.stdout
-        sys.stdout = open(os.devnull, "w")
+def run_coroutine(coro: Coroutine) -> Any:
+    """
+    Runs a coroutine to completion from synchronous code.
+
+    If the calling thread already has a running event loop (e.g. when called
+    from an `async def` endpoint), the coroutine is run on a new event loop
+    in a separate thread instead.
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
 
-    def __exit__(self, exc_type, exc_val, exc_tb):
-        sys.stdout.close()
-        sys.stdout = self._original_stdout
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(asyncio.run, coro).result()
@@ -2,7 +2,9 @@ from pathlib import Path
 
 from sidecar import config
 from sidecar.ai import chat
+from sidecar.ai.ranker import BM25Ranker, DenseRanker
 from sidecar.ai.schemas import ChatRequest
+from sidecar.references.storage import JsonStorage
 
 from ..helpers import _copy_fixture_to_temp_dir
 
@@ -52,3 +54,29 @@ def test_chat_ask_question_is_openai_error(
     assert output["status"] == "error"
     assert output["message"] == "This is a mocked error"
     assert len(output["choices"]) == 0
+
+
+def test_chat_get_relevant_documents(fixtures_dir):
+    jstore = JsonStorage(filepath=f"{fixtures_dir}/data/references.json")
+    jstore.load()
+    ranker = BM25Ranker(storage=jstore)
+
+    # test: rank chunks with BM25 only
+    bm25_only = chat.Chat(input_text="Chicago", storage=jstore, ranker=ranker)
+    assert bm25_only.get_relevant_documents(limit=2) == ranker.get_top_n(
+        query="Chicago", limit=2
+    )
+
+    # test: rank chunks with BM25 and their vectors
+    # expect: chunks about Chicago, with their vectors
+    hybrid = chat.Chat(
+        input_text="Chicago",
+        storage=jstore,
+        ranker=ranker,
+        dense_ranker=DenseRanker(storage=jstore),
+    )
+    docs = hybrid.get_relevant_documents(limit=2)
+    assert len(docs) == 2
+    for chunk in docs:
+        assert "chicago" in chunk.text.lower()
+        assert chunk.vector
@@ -1,7 +1,12 @@
 from pathlib import Path
 
-from sidecar.ai.ranker import BM25Ranker
+import pytest
+from sidecar import config
+from sidecar.ai.ranker import RRF_K, BM25Ranker, DenseRanker, Ranker, fuse_rankings
 from sidecar.references import storage
+from sidecar.references.schemas import Reference, ReferencePatch
+from sidecar.references.segments import Hit
+from sidecar.shared import chunk_reference
 
 
 def test_bm25_ranker(fixtures_dir):
@@ -30,3 +35,97 @@ def test_bm25_ranker(fixtures_dir):
     # relevant docs should not be about Chicago
     for chunk in docs:
         assert "chicago" not in chunk.text.lower()
+
+
+def test_bm25_ranker_with_chunk_spans(tmp_path):
+    ref = Reference(id="ref1", source_filename="ref1.pdf", status="complete")
+    ref.pages = ["Chicago is a city in Illinois.", "Baseball is a sport."]
+    ref.chunks = chunk_reference(ref)
+
+    jstore = storage.JsonStorage(filepath=tmp_path.joinpath("references.json"))
+    jstore.references = [ref]
+    jstore.save()
+
+    ranker = BM25Ranker(storage=jstore)
+
+    # chunks are returned with the text of their span of the page
+    docs = ranker.get_top_n(query="baseball", limit=1)
+    assert docs[0].text == "Baseball is a sport."
+    assert docs[0].page_num == 2
+
+    # chunks in storage do not keep a copy of their text
+    assert all(chunk.text is None for chunk in jstore.chunks)
+
+
+def test_ranker_skips_chunks_removed_since_search(tmp_path):
+    ref = Reference(id="ref1", source_filename="ref1.pdf", status="complete")
+    ref.pages = ["Chicago is a city in Illinois.", "Baseball is a sport."]
+    ref.chunks = chunk_reference(ref)
+
+    jstore = storage.JsonStorage(filepath=tmp_path.joinpath("references.json"))
+    jstore.references = [ref]
+    jstore.save()
+
+    ranker = BM25Ranker(storage=jstore)
+    hits = ranker.get_top_hits(query="baseball", limit=1)
+    assert [hit.chunk_index for hit in hits] == [1]
+
+    # the reference is updated to a single chunk after the search
+    chunks = [chunk.dict() for chunk in ref.chunks[:1]]
+    jstore.update("ref1", ReferencePatch(data={"chunks": chunks}))
+
+    assert ranker.get_chunks(hits) == []
+
+
+def test_bm25_ranker_batch(fixtures_dir):
+    jstore = storage.JsonStorage(filepath=f"{fixtures_dir}/data/references.json")
+    jstore.load()
+    ranker = BM25Ranker(storage=jstore)
+
+    queries = ["Chicago", "baseball"]
+    results = ranker.get_top_n_batch(queries, limit=2)
+
+    assert results == [ranker.get_top_n(query, limit=2) for query in queries]
+
+
+def test_dense_ranker(fixtures_dir):
+    jstore = storage.JsonStorage(filepath=f"{fixtures_dir}/data/references.json")
+    jstore.load()
+    ranker = DenseRanker(storage=jstore)
+
+    docs = ranker.get_top_n(query="Chicago", limit=2)
+    assert len(docs) == 2
+    for chunk in docs:
+        assert "chicago" in chunk.text.lower()
+        # chunks are returned with their vectors
+        assert len(chunk.vector) == config.EMBEDDING_DIM
+
+
+def test_dense_ranker_without_embedder(monkeypatch, fixtures_dir):
+    monkeypatch.setattr(config, "EMBEDDER", "none")
+    jstore = storage.JsonStorage(filepath=f"{fixtures_dir}/data/references.json")
+    jstore.load()
+
+    with pytest.raises(ValueError):
+        DenseRanker(storage=jstore)
+
+
+def test_fuse_rankings():
+    rankings = [
+        [Hit("a", 0, 9.0), Hit("b", 0, 8.0), Hit("c", 0, 7.0)],
+        [Hit("c", 0, 0.9), Hit("d", 0, 0.8), Hit("a", 0, 0.1)],
+    ]
+
+    # chunks ranked by both are ranked first, and scores are not compared
+    hits = fuse_rankings(rankings, limit=3)
+    assert [hit.reference_id for hit in hits] == ["a", "c", "b"]
+    assert hits[0].score == pytest.approx(1 / (RRF_K + 1) + 1 / (RRF_K + 3))
+    assert fuse_rankings([], limit=3) == []
+
+
+def test_ranker_is_abstract():
+    class IncompleteRanker(Ranker):
+        pass
+
+    with pytest.raises(TypeError):
+        IncompleteRanker(storage=None)
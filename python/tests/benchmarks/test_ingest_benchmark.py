@@ -0,0 +1,23 @@
+from benchmarks.grobid_stub import StubGrobidServer
+from benchmarks.ingest import run_benchmark
+
+
+def test_run_benchmark():
+    result = run_benchmark(num_docs=3, num_pages=2, latency=0, failure_rate=0.5)
+
+    stub = StubGrobidServer(failure_rate=0.5)
+    expected_failures = sum(
+        1 for i in range(3) if stub.is_failure(f"paper-{i:05d}.pdf")
+    )
+
+    assert result["references"] == 3
+    assert result["grobid_requests"] == 3
+    assert result["failures"] == expected_failures
+    assert result["peak_rss_mb"] > 0
+    assert list(result["stage_seconds"]) == [
+        "checking_uploads",
+        "grobid",
+        "creating_references",
+        "saving",
+        "done",
+    ]
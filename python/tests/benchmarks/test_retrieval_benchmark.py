@@ -0,0 +1,20 @@
+from benchmarks.retrieval import create_vocabulary, run_benchmark
+
+
+def test_create_vocabulary():
+    words, cum_weights = create_vocabulary(size=3)
+
+    assert words == ["w0", "w1", "w2"]
+    assert cum_weights == [1, 1.5, 1.5 + 1 / 3]
+
+
+def test_run_benchmark():
+    result = run_benchmark(num_references=3, pages_per_reference=2, num_queries=2)
+
+    assert result["references"] == 3
+    assert result["chunks"] > 6
+    assert result["baseline_query_seconds"] >= 0
+    assert result["query_ms"] >= 0
+    assert 0 <= result["token_ids_mb"] <= result["token_lists_mb"]
+    assert result["dense_query_ms"] >= 0
+    assert result["dense_recall"] == 1
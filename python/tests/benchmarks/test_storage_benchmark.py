@@ -0,0 +1,38 @@
+from sidecar.references.serialization import StorageFormat
+
+from benchmarks.storage import create_library, run_benchmark
+
+
+def test_create_library():
+    references = create_library(num_references=3, pages_per_reference=2)
+
+    assert [ref.source_filename for ref in references] == [
+        "paper-00000.pdf",
+        "paper-00001.pdf",
+        "paper-00002.pdf",
+    ]
+    assert all(len(ref.pages) == 2 for ref in references)
+    assert all(len(ref.chunks) > 2 for ref in references)
+
+
+def test_run_benchmark():
+    result = run_benchmark(num_references=3, pages_per_reference=2, repeat=1)
+
+    assert result["references"] == 3
+    assert result["chunks"] > 6
+    assert result["validated_seconds"] >= 0
+    assert result["trusted_seconds"] >= 0
+
+
+def test_run_benchmark_compact_format():
+    result = run_benchmark(
+        num_references=3,
+        pages_per_reference=2,
+        repeat=1,
+        format=StorageFormat.COMPACT,
+        compress=True,
+        vector_dims=4,
+    )
+
+    assert result["format"] == "compact+zlib"
+    assert result["save_seconds"] >= 0
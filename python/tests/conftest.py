@@ -6,9 +6,25 @@ from fastapi.testclient import TestClient
 from sidecar import config
 from sidecar.api import api
 from sidecar.projects import service as projects_service
+from sidecar.references.storage import storage_cache
 from sidecar.settings import service as settings_service
 
 
+@pytest.fixture(autouse=True)
+def disable_grobid_cache(monkeypatch):
+    # the Grobid cache is shared by all projects, so it would be shared by
+    # tests too. Tests that use the cache point it at their own directory.
+    monkeypatch.setattr(config, "GROBID_CACHE_MAX_BYTES", 0)
+
+
+@pytest.fixture(autouse=True)
+def clear_storage_cache():
+    yield
+    # write changes that are waiting to be saved before the next test, which
+    # may reuse the same project directory
+    storage_cache.clear()
+
+
 @pytest.fixture
 def fixtures_dir():
     return Path(__file__).parent / "fixtures"
@@ -1,3 +1,7 @@
+import os
+import stat
+from pathlib import Path
+
 from fastapi.testclient import TestClient
 from sidecar import config
 from sidecar.api import api
@@ -32,8 +36,31 @@ def test_create_file(monkeypatch, tmp_path, fixtures_dir):
         "filepath": str(filepath),
     }
 
-    # check that the file was created
+    # check that the file was created, with the mode of a new file
     assert filepath.exists()
+    umask = os.umask(0o022)
+    os.umask(umask)
+    assert stat.S_IMODE(filepath.stat().st_mode) == 0o666 & ~umask
+    filepath.chmod(0o640)
+
+    # test: upload a new version of the file while it is linked elsewhere
+    # expect: the file is replaced, and the link keeps the previous contents
+    linked_filepath = tmp_path / "linked.pdf"
+    os.link(filepath, linked_filepath)
+    previous_contents = filepath.read_bytes()
+
+    with open(f"{fixtures_dir}/pdf/test.pdf", "rb") as f:
+        response = client.put(
+            f"/api/fs/{project_id}/{filename}",
+            files={"file": ("test.pdf", f, "application/pdf")},
+        )
+
+    assert response.status_code == 200
+    assert filepath.read_bytes() == Path(f"{fixtures_dir}/pdf/test.pdf").read_bytes()
+    assert linked_filepath.read_bytes() == previous_contents
+    # the new version keeps the mode of the file it replaced
+    assert stat.S_IMODE(filepath.stat().st_mode) == 0o640
+    assert sorted(p.name for p in filepath.parent.iterdir()) == ["test.pdf"]
 
 
 def test_read_file(monkeypatch, tmp_path, fixtures_dir):
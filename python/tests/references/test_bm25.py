@@ -0,0 +1,222 @@
+import numpy as np
+import pytest
+from rank_bm25 import BM25Plus
+from sidecar.references import bm25, segments
+from sidecar.references.bm25 import BM25Index, Segment
+from sidecar.references.vocabulary import Vocabulary, tokenize
+from sidecar.references.schemas import Reference
+from sidecar.shared import chunk_reference
+
+
+def _reference(ref_id: str, *pages: str) -> Reference:
+    ref = Reference(id=ref_id, source_filename=f"{ref_id}.pdf", status="complete")
+    ref.pages = list(pages)
+    ref.chunks = chunk_reference(ref) if pages else []
+    return ref
+
+
+def _references() -> list[Reference]:
+    return [
+        _reference("chicago", "Chicago is a city in Illinois.", "Chicago has lakes."),
+        _reference("baseball", "Baseball is a sport.", "The Cubs play baseball."),
+        _reference("empty"),
+        _reference("cubs", "The Chicago Cubs are a baseball team in Chicago."),
+    ]
+
+
+def _corpus(references: list[Reference]) -> list[list[str]]:
+    return [
+        tokenize(ref.get_chunk_text(chunk))
+        for ref in references
+        for chunk in ref.chunks
+    ]
+
+
+def _chunk_ids(hits: list[bm25.Hit]) -> list[tuple[str, int]]:
+    return [(hit.reference_id, hit.chunk_index) for hit in hits]
+
+
+@pytest.mark.parametrize("query", ["chicago", "baseball team", "chicago chicago is"])
+@pytest.mark.parametrize("dense_query_ratio", [0, 1000])
+def test_scores_match_bm25plus(monkeypatch, query, dense_query_ratio):
+    monkeypatch.setattr(bm25, "DENSE_QUERY_RATIO", dense_query_ratio)
+    references = _references()
+    index = BM25Index.build(references)
+
+    expected = sorted(BM25Plus(_corpus(references)).get_scores(tokenize(query)))
+    hits = index.get_top_n(tokenize(query), n=10)
+
+    assert len(hits) == index.num_docs == 5
+    assert [hit.score for hit in hits] == pytest.approx(expected[::-1])
+
+
+def test_add_and_remove():
+    references = _references()
+    index = BM25Index.build(references[:2])
+    index.add(references[2:])
+
+    # test: remove a reference
+    # expect: its chunks are no longer found
+    index.remove(["cubs"])
+    hits = index.get_top_n(["cubs"], n=10)
+    assert "cubs" not in {hit.reference_id for hit in hits}
+    assert _chunk_ids(hits)[0] == ("baseball", 1)
+
+    # test: add a reference with the id of an indexed reference
+    # expect: it replaces the indexed reference
+    index.add([_reference("chicago", "Now about cubs")])
+    hits = index.get_top_n(["cubs"], n=2)
+    assert _chunk_ids(hits) == [("chicago", 0), ("baseball", 1)]
+    assert index.num_docs == 3
+
+    # the scores are the same as for an index built from scratch
+    rebuilt = BM25Index.build([_reference("chicago", "Now about cubs"), references[1]])
+    assert [hit.score for hit in hits] == pytest.approx(
+        [hit.score for hit in rebuilt.get_top_n(["cubs"], n=2)]
+    )
+
+
+def test_empty_index(tmp_path):
+    index = BM25Index.build([])
+    assert index.get_top_n(["chicago"]) == []
+
+    index.save(tmp_path, "checksum")
+    assert BM25Index.open(tmp_path, "checksum").get_top_n(["chicago"]) == []
+
+
+def test_save_and_open(tmp_path):
+    references = _references()
+    index = BM25Index.build(references[:2])
+    index.add(references[2:])
+    index.remove(["baseball"])
+    index.save(tmp_path, "checksum")
+
+    # test: open with the checksum of another storage file
+    # expect: no index
+    assert BM25Index.open(tmp_path, "other") is None
+    assert BM25Index.open(tmp_path.joinpath("missing"), "checksum") is None
+
+    opened = BM25Index.open(tmp_path, "checksum")
+    assert [segment.deleted for segment in opened.segments] == [
+        {"baseball"},
+        frozenset(),
+    ]
+    for query in [["chicago"], ["baseball", "team"], ["missing"]]:
+        assert opened.get_top_n(query, n=10) == index.get_top_n(query, n=10)
+
+    # test: change the opened index, and save it again
+    # expect: only the new segment is written
+    opened.add([_reference("new", "A new reference about Chicago.")])
+    opened.save(tmp_path, "changed")
+    assert len(list(tmp_path.glob("segment-*.bin"))) == 3
+    assert BM25Index.open(tmp_path, "changed").num_docs == 4
+
+
+def test_open_corrupt_segment(tmp_path):
+    BM25Index.build(_references()).save(tmp_path, "checksum")
+    for filepath in tmp_path.glob("segment-*.bin"):
+        filepath.write_bytes(b"not a segment")
+
+    assert BM25Index.open(tmp_path, "checksum") is None
+
+
+def test_compact(monkeypatch, tmp_path):
+    monkeypatch.setattr(segments, "MAX_SEGMENTS", 2)
+    references = _references()
+    vocabulary = Vocabulary()
+    index = BM25Index(
+        [Segment.build([ref], vocabulary) for ref in references], vocabulary
+    )
+    expected = index.get_top_n(["chicago"], n=10)
+
+    # test: save more than MAX_SEGMENTS segments
+    # expect: they are merged
+    index.save(tmp_path, "checksum")
+    assert len(index.segments) <= 2
+    assert len(list(tmp_path.glob("segment-*.bin"))) == len(index.segments)
+    assert index.get_top_n(["chicago"], n=10) == expected
+
+    # test: delete most of the chunks
+    # expect: the deleted chunks are merged away, and their files removed
+    index.remove(["chicago", "cubs", "empty"])
+    index.save(tmp_path, "checksum")
+    assert len(index.segments) == 1
+    assert index.segments[0].references == [("baseball", 2)]
+    assert len(list(tmp_path.glob("segment-*.bin"))) == 1
+    assert _chunk_ids(index.get_top_n(["baseball"], n=10)) == [
+        ("baseball", 0),
+        ("baseball", 1),
+    ]
+
+
+@pytest.mark.parametrize("dense_query_ratio", [0, 1000])
+def test_get_top_n_batch(monkeypatch, dense_query_ratio):
+    # every query is scored as dense, or as sparse
+    monkeypatch.setattr(bm25, "DENSE_QUERY_RATIO", dense_query_ratio)
+    monkeypatch.setattr(bm25, "DENSE_BLOCK_SIZE", 1)
+    references = _references()
+    index = BM25Index.build(references[:2])
+    index.add(references[2:])
+    index.remove(["baseball"])
+    queries = [["chicago"], ["cubs", "team"], [], ["missing"], ["chicago", "chicago"]]
+
+    # test: score several queries at once
+    # expect: the same results as scoring them one at a time
+    results = index.get_top_n_batch(queries, n=2)
+    assert results == [index.get_top_n(query, n=2) for query in queries]
+    assert _chunk_ids(results[1]) == [("cubs", 0), ("chicago", 0)]
+
+    # chunks without any query term are ranked in storage order
+    corpus = _corpus([references[0], references[3]])
+    expected = BM25Plus(corpus).get_scores(["cubs", "team"])
+    assert [hit.score for hit in index.get_top_n(["cubs", "team"], n=10)] == (
+        pytest.approx(sorted(expected, reverse=True))
+    )
+    assert _chunk_ids(results[3]) == [("chicago", 0), ("chicago", 1)]
+
+
+def test_get_top_n_ranks_only_matching_chunks(monkeypatch):
+    index = BM25Index.build(_references())
+    calls = []
+    argpartition = np.argpartition
+
+    def mock_argpartition(scores, kth):
+        calls.append(len(scores))
+        return argpartition(scores, kth)
+
+    monkeypatch.setattr(np, "argpartition", mock_argpartition)
+
+    # test: a query term found in 3 of the 5 chunks, for the top 2
+    # expect: only the 3 chunks are partitioned
+    hits = index.get_top_n(["chicago"], n=2)
+    assert calls == [3]
+    assert {hit.reference_id for hit in hits} <= {"chicago", "cubs"}
+
+
+def test_segments_share_vocabulary(tmp_path):
+    references = _references()
+    index = BM25Index.build(references[:1])
+    index.add(references[1:])
+
+    # test: a term in chunks of both segments
+    # expect: it has the same id in both
+    term_id = index.vocabulary.get("chicago")
+    assert [segment.find(term_id) is not None for segment in index.segments] == [
+        True,
+        True,
+    ]
+    # stopwords are not indexed
+    assert index.vocabulary.get("the") is None
+    assert index.get_top_n(["the"], n=1)[0].score == 0
+
+    # test: save and open the index
+    # expect: the vocabulary is saved with it
+    index.save(tmp_path, "checksum")
+    opened = BM25Index.open(tmp_path, "checksum")
+    assert opened.vocabulary.terms == index.vocabulary.terms
+    assert opened.get_top_n(["chicago"], n=10) == index.get_top_n(["chicago"], n=10)
+
+    # test: open an index whose vocabulary is missing terms
+    # expect: no index
+    tmp_path.joinpath(bm25.VOCABULARY_FILENAME).write_text("chicago")
+    assert BM25Index.open(tmp_path, "checksum") is None
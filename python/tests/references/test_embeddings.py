@@ -0,0 +1,82 @@
+import numpy as np
+import pytest
+from sidecar import config
+from sidecar.references import embeddings
+from sidecar.references.embeddings import Embedder, HashingEmbedder, get_embedder
+
+
+def test_hashing_embedder():
+    embedder = HashingEmbedder(dim=64)
+    texts = [
+        "The Chicago Cubs are a baseball team",
+        "Chicago cubs baseball",
+        "Quantum physics of atoms",
+        "the a of",
+    ]
+    vectors = embedder.embed(texts)
+
+    assert vectors.shape == (4, 64)
+    assert vectors.dtype == np.float32
+    assert np.linalg.norm(vectors, axis=1) == pytest.approx([1, 1, 1, 0], abs=1e-6)
+
+    # texts that share words are more similar than texts that do not
+    similarities = vectors @ vectors.T
+    assert similarities[0, 1] > 0.5
+    assert abs(similarities[0, 2]) < similarities[0, 1]
+
+    # test: embed the same texts again, and with another embedder
+    # expect: the same vectors, as features are hashed the same way
+    assert np.array_equal(embedder.embed(texts[::-1]), vectors[::-1])
+    assert np.array_equal(HashingEmbedder(dim=64).embed(texts), vectors)
+    assert embedder.embed([]).shape == (0, 64)
+
+
+def test_hashing_embedder_ngrams():
+    # words share character n-grams with their other forms
+    embedder = HashingEmbedder(dim=256)
+    vectors = embedder.embed(["embedding", "embeddings", "baseball"])
+    assert vectors[0] @ vectors[1] > 0.3
+    assert vectors[0] @ vectors[1] > vectors[0] @ vectors[2]
+
+    embedder = HashingEmbedder(dim=256, ngram_size=0)
+    vectors = embedder.embed(["embedding", "embeddings"])
+    assert vectors[0] @ vectors[1] < 0.3
+
+
+def test_hashing_embedder_limits_tokens():
+    texts = [f"token{i} shared" for i in range(20)]
+    vectors = HashingEmbedder(dim=64).embed(texts)
+
+    # test: embed more distinct tokens than the embedder keeps
+    # expect: the same vectors, without keeping every token
+    embedder = HashingEmbedder(dim=64, max_tokens=4)
+    for text, vector in zip(texts, vectors):
+        assert np.array_equal(embedder.embed([text])[0], vector)
+        assert len(embedder._token_ids) <= 4
+
+
+def test_get_embedder(monkeypatch):
+    monkeypatch.setattr(embeddings, "_embedders", {})
+    monkeypatch.setattr(config, "EMBEDDING_DIM", 32)
+
+    embedder = get_embedder()
+    assert isinstance(embedder, HashingEmbedder)
+    assert embedder.dim == 32
+    # embedders are shared
+    assert get_embedder() is embedder
+
+    monkeypatch.setattr(config, "EMBEDDER", "none")
+    assert get_embedder() is None
+
+    monkeypatch.setattr(config, "EMBEDDER", "unknown")
+    with pytest.raises(ValueError):
+        get_embedder()
+
+
+def test_embedder_is_abstract():
+    class IncompleteEmbedder(Embedder):
+        name = "incomplete"
+        dim = 8
+
+    with pytest.raises(TypeError):
+        IncompleteEmbedder()
@@ -0,0 +1,186 @@
+import asyncio
+import time
+
+import httpx
+from sidecar.references.grobid import GrobidClient
+
+
+async def _collect(client: GrobidClient, filepaths: list) -> list:
+    return [result async for result in client.process(filepaths)]
+
+
+def _create_pdfs(tmp_path, names: list[str]) -> list:
+    filepaths = []
+    for name in names:
+        filepath = tmp_path.joinpath(name)
+        filepath.write_bytes(b"%PDF-1.4")
+        filepaths.append(filepath)
+    return filepaths
+
+
+def test_grobid_client_process(tmp_path):
+    filepaths = _create_pdfs(tmp_path, ["ok.pdf", "fails.pdf"])
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        assert request.url.path == "/api/processHeaderDocument"
+        if b'filename="fails.pdf"' in request.read():
+            return httpx.Response(500, text="[GENERAL] An exception occurred")
+        return httpx.Response(200, text="<TEI></TEI>")
+
+    client = GrobidClient(
+        server_url="http://grobid.test", transport=httpx.MockTransport(handler)
+    )
+    results = asyncio.run(_collect(client, filepaths))
+
+    # test: one result per file
+    # expect: successes and failures are both reported with their status code
+    results = {r.filepath.name: r for r in results}
+    assert len(results) == 2
+
+    assert results["ok.pdf"].ok
+    assert results["ok.pdf"].text == "<TEI></TEI>"
+
+    assert not results["fails.pdf"].ok
+    assert results["fails.pdf"].status_code == 500
+
+
+def test_grobid_client_retries_when_busy(tmp_path):
+    filepaths = _create_pdfs(tmp_path, ["busy.pdf"])
+    calls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request)
+        if len(calls) < 3:
+            return httpx.Response(503)
+        return httpx.Response(200, text="<TEI></TEI>")
+
+    client = GrobidClient(
+        server_url="http://grobid.test",
+        retry_wait=0,
+        transport=httpx.MockTransport(handler),
+    )
+    results = asyncio.run(_collect(client, filepaths))
+
+    assert len(calls) == 3
+    assert results[0].ok
+
+
+def test_grobid_client_timeout_only_fails_slow_file(tmp_path):
+    filepaths = _create_pdfs(tmp_path, ["slow.pdf", "fast.pdf"])
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if b'filename="slow.pdf"' in request.read():
+            raise httpx.ReadTimeout("timed out", request=request)
+        return httpx.Response(200, text="<TEI></TEI>")
+
+    client = GrobidClient(
+        server_url="http://grobid.test", transport=httpx.MockTransport(handler)
+    )
+    results = asyncio.run(_collect(client, filepaths))
+    results = {r.filepath.name: r for r in results}
+
+    assert results["fast.pdf"].ok
+    assert not results["slow.pdf"].ok
+    assert results["slow.pdf"].status_code == GrobidClient.NO_RESPONSE_STATUS_CODE
+
+
+def test_grobid_client_timeout_is_per_file(tmp_path):
+    filepaths = _create_pdfs(tmp_path, ["slow.pdf", "busy.pdf"])
+    calls = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request)
+        if b'filename="busy.pdf"' in request.read():
+            return httpx.Response(503)
+        # a response that never finishes, without any single read timing out
+        await asyncio.sleep(10)
+        return httpx.Response(200, text="<TEI></TEI>")
+
+    client = GrobidClient(
+        server_url="http://grobid.test",
+        timeout=0.1,
+        retry_wait=0.2,
+        transport=httpx.MockTransport(handler),
+    )
+
+    # test: send a file that takes longer than the timeout, and a file that
+    # cannot be retried before its timeout
+    # expect: both fail once their timeout has passed
+    start = time.monotonic()
+    results = asyncio.run(_collect(client, filepaths))
+    results = {r.filepath.name: r for r in results}
+    assert time.monotonic() - start < 1
+
+    assert results["slow.pdf"].status_code == GrobidClient.NO_RESPONSE_STATUS_CODE
+    assert results["busy.pdf"].status_code == GrobidClient.BUSY_STATUS_CODE
+    assert len(calls) == 2
+
+
+def test_grobid_client_releases_slot_while_waiting_to_retry(tmp_path):
+    filepaths = _create_pdfs(tmp_path, ["busy.pdf", "ok.pdf"])
+    calls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request)
+        if len(calls) == 1:
+            return httpx.Response(503)
+        return httpx.Response(200, text="<TEI></TEI>")
+
+    client = GrobidClient(
+        server_url="http://grobid.test",
+        concurrency=1,
+        retry_wait=0.1,
+        transport=httpx.MockTransport(handler),
+    )
+    results = asyncio.run(_collect(client, filepaths))
+
+    # test: the only request slot is taken by a file that Grobid is too busy for
+    # expect: another file is sent while the busy file waits to be retried
+    assert [r.filepath.name for r in results] == ["ok.pdf", "busy.pdf"]
+    assert all(r.ok for r in results)
+
+
+def test_grobid_client_bounds_concurrency(tmp_path):
+    filepaths = _create_pdfs(tmp_path, [f"{i}.pdf" for i in range(10)])
+    in_flight = 0
+    max_in_flight = 0
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        nonlocal in_flight, max_in_flight
+        in_flight += 1
+        max_in_flight = max(max_in_flight, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return httpx.Response(200, text="<TEI></TEI>")
+
+    client = GrobidClient(
+        server_url="http://grobid.test",
+        concurrency=3,
+        transport=httpx.MockTransport(handler),
+    )
+    results = asyncio.run(_collect(client, filepaths))
+
+    assert len(results) == 10
+    assert max_in_flight == 3
+
+
+def test_grobid_client_get_version():
+    def handler(request: httpx.Request) -> httpx.Response:
+        assert request.url.path == "/api/version"
+        return httpx.Response(200, json={"version": "0.7.3", "revision": "abc"})
+
+    client = GrobidClient(
+        server_url="http://grobid.test", transport=httpx.MockTransport(handler)
+    )
+    assert asyncio.run(client.get_version()) == "0.7.3"
+
+    # older Grobid versions respond with plain text
+    client.transport = httpx.MockTransport(lambda r: httpx.Response(200, text="0.6.2"))
+    assert asyncio.run(client.get_version()) == "0.6.2"
+
+    # unreachable servers have no version
+    def unreachable(request: httpx.Request) -> httpx.Response:
+        raise httpx.ConnectError("connection refused", request=request)
+
+    client.transport = httpx.MockTransport(unreachable)
+    assert asyncio.run(client.get_version()) is None
@@ -0,0 +1,70 @@
+from sidecar import config
+from sidecar.references.grobid_cache import GrobidCache, get_default_cache
+
+
+def test_grobid_cache_get_and_put(tmp_path):
+    cache = GrobidCache(tmp_path.joinpath("grobid.sqlite3"), max_bytes=1024)
+
+    assert cache.get("abc", "http://grobid.test", "0.7.3") is None
+
+    cache.put("abc", "http://grobid.test", "0.7.3", "<TEI></TEI>")
+
+    # test: look up cached output
+    # expect: output is only returned for the same server and version
+    assert cache.get("abc", "http://grobid.test", "0.7.3") == "<TEI></TEI>"
+    assert cache.get("abc", "http://grobid.test", "0.8.0") is None
+    assert cache.get("abc", "http://other.test", "0.7.3") is None
+
+    # test: open the cache again
+    # expect: output is persisted
+    cache = GrobidCache(tmp_path.joinpath("grobid.sqlite3"), max_bytes=1024)
+    assert cache.get("abc", "http://grobid.test", "0.7.3") == "<TEI></TEI>"
+
+
+def test_grobid_cache_evicts_least_recently_used(tmp_path):
+    cache = GrobidCache(tmp_path.joinpath("grobid.sqlite3"), max_bytes=250)
+    server = "http://grobid.test"
+
+    cache.put("a", server, "1", "a" * 100)
+    cache.put("b", server, "1", "b" * 100)
+    # reading "a" makes "b" the least recently used
+    assert cache.get("a", server, "1") is not None
+
+    # test: add output that does not fit in the cache
+    # expect: least recently used output is evicted
+    cache.put("c", server, "1", "c" * 100)
+    assert cache.get("a", server, "1") is not None
+    assert cache.get("b", server, "1") is None
+    assert cache.get("c", server, "1") is not None
+
+    # output larger than the whole cache is never cached
+    cache.put("d", server, "1", "d" * 1000)
+    assert cache.get("d", server, "1") is None
+    assert cache.get("c", server, "1") is not None
+
+
+def test_grobid_cache_server_version(tmp_path):
+    cache = GrobidCache(tmp_path.joinpath("grobid.sqlite3"), max_bytes=1024)
+
+    assert cache.get_server_version("http://grobid.test") is None
+    cache.set_server_version("http://grobid.test", "0.7.3")
+    cache.set_server_version("http://grobid.test", "0.8.0")
+    assert cache.get_server_version("http://grobid.test") == "0.8.0"
+
+
+def test_get_default_cache(monkeypatch, tmp_path):
+    monkeypatch.setattr(config, "GROBID_CACHE_PATH", tmp_path.joinpath("c.sqlite3"))
+
+    monkeypatch.setattr(config, "GROBID_CACHE_MAX_BYTES", 0)
+    assert get_default_cache() is None
+
+    monkeypatch.setattr(config, "GROBID_CACHE_MAX_BYTES", 1024)
+    assert get_default_cache().filepath == tmp_path.joinpath("c.sqlite3")
+
+    # test: configure a path where the cache cannot be created
+    # expect: the cache is disabled
+    tmp_path.joinpath("file").write_text("not a directory")
+    monkeypatch.setattr(
+        config, "GROBID_CACHE_PATH", tmp_path.joinpath("file", "c.sqlite3")
+    )
+    assert get_default_cache() is None
@@ -1,12 +1,22 @@
+import asyncio
 import json
 import os
 from datetime import date
 from pathlib import Path
 from uuid import uuid4
 
+import pypdf
+import pytest
 from sidecar import config
 from sidecar.references import ingest, storage
-from sidecar.references.schemas import Author, IngestRequest, IngestStatus, Reference
+from sidecar.references.grobid import GrobidResult
+from sidecar.references.schemas import (
+    Author,
+    IngestRequest,
+    IngestStatus,
+    Reference,
+    ReferencePatch,
+)
 
 
 def _copy_fixture_to_temp_dir(source_path: Path, write_path: Path) -> None:
@@ -24,6 +34,29 @@ def _copy_fixture_to_temp_dir(source_path: Path, write_path: Path) -> None:
         f.write(file_bytes)
 
 
+def _mock_grobid(monkeypatch, fixtures_dir: Path) -> None:
+    # grobid server takes one PDF per request
+    # if grobid successfully parses the file, it responds with TEI XML
+    # if grobid fails to parse the file, it responds with an error code
+    # mock this by responding with the test xml / txt fixtures
+    async def mock_grobid_client_process_file(
+        self, http_client, filepath, semaphore=None
+    ):
+        if filepath.stem == "grobid-fails":
+            fixture = Path(f"{fixtures_dir}/xml/grobid-fails_500.txt")
+            return GrobidResult(
+                filepath=filepath, status_code=500, text=fixture.read_text()
+            )
+        fixture = Path(f"{fixtures_dir}/xml/{filepath.stem}.tei.xml")
+        return GrobidResult(
+            filepath=filepath, status_code=200, text=fixture.read_text()
+        )
+
+    monkeypatch.setattr(
+        ingest.GrobidClient, "process_file", mock_grobid_client_process_file
+    )
+
+
 def test_run_ingest(monkeypatch, tmp_path, fixtures_dir):
     # directories where ingest will write files
     staging_dir = tmp_path.joinpath(".staging")
@@ -38,17 +71,19 @@ def test_run_ingest(monkeypatch, tmp_path, fixtures_dir):
 
     monkeypatch.setattr(config, "UPLOADS_DIR", tmp_path.joinpath("uploads"))
 
-    # grobid server takes an input directory of PDFs
-    # if grobid successfully parses the file, it creates a {pdfname}.tei.xml file
-    # if grobid fails to parse the file, it creates a {pdfname}_{errorcode}.txt file
-    # mock this by copying the test xml to the output directory
-    def mock_grobid_client_process(*args, **kwargs):
-        path = Path(f"{fixtures_dir}/xml/")
-        for file_ in path.glob("*"):
-            write_path = grobid_output_dir.joinpath(file_.name)
-            _copy_fixture_to_temp_dir(file_, write_path)
+    _mock_grobid(monkeypatch, fixtures_dir)
 
-    monkeypatch.setattr(ingest.GrobidClient, "process", mock_grobid_client_process)
+    # record every PDF that is parsed for its text
+    # (PDFs must be parsed in this process for them to be recorded)
+    monkeypatch.setattr(ingest, "INGEST_PDF_WORKERS", 1)
+    parsed_pdfs = []
+
+    class RecordingPdfReader(pypdf.PdfReader):
+        def __init__(self, stream, *args, **kwargs):
+            parsed_pdfs.append(Path(stream).name)
+            super().__init__(stream, *args, **kwargs)
+
+    monkeypatch.setattr(pypdf, "PdfReader", RecordingPdfReader)
 
     pdf_directory = tmp_path.joinpath("uploads")
     response = ingest.run_ingest(IngestRequest(pdf_directory=str(pdf_directory)))
@@ -70,6 +105,12 @@ def test_run_ingest(monkeypatch, tmp_path, fixtures_dir):
     assert len(references[0].contents) > 0
     assert len(references[0].chunks) > 0
 
+    # check that chunks are spans of the text of each page, not copies of it
+    assert "".join(references[0].pages) == references[0].contents
+    for chunk in references[0].chunks:
+        assert chunk.text is None
+        assert references[0].get_chunk_text(chunk) in references[0].contents
+
     # check that test.pdf was parsed correctly
     assert references[1].title == "A Few Useful Things to Know about Machine Learning"
     assert references[1].doi is None
@@ -77,20 +118,413 @@ def test_run_ingest(monkeypatch, tmp_path, fixtures_dir):
     assert references[1].authors[0].full_name == "Pedro Domingos"
     assert references[1].citation_key == "domingos"
 
+    # check that each PDF was only parsed once, even though the text of
+    # grobid failures is used for both `contents` and chunks
+    assert sorted(parsed_pdfs) == ["grobid-fails.pdf", "test.pdf"]
+
     # check that all temporary files were cleaned up ...
+    # and that grobid output was never written to disk
     assert len(os.listdir(staging_dir)) == 0
-    assert len(os.listdir(grobid_output_dir)) == 0
-    assert len(os.listdir(json_storage_dir)) == 1
-
-    # ... except for the references.json file
+    assert not grobid_output_dir.exists()
+    # ... except for the references.json (with its header, metadata index and
+    # chunk indexes) and manifest.json files
+    assert sorted(os.listdir(json_storage_dir)) == [
+        "manifest.json",
+        "references.bm25",
+        "references.header.json",
+        "references.index.json",
+        "references.json",
+        "references.vectors",
+    ]
     references_json_path = json_storage_dir.joinpath("references.json")
-    assert references_json_path.exists()
 
     # references.json should contain the same references in stdout
     with open(references_json_path, "r") as f:
         assert json.load(f) == response.dict()["references"]
 
 
+def test_run_ingest_keeps_grobid_output(monkeypatch, tmp_path, fixtures_dir):
+    for pdf in Path(f"{fixtures_dir}/pdf/").glob("*.pdf"):
+        _copy_fixture_to_temp_dir(pdf, tmp_path.joinpath("uploads", pdf.name))
+    _mock_grobid(monkeypatch, fixtures_dir)
+
+    # stray JSON files in `.storage` should not be mistaken for Grobid output
+    tmp_path.joinpath(".storage").mkdir()
+    tmp_path.joinpath(".storage", "stray.json").write_text("{}")
+
+    pdf_ingestion = ingest.PDFIngestion(
+        input_dir=tmp_path.joinpath("uploads"), keep_grobid_output=True
+    )
+    response = pdf_ingestion.run()
+
+    assert sorted(ref.source_filename for ref in response.references) == [
+        "grobid-fails.pdf",
+        "test.pdf",
+    ]
+    assert sorted(os.listdir(tmp_path.joinpath(".grobid"))) == [
+        "grobid-fails_500.txt",
+        "test.tei.xml",
+    ]
+
+
+def test_run_ingest_resumes_from_journal(monkeypatch, tmp_path, fixtures_dir):
+    uploads_dir = tmp_path.joinpath("uploads")
+    for pdf in Path(f"{fixtures_dir}/pdf/").glob("*.pdf"):
+        _copy_fixture_to_temp_dir(pdf, uploads_dir.joinpath(pdf.name))
+    request = IngestRequest(pdf_directory=str(uploads_dir))
+
+    # test: ingest stops after Grobid has finished one of the files
+    # expect: the finished file is journaled, but no references are saved
+    async def mock_grobid_client_process_file(
+        self, http_client, filepath, semaphore=None
+    ):
+        if filepath.stem == "grobid-fails":
+            await asyncio.sleep(0.05)
+            raise RuntimeError("sidecar stopped")
+        fixture = Path(f"{fixtures_dir}/xml/{filepath.stem}.tei.xml")
+        return GrobidResult(
+            filepath=filepath, status_code=200, text=fixture.read_text()
+        )
+
+    monkeypatch.setattr(
+        ingest.GrobidClient, "process_file", mock_grobid_client_process_file
+    )
+    with pytest.raises(RuntimeError):
+        ingest.run_ingest(request)
+
+    assert not tmp_path.joinpath(".storage", "references.json").exists()
+    journal_path = tmp_path.joinpath(".storage", "journal.jsonl")
+    assert journal_path.exists()
+
+    # test: ingest again
+    # expect: only the unfinished file is sent to Grobid
+    grobid_calls = []
+
+    async def record_grobid_call(self, http_client, filepath, semaphore=None):
+        grobid_calls.append(filepath.name)
+        return GrobidResult(filepath=filepath, status_code=500, text="error")
+
+    monkeypatch.setattr(ingest.GrobidClient, "process_file", record_grobid_call)
+    response = ingest.run_ingest(request)
+
+    assert grobid_calls == ["grobid-fails.pdf"]
+    references = sorted(response.references, key=lambda x: x.source_filename)
+    assert [ref.source_filename for ref in references] == [
+        "grobid-fails.pdf",
+        "test.pdf",
+    ]
+    assert references[1].title == "A Few Useful Things to Know about Machine Learning"
+    assert len(references[1].chunks) > 0
+
+    # journal is removed once references are saved
+    assert not journal_path.exists()
+    assert list(tmp_path.joinpath(".staging").iterdir()) == []
+
+
+def test_run_ingest_commits_finished_references(monkeypatch, tmp_path, fixtures_dir):
+    monkeypatch.setattr(ingest, "INGEST_COMMIT_INTERVAL", 0)
+    monkeypatch.setattr(ingest, "INGEST_PDF_WORKERS", 1)
+    _mock_grobid(monkeypatch, fixtures_dir)
+
+    uploads_dir = tmp_path.joinpath("uploads")
+    for pdf in Path(f"{fixtures_dir}/pdf/").glob("*.pdf"):
+        _copy_fixture_to_temp_dir(pdf, uploads_dir.joinpath(pdf.name))
+
+    # test: ingest stops after the first file has been chunked
+    # expect: the finished file is already in storage
+    class StopAfterFirstFile(ingest.IngestProgress):
+        finished = 0
+
+        def update_file(self, filename, stage, status=IngestStatus.PROCESSING):
+            if stage == ingest.IngestStage.DONE:
+                self.finished += 1
+
+        def raise_if_cancelled(self):
+            if self.finished:
+                raise ingest.IngestCancelled()
+
+    pdf_ingestion = ingest.PDFIngestion(
+        input_dir=uploads_dir, progress=StopAfterFirstFile()
+    )
+    with pytest.raises(ingest.IngestCancelled):
+        pdf_ingestion.run()
+
+    storage.storage_cache.clear()
+    stored = storage.get_storage(tmp_path.joinpath(".storage"))
+    stored.load()
+    assert [ref.source_filename for ref in stored.references] == ["grobid-fails.pdf"]
+    assert len(stored.references[0].chunks) > 0
+
+    # test: ingest again
+    # expect: the unfinished file is resumed from the journal, and the
+    # finished file is not ingested again
+    async def fail_grobid_call(self, http_client, filepath, semaphore=None):
+        raise AssertionError(f"{filepath.name} sent to Grobid")
+
+    monkeypatch.setattr(ingest.GrobidClient, "process_file", fail_grobid_call)
+    response = ingest.run_ingest(IngestRequest(pdf_directory=str(uploads_dir)))
+
+    assert [ref.source_filename for ref in response.references] == [
+        "grobid-fails.pdf",
+        "test.pdf",
+    ]
+    assert response.references[0].id == stored.references[0].id
+    assert not tmp_path.joinpath(".storage", "journal.jsonl").exists()
+
+
+def test_run_ingest_uses_grobid_cache(monkeypatch, tmp_path, fixtures_dir):
+    monkeypatch.setattr(config, "GROBID_CACHE_PATH", tmp_path.joinpath("cache.db"))
+    monkeypatch.setattr(config, "GROBID_CACHE_MAX_BYTES", 1024 * 1024)
+
+    grobid_calls = []
+
+    async def mock_grobid_client_get_version(self):
+        return "0.7.3"
+
+    async def mock_grobid_client_process_file(
+        self, http_client, filepath, semaphore=None
+    ):
+        grobid_calls.append(filepath.name)
+        fixture = Path(f"{fixtures_dir}/xml/test.tei.xml")
+        return GrobidResult(
+            filepath=filepath, status_code=200, text=fixture.read_text()
+        )
+
+    monkeypatch.setattr(
+        ingest.GrobidClient, "get_version", mock_grobid_client_get_version
+    )
+    monkeypatch.setattr(
+        ingest.GrobidClient, "process_file", mock_grobid_client_process_file
+    )
+
+    # test: upload the same PDF to two projects
+    # expect: Grobid is only called for the first project
+    responses = []
+    for project in ["project1", "project2"]:
+        uploads_dir = tmp_path.joinpath(project, "uploads")
+        tmp_path.joinpath(project).mkdir()
+        _copy_fixture_to_temp_dir(
+            Path(f"{fixtures_dir}/pdf/test.pdf"), uploads_dir.joinpath("test.pdf")
+        )
+        request = IngestRequest(pdf_directory=str(uploads_dir))
+        responses.append(ingest.run_ingest(request))
+
+    assert grobid_calls == ["test.pdf"]
+    assert responses[0].references[0].title == responses[1].references[0].title
+    assert responses[1].references[0].status == IngestStatus.COMPLETE
+
+
+def test_run_ingest_with_sqlite_storage(monkeypatch, tmp_path, fixtures_dir):
+    monkeypatch.setattr(config, "REFERENCES_STORAGE_BACKEND", "sqlite")
+    _mock_grobid(monkeypatch, fixtures_dir)
+
+    uploads_dir = tmp_path.joinpath("uploads")
+    for pdf in Path(f"{fixtures_dir}/pdf/").glob("*.pdf"):
+        _copy_fixture_to_temp_dir(pdf, uploads_dir.joinpath(pdf.name))
+
+    response = ingest.run_ingest(IngestRequest(pdf_directory=str(uploads_dir)))
+
+    assert tmp_path.joinpath(".storage", "references.sqlite3").exists()
+    assert not tmp_path.joinpath(".storage", "references.json").exists()
+
+    store = storage.get_storage(tmp_path.joinpath(".storage"))
+    store.load()
+    assert store.references == response.references
+
+
+def test_run_ingest_with_worker_processes(monkeypatch, tmp_path, fixtures_dir):
+    _mock_grobid(monkeypatch, fixtures_dir)
+
+    # record how worker processes are started
+    start_methods = []
+
+    class RecordingExecutor(ingest.ProcessPoolExecutor):
+        def __init__(self, *args, mp_context=None, **kwargs):
+            start_methods.append(mp_context.get_start_method())
+            super().__init__(*args, mp_context=mp_context, **kwargs)
+
+    monkeypatch.setattr(ingest, "ProcessPoolExecutor", RecordingExecutor)
+
+    def ingest_fixtures(project_dir: Path, max_workers: int) -> list[Reference]:
+        for pdf in Path(f"{fixtures_dir}/pdf/").glob("*.pdf"):
+            _copy_fixture_to_temp_dir(pdf, project_dir.joinpath("uploads", pdf.name))
+        pdf_ingestion = ingest.PDFIngestion(
+            input_dir=project_dir.joinpath("uploads"), max_workers=max_workers
+        )
+        return pdf_ingestion.run().references
+
+    # test: extract and chunk PDFs in worker processes
+    # expect: the same references, in the same order, as in a single process
+    tmp_path.joinpath("single").mkdir()
+    tmp_path.joinpath("pool").mkdir()
+    single = ingest_fixtures(tmp_path.joinpath("single"), max_workers=1)
+    pool = ingest_fixtures(tmp_path.joinpath("pool"), max_workers=2)
+
+    exclude = {"id"}
+    assert [ref.dict(exclude=exclude) for ref in pool] == [
+        ref.dict(exclude=exclude) for ref in single
+    ]
+    assert all(len(ref.chunks) > 0 for ref in pool)
+    # workers are not forked from the (multithreaded) server
+    assert start_methods == ["spawn"]
+
+
+def test_run_ingest_uses_content_hashes(monkeypatch, tmp_path, fixtures_dir):
+    uploads_dir = tmp_path.joinpath("uploads")
+    _copy_fixture_to_temp_dir(
+        Path(f"{fixtures_dir}/pdf/test.pdf"), uploads_dir.joinpath("test.pdf")
+    )
+    monkeypatch.setattr(config, "UPLOADS_DIR", uploads_dir)
+
+    grobid_calls = []
+
+    async def mock_grobid_client_process_file(
+        self, http_client, filepath, semaphore=None
+    ):
+        grobid_calls.append(filepath.name)
+        fixture = Path(f"{fixtures_dir}/xml/test.tei.xml")
+        return GrobidResult(
+            filepath=filepath, status_code=200, text=fixture.read_text()
+        )
+
+    monkeypatch.setattr(
+        ingest.GrobidClient, "process_file", mock_grobid_client_process_file
+    )
+    request = IngestRequest(pdf_directory=str(uploads_dir))
+
+    response = ingest.run_ingest(request)
+    assert grobid_calls == ["test.pdf"]
+    assert len(response.references) == 1
+    original = response.references[0]
+
+    # test: ingest again without any new uploads
+    # expect: unchanged files are not sent to Grobid again
+    response = ingest.run_ingest(request)
+    assert grobid_calls == ["test.pdf"]
+    assert [ref.id for ref in response.references] == [original.id]
+
+    # test: upload the same PDF under a different name
+    # expect: the duplicate gets its own Reference without calling Grobid
+    _copy_fixture_to_temp_dir(
+        Path(f"{fixtures_dir}/pdf/test.pdf"), uploads_dir.joinpath("renamed.pdf")
+    )
+    response = ingest.run_ingest(request)
+    assert grobid_calls == ["test.pdf"]
+    assert len(response.references) == 2
+
+    duplicate = [r for r in response.references if r.source_filename == "renamed.pdf"]
+    assert len(duplicate) == 1
+    assert duplicate[0].id != original.id
+    assert duplicate[0].title == original.title
+    assert duplicate[0].citation_key == "domingosa"
+    assert len(duplicate[0].chunks) == len(original.chunks)
+    for chunk in duplicate[0].chunks:
+        assert chunk.metadata["source_filename"] == "renamed.pdf"
+
+    # test: replace an uploaded PDF with different contents under the same name
+    # expect: the file is ingested again and replaces its previous Reference
+    _copy_fixture_to_temp_dir(
+        Path(f"{fixtures_dir}/pdf/grobid-fails.pdf"), uploads_dir.joinpath("test.pdf")
+    )
+    response = ingest.run_ingest(request)
+    assert grobid_calls == ["test.pdf", "test.pdf"]
+    assert len(response.references) == 2
+
+    replaced = [r for r in response.references if r.source_filename == "test.pdf"]
+    assert len(replaced) == 1
+    assert replaced[0].id != original.id
+
+
+def test_run_ingest_copies_replaced_upload_for_duplicate(
+    monkeypatch, tmp_path, fixtures_dir
+):
+    uploads_dir = tmp_path.joinpath("uploads")
+    _copy_fixture_to_temp_dir(
+        Path(f"{fixtures_dir}/pdf/test.pdf"), uploads_dir.joinpath("test.pdf")
+    )
+    monkeypatch.setattr(config, "UPLOADS_DIR", uploads_dir)
+
+    # Grobid parses the first file it is sent, and fails on any others
+    grobid_calls = []
+
+    async def mock_grobid_client_process_file(
+        self, http_client, filepath, semaphore=None
+    ):
+        grobid_calls.append(filepath.name)
+        if len(grobid_calls) > 1:
+            return GrobidResult(filepath=filepath, status_code=500, text="error")
+        fixture = Path(f"{fixtures_dir}/xml/test.tei.xml")
+        return GrobidResult(
+            filepath=filepath, status_code=200, text=fixture.read_text()
+        )
+
+    monkeypatch.setattr(
+        ingest.GrobidClient, "process_file", mock_grobid_client_process_file
+    )
+    request = IngestRequest(pdf_directory=str(uploads_dir))
+    original = ingest.run_ingest(request).references[0]
+
+    # test: replace an uploaded PDF, and upload its previous contents under
+    # another name, at the same time
+    # expect: the new upload gets a copy of the replaced Reference
+    _copy_fixture_to_temp_dir(
+        Path(f"{fixtures_dir}/pdf/test.pdf"), uploads_dir.joinpath("renamed.pdf")
+    )
+    _copy_fixture_to_temp_dir(
+        Path(f"{fixtures_dir}/pdf/grobid-fails.pdf"), uploads_dir.joinpath("test.pdf")
+    )
+    response = ingest.run_ingest(request)
+    assert grobid_calls == ["test.pdf", "test.pdf"]
+
+    refs = {ref.source_filename: ref for ref in response.references}
+    assert sorted(refs) == ["renamed.pdf", "test.pdf"]
+    assert refs["test.pdf"].status == IngestStatus.FAILURE
+    assert refs["renamed.pdf"].status == IngestStatus.COMPLETE
+    assert refs["renamed.pdf"].title == original.title
+    assert refs["renamed.pdf"].id != original.id
+
+
+def test_run_ingest_keeps_concurrent_updates(monkeypatch, tmp_path, fixtures_dir):
+    uploads_dir = tmp_path.joinpath("uploads")
+    storage_dir = tmp_path.joinpath(".storage")
+    _copy_fixture_to_temp_dir(
+        Path(f"{fixtures_dir}/pdf/test.pdf"), uploads_dir.joinpath("test.pdf")
+    )
+    monkeypatch.setattr(config, "UPLOADS_DIR", uploads_dir)
+    _mock_grobid(monkeypatch, fixtures_dir)
+    request = IngestRequest(pdf_directory=str(uploads_dir))
+
+    original = ingest.run_ingest(request).references[0]
+
+    # update the existing Reference while a new upload is sent to Grobid
+    mock_process_file = ingest.GrobidClient.process_file
+
+    async def process_file_and_update(self, http_client, filepath, semaphore=None):
+        patch = ReferencePatch(data={"citation_key": "updated"})
+        storage.load_storage(storage_dir).update(original.id, patch)
+        return await mock_process_file(self, http_client, filepath, semaphore)
+
+    monkeypatch.setattr(ingest.GrobidClient, "process_file", process_file_and_update)
+    _copy_fixture_to_temp_dir(
+        Path(f"{fixtures_dir}/pdf/grobid-fails.pdf"),
+        uploads_dir.joinpath("grobid-fails.pdf"),
+    )
+    response = ingest.run_ingest(request)
+
+    # the update is not overwritten by the References that ingest loaded
+    refs = {ref.source_filename: ref for ref in response.references}
+    assert refs["test.pdf"].citation_key == "updated"
+    assert "grobid-fails.pdf" in refs
+
+    storage.storage_cache.flush()
+    jstore = storage.JsonStorage(storage_dir.joinpath("references.json"))
+    jstore.load()
+    assert {ref.source_filename: ref.citation_key for ref in jstore.references} == {
+        "test.pdf": "updated",
+        "grobid-fails.pdf": "untitled",
+    }
+
+
 def test_ingest_add_citation_keys(monkeypatch, tmp_path):
     ingestion = ingest.PDFIngestion(input_dir=tmp_path)
 
@@ -319,13 +753,11 @@ def test_ingest_get_statuses(monkeypatch, fixtures_dir):
         Path("not_yet_processed.pdf"),  # not in mock_reference -> `processing`
     ]
 
-    def mock_storage_load(*args, **kwargs):
-        # do nothing since we also mock references propery
-        pass
+    def mock_storage_iter_references(*args, **kwargs):
+        return iter(mock_references)
 
     jstore = storage.JsonStorage("to_be_mocked.json")
-    monkeypatch.setattr(jstore, "load", mock_storage_load)
-    monkeypatch.setattr(jstore, "references", mock_references)
+    monkeypatch.setattr(jstore, "iter_references", mock_storage_iter_references)
 
     fetcher = ingest.IngestStatusFetcher(storage=jstore)
     monkeypatch.setattr(fetcher, "uploads", mock_uploads)
@@ -344,12 +776,30 @@ def test_ingest_get_statuses(monkeypatch, fixtures_dir):
         else:
             ref.status == "processing"
 
+    # test: statuses from storage that has been loaded
+    # expect: uploads are looked up by filename, without reading the file
+    loaded = storage.JsonStorage("not_read.json")
+    loaded.references = mock_references
+    loaded_fetcher = ingest.IngestStatusFetcher(storage=loaded, loaded=True)
+    monkeypatch.setattr(loaded_fetcher, "uploads", mock_uploads)
+
+    response = loaded_fetcher.emit_statuses()
+
+    assert response.status == "ok"
+    assert [(s.source_filename, s.status) for s in response.reference_statuses] == [
+        ("completed.pdf", IngestStatus.COMPLETE),
+        ("failed.pdf", IngestStatus.FAILURE),
+        ("not_yet_processed.pdf", IngestStatus.PROCESSING),
+    ]
+
     # test: Exception on storage load should return error status
     # expect: response status = error, ref statuses = []
-    def mock_storage_load_raises_exception(*args, **kwargs):
+    def mock_storage_iter_references_raises_exception(*args, **kwargs):
         raise Exception
 
-    monkeypatch.setattr(jstore, "load", mock_storage_load_raises_exception)
+    monkeypatch.setattr(
+        jstore, "iter_references", mock_storage_iter_references_raises_exception
+    )
     response = fetcher.emit_statuses()
 
     statuses = response.reference_statuses
@@ -0,0 +1,53 @@
+import numpy as np
+from sidecar.references.ivf import InvertedLists
+
+
+def _clustered_vectors(num_clusters: int, size: int, dim: int = 16) -> np.ndarray:
+    rng = np.random.default_rng(0)
+    centers = rng.normal(size=(num_clusters, dim))
+    vectors = np.repeat(centers, size, axis=0) + 0.05 * rng.normal(
+        size=(num_clusters * size, dim)
+    )
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors.astype(np.float32)
+
+
+def test_train():
+    vectors = _clustered_vectors(num_clusters=4, size=100)
+    lists = InvertedLists.train(vectors)
+
+    assert len(lists) == 20
+    assert lists.offsets[0] == 0 and lists.offsets[-1] == 400
+    # every vector is listed once, under its nearest centroid
+    assert sorted(lists.docs) == list(range(400))
+    for i in range(len(lists)):
+        docs = lists.docs[lists.offsets[i] : lists.offsets[i + 1]]
+        assert list(docs) == sorted(docs)
+        assert (np.argmax(vectors[docs] @ lists.centroids.T, axis=1) == i).all()
+    # vectors of different clusters are not listed together
+    nearest = np.argmax(vectors @ lists.centroids.T, axis=1)
+    clusters = [set(nearest[i : i + 100]) for i in range(0, 400, 100)]
+    assert sum(len(c) for c in clusters) == len(set.union(*clusters))
+
+    # training is deterministic
+    assert np.array_equal(InvertedLists.train(vectors).docs, lists.docs)
+
+
+def test_probe():
+    vectors = _clustered_vectors(num_clusters=4, size=100)
+    lists = InvertedLists.train(vectors)
+    queries = vectors[[0, 150]]
+
+    # test: probe one list
+    # expect: the block of the list nearest to each query
+    probed = lists.probe(queries, nprobe=1)
+    for query, blocks in zip(queries, probed):
+        [block] = blocks
+        nearest = np.argmax(lists.centroids @ query)
+        assert (block.start, block.stop) == tuple(lists.offsets[nearest : nearest + 2])
+
+    # test: probe more lists than there are
+    # expect: every list, in order
+    for blocks in lists.probe(queries, nprobe=100):
+        assert len(blocks) == len(lists)
+        assert [block.start for block in blocks] == list(lists.offsets[:-1])
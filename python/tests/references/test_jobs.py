@@ -0,0 +1,116 @@
+import threading
+import time
+from pathlib import Path
+
+from sidecar.references import ingest, jobs
+from sidecar.references.grobid import GrobidResult
+
+from ..helpers import _copy_fixture_to_temp_dir
+
+
+def _setup_uploads(tmp_path, fixtures_dir) -> Path:
+    uploads_dir = tmp_path.joinpath("uploads")
+    for pdf in Path(f"{fixtures_dir}/pdf/").glob("*.pdf"):
+        _copy_fixture_to_temp_dir(pdf, uploads_dir.joinpath(pdf.name))
+    return uploads_dir
+
+
+def _wait_until_finished(job: jobs.IngestJob, timeout: float = 10):
+    deadline = time.monotonic() + timeout
+    while not job.is_finished and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert job.is_finished
+
+
+def test_ingest_job_manager_runs_job(monkeypatch, tmp_path, fixtures_dir):
+    uploads_dir = _setup_uploads(tmp_path, fixtures_dir)
+    release = threading.Event()
+
+    async def mock_grobid_client_process_file(
+        self, http_client, filepath, semaphore=None
+    ):
+        release.wait(timeout=10)
+        fixture = Path(f"{fixtures_dir}/xml/test.tei.xml")
+        return GrobidResult(
+            filepath=filepath, status_code=200, text=fixture.read_text()
+        )
+
+    monkeypatch.setattr(
+        ingest.GrobidClient, "process_file", mock_grobid_client_process_file
+    )
+    manager = jobs.IngestJobManager(max_workers=1)
+
+    # test: submit an ingest job
+    # expect: job is returned right away, before ingest has finished
+    job = manager.submit("project1", uploads_dir)
+    assert not job.is_finished
+    assert manager.get(job.job_id) is job
+
+    # test: submit another ingest job for the same project while it is running
+    # expect: the running job is returned instead of starting a new one
+    assert manager.submit("project1", uploads_dir) is job
+
+    release.set()
+    _wait_until_finished(job)
+
+    # expect: per-file progress is reported for every uploaded file
+    response = job.to_response()
+    assert response.status == "completed"
+    assert response.stage == "done"
+    assert response.files_total == 2
+    assert response.files_done == 2
+    assert {f.source_filename for f in response.files} == {
+        "test.pdf",
+        "grobid-fails.pdf",
+    }
+    assert tmp_path.joinpath(".storage", "references.json").exists()
+
+    # test: submit an ingest job once the previous one has finished
+    # expect: a new job is started
+    new_job = manager.submit("project1", uploads_dir)
+    assert new_job is not job
+    _wait_until_finished(new_job)
+
+
+def test_ingest_job_cancel(monkeypatch, tmp_path, fixtures_dir):
+    uploads_dir = _setup_uploads(tmp_path, fixtures_dir)
+    started = threading.Event()
+    release = threading.Event()
+
+    async def mock_grobid_client_process_file(
+        self, http_client, filepath, semaphore=None
+    ):
+        started.set()
+        release.wait(timeout=10)
+        return GrobidResult(filepath=filepath, status_code=500, text="error")
+
+    monkeypatch.setattr(
+        ingest.GrobidClient, "process_file", mock_grobid_client_process_file
+    )
+    manager = jobs.IngestJobManager(max_workers=1)
+
+    job = manager.submit("project1", uploads_dir)
+    assert started.wait(timeout=10)
+
+    # test: cancel a running job
+    # expect: job stops without saving references or leaving temporary files
+    job.cancel()
+    release.set()
+    _wait_until_finished(job)
+
+    assert job.to_response().status == "cancelled"
+    assert not tmp_path.joinpath(".storage", "references.json").exists()
+    assert list(tmp_path.joinpath(".staging").iterdir()) == []
+    assert not tmp_path.joinpath(".grobid").exists()
+
+
+def test_ingest_job_cancel_before_start(tmp_path):
+    job = jobs.IngestJob(project_id="project1", uploads_dir=tmp_path)
+
+    # test: cancel a job that has not started yet
+    # expect: job is cancelled and never runs ingest
+    job.cancel()
+    assert job.to_response().status == "cancelled"
+
+    job.run()
+    assert job.to_response().status == "cancelled"
@@ -0,0 +1,77 @@
+from uuid import uuid4
+
+from sidecar.references.journal import IngestJournal
+from sidecar.references.schemas import Reference
+
+
+def _create_reference(source_filename: str) -> Reference:
+    return Reference(
+        id=str(uuid4()),
+        source_filename=source_filename,
+        status="complete",
+        title="Some title",
+        published_date="2021-01-01",
+    )
+
+
+def test_ingest_journal(tmp_path):
+    filepath = tmp_path.joinpath("journal.jsonl")
+    ref = _create_reference("a.pdf")
+
+    journal = IngestJournal(filepath)
+    journal.load()
+    journal.append("hash-a", ref)
+
+    # test: load a journal written by an earlier ingest
+    # expect: References are returned only for files with the same contents
+    journal = IngestJournal(filepath)
+    journal.load()
+    assert journal.get_reference("a.pdf", "hash-a") == ref
+    assert journal.get_reference("a.pdf", "changed") is None
+    assert journal.get_reference("b.pdf", "hash-a") is None
+
+    # test: clear the journal
+    # expect: the journal file is removed
+    journal.clear()
+    assert not filepath.exists()
+    assert journal.get_reference("a.pdf", "hash-a") is None
+
+
+def test_ingest_journal_skips_partially_written_entries(tmp_path):
+    filepath = tmp_path.joinpath("journal.jsonl")
+    journal = IngestJournal(filepath)
+    journal.append("hash-a", _create_reference("a.pdf"))
+    journal.append("hash-b", _create_reference("b.pdf"))
+
+    # simulate the sidecar stopping while the last entry was being written
+    contents = filepath.read_text()
+    filepath.write_text(contents[: len(contents) - 20])
+
+    journal = IngestJournal(filepath)
+    journal.load()
+    assert journal.get_reference("a.pdf", "hash-a") is not None
+    assert journal.get_reference("b.pdf", "hash-b") is None
+
+
+def test_ingest_journal_appends_after_partially_written_entries(tmp_path):
+    filepath = tmp_path.joinpath("journal.jsonl")
+    journal = IngestJournal(filepath)
+    journal.append("hash-a", _create_reference("a.pdf"))
+    journal.append("hash-b", _create_reference("b.pdf"))
+
+    # simulate the sidecar stopping while the last entry was being written
+    contents = filepath.read_text()
+    filepath.write_text(contents[: len(contents) - 20])
+
+    # test: resume, journaling another Reference, and load the journal again
+    # expect: the new entry is not merged into the partially written one
+    journal = IngestJournal(filepath)
+    journal.load()
+    ref = _create_reference("c.pdf")
+    journal.append("hash-c", ref)
+
+    journal = IngestJournal(filepath)
+    journal.load()
+    assert journal.get_reference("a.pdf", "hash-a") is not None
+    assert journal.get_reference("b.pdf", "hash-b") is None
+    assert journal.get_reference("c.pdf", "hash-c") == ref
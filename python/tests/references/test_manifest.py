@@ -0,0 +1,70 @@
+import hashlib
+import os
+
+from sidecar.references import manifest
+
+
+def test_hash_file(tmp_path):
+    filepath = tmp_path.joinpath("file.pdf")
+    filepath.write_bytes(b"some pdf bytes")
+
+    assert manifest.hash_file(filepath) == hashlib.sha256(b"some pdf bytes").hexdigest()
+
+
+def test_ingest_manifest_get_hash(monkeypatch, tmp_path):
+    filepath = tmp_path.joinpath("file.pdf")
+    filepath.write_bytes(b"some pdf bytes")
+
+    m = manifest.IngestManifest(tmp_path.joinpath("manifest.json"))
+    m.load()
+
+    # test: file has not been seen before
+    # expect: file is hashed and recorded
+    assert not m.is_unchanged(filepath)
+    sha256 = m.get_hash(filepath)
+    assert m.get_recorded_hash("file.pdf") == sha256
+    assert m.is_unchanged(filepath)
+
+    # test: file size and mtime are unchanged
+    # expect: file is not read again
+    def mock_hash_file(*args, **kwargs):
+        raise AssertionError("file should not be read")
+
+    monkeypatch.setattr(manifest, "hash_file", mock_hash_file)
+    assert m.get_hash(filepath) == sha256
+    monkeypatch.undo()
+
+    # test: file contents change
+    # expect: file is hashed again
+    filepath.write_bytes(b"other pdf bytes")
+    os.utime(filepath, ns=(0, 0))
+    assert not m.is_unchanged(filepath)
+    assert m.get_hash(filepath) == hashlib.sha256(b"other pdf bytes").hexdigest()
+
+
+def test_ingest_manifest_save_and_load(tmp_path):
+    filepath = tmp_path.joinpath("file.pdf")
+    filepath.write_bytes(b"some pdf bytes")
+    other_filepath = tmp_path.joinpath("other.pdf")
+    other_filepath.write_bytes(b"other pdf bytes")
+
+    m = manifest.IngestManifest(tmp_path.joinpath("manifest.json"))
+    sha256 = m.get_hash(filepath)
+    m.get_hash(other_filepath)
+
+    # test: entries for removed files are pruned before saving
+    m.prune({"file.pdf"})
+    m.save()
+
+    loaded = manifest.IngestManifest(tmp_path.joinpath("manifest.json"))
+    loaded.load()
+    assert loaded.get_recorded_hash("file.pdf") == sha256
+    assert loaded.get_recorded_hash("other.pdf") is None
+    assert loaded.is_unchanged(filepath)
+
+    # test: unreadable manifest
+    # expect: treated as empty
+    tmp_path.joinpath("manifest.json").write_text("not json")
+    loaded = manifest.IngestManifest(tmp_path.joinpath("manifest.json"))
+    loaded.load()
+    assert loaded.files == {}
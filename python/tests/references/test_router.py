@@ -1,10 +1,15 @@
+import time
+from datetime import date
 from pathlib import Path
 
 from fastapi.testclient import TestClient
 from sidecar import config
 from sidecar.api import api
+from sidecar.projects import service as projects_service
 from sidecar.projects.service import create_project, delete_project
-from sidecar.references.storage import JsonStorage
+from sidecar.references import ingest
+from sidecar.references.grobid import GrobidResult
+from sidecar.references.storage import JsonStorage, storage_cache
 
 from ..helpers import _copy_fixture_to_temp_dir
 
@@ -50,6 +55,75 @@ def test_list_references_should_return_references(monkeypatch, tmp_path, fixture
     assert len(response.json()) != 0
 
 
+def test_list_reference_summaries(monkeypatch, tmp_path, fixtures_dir):
+    user_id = "user1"
+    project_id = "project1"
+
+    monkeypatch.setattr(projects_service, "WEB_STORAGE_URL", tmp_path)
+    project_path = create_project(user_id, project_id, project_name="foo")
+
+    # test: list summaries before any references have been ingested
+    # expect: an empty page
+    response = client.get(f"/api/references/{project_id}/summaries")
+    assert response.status_code == 200
+    assert response.json() == {"total": 0, "offset": 0, "references": []}
+
+    mocked_path = project_path / ".storage" / "references.json"
+    test_file = f"{fixtures_dir}/data/references.json"
+    path_to_test_file = Path(__file__).parent.joinpath(test_file)
+    _copy_fixture_to_temp_dir(path_to_test_file, mocked_path)
+
+    jstore = JsonStorage(filepath=mocked_path)
+    jstore.load()
+
+    # test: list a page of summaries with only some fields, sorted by title
+    # expect: only `id` and the requested fields are returned
+    response = client.get(
+        f"/api/references/{project_id}/summaries",
+        params={
+            "fields": ["title", "authors"],
+            "sort": "title",
+            "order": "desc",
+            "limit": 1,
+        },
+    )
+    assert response.status_code == 200
+    assert response.json() == {
+        "total": 2,
+        "offset": 0,
+        "references": [
+            {
+                "id": jstore.references[0].id,
+                "title": "Some title",
+                "authors": [a.dict() for a in jstore.references[0].authors],
+            }
+        ],
+    }
+
+    # test: request an unknown field
+    # expect: the request is rejected
+    response = client.get(
+        f"/api/references/{project_id}/summaries", params={"fields": ["chunks"]}
+    )
+    assert response.status_code == 422
+
+    # test: list summaries right after editing a reference, before the edit
+    # would be written to disk
+    # expect: the edit is listed
+    monkeypatch.setattr(config, "STORAGE_WRITE_DELAY", 60)
+    # saving writes the metadata index the summaries are read from
+    jstore.save()
+    ref_id = jstore.references[0].id
+    patch = {"data": {"title": "Edited"}}
+    response = client.patch(f"/api/references/{project_id}/{ref_id}", json=patch)
+    assert response.json()["status"] == "ok"
+
+    response = client.get(
+        f"/api/references/{project_id}/summaries", params={"fields": ["title"]}
+    )
+    assert response.json()["references"][0] == {"id": ref_id, "title": "Edited"}
+
+
 def test_get_reference(monkeypatch, tmp_path, fixtures_dir):
     user_id = "user1"
     project_id = "project1"
@@ -103,6 +177,9 @@ def test_references_update(monkeypatch, tmp_path, fixtures_dir):
     assert response.status_code == 200
     assert response.json()["status"] == "ok"
 
+    # updates are written to disk after a short delay
+    storage_cache.flush()
+
     # reload from `mocked_path` to check that the update was successful
     jstore = JsonStorage(filepath=mocked_path)
     jstore.load()
@@ -111,6 +188,89 @@ def test_references_update(monkeypatch, tmp_path, fixtures_dir):
     assert jstore.references[0].citation_key == "reda2023"
 
 
+def test_references_update_published_date(monkeypatch, tmp_path, fixtures_dir):
+    user_id = "user1"
+    project_id = "project1"
+
+    monkeypatch.setattr(config, "WEB_STORAGE_URL", tmp_path)
+    project_path = create_project(user_id, project_id, project_name="foo")
+    mocked_path = project_path / ".storage" / "references.json"
+
+    test_file = f"{fixtures_dir}/data/references.json"
+    path_to_test_file = Path(__file__).parent.joinpath(test_file)
+
+    _copy_fixture_to_temp_dir(path_to_test_file, mocked_path)
+
+    jstore = JsonStorage(filepath=mocked_path)
+    jstore.load()
+    ids = [ref.id for ref in jstore.references]
+
+    # test: patch a date as a string, as the frontend sends it
+    # expect: it is parsed as a date, and the references can still be saved
+    patch = {"data": {"published_date": "2021-02-03"}}
+    response = client.patch(f"/api/references/{project_id}/{ids[0]}", json=patch)
+    assert response.status_code == 200
+    assert response.json()["status"] == "ok"
+
+    response = client.delete(f"/api/references/{project_id}/{ids[1]}")
+    assert response.status_code == 200
+    assert response.json()["status"] == "ok"
+
+    jstore = JsonStorage(filepath=mocked_path)
+    jstore.load()
+    assert [ref.id for ref in jstore.references] == ids[:1]
+    assert jstore.references[0].published_date == date(2021, 2, 3)
+
+    # test: patch a date that is not valid
+    # expect: an error, and no update
+    patch = {"data": {"published_date": "not a date"}}
+    response = client.patch(f"/api/references/{project_id}/{ids[0]}", json=patch)
+    assert response.status_code == 200
+    assert response.json()["status"] == "error"
+    response = client.get(f"/api/references/{project_id}/{ids[0]}")
+    assert response.json()["published_date"] == "2021-02-03"
+
+
+def test_references_bulk_update(monkeypatch, tmp_path, fixtures_dir):
+    user_id = "user1"
+    project_id = "project1"
+
+    monkeypatch.setattr(config, "WEB_STORAGE_URL", tmp_path)
+    project_path = create_project(user_id, project_id, project_name="foo")
+    mocked_path = project_path / ".storage" / "references.json"
+
+    # copy references.json to mocked storage path
+    test_file = f"{fixtures_dir}/data/references.json"
+    path_to_test_file = Path(__file__).parent.joinpath(test_file)
+
+    _copy_fixture_to_temp_dir(path_to_test_file, mocked_path)
+
+    jstore = JsonStorage(filepath=mocked_path)
+    jstore.load()
+    ids = [ref.id for ref in jstore.references]
+
+    request = [
+        {"reference_id": ids[0], "patch": {"data": {"citation_key": "reda2023"}}},
+        {"reference_id": ids[1], "patch": {"data": {"citation_key": "doe2023"}}},
+    ]
+    response = client.post(f"/api/references/{project_id}/bulk_update", json=request)
+
+    assert response.status_code == 200
+    assert response.json() == {
+        "status": "ok",
+        "message": "",
+    }
+
+    # updates are written to disk after a short delay
+    storage_cache.flush()
+
+    # reload from `mocked_path` to check that the update was successful
+    jstore = JsonStorage(filepath=mocked_path)
+    jstore.load()
+
+    assert [ref.citation_key for ref in jstore.references] == ["reda2023", "doe2023"]
+
+
 def test_references_bulk_delete(monkeypatch, tmp_path, fixtures_dir):
     user_id = "user1"
     project_id = "project1"
@@ -147,3 +307,57 @@ def test_references_bulk_delete(monkeypatch, tmp_path, fixtures_dir):
 
     # ensure that the reference was deleted
     assert len(jstore.references) == 0
+
+
+def test_ingest_references_runs_in_background(monkeypatch, tmp_path, fixtures_dir):
+    user_id = "user1"
+    project_id = "project1"
+
+    monkeypatch.setattr(projects_service, "WEB_STORAGE_URL", tmp_path)
+    project_path = create_project(user_id, project_id, project_name="foo")
+    _copy_fixture_to_temp_dir(
+        Path(f"{fixtures_dir}/pdf/test.pdf"), project_path / "uploads" / "test.pdf"
+    )
+
+    async def mock_grobid_client_process_file(
+        self, http_client, filepath, semaphore=None
+    ):
+        fixture = Path(f"{fixtures_dir}/xml/test.tei.xml")
+        return GrobidResult(
+            filepath=filepath, status_code=200, text=fixture.read_text()
+        )
+
+    monkeypatch.setattr(
+        ingest.GrobidClient, "process_file", mock_grobid_client_process_file
+    )
+
+    # test: start ingest
+    # expect: an ingest job is returned
+    response = client.post(f"/api/references/{project_id}", json={})
+    assert response.status_code == 200
+    job_id = response.json()["job_id"]
+    assert response.json()["project_id"] == project_id
+
+    # test: poll the ingest job until it has finished
+    # expect: job completes with progress for the uploaded file
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        response = client.get(f"/api/references/{project_id}/jobs/{job_id}")
+        assert response.status_code == 200
+        if response.json()["status"] not in ["queued", "running"]:
+            break
+        time.sleep(0.01)
+
+    job = response.json()
+    assert job["status"] == "completed"
+    assert job["files_total"] == 1
+    assert job["files_done"] == 1
+    assert job["files"][0]["source_filename"] == "test.pdf"
+
+    response = client.get(f"/api/references/{project_id}")
+    assert len(response.json()) == 1
+
+    # test: get an ingest job that does not exist
+    # expect: 404
+    response = client.get(f"/api/references/{project_id}/jobs/does-not-exist")
+    assert response.status_code == 404
@@ -0,0 +1,186 @@
+import io
+import json
+import random
+from array import array
+
+import pytest
+from sidecar.references import serialization
+from sidecar.references.serialization import StorageFormat
+
+
+def _references() -> list[dict]:
+    return [
+        {
+            "id": "ref1",
+            "title": "Some title",
+            "published_date": "2023-01-01",
+            "chunks": [
+                {"text": "first", "vector": [0.5, -1.25, 3.0], "metadata": {}},
+                {"text": "second", "vector": [], "metadata": {"page_num": 1}},
+            ],
+        },
+        {"id": "ref2", "title": None, "chunks": []},
+        {
+            "id": "ref3",
+            "title": "Ünïcode ✓",
+            "chunks": [{"text": "third", "vector": [0.1], "metadata": {}}],
+        },
+    ]
+
+
+@pytest.mark.parametrize(
+    "format, compress",
+    [
+        (StorageFormat.JSON, False),
+        (StorageFormat.COMPACT, False),
+        (StorageFormat.COMPACT, True),
+    ],
+)
+def test_dumps_and_loads(format, compress):
+    raw = serialization.dumps(_references(), format, compress)
+
+    assert serialization.detect_format(raw) == format
+    assert serialization.is_compressed(raw) == compress
+
+    loaded = serialization.loads(raw)
+    expected = _references()
+    # vectors are stored as float32 in the compact format
+    expected[2]["chunks"][0]["vector"] = (
+        [pytest.approx(0.1)] if format == StorageFormat.COMPACT else [0.1]
+    )
+    assert loaded == expected
+
+
+def test_json_format_is_readable():
+    raw = serialization.dumps(_references(), StorageFormat.JSON)
+    # the same pretty-printed JSON as written by older sidecars
+    assert raw == json.dumps(_references(), indent=2).encode("utf8")
+
+
+def test_compact_format_is_smaller():
+    references = [
+        {"id": f"ref{i}", "chunks": [{"vector": [0.123456789] * 64}] * 10}
+        for i in range(10)
+    ]
+    json_size = len(serialization.dumps(references, StorageFormat.JSON))
+    compact = serialization.dumps(references, StorageFormat.COMPACT)
+    compressed = serialization.dumps(references, StorageFormat.COMPACT, compress=True)
+
+    assert len(compact) < json_size / 4
+    assert len(compressed) < len(compact)
+
+
+def test_loads_unsupported_version():
+    raw = bytearray(serialization.dumps(_references(), StorageFormat.COMPACT))
+    raw[len(serialization.MAGIC)] = serialization.VERSION + 1
+
+    with pytest.raises(ValueError):
+        serialization.loads(bytes(raw))
+
+
+@pytest.mark.parametrize(
+    "format, compress",
+    [
+        (StorageFormat.JSON, False),
+        (StorageFormat.COMPACT, False),
+        (StorageFormat.COMPACT, True),
+    ],
+)
+def test_iter_references(monkeypatch, tmp_path, format, compress):
+    # blocks smaller than a reference, so that references span blocks
+    monkeypatch.setattr(serialization, "STREAM_BLOCK_SIZE", 16)
+    filepath = tmp_path.joinpath("references.json")
+    filepath.write_bytes(serialization.dumps(_references(), format, compress))
+    expected = serialization.loads(filepath.read_bytes())
+
+    with open(filepath, "rb") as f:
+        assert list(serialization.iter_references(f)) == expected
+
+    # test: skip chunks
+    # expect: references without chunks, whose later vectors are still unpacked
+    with open(filepath, "rb") as f:
+        refs = list(serialization.iter_references(f, include_chunks=False))
+    assert refs == [{k: v for k, v in ref.items() if k != "chunks"} for ref in expected]
+
+    # test: stop after the first reference
+    with open(filepath, "rb") as f:
+        assert next(serialization.iter_references(f)) == expected[0]
+
+
+def test_iter_references_stops_reading_early(monkeypatch, tmp_path):
+    monkeypatch.setattr(serialization, "STREAM_BLOCK_SIZE", 4096)
+    references = [{"id": f"ref{i}", "text": "x" * 1000} for i in range(1000)]
+    filepath = tmp_path.joinpath("references.json")
+    filepath.write_bytes(serialization.dumps(references))
+
+    with open(filepath, "rb") as f:
+        assert next(serialization.iter_references(f)) == references[0]
+        # only the start of the file has been read
+        assert f.tell() < filepath.stat().st_size / 10
+
+
+class _CountingFile(io.BytesIO):
+    bytes_read = 0
+
+    def read(self, size=-1):
+        data = super().read(size)
+        self.bytes_read += len(data)
+        return data
+
+
+@pytest.mark.parametrize(
+    "compress, include_chunks", [(False, True), (False, False), (True, False)]
+)
+def test_iter_references_compact_stops_reading_early(
+    monkeypatch, compress, include_chunks
+):
+    monkeypatch.setattr(serialization, "STREAM_BLOCK_SIZE", 4096)
+    # random text, which does not compress much
+    rng = random.Random(0)
+    references = [
+        {
+            "id": f"ref{i}",
+            "text": " ".join(str(rng.random()) for _ in range(100)),
+            "chunks": [{"text": "x", "vector": [float(i)] * 100}],
+        }
+        for i in range(1000)
+    ]
+    raw = serialization.dumps(references, StorageFormat.COMPACT, compress)
+
+    f = _CountingFile(raw)
+    ref = next(serialization.iter_references(f, include_chunks=include_chunks))
+    assert ref["id"] == "ref0"
+    if include_chunks:
+        assert ref["chunks"][0]["vector"] == [0.0] * 100
+    # only the start of the JSON, and of the vectors, has been read
+    assert f.bytes_read < len(raw) / 10
+
+
+def test_iter_references_invalid_json(tmp_path):
+    filepath = tmp_path.joinpath("references.json")
+
+    filepath.write_text('[{"id": "ref1"}, {"id": ')
+    with open(filepath, "rb") as f:
+        with pytest.raises(ValueError):
+            list(serialization.iter_references(f))
+
+    filepath.write_text('{"id": "ref1"}')
+    with open(filepath, "rb") as f:
+        with pytest.raises(ValueError):
+            list(serialization.iter_references(f))
+
+
+def test_iter_references_with_vector_lengths_last(tmp_path):
+    # compact files can also have the vector lengths after the references
+    encoded = json.dumps(
+        {"references": [{"id": "ref1", "chunks": [{}]}], "vector_lengths": [2]}
+    ).encode("utf8")
+    body = serialization._LENGTH.pack(len(encoded)) + encoded
+    body += array("f", [1.0, 2.0]).tobytes()
+    filepath = tmp_path.joinpath("references.json")
+    filepath.write_bytes(serialization.MAGIC + bytes([1, 0]) + body)
+
+    with open(filepath, "rb") as f:
+        assert list(serialization.iter_references(f)) == [
+            {"id": "ref1", "chunks": [{"vector": [1.0, 2.0]}]}
+        ]
@@ -1,5 +1,24 @@
-from sidecar.references import storage
-from sidecar.references.schemas import Author, Chunk, Reference, ReferencePatch
+import os
+import shutil
+import weakref
+from datetime import date
+
+import pytest
+
+from sidecar import config
+from sidecar.references import serialization, storage
+from sidecar.references.schemas import (
+    Author,
+    Chunk,
+    Reference,
+    ReferencePatch,
+    ReferenceSummaryField,
+    ReferenceUpdate,
+    SortOrder,
+)
+from sidecar.references.serialization import StorageFormat
+from sidecar.references.vocabulary import tokenize
+from sidecar.shared import chunk_reference
 
 
 def test_json_storage_load(fixtures_dir):
@@ -14,7 +33,13 @@ def test_json_storage_load(fixtures_dir):
     total_chunks = sum([len(ref.chunks) for ref in jstore.references])
     assert len(jstore.corpus) == total_chunks
 
-    assert jstore.tokenized_corpus == [c.lower().split() for c in jstore.corpus]
+    # every token of the chunks is a term of the BM25 index
+    vocabulary = jstore.bm25_index.vocabulary
+    assert all(
+        vocabulary.get(token) is not None
+        for text in jstore.corpus
+        for token in tokenize(text)
+    )
 
     for ref in jstore.references:
         assert isinstance(ref, Reference)
@@ -31,6 +56,156 @@ def test_json_storage_load(fixtures_dir):
             assert isinstance(chunk, Chunk)
 
 
+def test_json_storage_trusted_load(monkeypatch, tmp_path, fixtures_dir):
+    fp = tmp_path.joinpath("references.json")
+    shutil.copy(f"{fixtures_dir}/data/references.json", fp)
+
+    validated = []
+    original_parse_obj = Reference.parse_obj.__func__
+
+    def mock_parse_obj(cls, obj):
+        validated.append(obj["id"])
+        return original_parse_obj(cls, obj)
+
+    monkeypatch.setattr(Reference, "parse_obj", classmethod(mock_parse_obj))
+
+    # test: load a file without a header
+    # expect: every reference is validated, and no header is written
+    jstore = storage.JsonStorage(filepath=fp)
+    jstore.load()
+    assert len(validated) == 2
+    assert not jstore.header_filepath.exists()
+
+    # test: load a file after it has been saved by storage
+    # expect: references are not validated, but are the same as validated ones
+    jstore.references[0].published_date = date(2023, 7, 1)
+    jstore.save()
+    assert jstore.header_filepath.exists()
+    validated.clear()
+
+    trusted = storage.JsonStorage(filepath=fp)
+    trusted.load()
+    assert validated == []
+    assert trusted.references == jstore.references
+    assert trusted.corpus == jstore.corpus
+    for ref in trusted.references:
+        assert isinstance(ref, Reference)
+        assert all(isinstance(author, Author) for author in ref.authors)
+        assert all(isinstance(chunk, Chunk) for chunk in ref.chunks)
+
+    # test: force validation of a trusted file
+    # expect: every reference is validated
+    trusted.load(validate=True)
+    assert len(validated) == 2
+
+    # test: load a file that was changed after it was saved
+    # expect: every reference is validated
+    validated.clear()
+    with open(fp, "a") as f:
+        f.write("\n")
+    trusted.load()
+    assert len(validated) == 2
+
+    # test: load a file saved with an older schema version
+    # expect: every reference is validated
+    jstore.save()
+    monkeypatch.setattr(storage, "SCHEMA_VERSION", storage.SCHEMA_VERSION + 1)
+    validated.clear()
+    trusted.load()
+    assert len(validated) == 2
+
+
+@pytest.mark.parametrize(
+    "storage_class, filename",
+    [
+        (storage.JsonStorage, "references.json"),
+        (storage.SqliteStorage, "references.sqlite3"),
+    ],
+)
+def test_storage_chunk_spans(tmp_path, storage_class, filename):
+    pages = ["Chicago is a city in Illinois. " * 50, "Baseball is a sport. " * 10]
+    ref = Reference(id="ref1", source_filename="ref1.pdf", status="complete")
+    ref.pages = pages
+    ref.chunks = chunk_reference(ref)
+    legacy = Reference(
+        id="ref2",
+        source_filename="ref2.pdf",
+        status="complete",
+        chunks=[Chunk(text="A chunk stored with its text")],
+    )
+
+    store = storage_class(tmp_path.joinpath(filename))
+    store.references = [ref, legacy]
+    store.save()
+
+    # test: load chunks stored as spans of page text, and with their own text
+    # expect: chunk text is sliced out of the pages of each reference
+    loaded = storage_class(tmp_path.joinpath(filename))
+    loaded.load()
+    assert loaded.references == [ref, legacy]
+    assert loaded.corpus == [ref.get_chunk_text(c) for c in ref.chunks] + [
+        "A chunk stored with its text"
+    ]
+    assert loaded.corpus[0] == pages[0][:1000]
+    assert loaded.corpus[-2] == pages[1]
+    assert all(chunk.text is None for chunk in loaded.references[0].chunks)
+
+
+def test_json_storage_compact_format(monkeypatch, tmp_path, fixtures_dir):
+    monkeypatch.setattr(config, "REFERENCES_STORAGE_FORMAT", "compact")
+    source = storage.JsonStorage(f"{fixtures_dir}/data/references.json")
+    source.load()
+    source.references[0].chunks[0].vector = [0.5, 0.25]
+
+    # test: save a new storage file
+    # expect: it is written in the configured format, and loaded without
+    #   validation
+    filepath = tmp_path.joinpath("references.json")
+    jstore = storage.JsonStorage(filepath)
+    jstore.references = source.references
+    jstore.save()
+    assert serialization.detect_format(filepath.read_bytes()) == "compact"
+
+    monkeypatch.setattr(config, "REFERENCES_STORAGE_FORMAT", "json")
+    monkeypatch.setattr(
+        storage.Reference, "parse_obj", lambda *args: pytest.fail("validated")
+    )
+    loaded = storage.JsonStorage(filepath)
+    loaded.load()
+    assert loaded.references == source.references
+
+    # test: save the loaded storage, whose format is no longer the default
+    # expect: the file keeps its format
+    loaded.save()
+    assert serialization.detect_format(filepath.read_bytes()) == "compact"
+
+
+def test_convert_storage(tmp_path, fixtures_dir):
+    filepath = tmp_path.joinpath("references.json")
+    shutil.copy(f"{fixtures_dir}/data/references.json", filepath)
+    jstore = storage.JsonStorage(filepath)
+    jstore.load()
+
+    # test: convert a JSON storage file to the compressed compact format
+    # expect: the same references are loaded from it
+    storage.convert_storage(tmp_path, StorageFormat.COMPACT, compress=True)
+    raw = filepath.read_bytes()
+    assert serialization.detect_format(raw) == "compact"
+    assert serialization.is_compressed(raw)
+
+    converted = storage.JsonStorage(filepath)
+    converted.load()
+    assert converted.references == jstore.references
+
+    # test: convert back to JSON
+    # expect: the same references, readable as JSON again
+    storage.convert_storage(tmp_path, StorageFormat.JSON)
+    assert serialization.detect_format(filepath.read_bytes()) == "json"
+    converted = storage.JsonStorage(filepath)
+    converted.load(validate=True)
+    assert converted.references == jstore.references
+
+
 def test_json_storage_update(monkeypatch, tmp_path, fixtures_dir):
     fp = f"{fixtures_dir}/data/references.json"
     jstore = storage.JsonStorage(filepath=fp)
@@ -78,6 +253,9 @@ def test_json_storage_update(monkeypatch, tmp_path, fixtures_dir):
     assert output["status"] == "ok"
     assert output["message"] == ""
 
+    # updates are written to disk after a short delay
+    jstore.flush()
+
     # reload from `savepath` to check that the update was successful
     jstore = storage.JsonStorage(filepath=savepath)
     jstore.load()
@@ -98,6 +276,392 @@ def test_json_storage_update(monkeypatch, tmp_path, fixtures_dir):
     assert len(jstore.references[1].chunks) == 6
 
 
+def test_json_storage_coalesces_updates(monkeypatch, tmp_path, fixtures_dir):
+    monkeypatch.setattr(config, "STORAGE_WRITE_DELAY", 60)
+    savepath = tmp_path.joinpath("references.json")
+    shutil.copy(f"{fixtures_dir}/data/references.json", savepath)
+
+    jstore = storage.JsonStorage(filepath=savepath)
+    jstore.load()
+    saves = []
+    monkeypatch.setattr(
+        storage, "write_file_atomically", lambda fp, data: saves.append(fp)
+    )
+
+    for i in range(10):
+        patch = ReferencePatch(data={"citation_key": f"key{i}"})
+        assert jstore.update(jstore.references[0].id, patch).status == "ok"
+
+    # updates are visible immediately, but nothing has been written yet
+    assert jstore.references[0].citation_key == "key9"
+    assert saves == []
+
+    jstore.flush()
+    # references.json, its header and the metadata index are written once
+    assert len(saves) == 3
+
+    # flushing again does nothing, as there are no pending changes
+    jstore.flush()
+    assert len(saves) == 3
+
+
+def test_json_storage_save_is_atomic(monkeypatch, tmp_path, fixtures_dir):
+    savepath = tmp_path.joinpath("references.json")
+    shutil.copy(f"{fixtures_dir}/data/references.json", savepath)
+    original = savepath.read_bytes()
+
+    jstore = storage.JsonStorage(filepath=savepath)
+    jstore.load()
+
+    def fail_replace(src, dst):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(os, "replace", fail_replace)
+    jstore.references[0].citation_key = "reda2023"
+    with pytest.raises(OSError):
+        jstore.save()
+
+    # the previous file is left untouched, and no temporary files remain
+    assert savepath.read_bytes() == original
+    assert [p.name for p in tmp_path.iterdir()] == ["references.json"]
+
+
+@pytest.mark.parametrize(
+    "storage_class, filename",
+    [
+        (storage.JsonStorage, "references.json"),
+        (storage.SqliteStorage, "references.sqlite3"),
+    ],
+)
+def test_storage_update_many(tmp_path, fixtures_dir, storage_class, filename):
+    source = storage.JsonStorage(f"{fixtures_dir}/data/references.json")
+    source.load()
+    store = storage_class(tmp_path.joinpath(filename))
+    store.references = source.references
+    store.save()
+    ids = [ref.id for ref in store.references]
+    version = store.version
+
+    # test: update several references, one of which does not exist
+    # expect: error response, and no reference is changed
+    updates = [
+        ReferenceUpdate(
+            reference_id=ids[0], patch=ReferencePatch(data={"citation_key": "a"})
+        ),
+        ReferenceUpdate(
+            reference_id="id-does-not-exist",
+            patch=ReferencePatch(data={"citation_key": "b"}),
+        ),
+    ]
+    response = store.update_many(updates)
+    assert response.status == "error"
+    assert "id-does-not-exist" in response.message
+    assert [ref.citation_key for ref in store.references] == [None, None]
+    assert store.version == version
+
+    # test: update every reference, patching the first one twice
+    # expect: patches are applied in order, and saved together
+    updates = [
+        ReferenceUpdate(
+            reference_id=ids[0], patch=ReferencePatch(data={"citation_key": "a"})
+        ),
+        ReferenceUpdate(
+            reference_id=ids[1],
+            patch=ReferencePatch(data={"citation_key": "b", "title": "New title"}),
+        ),
+        ReferenceUpdate(
+            reference_id=ids[0], patch=ReferencePatch(data={"citation_key": "c"})
+        ),
+    ]
+    response = store.update_many(updates)
+    assert response.status == "ok"
+    store.flush()
+    assert store.version == version + 1
+
+    reloaded = storage_class(tmp_path.joinpath(filename))
+    reloaded.load()
+    assert [ref.citation_key for ref in reloaded.references] == ["c", "b"]
+    assert reloaded.references[1].title == "New title"
+    assert reloaded.references[0].title == source.references[0].title
+    assert reloaded.references == store.references
+
+
+@pytest.mark.parametrize(
+    "storage_class, filename",
+    [
+        (storage.JsonStorage, "references.json"),
+        (storage.SqliteStorage, "references.sqlite3"),
+    ],
+)
+def test_storage_lookups(tmp_path, fixtures_dir, storage_class, filename):
+    source = storage.JsonStorage(f"{fixtures_dir}/data/references.json")
+    source.load()
+    store = storage_class(tmp_path.joinpath(filename))
+    store.references = source.references
+    store.save()
+    first, second = store.references
+
+    assert store.get_reference_by_filename("some_file.pdf") == first
+    assert store.get_reference_by_filename("missing.pdf") is None
+    assert store.get_reference_by_citation_key("a") is None
+    assert store.get_references_by_doi("10.1/x") == []
+
+    # test: update the indexed fields of references
+    # expect: lookups by the new values find them, and the old values do not
+    store.update_many(
+        [
+            ReferenceUpdate(
+                reference_id=first.id,
+                patch=ReferencePatch(data={"citation_key": "a", "doi": "10.1/X"}),
+            ),
+            ReferenceUpdate(
+                reference_id=second.id,
+                patch=ReferencePatch(data={"doi": "10.1/x"}),
+            ),
+        ]
+    )
+    store.update(first.id, ReferencePatch(data={"citation_key": "b"}))
+    store.flush()
+    assert store.get_reference_by_citation_key("a") is None
+    assert store.get_reference_by_citation_key("b").id == first.id
+    # DOIs are case-insensitive, and several references can share one
+    assert [ref.id for ref in store.get_references_by_doi("10.1/X")] == [
+        first.id,
+        second.id,
+    ]
+
+    # test: add a reference for a new file, and one for a file already stored
+    # expect: the new reference is appended, the other replaces the stored one
+    new_ref = Reference(id="new", source_filename="new.pdf", status="complete")
+    replacement = Reference(
+        id="replacement", source_filename="some_file.pdf", status="complete"
+    )
+    store.add_references([new_ref, replacement])
+    assert [ref.id for ref in store.references] == ["replacement", second.id, "new"]
+    assert store.get_reference_by_filename("some_file.pdf").id == "replacement"
+    assert store.get_reference(first.id) is None
+    assert store.get_reference("new").source_filename == "new.pdf"
+    assert store.get_reference_by_citation_key("b") is None
+
+    reloaded = storage_class(tmp_path.joinpath(filename))
+    reloaded.load()
+    assert reloaded.references == store.references
+
+    # test: delete a reference
+    # expect: it can no longer be looked up, and the rest still can
+    store.delete(reference_ids=[second.id])
+    assert store.get_reference(second.id) is None
+    assert store.get_references_by_doi("10.1/x") == []
+    assert store.get_reference("new").id == "new"
+    assert store.get_reference_by_filename("new.pdf").id == "new"
+
+    store.delete(all_=True)
+    assert store.get_reference_by_filename("new.pdf") is None
+
+
+def test_json_storage_bm25_index(monkeypatch, tmp_path, fixtures_dir):
+    shutil.copy(f"{fixtures_dir}/data/references.json", tmp_path)
+    filepath = tmp_path.joinpath("references.json")
+    source = storage.JsonStorage(filepath)
+    source.load()
+
+    # test: index a file that storage did not write
+    # expect: the index is built, but not saved
+    assert source.bm25_index.num_docs == len(source.chunks)
+    assert not source.bm25_dirpath.exists()
+
+    # test: save the storage
+    # expect: the index is saved with it, and opened with the saved file
+    source.save()
+    assert source.bm25_dirpath.joinpath("manifest.json").exists()
+
+    def mock_build(references):
+        raise AssertionError("index should not be built")
+
+    store = storage.JsonStorage(filepath)
+    store.load()
+    monkeypatch.setattr(storage.BM25Index, "build", mock_build)
+    index = store.bm25_index
+    assert index.get_top_n(["chicago"]) == source.bm25_index.get_top_n(["chicago"])
+
+    # test: patch a reference's metadata, then its pages
+    # expect: it is only indexed again when its text changes
+    first, second = store.references
+    store.update(first.id, ReferencePatch(data={"title": "New title"}))
+    assert store.bm25_index is index
+    assert len(index.segments) == 1
+
+    pages = ["Zebras are not found in Chicago."]
+    chunks = [Chunk(page_num=1, start=0, end=len(pages[0]))]
+    store.update(second.id, ReferencePatch(data={"pages": pages, "chunks": chunks}))
+    store.flush()
+    assert index.get_top_n(["zebras"], n=1)[0].reference_id == second.id
+
+    # test: delete a reference
+    # expect: it is no longer found, and the saved index matches storage
+    store.delete(reference_ids=[second.id])
+    assert {hit.reference_id for hit in index.get_top_n(["zebras"], n=10)} == {first.id}
+    reloaded = storage.JsonStorage(filepath)
+    reloaded.load()
+    assert reloaded.bm25_index.get_top_n(["zebras"], n=10) == index.get_top_n(
+        ["zebras"], n=10
+    )
+
+    # test: add a reference
+    # expect: it is found by the index
+    ref = Reference(id="new", source_filename="new.pdf", status="complete")
+    ref.pages = ["Zebras again."]
+    ref.chunks = chunk_reference(ref)
+    store.add_references([ref])
+    assert index.get_top_n(["zebras"], n=1)[0].reference_id == "new"
+
+
+def test_json_storage_metadata_update_keeps_chunk_indexes(
+    monkeypatch, tmp_path, fixtures_dir
+):
+    shutil.copy(f"{fixtures_dir}/data/references.json", tmp_path)
+    filepath = tmp_path.joinpath("references.json")
+    source = storage.JsonStorage(filepath)
+    source.load()
+    source.bm25_index
+    source.vector_index
+    source.save()
+
+    def mock_build(*args, **kwargs):
+        raise AssertionError("index should not be built")
+
+    monkeypatch.setattr(storage.BM25Index, "build", mock_build)
+    monkeypatch.setattr(storage.VectorIndex, "build", mock_build)
+    monkeypatch.setattr(storage.BM25Index, "open", mock_build)
+    monkeypatch.setattr(storage.VectorIndex, "open", mock_build)
+
+    # test: patch a reference's metadata, and save it
+    # expect: the chunk indexes are not opened
+    store = storage.JsonStorage(filepath)
+    store.load()
+    ref = store.references[0]
+    store.update_many(
+        [
+            ReferenceUpdate(
+                reference_id=ref.id, patch=ReferencePatch(data={"title": "New"})
+            ),
+            ReferenceUpdate(
+                reference_id=ref.id, patch=ReferencePatch(data={"citation_key": "k"})
+            ),
+        ]
+    )
+    store.flush()
+    assert store._chunk_indexes == {}
+
+    # test: open the chunk indexes of the saved file
+    # expect: the indexes saved before the patch, which are still up to date
+    monkeypatch.undo()
+    monkeypatch.setattr(storage.BM25Index, "build", mock_build)
+    monkeypatch.setattr(storage.VectorIndex, "build", mock_build)
+    reloaded = storage.JsonStorage(filepath)
+    reloaded.load()
+    assert reloaded.references[0].title == "New"
+    assert reloaded.bm25_index.num_docs == len(reloaded.chunks)
+    assert reloaded.vector_index.num_docs == len(reloaded.chunks)
+
+
+def test_sqlite_storage_bm25_index(monkeypatch, tmp_path, fixtures_dir):
+    store = _create_sqlite_storage(tmp_path, fixtures_dir)
+    index = store.bm25_index
+    vector_index = store.vector_index
+    assert index.num_docs == len(store.chunks)
+    assert store.bm25_index is index
+
+    def mock_build(*args, **kwargs):
+        raise AssertionError("index should not be built again")
+
+    monkeypatch.setattr(storage.BM25Index, "build", mock_build)
+    monkeypatch.setattr(storage.VectorIndex, "build", mock_build)
+
+    # test: patch a reference's metadata, then its pages
+    # expect: the indexes are kept, and only updated when its text changes
+    first, second = store.references
+    store.update(first.id, ReferencePatch(data={"title": "New title"}))
+    assert store.bm25_index is index
+    assert len(index.segments) == 1
+
+    pages = ["Zebras are not found in Chicago."]
+    chunks = [Chunk(page_num=1, start=0, end=len(pages[0]))]
+    store.update(second.id, ReferencePatch(data={"pages": pages, "chunks": chunks}))
+    assert store.bm25_index.get_top_n(["zebras"], n=1)[0].reference_id == second.id
+
+    # test: delete a reference
+    # expect: it is removed from the indexes
+    store.delete(reference_ids=[first.id])
+    assert store.bm25_index is index
+    assert first.id not in {
+        hit.reference_id for hit in store.bm25_index.get_top_n(["chicago"], n=100)
+    }
+    assert store.vector_index is vector_index
+    assert store.vector_index.num_docs == len(store.chunks)
+
+    # test: add a reference for the file of a stored reference
+    # expect: it replaces the stored reference in the indexes
+    ref = Reference(id="new", source_filename=second.source_filename, status="complete")
+    ref.pages = ["Zebras again."]
+    ref.chunks = chunk_reference(ref)
+    store.add_references([ref])
+    assert [hit.reference_id for hit in index.get_top_n(["zebras"], n=10)] == ["new"]
+    assert index.num_docs == vector_index.num_docs == len(store.chunks) == 1
+
+
+def test_json_storage_vector_index(monkeypatch, tmp_path, fixtures_dir):
+    shutil.copy(f"{fixtures_dir}/data/references.json", tmp_path)
+    filepath = tmp_path.joinpath("references.json")
+    source = storage.JsonStorage(filepath)
+    source.load()
+    source.save()
+
+    # test: add a reference
+    # expect: its chunks are embedded, and saved with the storage
+    ref = Reference(id="new", source_filename="new.pdf", status="complete")
+    ref.pages = ["Zebras are not found in Chicago."]
+    ref.chunks = chunk_reference(ref)
+    source.add_references([ref])
+    assert source.vector_index.num_docs == len(source.chunks)
+    assert source.vector_index.get_top_n("zebras", n=1)[0].reference_id == "new"
+    assert source.vectors_dirpath.joinpath("manifest.json").exists()
+
+    def mock_build(references):
+        raise AssertionError("index should not be built")
+
+    store = storage.JsonStorage(filepath)
+    store.load()
+    monkeypatch.setattr(storage.VectorIndex, "build", mock_build)
+    assert store.vector_index.get_top_n("zebras") == source.vector_index.get_top_n(
+        "zebras"
+    )
+
+    # test: delete the reference
+    # expect: it is no longer found
+    store.delete(reference_ids=["new"])
+    assert "new" not in {
+        hit.reference_id for hit in store.vector_index.get_top_n("zebras", n=10)
+    }
+
+
+def test_json_storage_without_embedder(monkeypatch, tmp_path):
+    monkeypatch.setattr(config, "EMBEDDER", "none")
+    store = storage.JsonStorage(tmp_path.joinpath("references.json"))
+    store.references = []
+    store.save()
+
+    # test: add a reference without an embedder
+    # expect: it is not embedded, and there is no vector index
+    ref = Reference(id="new", source_filename="new.pdf", status="complete")
+    ref.pages = ["Zebras are not found in Chicago."]
+    ref.chunks = chunk_reference(ref)
+    store.add_references([ref])
+    assert store.vector_index is None
+    assert not store.vectors_dirpath.exists()
+    assert store.bm25_index.num_docs == 1
+
+
 def test_storage_delete_references(monkeypatch, tmp_path, fixtures_dir):
     fp = f"{fixtures_dir}/data/references.json"
     jstore = storage.JsonStorage(filepath=fp)
@@ -160,3 +724,386 @@ def test_storage_delete_references(monkeypatch, tmp_path, fixtures_dir):
 
     assert output["status"] == "error"
     assert output["message"] != ""
+
+
+def test_json_storage_iter_references(monkeypatch, tmp_path, fixtures_dir):
+    filepath = tmp_path.joinpath("references.json")
+    shutil.copy(f"{fixtures_dir}/data/references.json", filepath)
+    jstore = storage.JsonStorage(filepath)
+    jstore.load()
+
+    validated = []
+    parse_obj = storage.Reference.parse_obj
+
+    def mock_parse_obj(data):
+        validated.append(data["id"])
+        return parse_obj(data)
+
+    monkeypatch.setattr(storage.Reference, "parse_obj", mock_parse_obj)
+
+    # test: iterate over a file that storage has not saved
+    # expect: every reference is validated
+    assert list(jstore.iter_references()) == jstore.references
+    assert len(validated) == 2
+
+    # test: iterate over a file saved by storage, without chunks
+    # expect: references are not validated, and have no chunks
+    jstore.save()
+    validated.clear()
+    refs = list(jstore.iter_references(include_chunks=False))
+    assert validated == []
+    assert [ref.id for ref in refs] == [ref.id for ref in jstore.references]
+    assert all(ref.chunks == [] for ref in refs)
+    assert refs[0].title == jstore.references[0].title
+
+    # test: the file changes after it was saved
+    # expect: references are validated again
+    filepath.write_bytes(filepath.read_bytes() + b"\n")
+    list(jstore.iter_references())
+    assert len(validated) == 2
+
+    with pytest.raises(FileNotFoundError):
+        storage.JsonStorage(tmp_path.joinpath("missing.json")).iter_references()
+
+
+def test_find_reference(monkeypatch, tmp_path, fixtures_dir):
+    shutil.copy(f"{fixtures_dir}/data/references.json", tmp_path)
+    jstore = storage.JsonStorage(tmp_path.joinpath("references.json"))
+    jstore.load()
+    ref = jstore.references[1]
+
+    # test: find a reference in a storage that has not been loaded
+    # expect: it is read from the file, without loading the storage
+    def mock_load(self, validate=False):
+        raise AssertionError("storage should not be loaded")
+
+    monkeypatch.setattr(storage.JsonStorage, "load", mock_load)
+    assert storage.find_reference(tmp_path, ref.id) == ref
+    assert storage.find_reference(tmp_path, "id-does-not-exist") is None
+    assert storage.storage_cache.get(tmp_path) is None
+    monkeypatch.undo()
+
+    # test: find a reference in a cached storage
+    # expect: the cached reference is returned
+    cached = storage.load_storage(tmp_path)
+    assert storage.storage_cache.get(tmp_path) is cached
+    assert storage.find_reference(tmp_path, ref.id) is cached.references[1]
+
+    with pytest.raises(FileNotFoundError):
+        storage.find_reference(tmp_path.joinpath("missing"), ref.id)
+
+
+def test_sqlite_storage_iter_references(monkeypatch, tmp_path, fixtures_dir):
+    monkeypatch.setattr(storage, "SQLITE_MAX_PARAMETERS", 1)
+    store = _create_sqlite_storage(tmp_path, fixtures_dir)
+
+    assert list(store.iter_references()) == store.references
+    refs = list(store.iter_references(include_chunks=False))
+    assert [ref.id for ref in refs] == [ref.id for ref in store.references]
+    assert all(ref.chunks == [] for ref in refs)
+    assert [ref.authors for ref in refs] == [ref.authors for ref in store.references]
+
+
+def test_sqlite_storage_reuses_connection(monkeypatch, tmp_path, fixtures_dir):
+    filepath = _create_sqlite_storage(tmp_path, fixtures_dir).filepath
+    connections = []
+    original_connect = storage.sqlite3.connect
+
+    def mock_connect(*args, **kwargs):
+        conn = original_connect(*args, **kwargs)
+        connections.append(conn)
+        conn.set_trace_callback(statements.append)
+        return conn
+
+    monkeypatch.setattr(storage.sqlite3, "connect", mock_connect)
+    statements = []
+    store = storage.SqliteStorage(filepath)
+    store.load()
+    ref = store.references[0]
+
+    # test: look up and update references several times
+    # expect: one connection, which creates the schema once
+    for _ in range(3):
+        assert store.get_reference_by_filename(ref.source_filename).id == ref.id
+        store.update(ref.id, ReferencePatch(data={"title": "New title"}))
+    assert len(connections) == 1
+    assert sum("CREATE TABLE" in sql for sql in statements) == 3
+
+    # test: read references without their chunks
+    # expect: chunks are not queried
+    statements.clear()
+    refs = list(store.iter_references(include_chunks=False))
+    assert [r.id for r in refs] == [r.id for r in store.references]
+    assert not any("FROM chunk" in sql for sql in statements)
+
+    store.close()
+    assert store.get_reference(ref.id).title == "New title"
+    assert len(connections) == 2
+
+
+def _create_sqlite_storage(tmp_path, fixtures_dir) -> storage.SqliteStorage:
+    json_path = tmp_path.joinpath("references.json")
+    shutil.copy(f"{fixtures_dir}/data/references.json", json_path)
+
+    store = storage.SqliteStorage(tmp_path.joinpath("references.sqlite3"))
+    assert store.migrate_from_json(json_path)
+    return store
+
+
+def test_list_reference_summaries(monkeypatch, tmp_path, fixtures_dir):
+    fp = tmp_path.joinpath("references.json")
+    shutil.copy(f"{fixtures_dir}/data/references.json", fp)
+
+    # test: list summaries for a file without a metadata index
+    # expect: summaries are read from the storage file
+    page = storage.list_reference_summaries(tmp_path)
+    assert page.total == 2
+    assert [ref.title for ref in page.references] == ["Some title", "Another title"]
+    assert page.references[0].authors[0].full_name == "John Doe"
+    assert page.references[0].status == "complete"
+
+    # test: list summaries after storage has been saved
+    # expect: the storage file is not loaded, only its metadata index
+    jstore = storage.JsonStorage(fp)
+    jstore.load()
+    jstore.references[0].citation_key = "doe2023"
+    jstore.save()
+    assert jstore.index_filepath.exists()
+
+    def mock_load(self, validate=False):
+        raise AssertionError("storage should not be loaded")
+
+    monkeypatch.setattr(storage.JsonStorage, "load", mock_load)
+    storage.storage_cache.clear()
+
+    page = storage.list_reference_summaries(
+        tmp_path,
+        fields=[ReferenceSummaryField.TITLE, ReferenceSummaryField.CITATION_KEY],
+        sort=ReferenceSummaryField.TITLE,
+    )
+    assert [ref.title for ref in page.references] == ["Another title", "Some title"]
+    assert [ref.dict(exclude_unset=True) for ref in page.references] == [
+        {"id": jstore.references[1].id, "title": "Another title", "citation_key": None},
+        {
+            "id": jstore.references[0].id,
+            "title": "Some title",
+            "citation_key": "doe2023",
+        },
+    ]
+
+    # test: sort by a field that is missing for some references
+    # expect: references without a value come last, in both orders
+    for order in [SortOrder.ASC, SortOrder.DESC]:
+        page = storage.list_reference_summaries(
+            tmp_path, sort=ReferenceSummaryField.CITATION_KEY, order=order
+        )
+        assert [ref.citation_key for ref in page.references] == ["doe2023", None]
+
+    # test: page through summaries
+    # expect: only the requested page is returned, with the total count
+    page = storage.list_reference_summaries(tmp_path, offset=1, limit=5)
+    assert page.total == 2
+    assert page.offset == 1
+    assert [ref.title for ref in page.references] == ["Another title"]
+
+    # test: change the storage file without updating its metadata index
+    # expect: the out of date index is not used
+    with open(fp, "a") as f:
+        f.write("\n")
+    assert jstore.read_summaries() is None
+
+
+def test_sqlite_storage_migrate_from_json(tmp_path, fixtures_dir):
+    store = _create_sqlite_storage(tmp_path, fixtures_dir)
+
+    jstore = storage.JsonStorage(filepath=f"{fixtures_dir}/data/references.json")
+    jstore.load()
+
+    # test: load migrated references
+    # expect: references are the same as in the JSON file, in the same order
+    store.load()
+    assert store.references == jstore.references
+    assert store.corpus == jstore.corpus
+    assert store.bm25_index.vocabulary.terms == jstore.bm25_index.vocabulary.terms
+
+    # test: read reference summaries
+    # expect: same summaries as for the JSON file
+    assert store.read_summaries() == [
+        storage.summarize_reference(ref) for ref in jstore.references
+    ]
+
+    # test: migrate again
+    # expect: the JSON file was renamed, so nothing is migrated twice
+    assert not tmp_path.joinpath("references.json").exists()
+    assert tmp_path.joinpath("references.json.migrated").exists()
+    assert not store.migrate_from_json(tmp_path.joinpath("references.json"))
+
+
+def test_sqlite_storage_get_and_update(tmp_path, fixtures_dir):
+    store = _create_sqlite_storage(tmp_path, fixtures_dir)
+    store.load()
+    ref = store.references[0]
+
+    assert store.get_reference(ref.id) == ref
+    assert store.get_reference("id-does-not-exist") is None
+
+    # test: update for a reference that does not exist
+    # expect: error response
+    patch = ReferencePatch(data={"citation_key": "should-not-change"})
+    response = store.update("id-does-not-exist", patch)
+    assert response.status == "error"
+
+    # test: update `citation_key` and `authors` for one Reference
+    # expect: only that Reference is changed
+    patch = ReferencePatch(
+        data={"citation_key": "reda2023", "authors": [{"full_name": "Reda"}]}
+    )
+    response = store.update(ref.id, patch)
+    assert response.status == "ok"
+
+    reloaded = storage.SqliteStorage(store.filepath)
+    reloaded.load()
+    assert reloaded.references[0].citation_key == "reda2023"
+    assert reloaded.references[0].authors == [Author(full_name="Reda")]
+    assert reloaded.references[0].chunks == ref.chunks
+    assert reloaded.references[1] == store.references[1]
+
+    # loaded references are kept up to date
+    assert store.references[0] == reloaded.references[0]
+
+
+def test_sqlite_storage_delete(tmp_path, fixtures_dir):
+    store = _create_sqlite_storage(tmp_path, fixtures_dir)
+    store.load()
+    ids = [ref.id for ref in store.references]
+
+    # test: delete a reference that does not exist, along with one that does
+    # expect: error response, and nothing is deleted
+    response = store.delete(reference_ids=[ids[0], "id-does-not-exist"])
+    assert response.status == "error"
+    assert store.get_reference(ids[0]) is not None
+
+    # test: delete one reference
+    # expect: its authors and chunks are deleted with it
+    response = store.delete(reference_ids=[ids[0]])
+    assert response.status == "ok"
+    assert [ref.id for ref in store.references] == ids[1:]
+
+    reloaded = storage.SqliteStorage(store.filepath)
+    reloaded.load()
+    assert [ref.id for ref in reloaded.references] == ids[1:]
+    assert len(reloaded.chunks) == len(reloaded.references[0].chunks)
+
+    # test: delete all references
+    response = store.delete(all_=True)
+    assert response.status == "ok"
+    assert store.references == []
+
+
+def test_get_storage(monkeypatch, tmp_path, fixtures_dir):
+    shutil.copy(
+        f"{fixtures_dir}/data/references.json", tmp_path.joinpath("references.json")
+    )
+
+    monkeypatch.setattr(config, "REFERENCES_STORAGE_BACKEND", "json")
+    store = storage.get_storage(tmp_path)
+    assert isinstance(store, storage.JsonStorage)
+
+    # test: switch to the SQLite backend
+    # expect: existing references are migrated
+    monkeypatch.setattr(config, "REFERENCES_STORAGE_BACKEND", "sqlite")
+    store = storage.get_storage(tmp_path)
+    assert isinstance(store, storage.SqliteStorage)
+    store.load()
+    assert len(store.references) == 2
+
+
+def test_storage_cache(monkeypatch, tmp_path, fixtures_dir):
+    for project in ["project1", "project2"]:
+        tmp_path.joinpath(project).mkdir()
+        shutil.copy(
+            f"{fixtures_dir}/data/references.json",
+            tmp_path.joinpath(project, "references.json"),
+        )
+
+    loads = []
+    original_load = storage.JsonStorage.load
+
+    def mock_load(self):
+        loads.append(self.filepath)
+        original_load(self)
+
+    monkeypatch.setattr(storage.JsonStorage, "load", mock_load)
+    cache = storage.StorageCache(max_bytes=1024 * 1024)
+
+    # test: load the same storage twice
+    # expect: the storage is only loaded once
+    store = cache.load(tmp_path.joinpath("project1"))
+    assert cache.load(tmp_path.joinpath("project1")) is store
+    assert len(loads) == 1
+
+    # test: update a reference through the cached storage
+    # expect: storage is not loaded again, and the change is visible
+    ref = store.references[0]
+    store.update(ref.id, ReferencePatch(data={"citation_key": "reda2023"}))
+    assert cache.load(tmp_path.joinpath("project1")) is store
+    assert store.get_reference(ref.id).citation_key == "reda2023"
+    assert len(loads) == 1
+
+    # test: the file is changed by something other than the cached storage
+    # expect: storage is loaded again
+    other = storage.JsonStorage(tmp_path.joinpath("project1", "references.json"))
+    other.load()
+    other.delete(reference_ids=[ref.id])
+    reloaded = cache.load(tmp_path.joinpath("project1"))
+    assert reloaded is not store
+    assert len(reloaded.references) == 1
+
+    # test: load a storage that does not fit in the cache with the other one
+    # expect: least recently used storage is evicted
+    del store, reloaded
+    cache.max_bytes = 1
+    cache.load(tmp_path.joinpath("project2"))
+    loads.clear()
+    cache.load(tmp_path.joinpath("project1"))
+    assert len(loads) == 1
+
+
+def test_storage_cache_keeps_evicted_storage_in_use(tmp_path, fixtures_dir):
+    for project in ["project1", "project2", "project3"]:
+        tmp_path.joinpath(project).mkdir()
+        shutil.copy(
+            f"{fixtures_dir}/data/references.json",
+            tmp_path.joinpath(project, "references.json"),
+        )
+    cache = storage.StorageCache(max_bytes=1)
+
+    # test: evict a storage that is still used (e.g. by an ingest job), and
+    # load it again
+    # expect: the same storage, so that it remains the only writer
+    store = cache.load(tmp_path.joinpath("project1"))
+    cache.load(tmp_path.joinpath("project2"))
+    assert cache.load(tmp_path.joinpath("project1")) is store
+    assert cache.get(tmp_path.joinpath("project1")) is store
+
+    # test: evict the storage again, load it, and change references both
+    # through the evicted storage and (with a pending save) the loaded one
+    # expect: no change is lost
+    cache.load(tmp_path.joinpath("project3"))
+    current = cache.load(tmp_path.joinpath("project1"))
+    deleted, updated = [ref.id for ref in current.references]
+    store.delete(reference_ids=[deleted])
+    current.update(updated, ReferencePatch(data={"citation_key": "reda2023"}))
+    current.flush()
+
+    jstore = storage.JsonStorage(tmp_path.joinpath("project1", "references.json"))
+    jstore.load()
+    assert [ref.citation_key for ref in jstore.references] == ["reda2023"]
+
+    # test: evict a storage that is no longer used
+    # expect: the cache does not keep it
+    store_ref = weakref.ref(store)
+    del store, current
+    cache.load(tmp_path.joinpath("project2"))
+    assert store_ref() is None
+    assert cache.load(tmp_path.joinpath("project1")).references == jstore.references
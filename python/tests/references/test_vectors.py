@@ -0,0 +1,198 @@
+import pytest
+from sidecar.references import segments, vectors
+from sidecar.references.embeddings import HashingEmbedder
+from sidecar.references.schemas import Reference
+from sidecar.references.vectors import VectorIndex, VectorSegment
+from sidecar.shared import chunk_reference
+
+
+def _reference(ref_id: str, *pages: str) -> Reference:
+    ref = Reference(id=ref_id, source_filename=f"{ref_id}.pdf", status="complete")
+    ref.pages = list(pages)
+    ref.chunks = chunk_reference(ref) if pages else []
+    return ref
+
+
+def _references() -> list[Reference]:
+    return [
+        _reference("chicago", "Chicago is a city in Illinois.", "Chicago has lakes."),
+        _reference("baseball", "Baseball is a sport.", "The Cubs play baseball."),
+        _reference("empty"),
+        _reference("cubs", "The Chicago Cubs are a baseball team in Chicago."),
+    ]
+
+
+def _library(num_references: int) -> list[Reference]:
+    words = ["chicago", "cubs", "baseball", "city", "lake", "team", "sport", "game"]
+    return [
+        _reference(
+            f"ref-{i}",
+            *[" ".join(words[(i + j) % 8 : (i + j) % 8 + 3]) for j in range(3)],
+        )
+        for i in range(num_references)
+    ]
+
+
+def _chunk_ids(hits) -> list[tuple[str, int]]:
+    return [(hit.reference_id, hit.chunk_index) for hit in hits]
+
+
+@pytest.fixture
+def embedder():
+    return HashingEmbedder(dim=64)
+
+
+def _expected_scores(references, embedder, query):
+    texts = [ref.get_chunk_text(c) for ref in references for c in ref.chunks]
+    return sorted(embedder.embed(texts) @ embedder.embed([query])[0], reverse=True)
+
+
+def test_get_top_n(embedder):
+    references = _references()
+    index = VectorIndex.build(references, embedder)
+
+    # test: rank all the chunks
+    # expect: they are ranked by the cosine similarity of their vectors
+    hits = index.get_top_n("Chicago baseball", n=10)
+    assert index.num_docs == 5
+    assert [hit.score for hit in hits] == pytest.approx(
+        _expected_scores(references, embedder, "Chicago baseball")
+    )
+    assert _chunk_ids(hits)[0] == ("cubs", 0)
+    assert len(index.get_top_n("Chicago baseball", n=2)) == 2
+    assert index.get_top_n("Chicago baseball", n=0) == []
+
+
+def test_add_and_remove(embedder):
+    references = _references()
+    index = VectorIndex.build(references[:2], embedder)
+    index.add(references[2:])
+
+    # test: remove a reference
+    # expect: its chunks are no longer found
+    index.remove(["cubs"])
+    hits = index.get_top_n("cubs", n=10)
+    assert "cubs" not in {hit.reference_id for hit in hits}
+    assert index.get_vectors("cubs") is None
+
+    # test: add a reference with the id of an indexed reference
+    # expect: it replaces the indexed reference
+    index.add([_reference("chicago", "Now about cubs")])
+    assert index.num_docs == 3
+    assert _chunk_ids(index.get_top_n("cubs", n=1)) == [("chicago", 0)]
+    assert index.get_vectors("chicago").shape == (1, 64)
+
+    # test: remove every reference
+    index.remove(["chicago", "baseball"])
+    assert index.get_top_n("cubs", n=10) == []
+
+
+def test_get_top_n_batch(embedder):
+    references = _references()
+    index = VectorIndex.build(references[:2], embedder)
+    index.add(references[2:])
+    index.remove(["baseball"])
+    queries = ["chicago", "cubs team", "", "missing"]
+
+    results = index.get_top_n_batch(queries, n=2)
+    for hits, query in zip(results, queries):
+        expected = index.get_top_n(query, n=2)
+        assert _chunk_ids(hits) == _chunk_ids(expected)
+        assert [h.score for h in hits] == pytest.approx([h.score for h in expected])
+    assert index.get_top_n_batch([], n=2) == []
+
+
+def test_save_and_open(tmp_path, embedder):
+    references = _references()
+    index = VectorIndex.build(references[:2], embedder)
+    index.add(references[2:])
+    index.remove(["baseball"])
+    index.save(tmp_path, "checksum")
+
+    assert VectorIndex.open(tmp_path, "other", embedder=embedder) is None
+    opened = VectorIndex.open(tmp_path, "checksum", embedder=embedder)
+    assert [segment.deleted for segment in opened.segments] == [
+        {"baseball"},
+        frozenset(),
+    ]
+    # vectors are memory mapped, read only, from the segment files
+    assert not any(segment.vectors.flags.writeable for segment in opened.segments)
+    for query in ["chicago", "baseball team"]:
+        assert opened.get_top_n(query, n=10) == index.get_top_n(query, n=10)
+
+    # test: open with another embedder
+    # expect: no index, as the vectors are not comparable
+    assert VectorIndex.open(tmp_path, "checksum", embedder=HashingEmbedder(32)) is None
+
+
+def test_compact(monkeypatch, tmp_path, embedder):
+    monkeypatch.setattr(segments, "MAX_SEGMENTS", 2)
+    references = _references()
+    index = VectorIndex(
+        [VectorSegment.build([ref], embedder) for ref in references], embedder
+    )
+    expected = index.get_top_n("chicago", n=10)
+
+    index.save(tmp_path, "checksum")
+    assert len(index.segments) <= 2
+    assert len(list(tmp_path.glob("segment-*"))) == len(index.segments)
+    assert index.get_top_n("chicago", n=10) == expected
+
+    index.remove(["chicago", "cubs", "empty"])
+    index.save(tmp_path, "checksum")
+    assert len(index.segments) == 1
+    assert index.segments[0].references == [("baseball", 2)]
+    assert _chunk_ids(index.get_top_n("baseball", n=10)) == [
+        ("baseball", 0),
+        ("baseball", 1),
+    ]
+
+
+def test_approximate_search(monkeypatch, tmp_path, embedder):
+    monkeypatch.setattr(vectors, "MIN_VECTORS", 16)
+    references = _library(20)
+    index = VectorIndex.build(references, embedder)
+    [segment] = index.segments
+    assert len(segment.lists) == 7
+
+    # test: probe every list
+    # expect: the same chunks as an exact search
+    monkeypatch.setattr(vectors, "MIN_VECTORS", 1000)
+    exact = VectorIndex.build(references, embedder)
+    assert exact.segments[0].lists is None
+    for query in ["chicago cubs", "lake sport", ""]:
+        hits = index.get_top_n(query, n=5, nprobe=7)
+        assert [h.score for h in hits] == pytest.approx(
+            [h.score for h in exact.get_top_n(query, n=5)]
+        )
+
+    # test: probe one list
+    # expect: only chunks of that list
+    hits = index.get_top_n("chicago cubs", n=60, nprobe=1)
+    assert 0 < len(hits) < 60
+
+    # test: remove, save and open
+    # expect: the vectors of the remaining chunks, in the order of the lists
+    index.remove(["ref-0"])
+    index.save(tmp_path, "checksum")
+    opened = VectorIndex.open(tmp_path, "checksum", embedder=embedder)
+    assert len(opened.segments[0].lists) == 7
+    assert opened.get_top_n("chicago cubs", n=60) == index.get_top_n(
+        "chicago cubs", n=60
+    )
+    assert "ref-0" not in {hit.reference_id for hit in opened.get_top_n("x", n=60)}
+    for ref in references[1:]:
+        assert opened.get_vectors(ref.id) == pytest.approx(exact.get_vectors(ref.id))
+
+
+def test_segments_are_abstract():
+    class IncompleteSegment(segments.IndexSegment):
+        pass
+
+    class IncompleteIndex(segments.SegmentedIndex):
+        segment_class = IncompleteSegment
+
+    with pytest.raises(TypeError):
+        IncompleteSegment([])
+    with pytest.raises(TypeError):
+        IncompleteIndex()
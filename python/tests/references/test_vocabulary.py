@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+from sidecar.references.vocabulary import TokenizedCorpus, Vocabulary, tokenize
+
+
+def test_tokenize():
+    # stopwords are dropped, after lowercasing
+    assert tokenize("The Cubs are a baseball TEAM") == ["cubs", "baseball", "team"]
+    assert tokenize("") == []
+
+
+def test_vocabulary_add_and_decode():
+    vocabulary = Vocabulary()
+    assert vocabulary.add(["cubs", "baseball", "cubs"]) == [0, 1, 0]
+
+    # test: encode tokens with new and known terms
+    # expect: only new terms get new ids
+    ids = vocabulary.encode(["team", "cubs"])
+    assert ids.dtype == np.int32
+    assert ids.tolist() == [2, 0]
+    assert len(vocabulary) == 3
+    assert vocabulary.get("team") == 2
+    assert vocabulary.get("missing") is None
+    assert vocabulary.decode(ids) == ["team", "cubs"]
+
+
+@pytest.mark.parametrize("terms", [[], ["cubs", "ünïcode", "it's"]])
+def test_vocabulary_save_and_open(tmp_path, terms):
+    filepath = tmp_path.joinpath("vocabulary.txt")
+    Vocabulary(terms).save(filepath)
+
+    opened = Vocabulary.open(filepath)
+    assert opened.terms == terms
+    assert [opened.get(term) for term in terms] == list(range(len(terms)))
+
+
+def test_tokenized_corpus():
+    vocabulary = Vocabulary(["chicago"])
+    texts = ["Chicago is a city in Illinois.", "", "The Cubs play in Chicago"]
+    corpus = TokenizedCorpus.from_texts(texts, vocabulary)
+
+    assert len(corpus) == 3
+    assert corpus.lengths.tolist() == [3, 0, 3]
+    assert [vocabulary.decode(ids) for ids in corpus] == [tokenize(t) for t in texts]
+    assert corpus[-1].tolist() == [vocabulary.get("cubs"), vocabulary.get("play"), 0]
+    assert corpus.nbytes == 6 * 4 + 4 * 8
+    with pytest.raises(IndexError):
+        corpus[3]
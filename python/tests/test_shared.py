@@ -1,3 +1,5 @@
+import os
+import stat
 from datetime import date, datetime
 from pathlib import Path
 from uuid import uuid4
@@ -99,6 +101,15 @@ def test_extract_text_from_pdf():
     assert len(text) > 0
 
 
+def test_extract_pages_from_pdf():
+    pdf_file = "fixtures/pdf/grobid-fails.pdf"
+    test_filepath = Path(__file__).parent.joinpath(pdf_file)
+    pages = shared.extract_pages_from_pdf(test_filepath)
+
+    assert len(pages) > 0
+    assert "".join(pages) == shared.extract_text_from_pdf(test_filepath)
+
+
 def test_chunk_text():
     # empty text should return empty list
     chunks = shared.chunk_text("")
@@ -140,7 +151,90 @@ def test_chunk_reference(monkeypatch, tmp_path):
     assert len(chunks) > 0
     assert isinstance(chunks[0], shared.Chunk)
 
+    # chunks are spans of the text of the PDF's pages
+    reference.pages = shared.extract_pages_from_pdf(filepath)
     for chunk in chunks:
-        assert chunk.text is not None
+        assert chunk.text is None
+        assert reference.get_chunk_text(chunk) != ""
         assert chunk.metadata != {}
-        assert chunk.metadata["page_num"] is not None
+        assert chunk.metadata["page_num"] == chunk.page_num
+
+
+def test_chunk_reference_with_extracted_pages():
+    reference = Reference(
+        id=str(uuid4()),
+        source_filename="does-not-exist.pdf",
+        status="complete",
+    )
+    pages = ["a" * 1500, "b" * 10]
+
+    # the PDF is not read when page text is given
+    chunks = shared.chunk_reference(reference, pages=pages)
+
+    assert [chunk.metadata["page_num"] for chunk in chunks] == [1, 1, 2]
+    assert [(c.page_num, c.start, c.end) for c in chunks] == [
+        (1, 0, 1000),
+        (1, 800, 1500),
+        (2, 0, 10),
+    ]
+
+    reference.pages = pages
+    assert reference.get_chunk_text(chunks[0]) == "a" * 1000
+    assert reference.get_chunk_text(chunks[-1]) == "b" * 10
+
+    # test: re-chunk a Reference that has the text of its pages
+    # expect: chunks are created from its pages, without reading the PDF
+    rechunked = shared.chunk_reference(reference, chunk_size=100, chunk_overlap=0)
+    assert len(rechunked) == 16
+    assert "".join(reference.get_chunk_text(c) for c in rechunked) == "".join(pages)
+
+
+def test_link_or_copy_file(monkeypatch, tmp_path):
+    source = tmp_path.joinpath("source.pdf")
+    source.write_bytes(b"%PDF-1.4")
+
+    # test: link a file
+    # expect: the destination shares the source's contents without a copy
+    linked = tmp_path.joinpath("linked.pdf")
+    shared.link_or_copy_file(source, linked)
+    assert linked.read_bytes() == b"%PDF-1.4"
+    assert os.path.samefile(source, linked)
+
+    # test: filesystem does not support hard links
+    # expect: the file is copied instead, replacing any existing file
+    def mock_link(*args):
+        raise OSError("Operation not permitted")
+
+    monkeypatch.setattr(os, "link", mock_link)
+    shared.link_or_copy_file(source, linked)
+    assert linked.read_bytes() == b"%PDF-1.4"
+    assert not os.path.samefile(source, linked)
+
+
+def test_write_file_atomically(tmp_path):
+    filepath = tmp_path.joinpath("data.json")
+    filepath.write_bytes(b"old")
+
+    shared.write_file_atomically(filepath, b"new")
+
+    assert filepath.read_bytes() == b"new"
+    # the temporary file has been renamed over the target
+    assert [p.name for p in tmp_path.iterdir()] == ["data.json"]
+
+
+def test_write_file_atomically_mode(tmp_path):
+    umask = os.umask(0o022)
+    try:
+        # test: write a new file
+        # expect: the mode of a new file, following the umask
+        filepath = tmp_path.joinpath("data.json")
+        shared.write_file_atomically(filepath, b"new")
+        assert stat.S_IMODE(filepath.stat().st_mode) == 0o644
+
+        # test: replace a file
+        # expect: the mode of the file is kept
+        filepath.chmod(0o640)
+        shared.write_file_atomically(filepath, b"newer")
+        assert stat.S_IMODE(filepath.stat().st_mode) == 0o640
+    finally:
+        os.umask(umask)
@@ -1,4 +1,5 @@
-import { universalPost } from '../api';
+import { universalGet, universalPost } from '../api';
+import { IngestJobResponse } from '../api-types';
 import { runProjectIngestion } from '../referencesAPI';
 
 vi.mock('../api');
@@ -6,43 +7,68 @@ vi.mock('../../io/filesystem');
 
 const PROJECT_ID = 'cafe-babe-1234-5678-1234-5678-1234-5678';
 
+const makeJob = (status: IngestJobResponse['status']): IngestJobResponse => ({
+  job_id: 'job-id',
+  project_id: PROJECT_ID,
+  status,
+  stage: status === 'completed' ? 'done' : 'grobid',
+  files_total: 1,
+  files_done: status === 'completed' ? 1 : 0,
+  files: [],
+  message: status === 'failed' ? 'Ingest failed' : '',
+});
+
 describe('ingestion.ingest', () => {
+  beforeEach(() => {
+    vi.mocked(universalPost).mockResolvedValue(makeJob('completed'));
+    vi.mocked(universalGet).mockResolvedValue([]);
+  });
+
   afterEach(() => {
     vi.clearAllMocks();
+    vi.useRealTimers();
   });
 
   it('should call backend API to start ingest', async () => {
-    vi.mocked(universalPost).mockResolvedValue({
-      project_name: 'project-name',
-      references: [],
-    });
-
     await runProjectIngestion(PROJECT_ID);
     expect(universalPost).toHaveBeenCalledTimes(1);
     expect(universalPost).toHaveBeenCalledWith(`/api/references/${PROJECT_ID}`, {});
   });
 
-  it('Should map empty IngestResponse[] to empty ReferenceItem[]', async () => {
-    vi.mocked(universalPost).mockResolvedValue({
-      project_name: 'project-name',
-      references: [],
-    });
+  it('should poll the ingest job until it has finished', async () => {
+    vi.useFakeTimers();
+    vi.mocked(universalPost).mockResolvedValue(makeJob('running'));
+    vi.mocked(universalGet)
+      .mockResolvedValueOnce(makeJob('running'))
+      .mockResolvedValueOnce(makeJob('completed'))
+      .mockResolvedValueOnce([]);
+
+    const promise = runProjectIngestion(PROJECT_ID);
+    await vi.runAllTimersAsync();
+    await promise;
+
+    expect(universalGet).toHaveBeenCalledWith(`/api/references/${PROJECT_ID}/jobs/job-id`, undefined);
+    expect(universalGet).toHaveBeenLastCalledWith(`/api/references/${PROJECT_ID}`, undefined);
+  });
+
+  it('should throw if the ingest job failed', async () => {
+    vi.mocked(universalPost).mockResolvedValue(makeJob('failed'));
+    await expect(runProjectIngestion(PROJECT_ID)).rejects.toThrow('Ingest failed');
+  });
 
+  it('Should map empty Reference[] to empty ReferenceItem[]', async () => {
     const response = await runProjectIngestion(PROJECT_ID);
     expect(response).toStrictEqual([]);
   });
 
-  it('Should map undefined IngestResponse to ReferenceItem', async () => {
-    vi.mocked(universalPost).mockResolvedValue({
-      project_name: 'project-name',
-      references: [
-        {
-          id: '45722618-c4fb-4ae1-9230-7fc19a7219ed',
-          source_filename: 'file.pdf',
-          status: 'complete',
-        },
-      ],
-    });
+  it('Should map undefined Reference fields to ReferenceItem', async () => {
+    vi.mocked(universalGet).mockResolvedValue([
+      {
+        id: '45722618-c4fb-4ae1-9230-7fc19a7219ed',
+        source_filename: 'file.pdf',
+        status: 'complete',
+      },
+    ]);
 
     const response = await runProjectIngestion(PROJECT_ID);
     expect(response).toHaveLength(1);
@@ -51,27 +77,24 @@ describe('ingestion.ingest', () => {
   });
 
   it('Should map fullName of authors ReferenceItem', async () => {
-    vi.mocked(universalPost).mockResolvedValue({
-      project_name: 'project-name',
-      references: [
-        {
-          id: '45722618-c4fb-4ae1-9230-7fc19a7219ed',
-          source_filename: 'file.pdf',
-          status: 'complete',
-          authors: [
-            {
-              full_name: 'Joe Doe',
-              email: 'joe@doe.com',
-              given_name: 'Joe',
-              surname: 'Doe',
-            },
-            {
-              full_name: 'Ana Maria',
-            },
-          ],
-        },
-      ],
-    });
+    vi.mocked(universalGet).mockResolvedValue([
+      {
+        id: '45722618-c4fb-4ae1-9230-7fc19a7219ed',
+        source_filename: 'file.pdf',
+        status: 'complete',
+        authors: [
+          {
+            full_name: 'Joe Doe',
+            email: 'joe@doe.com',
+            given_name: 'Joe',
+            surname: 'Doe',
+          },
+          {
+            full_name: 'Ana Maria',
+          },
+        ],
+      },
+    ]);
 
     const response = await runProjectIngestion(PROJECT_ID);
     expect(response).toHaveLength(1);
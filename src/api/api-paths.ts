@@ -15,13 +15,20 @@ import {
   FlatSettingsSchemaPatch,
   FolderEntry,
   HTTPValidationError,
-  IngestResponse,
+  IngestFileProgress,
+  IngestJobResponse,
+  IngestJobStatus,
+  IngestStage,
   IngestStatus,
   ProjectCreateRequest,
   ProjectDetailsResponse,
   ProjectFileTreeResponse,
   Reference,
   ReferencePatch,
+  ReferenceSummary,
+  ReferenceSummaryField,
+  ReferenceSummaryPage,
+  ReferenceUpdate,
   ResponseStatus,
   RewriteChoice,
   RewriteMannerType,
@@ -29,6 +36,7 @@ import {
   RewriteResponse,
   S2SearchResult,
   SearchResponse,
+  SortOrder,
   TextCompletionChoice,
   TextCompletionRequest,
   TextCompletionResponse,
@@ -108,7 +116,7 @@ export interface paths {
     get: operations['list_references_api_references__project_id__get'];
     /**
      * Ingest References
-     * @description Ingests references from PDFs in the project uploads directory
+     * @description Starts a background job to ingest PDFs in the project uploads directory
      */
     post: operations['ingest_references_api_references__project_id__post'];
   };
@@ -124,6 +132,35 @@ export interface paths {
     /** Http Bulk Delete */
     post: operations['http_bulk_delete_api_references__project_id__bulk_delete_post'];
   };
+  '/api/references/{project_id}/bulk_update': {
+    /**
+     * Http Bulk Update
+     * @description Applies the patches of several references, saving them together
+     */
+    post: operations['http_bulk_update_api_references__project_id__bulk_update_post'];
+  };
+  '/api/references/{project_id}/jobs/{job_id}': {
+    /**
+     * Get Ingest Job
+     * @description Returns the progress of an ingest job
+     */
+    get: operations['get_ingest_job_api_references__project_id__jobs__job_id__get'];
+  };
+  '/api/references/{project_id}/jobs/{job_id}/cancel': {
+    /**
+     * Cancel Ingest Job
+     * @description Cancels an ingest job, discarding any references it has not saved yet
+     */
+    post: operations['cancel_ingest_job_api_references__project_id__jobs__job_id__cancel_post'];
+  };
+  '/api/references/{project_id}/summaries': {
+    /**
+     * List Reference Summaries
+     * @description Returns a page of reference summaries (metadata without contents or
+     * chunks), with only the requested `fields`
+     */
+    get: operations['list_reference_summaries_api_references__project_id__summaries_get'];
+  };
   '/api/search/s2': {
     /** Http Search S2 */
     get: operations['http_search_s2_api_search_s2_get'];
@@ -174,11 +211,21 @@ export interface components {
       index: number;
       text: string;
     };
-    /** Chunk */
+    /**
+     * Chunk
+     * @description A piece of a Reference's text.
+     *
+     * Chunks created by ingest do not hold a copy of their text. They are a
+     * span, from character `start` to `end`, of page `page_num` of their
+     * Reference's `pages`: use `Reference.get_chunk_text` to read it.
+     */
     Chunk: {
+      end?: number;
       /** @default {} */
       metadata?: Record<string, never>;
-      text: string;
+      page_num?: number;
+      start?: number;
+      text?: string;
       /** @default [] */
       vector?: number[];
     };
@@ -236,11 +283,39 @@ export interface components {
       /** Detail */
       detail?: ValidationError[];
     };
-    /** IngestResponse */
-    IngestResponse: {
-      project_name: string;
-      references: Reference[];
+    /** IngestFileProgress */
+    IngestFileProgress: {
+      source_filename: string;
+      stage: IngestStage;
+      status: IngestStatus;
+    };
+    /**
+     * IngestJobResponse
+     * @description The state of a background ingest job for a project
+     */
+    IngestJobResponse: {
+      eta_seconds?: number;
+      files: IngestFileProgress[];
+      files_done: number;
+      files_total: number;
+      job_id: string;
+      message: string;
+      project_id: string;
+      stage: IngestStage;
+      status: IngestJobStatus;
     };
+    /**
+     * IngestJobStatus
+     * @description An enumeration.
+     * @enum {string}
+     */
+    IngestJobStatus: 'queued' | 'running' | 'completed' | 'failed' | 'cancelled';
+    /**
+     * IngestStage
+     * @description An enumeration.
+     * @enum {string}
+     */
+    IngestStage: 'queued' | 'checking_uploads' | 'grobid' | 'creating_references' | 'saving' | 'done';
     /**
      * IngestStatus
      * @description An enumeration.
@@ -278,6 +353,8 @@ export interface components {
       id: string;
       /** @default {} */
       metadata?: Record<string, never>;
+      /** @default [] */
+      pages?: string[];
       /** Format: date */
       published_date?: string;
       source_filename: string;
@@ -291,6 +368,51 @@ export interface components {
     ReferencePatch: {
       data: Record<string, never>;
     };
+    /**
+     * ReferenceSummary
+     * @description The metadata of a Reference, without its contents and chunks, for
+     * listing references. Only `id` and the requested fields are returned.
+     */
+    ReferenceSummary: {
+      abstract?: string;
+      authors?: Author[];
+      citation_key?: string;
+      doi?: string;
+      id: string;
+      /** Format: date */
+      published_date?: string;
+      source_filename?: string;
+      status?: IngestStatus;
+      title?: string;
+    };
+    /**
+     * ReferenceSummaryField
+     * @description An enumeration.
+     * @enum {string}
+     */
+    ReferenceSummaryField:
+      | 'source_filename'
+      | 'status'
+      | 'citation_key'
+      | 'doi'
+      | 'title'
+      | 'abstract'
+      | 'published_date'
+      | 'authors';
+    /**
+     * ReferenceSummaryPage
+     * @description A page of reference summaries, out of `total` references
+     */
+    ReferenceSummaryPage: {
+      offset: number;
+      references: ReferenceSummary[];
+      total: number;
+    };
+    /** ReferenceUpdate */
+    ReferenceUpdate: {
+      patch: ReferencePatch;
+      reference_id: string;
+    };
     /**
      * ResponseStatus
      * @description An enumeration.
@@ -341,6 +463,12 @@ export interface components {
       results: S2SearchResult[];
       status: ResponseStatus;
     };
+    /**
+     * SortOrder
+     * @description An enumeration.
+     * @enum {string}
+     */
+    SortOrder: 'asc' | 'desc';
     /** TextCompletionChoice */
     TextCompletionChoice: {
       index: number;
@@ -719,7 +847,7 @@ export interface operations {
   };
   /**
    * Ingest References
-   * @description Ingests references from PDFs in the project uploads directory
+   * @description Starts a background job to ingest PDFs in the project uploads directory
    */
   ingest_references_api_references__project_id__post: {
     parameters: {
@@ -736,7 +864,7 @@ export interface operations {
       /** @description Successful Response */
       200: {
         content: {
-          'application/json': IngestResponse;
+          'application/json': IngestJobResponse;
         };
       };
       /** @description Validation Error */
@@ -848,6 +976,126 @@ export interface operations {
       };
     };
   };
+  /**
+   * Http Bulk Update
+   * @description Applies the patches of several references, saving them together
+   */
+  http_bulk_update_api_references__project_id__bulk_update_post: {
+    parameters: {
+      path: {
+        project_id: string;
+      };
+    };
+    requestBody: {
+      content: {
+        'application/json': ReferenceUpdate[];
+      };
+    };
+    responses: {
+      /** @description Successful Response */
+      200: {
+        content: {
+          'application/json': UpdateStatusResponse;
+        };
+      };
+      /** @description Validation Error */
+      422: {
+        content: {
+          'application/json': HTTPValidationError;
+        };
+      };
+    };
+  };
+  /**
+   * Get Ingest Job
+   * @description Returns the progress of an ingest job
+   */
+  get_ingest_job_api_references__project_id__jobs__job_id__get: {
+    parameters: {
+      path: {
+        project_id: string;
+        job_id: string;
+      };
+    };
+    responses: {
+      /** @description Successful Response */
+      200: {
+        content: {
+          'application/json': IngestJobResponse;
+        };
+      };
+      /** @description Validation Error */
+      422: {
+        content: {
+          'application/json': HTTPValidationError;
+        };
+      };
+    };
+  };
+  /**
+   * Cancel Ingest Job
+   * @description Cancels an ingest job, discarding any references it has not saved yet
+   */
+  cancel_ingest_job_api_references__project_id__jobs__job_id__cancel_post: {
+    parameters: {
+      path: {
+        project_id: string;
+        job_id: string;
+      };
+    };
+    requestBody: {
+      content: {
+        'application/json': EmptyRequest;
+      };
+    };
+    responses: {
+      /** @description Successful Response */
+      200: {
+        content: {
+          'application/json': IngestJobResponse;
+        };
+      };
+      /** @description Validation Error */
+      422: {
+        content: {
+          'application/json': HTTPValidationError;
+        };
+      };
+    };
+  };
+  /**
+   * List Reference Summaries
+   * @description Returns a page of reference summaries (metadata without contents or
+   * chunks), with only the requested `fields`
+   */
+  list_reference_summaries_api_references__project_id__summaries_get: {
+    parameters: {
+      query?: {
+        fields?: ReferenceSummaryField[];
+        offset?: number;
+        limit?: number;
+        sort?: ReferenceSummaryField;
+        order?: SortOrder;
+      };
+      path: {
+        project_id: string;
+      };
+    };
+    responses: {
+      /** @description Successful Response */
+      200: {
+        content: {
+          'application/json': ReferenceSummaryPage;
+        };
+      };
+      /** @description Validation Error */
+      422: {
+        content: {
+          'application/json': HTTPValidationError;
+        };
+      };
+    };
+  };
   /** Http Search S2 */
   http_search_s2_api_search_s2_get: {
     parameters: {
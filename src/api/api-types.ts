@@ -24,6 +24,13 @@ export type Location = (string | number)[];
 export type Message = string;
 export type ErrorType = string;
 export type Detail = ValidationError[];
+/**
+ * An enumeration.
+ *
+ * This interface was referenced by `ApiSchema`'s JSON-Schema
+ * via the `definition` "IngestStage".
+ */
+export type IngestStage = 'queued' | 'checking_uploads' | 'grobid' | 'creating_references' | 'saving' | 'done';
 /**
  * An enumeration.
  *
@@ -31,6 +38,35 @@ export type Detail = ValidationError[];
  * via the `definition` "IngestStatus".
  */
 export type IngestStatus = 'processing' | 'failure' | 'complete';
+/**
+ * An enumeration.
+ *
+ * This interface was referenced by `ApiSchema`'s JSON-Schema
+ * via the `definition` "IngestJobStatus".
+ */
+export type IngestJobStatus = 'queued' | 'running' | 'completed' | 'failed' | 'cancelled';
+/**
+ * An enumeration.
+ *
+ * This interface was referenced by `ApiSchema`'s JSON-Schema
+ * via the `definition` "ReferenceSummaryField".
+ */
+export type ReferenceSummaryField =
+  | 'source_filename'
+  | 'status'
+  | 'citation_key'
+  | 'doi'
+  | 'title'
+  | 'abstract'
+  | 'published_date'
+  | 'authors';
+/**
+ * An enumeration.
+ *
+ * This interface was referenced by `ApiSchema`'s JSON-Schema
+ * via the `definition` "SortOrder".
+ */
+export type SortOrder = 'asc' | 'desc';
 
 export interface ApiSchema {
   [k: string]: unknown;
@@ -79,11 +115,20 @@ export interface ChatResponseChoice {
   text: string;
 }
 /**
+ * A piece of a Reference's text.
+ *
+ * Chunks created by ingest do not hold a copy of their text. They are a
+ * span, from character `start` to `end`, of page `page_num` of their
+ * Reference's `pages`: use `Reference.get_chunk_text` to read it.
+ *
  * This interface was referenced by `ApiSchema`'s JSON-Schema
  * via the `definition` "Chunk".
  */
 export interface Chunk {
-  text: string;
+  text?: string;
+  page_num?: number;
+  start?: number;
+  end?: number;
   vector?: number[];
   metadata?: {};
 }
@@ -172,11 +217,53 @@ export interface ValidationError {
 }
 /**
  * This interface was referenced by `ApiSchema`'s JSON-Schema
- * via the `definition` "IngestResponse".
+ * via the `definition` "IngestFileProgress".
+ */
+export interface IngestFileProgress {
+  source_filename: string;
+  stage: IngestStage;
+  status: IngestStatus;
+}
+/**
+ * The state of a background ingest job for a project
+ *
+ * This interface was referenced by `ApiSchema`'s JSON-Schema
+ * via the `definition` "IngestJobResponse".
+ */
+export interface IngestJobResponse {
+  job_id: string;
+  project_id: string;
+  status: IngestJobStatus;
+  stage: IngestStage;
+  files_total: number;
+  files_done: number;
+  files: IngestFileProgress[];
+  eta_seconds?: number;
+  message: string;
+}
+/**
+ * This interface was referenced by `ApiSchema`'s JSON-Schema
+ * via the `definition` "ProjectCreateRequest".
  */
-export interface IngestResponse {
+export interface ProjectCreateRequest {
   project_name: string;
-  references: Reference[];
+  project_path?: string;
+}
+/**
+ * This interface was referenced by `ApiSchema`'s JSON-Schema
+ * via the `definition` "ProjectDetailsResponse".
+ */
+export interface ProjectDetailsResponse {
+  id: string;
+  name: string;
+  path: string;
+}
+/**
+ * This interface was referenced by `ApiSchema`'s JSON-Schema
+ * via the `definition` "ProjectFileTreeResponse".
+ */
+export interface ProjectFileTreeResponse {
+  contents: (FileEntry | FolderEntry)[];
 }
 /**
  * A reference for an academic paper / PDF
@@ -196,40 +283,54 @@ export interface Reference {
   published_date?: string;
   authors?: Author[];
   chunks?: Chunk[];
+  pages?: string[];
   metadata?: {};
 }
 /**
+ * ReferencePatch is the input type for updating a Reference's metadata.
+ *
  * This interface was referenced by `ApiSchema`'s JSON-Schema
- * via the `definition` "ProjectCreateRequest".
+ * via the `definition` "ReferencePatch".
  */
-export interface ProjectCreateRequest {
-  project_name: string;
-  project_path?: string;
+export interface ReferencePatch {
+  data: {};
 }
 /**
+ * The metadata of a Reference, without its contents and chunks, for
+ * listing references. Only `id` and the requested fields are returned.
+ *
  * This interface was referenced by `ApiSchema`'s JSON-Schema
- * via the `definition` "ProjectDetailsResponse".
+ * via the `definition` "ReferenceSummary".
  */
-export interface ProjectDetailsResponse {
+export interface ReferenceSummary {
   id: string;
-  name: string;
-  path: string;
+  source_filename?: string;
+  status?: IngestStatus;
+  citation_key?: string;
+  doi?: string;
+  title?: string;
+  abstract?: string;
+  published_date?: string;
+  authors?: Author[];
 }
 /**
+ * A page of reference summaries, out of `total` references
+ *
  * This interface was referenced by `ApiSchema`'s JSON-Schema
- * via the `definition` "ProjectFileTreeResponse".
+ * via the `definition` "ReferenceSummaryPage".
  */
-export interface ProjectFileTreeResponse {
-  contents: (FileEntry | FolderEntry)[];
+export interface ReferenceSummaryPage {
+  total: number;
+  offset: number;
+  references: ReferenceSummary[];
 }
 /**
- * ReferencePatch is the input type for updating a Reference's metadata.
- *
  * This interface was referenced by `ApiSchema`'s JSON-Schema
- * via the `definition` "ReferencePatch".
+ * via the `definition` "ReferenceUpdate".
  */
-export interface ReferencePatch {
-  data: {};
+export interface ReferenceUpdate {
+  reference_id: string;
+  patch: ReferencePatch;
 }
 /**
  * This interface was referenced by `ApiSchema`'s JSON-Schema
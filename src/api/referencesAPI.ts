@@ -3,9 +3,20 @@ import { ReferenceItem } from '../types/ReferenceItem';
 import { Reference } from './api-types';
 import { apiGetJson, apiPatch, apiPost } from './typed-api';
 
+const INGEST_POLL_INTERVAL_MS = 1000;
+
 export async function runProjectIngestion(projectId: string): Promise<ReferenceItem[]> {
-  const ingestResponse = await apiPost('/api/references/{project_id}', { path: { project_id: projectId } }, {});
-  return parsePdfIngestionResponse(ingestResponse.references);
+  let job = await apiPost('/api/references/{project_id}', { path: { project_id: projectId } }, {});
+  while (job.status === 'queued' || job.status === 'running') {
+    await new Promise((resolve) => setTimeout(resolve, INGEST_POLL_INTERVAL_MS));
+    job = await apiGetJson('/api/references/{project_id}/jobs/{job_id}', {
+      path: { project_id: projectId, job_id: job.job_id },
+    });
+  }
+  if (job.status === 'failed') {
+    throw new Error(job.message);
+  }
+  return getProjectReferences(projectId);
 }
 
 export async function removeProjectReferences(projectId: string, ids: string[]) {